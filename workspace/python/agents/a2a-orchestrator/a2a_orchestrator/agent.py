@@ -16,13 +16,14 @@
 #### 運作流程
 1.  **初始化**：腳本首先匯入必要的 ADK 模組，並為三個遠端代理建立 `RemoteA2aAgent` 實例。每個遠端代理都透過其 `agent_card` URL 進行識別，該 URL 指向一個描述代理能力的 JSON 檔案。
 2.  **工具定義**：定義了兩個輔助工具：
-    - `check_agent_availability`：用於檢查遠端代理是否在線上且可正常通訊。
+    - `check_agent_availability`：回報遠端代理是否可用。結果來自 `health.py` 的背景健康監控快取，不會阻塞事件迴圈。
     - `log_coordination_step`：用於在協調過程中記錄每個步驟，方便追蹤與除錯。
 3.  **協調器設定**：
     - `root_agent` (協調器) 被設定為使用 `gemini-2.0-flash` 模型。
     - `instruction` 參數提供了詳細的提示，指導協調器如何根據任務類型將工作委派給正確的子代理。
     - `sub_agents` 參數將三個遠端代理註冊為協調器的子代理，使其能夠直接呼叫它們。
     - `tools` 參數將上述定義的輔助工具提供給協調器使用。
+    - 每個遠端代理都設定了斷路器的 `before_agent_callback`，已知無法使用的代理會立即回覆而不是等待連線逾時。
 4.  **執行**：當協調器收到一個查詢時，它會根據其指示分析查詢內容，決定需要哪個（或哪些）子代理的技能，然後將相應的子任務委派出去。例如，一個需要研究和寫作的查詢會先被送到 `research_specialist`，其結果再交給 `content_writer` 進行處理。
 """
 
@@ -32,51 +33,52 @@ from google.adk.agents.remote_a2a_agent import RemoteA2aAgent, AGENT_CARD_WELL_K
 from google.adk.tools import FunctionTool
 from google.genai import types
 
+from .health import AgentHealthMonitor
 
-def check_agent_availability(agent_name: str, base_url: str) -> dict:
+
+# --- 遠端代理健康監控 ---
+# 背景探測三個遠端代理的 agent card，並維護可用性表與斷路器狀態。
+REMOTE_AGENTS = {
+    "research_specialist": "http://localhost:8001",
+    "data_analyst": "http://localhost:8002",
+    "content_writer": "http://localhost:8003",
+}
+
+health_monitor = AgentHealthMonitor(REMOTE_AGENTS)
+
+
+async def check_agent_availability(agent_name: str, base_url: str) -> dict:
     """
     檢查遠端 A2A 代理是否可用。
 
-    此函式會向遠端代理的 agent-card URL 發送一個 HTTP GET 請求，
-    以確認代理伺服器是否正在運行且可存取。
+    結果來自背景健康監控的快取，不會在每次呼叫時發出 HTTP 請求；
+    只有尚未探測過的代理會在第一次呼叫時立即探測一次。
+    只能檢查啟動時註冊的代理 (REMOTE_AGENTS)，其他 URL 回傳 "unknown"，
+    也不會加入探測清單。
 
     Args:
         agent_name: 要檢查的代理名稱。
         base_url: 遠端代理的基礎 URL (例如 http://localhost:8001)。
 
     Returns:
-        一個包含檢查狀態、可用性與詳細報告的字典。
+        一個包含檢查狀態、可用性、斷路器狀態與詳細報告的字典。
     """
-    try:
-        # 匯入 requests 函式庫以發送 HTTP 請求
-        import requests
-        # 組合代理卡片的完整 URL
-        card_url = f"{base_url}{AGENT_CARD_WELL_KNOWN_PATH}"
-        # 發送 GET 請求，並設定 5 秒超時以避免無限等待
-        response = requests.get(card_url, timeout=5)
-
-        # 如果回應狀態碼為 200 (OK)，表示代理可用
-        if response.status_code == 200:
-            return {
-                "status": "success",
-                "available": True,
-                "report": f"代理 {agent_name} 可用",
-                "agent_card": response.json()  # 回傳代理的能力描述檔
-            }
-        else:
-            # 如果狀態碼不是 200，表示代理有問題
-            return {
-                "status": "error",
-                "available": False,
-                "report": f"代理 {agent_name} 回傳狀態 {response.status_code}"
-            }
-    except Exception as e:
-        # 捕捉請求過程中的任何例外狀況 (例如網路錯誤、超時)
+    health = health_monitor.get(base_url)
+    if health is None:
         return {
             "status": "error",
             "available": False,
-            "report": f"檢查 {agent_name} 失敗：{str(e)}"
+            "circuit_state": "unknown",
+            "report": (
+                f"未知的代理 {agent_name} ({base_url})；"
+                f"只能檢查已註冊的代理：{', '.join(REMOTE_AGENTS)}"
+            ),
         }
+    # 確保背景探測已在目前的事件迴圈中啟動
+    health_monitor.start()
+    if health.last_checked is None:
+        await health_monitor.probe(health.base_url)
+    return health_monitor.report(health)
 
 
 def log_coordination_step(step: str, agent_name: str = "") -> dict:
@@ -112,26 +114,33 @@ def log_coordination_step(step: str, agent_name: str = "") -> dict:
 # 每個實例都代表一個獨立運行的遠端服務。
 # `agent_card` URL 指向遠端代理伺服器自動產生的 .well-known/agent-card.json，
 # ADK 會使用這個檔案來了解遠端代理的能力。
+# `before_agent_callback` 在代理已知無法使用時直接結束委派 (fail fast)。
 
 research_agent = RemoteA2aAgent(
     name="research_specialist",
     description="進行網路研究與事實查核",
     # 指定研究代理的 agent-card 位置
-    agent_card=f"http://localhost:8001{AGENT_CARD_WELL_KNOWN_PATH}"
+    agent_card=f"{REMOTE_AGENTS['research_specialist']}{AGENT_CARD_WELL_KNOWN_PATH}",
+    # 斷路器開啟時立即回覆，不等待連線逾時
+    before_agent_callback=health_monitor.fail_fast_callback(),
 )
 
 analysis_agent = RemoteA2aAgent(
     name="data_analyst",
     description="分析資料並產生洞察",
     # 指定分析代理的 agent-card 位置
-    agent_card=f"http://localhost:8002{AGENT_CARD_WELL_KNOWN_PATH}"
+    agent_card=f"{REMOTE_AGENTS['data_analyst']}{AGENT_CARD_WELL_KNOWN_PATH}",
+    # 斷路器開啟時立即回覆，不等待連線逾時
+    before_agent_callback=health_monitor.fail_fast_callback(),
 )
 
 content_agent = RemoteA2aAgent(
     name="content_writer",
     description="建立書面內容與摘要",
     # 指定內容代理的 agent-card 位置
-    agent_card=f"http://localhost:8003{AGENT_CARD_WELL_KNOWN_PATH}"
+    agent_card=f"{REMOTE_AGENTS['content_writer']}{AGENT_CARD_WELL_KNOWN_PATH}",
+    # 斷路器開啟時立即回覆，不等待連線逾時
+    before_agent_callback=health_monitor.fail_fast_callback(),
 )
 
 # --- 主要協調器代理 ---
@@ -156,7 +165,7 @@ root_agent = Agent(
     3. 將分析任務委派給 data_analyst 子代理。
     4. 將內容創作任務委派給 content_writer 子代理。
     5. 使用 log_coordination_step 工具來追蹤協調過程的每一步。
-    6. (可選) 使用 check_agent_availability 工具來驗證代理在委派前的狀態。
+    6. (可選) 使用 check_agent_availability 工具查詢代理目前的狀態 (結果來自快取，呼叫成本很低)。
 
     遠端代理是使用 uvicorn + to_a2a() 公開的，並在您的協調工作流程中作為子代理無縫地運作。
 
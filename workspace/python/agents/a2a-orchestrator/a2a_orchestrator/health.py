@@ -0,0 +1,315 @@
+"""
+遠端 A2A 代理的健康探測 (Health Probing) 與斷路器 (Circuit Breaker)
+
+### 程式碼流程註解
+
+#### 核心功能
+`AgentHealthMonitor` 在背景定期以非同步 HTTP 請求取得每個遠端代理的 agent card，
+並把結果保存在記憶體中的可用性表。協調器的 `check_agent_availability` 工具
+直接從這張表回答，不必在每次委派前於事件迴圈中發出阻塞式請求。
+
+#### 斷路器狀態
+1.  **closed**：代理正常，委派照常進行。
+2.  **open**：連續失敗達到 `failure_threshold` 次。委派會立即失敗 (fail fast)，
+    並在 `reset_timeout` 秒內不再探測該代理。
+3.  **half_open**：冷卻時間結束後的試探。下一次探測成功就回到 closed，失敗則重新 open。
+
+#### 可調參數 (環境變數)
+- `A2A_PROBE_INTERVAL`：背景探測間隔秒數 (預設 15)
+- `A2A_PROBE_TIMEOUT`：單次探測逾時秒數 (預設 2)
+- `A2A_FAILURE_THRESHOLD`：開啟斷路器前允許的連續失敗次數 (預設 2)
+- `A2A_CIRCUIT_RESET`：斷路器開啟後再次探測前的冷卻秒數 (預設 30)
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Callable, Dict, Optional, Set
+
+import httpx
+from google.adk.agents.remote_a2a_agent import AGENT_CARD_WELL_KNOWN_PATH
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROBE_INTERVAL = float(os.getenv("A2A_PROBE_INTERVAL", "15"))
+DEFAULT_PROBE_TIMEOUT = float(os.getenv("A2A_PROBE_TIMEOUT", "2"))
+DEFAULT_FAILURE_THRESHOLD = int(os.getenv("A2A_FAILURE_THRESHOLD", "2"))
+DEFAULT_RESET_TIMEOUT = float(os.getenv("A2A_CIRCUIT_RESET", "30"))
+
+
+class CircuitState(str, Enum):
+    """斷路器狀態。"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+@dataclass
+class AgentHealth:
+    """
+    單一遠端代理的健康狀態。
+
+    Attributes:
+        name: 代理名稱。
+        base_url: 遠端代理的基礎 URL。
+        state: 斷路器狀態。
+        available: 最近一次探測是否成功；尚未探測時為 None。
+        consecutive_failures: 連續失敗次數。
+        last_checked: 最近一次探測完成的時間 (monotonic 秒)。
+        opened_at: 斷路器開啟的時間 (monotonic 秒)。
+        last_error: 最近一次失敗的原因。
+        latency: 最近一次探測的耗時 (秒)。
+        agent_card: 最近一次成功取得的 agent card。
+    """
+
+    name: str
+    base_url: str
+    state: CircuitState = CircuitState.CLOSED
+    available: Optional[bool] = None
+    consecutive_failures: int = 0
+    last_checked: Optional[float] = None
+    opened_at: Optional[float] = None
+    last_error: Optional[str] = None
+    latency: Optional[float] = None
+    agent_card: Optional[Dict[str, Any]] = None
+
+
+class AgentHealthMonitor:
+    """
+    在背景探測遠端代理並維護可用性表與斷路器狀態。
+
+    所有方法都必須在事件迴圈中呼叫；背景探測任務與 HTTP 客戶端會綁定到
+    目前的事件迴圈，若迴圈改變 (例如測試中多次 `asyncio.run`) 會自動重新建立。
+    """
+
+    def __init__(
+        self,
+        agents: Optional[Dict[str, str]] = None,
+        interval: float = DEFAULT_PROBE_INTERVAL,
+        timeout: float = DEFAULT_PROBE_TIMEOUT,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        初始化監控器。
+
+        Args:
+            agents: 要監控的代理，格式為 {名稱: 基礎 URL}。
+            interval: 背景探測間隔秒數。
+            timeout: 單次探測逾時秒數。
+            failure_threshold: 開啟斷路器前允許的連續失敗次數。
+            reset_timeout: 斷路器開啟後再次探測前的冷卻秒數。
+            transport: (可選) 自訂 httpx 傳輸層，主要用於測試。
+            clock: (可選) 取得目前時間的函式，主要用於測試。
+        """
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold 必須大於 0")
+        self.interval = interval
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._transport = transport
+        self._clock = clock
+        self._agents: Dict[str, AgentHealth] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing: Set[asyncio.Task] = set()
+        for name, base_url in (agents or {}).items():
+            self.register(name, base_url)
+
+    @staticmethod
+    def _normalize(base_url: str) -> str:
+        return base_url.rstrip("/")
+
+    def register(self, name: str, base_url: str) -> AgentHealth:
+        """註冊要監控的代理；以基礎 URL 為鍵，重複註冊時回傳既有狀態。"""
+        key = self._normalize(base_url)
+        if key not in self._agents:
+            self._agents[key] = AgentHealth(name=name, base_url=key)
+        return self._agents[key]
+
+    def get(self, name_or_url: str) -> Optional[AgentHealth]:
+        """以基礎 URL 或代理名稱查詢健康狀態。"""
+        health = self._agents.get(self._normalize(name_or_url))
+        if health is not None:
+            return health
+        return next((h for h in self._agents.values() if h.name == name_or_url), None)
+
+    def is_open(self, name_or_url: str) -> bool:
+        """代理的斷路器是否開啟 (已知無法使用)。"""
+        health = self.get(name_or_url)
+        return health is not None and health.state == CircuitState.OPEN
+
+    def _bind_loop(self) -> None:
+        """確保 HTTP 客戶端與背景任務屬於目前的事件迴圈；舊的客戶端會被關閉。"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        if self._client is not None:
+            closing = loop.create_task(self._close_client(self._client))
+            self._closing.add(closing)
+            closing.add_done_callback(self._closing.discard)
+        self._loop = loop
+        self._client = httpx.AsyncClient(timeout=self.timeout, transport=self._transport)
+        self._task = None
+        self._inflight.clear()
+
+    @staticmethod
+    async def _close_client(client: httpx.AsyncClient) -> None:
+        """關閉舊事件迴圈留下的客戶端；其連線可能已隨舊迴圈失效。"""
+        try:
+            await client.aclose()
+        except Exception:
+            logger.debug("關閉舊的 HTTP 客戶端失敗", exc_info=True)
+
+    def start(self) -> None:
+        """啟動背景探測任務 (可重複呼叫)。"""
+        self._bind_loop()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="a2a-health-monitor")
+
+    async def stop(self) -> None:
+        """停止背景探測並關閉 HTTP 客戶端。"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._client is not None:
+            await self._client.aclose()
+        if self._closing:
+            await asyncio.gather(*self._closing)
+        self._task = None
+        self._client = None
+        self._loop = None
+
+    async def _run(self) -> None:
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(self.interval)
+
+    async def probe_all(self) -> None:
+        """同時探測所有已註冊的代理。"""
+        await asyncio.gather(*(self.probe(key) for key in list(self._agents)))
+
+    async def probe(self, name_or_url: str) -> AgentHealth:
+        """
+        探測單一代理並更新其狀態。
+
+        斷路器開啟且仍在冷卻期間時不發出請求；同一代理同時只會有一個探測請求，
+        其他呼叫者會等待同一個結果。
+        """
+        self._bind_loop()
+        health = self.get(name_or_url)
+        if health is None:
+            raise KeyError(f"未註冊的代理：{name_or_url}")
+
+        if health.state == CircuitState.OPEN:
+            if self._clock() - health.opened_at < self.reset_timeout:
+                return health
+            health.state = CircuitState.HALF_OPEN
+
+        inflight = self._inflight.get(health.base_url)
+        if inflight is None:
+            inflight = asyncio.ensure_future(self._probe(health))
+            self._inflight[health.base_url] = inflight
+            inflight.add_done_callback(
+                lambda _, key=health.base_url: self._inflight.pop(key, None)
+            )
+        await asyncio.shield(inflight)
+        return health
+
+    async def _probe(self, health: AgentHealth) -> None:
+        started = self._clock()
+        try:
+            response = await self._client.get(f"{health.base_url}{AGENT_CARD_WELL_KNOWN_PATH}")
+            if response.status_code != 200:
+                raise RuntimeError(f"回傳狀態 {response.status_code}")
+            card = response.json()
+        except Exception as e:
+            self._record_failure(health, str(e) or type(e).__name__)
+        else:
+            self._record_success(health, card)
+        finally:
+            health.latency = self._clock() - started
+
+    def _record_success(self, health: AgentHealth, card: Dict[str, Any]) -> None:
+        if health.state != CircuitState.CLOSED:
+            logger.info("代理 %s 已恢復，關閉斷路器", health.name)
+        health.state = CircuitState.CLOSED
+        health.available = True
+        health.consecutive_failures = 0
+        health.opened_at = None
+        health.last_error = None
+        health.agent_card = card
+        health.last_checked = self._clock()
+
+    def _record_failure(self, health: AgentHealth, error: str) -> None:
+        health.available = False
+        health.consecutive_failures += 1
+        health.last_error = error
+        health.last_checked = self._clock()
+        if (
+            health.state == CircuitState.HALF_OPEN
+            or health.consecutive_failures >= self.failure_threshold
+        ):
+            if health.state != CircuitState.OPEN:
+                logger.warning("代理 %s 無法使用，開啟斷路器：%s", health.name, error)
+            health.state = CircuitState.OPEN
+            health.opened_at = self._clock()
+
+    def report(self, health: AgentHealth) -> dict:
+        """將健康狀態轉換為工具回傳的字典格式。"""
+        age = None if health.last_checked is None else round(self._clock() - health.last_checked, 1)
+        result = {
+            "status": "success" if health.available else "error",
+            "available": bool(health.available),
+            "circuit_state": health.state.value,
+            "consecutive_failures": health.consecutive_failures,
+            "checked_seconds_ago": age,
+        }
+        if health.available:
+            result["report"] = f"代理 {health.name} 可用"
+            result["agent_card"] = health.agent_card
+        elif health.state == CircuitState.OPEN:
+            result["report"] = f"代理 {health.name} 目前無法使用 (斷路器開啟)：{health.last_error}"
+        else:
+            result["report"] = f"檢查 {health.name} 失敗：{health.last_error}"
+        return result
+
+    def fail_fast_callback(self) -> Callable:
+        """
+        建立供 `RemoteA2aAgent` 使用的 `before_agent_callback`。
+
+        斷路器開啟時直接回傳說明訊息並結束該子代理的呼叫，
+        避免等待連線逾時；其他情況回傳 None，照常委派。
+        """
+
+        async def fail_fast(callback_context) -> Optional[types.Content]:
+            self.start()
+            health = self.get(callback_context.agent_name)
+            if health is None or health.state != CircuitState.OPEN:
+                return None
+            return types.Content(
+                role="model",
+                parts=[
+                    types.Part(
+                        text=(
+                            f"遠端代理 {health.name} 目前無法使用 ({health.last_error})，"
+                            "已略過此次委派。"
+                        )
+                    )
+                ],
+            )
+
+        return fail_fast
@@ -8,6 +8,8 @@ A2A Agent 實作的測試套件。
 - 測試工具函式的行為是否符合預期。
 """
 
+import asyncio
+
 import pytest
 from google.adk.agents import Agent
 from google.adk.agents.remote_a2a_agent import RemoteA2aAgent
@@ -53,7 +55,7 @@ class TestA2AAgent:
         from a2a_orchestrator.agent import check_agent_availability
 
         # 使用無效的 URL 進行測試 (應返回錯誤)
-        result = check_agent_availability("test_agent", "http://invalid-url:9999")
+        result = asyncio.run(check_agent_availability("test_agent", "http://invalid-url:9999"))
         assert result["status"] == "error"
         assert result["available"] is False
 
@@ -81,6 +83,8 @@ class TestAgentConfiguration:
 
         for sub_agent in root_agent.sub_agents:
             assert isinstance(sub_agent, RemoteA2aAgent)
+            # 每個遠端代理都設定了斷路器的 fail-fast 回呼
+            assert sub_agent.before_agent_callback is not None
             # RemoteA2aAgent 使用 agent_card 參數而非 base_url
             assert hasattr(sub_agent, 'name')
             assert hasattr(sub_agent, 'description')
@@ -94,7 +98,7 @@ class TestTools:
         """測試 `check_agent_availability` 是否返回正確的格式。"""
         from a2a_orchestrator.agent import check_agent_availability
 
-        result = check_agent_availability("test", "http://invalid:9999")
+        result = asyncio.run(check_agent_availability("test", "http://invalid:9999"))
 
         assert isinstance(result, dict)
         assert "status" in result
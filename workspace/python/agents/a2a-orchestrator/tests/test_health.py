@@ -0,0 +1,227 @@
+"""
+遠端代理健康監控的測試套件。
+
+**重點說明：**
+- 使用 `httpx.MockTransport` 模擬遠端代理的 agent card 端點，不需啟動伺服器。
+- 驗證可用性快取、斷路器的 closed → open → half_open → closed 轉換。
+- 驗證 `check_agent_availability` 從快取回答，以及 `RemoteA2aAgent` 的 fail-fast 回呼。
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from a2a_orchestrator.health import AgentHealthMonitor, CircuitState
+
+BASE_URL = "http://localhost:8001"
+CARD = {"name": "research_specialist", "url": BASE_URL}
+
+
+class FakeClock:
+    """可手動推進的時鐘。"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeAgent:
+    """回應 agent card 請求的模擬遠端代理，可切換上線/離線。"""
+
+    def __init__(self):
+        self.up = True
+        self.requests = 0
+
+    async def handler(self, request):
+        self.requests += 1
+        await asyncio.sleep(0.01)
+        if not self.up:
+            raise httpx.ConnectError("Connection refused", request=request)
+        return httpx.Response(200, json=CARD)
+
+
+def make_monitor(remote, clock=None, **kwargs):
+    return AgentHealthMonitor(
+        {"research_specialist": BASE_URL},
+        transport=httpx.MockTransport(remote.handler),
+        clock=clock or FakeClock(),
+        **kwargs,
+    )
+
+
+class TestAgentHealthMonitor:
+    """測試健康探測與斷路器狀態轉換。"""
+
+    def test_successful_probe_caches_card(self):
+        """測試成功探測後保存 agent card 並標記為可用。"""
+        remote = FakeAgent()
+        monitor = make_monitor(remote)
+
+        health = asyncio.run(monitor.probe("research_specialist"))
+
+        assert health.available is True
+        assert health.state == CircuitState.CLOSED
+        assert health.agent_card == CARD
+        assert monitor.report(health)["status"] == "success"
+
+    def test_concurrent_probes_share_one_request(self):
+        """測試同一代理的並行探測只會發出一個請求。"""
+        remote = FakeAgent()
+        monitor = make_monitor(remote)
+
+        async def run():
+            await asyncio.gather(*(monitor.probe(BASE_URL) for _ in range(10)))
+
+        asyncio.run(run())
+        assert remote.requests == 1
+
+    def test_circuit_opens_after_threshold_and_recovers(self):
+        """測試斷路器在連續失敗後開啟、冷卻期間不探測、冷卻後試探成功即關閉。
+
+        重點說明：
+        1. 遠端離線，連續失敗達到門檻後斷路器開啟
+        2. 冷卻期間的探測不發出請求
+        3. 冷卻結束且遠端恢復後，試探成功並關閉斷路器
+        """
+        remote = FakeAgent()
+        remote.up = False
+        clock = FakeClock()
+        monitor = make_monitor(remote, clock, failure_threshold=2, reset_timeout=30)
+
+        async def run():
+            health = await monitor.probe(BASE_URL)
+            assert health.state == CircuitState.CLOSED
+            assert health.available is False
+
+            await monitor.probe(BASE_URL)
+            assert health.state == CircuitState.OPEN
+            assert monitor.is_open("research_specialist")
+
+            clock.now += 10
+            await monitor.probe(BASE_URL)
+            assert remote.requests == 2
+
+            remote.up = True
+            clock.now += 30
+            await monitor.probe(BASE_URL)
+            assert health.state == CircuitState.CLOSED
+            assert health.consecutive_failures == 0
+
+        asyncio.run(run())
+        assert remote.requests == 3
+
+    def test_half_open_failure_reopens_circuit(self):
+        """測試冷卻後的試探失敗時，斷路器立即重新開啟。"""
+        remote = FakeAgent()
+        remote.up = False
+        clock = FakeClock()
+        monitor = make_monitor(remote, clock, failure_threshold=1, reset_timeout=5)
+
+        async def run():
+            health = await monitor.probe(BASE_URL)
+            assert health.state == CircuitState.OPEN
+            clock.now += 5
+            await monitor.probe(BASE_URL)
+            assert health.state == CircuitState.OPEN
+            assert health.opened_at == clock.now
+
+        asyncio.run(run())
+
+    def test_background_loop_updates_state(self):
+        """測試背景探測任務會定期更新可用性表。"""
+        remote = FakeAgent()
+        monitor = make_monitor(remote, interval=0.02)
+
+        async def run():
+            monitor.start()
+            await asyncio.sleep(0.1)
+            await monitor.stop()
+
+        asyncio.run(run())
+        assert remote.requests >= 2
+        assert monitor.get(BASE_URL).available is True
+
+    def test_rebinding_closes_previous_client(self):
+        """測試換到新的事件迴圈時，舊迴圈的 HTTP 客戶端會被關閉。"""
+        monitor = make_monitor(FakeAgent())
+
+        asyncio.run(monitor.probe(BASE_URL))
+        first = monitor._client
+
+        async def run():
+            await monitor.probe(BASE_URL)
+            await monitor.stop()
+
+        asyncio.run(run())
+        assert first.is_closed
+        assert monitor._client is None
+
+    def test_invalid_threshold(self):
+        """測試 failure_threshold 小於 1 時引發 ValueError。"""
+        with pytest.raises(ValueError):
+            AgentHealthMonitor(failure_threshold=0)
+
+
+class TestCachedAvailabilityTool:
+    """測試 `check_agent_availability` 與 fail-fast 回呼。"""
+
+    @pytest.fixture
+    def monitor(self, monkeypatch):
+        from a2a_orchestrator import agent
+
+        remote = FakeAgent()
+        monitor = make_monitor(remote, failure_threshold=1)
+        monitor.remote = remote
+        monkeypatch.setattr(agent, "health_monitor", monitor)
+        return monitor
+
+    def test_tool_answers_from_cache(self, monitor):
+        """測試第一次呼叫探測一次，之後的呼叫直接從快取回答。"""
+        from a2a_orchestrator.agent import check_agent_availability
+
+        async def run():
+            results = [
+                await check_agent_availability("research_specialist", BASE_URL)
+                for _ in range(5)
+            ]
+            await monitor.stop()
+            return results
+
+        results = asyncio.run(run())
+        assert all(r["available"] for r in results)
+        assert results[-1]["agent_card"] == CARD
+        # 第一次呼叫的探測與背景任務的第一輪探測共用同一個請求
+        assert monitor.remote.requests == 1
+
+    def test_unknown_agents_are_not_probed(self, monitor):
+        """測試未註冊的 URL 回傳 unknown，不發出請求也不加入探測清單。"""
+        from a2a_orchestrator.agent import check_agent_availability
+
+        result = asyncio.run(check_agent_availability("internal", "http://169.254.169.254"))
+
+        assert result["circuit_state"] == "unknown"
+        assert result["available"] is False
+        assert monitor.get("http://169.254.169.254") is None
+        assert monitor.remote.requests == 0
+        assert monitor._task is None
+
+    def test_fail_fast_callback(self, monitor):
+        """測試斷路器開啟時 fail-fast 回呼回傳訊息，關閉時回傳 None。"""
+        callback = monitor.fail_fast_callback()
+        context = SimpleNamespace(agent_name="research_specialist")
+
+        async def run():
+            assert await callback(context) is None
+            monitor.remote.up = False
+            await monitor.probe(BASE_URL)
+            content = await callback(context)
+            await monitor.stop()
+            return content
+
+        content = asyncio.run(run())
+        assert content is not None
+        assert "research_specialist" in content.parts[0].text
@@ -17,6 +17,8 @@ from google.adk.tools.load_artifacts_tool import load_artifacts_tool
 from google.adk.tools.tool_context import ToolContext
 from google.genai import types
 
+from .artifact_index import collect_metadata, latest_metadata, save_artifact_with_index, version_metadata
+
 
 async def extract_text_tool(document_content: str, tool_context: ToolContext) -> Dict[str, Any]:
     """
@@ -48,10 +50,7 @@ async def extract_text_tool(document_content: str, tool_context: ToolContext) ->
         text_part = types.Part.from_text(text=extracted_text)
 
         # 另存為Artifacts
-        version = await tool_context.save_artifact(
-            filename='document_extracted.txt',
-            artifact=text_part
-        )
+        version, _ = await save_artifact_with_index(tool_context, 'document_extracted.txt', text_part)
 
         return {
             'status': 'success',
@@ -112,10 +111,7 @@ async def summarize_document_tool(document_text: Optional[str], tool_context: To
         summary_part = types.Part.from_text(text=summary)
 
         # 另存為Artifacts
-        version = await tool_context.save_artifact(
-            filename='document_summary.txt',
-            artifact=summary_part
-        )
+        version, _ = await save_artifact_with_index(tool_context, 'document_summary.txt', summary_part)
 
         return {
             'status': 'success',
@@ -166,10 +162,7 @@ async def translate_document_tool(text: str, target_language: str, tool_context:
 
         # 另存為Artifacts
         filename = f'document_{target_language.lower()}.txt'
-        version = await tool_context.save_artifact(
-            filename=filename,
-            artifact=translation_part
-        )
+        version, _ = await save_artifact_with_index(tool_context, filename, translation_part)
 
         return {
             'status': 'success',
@@ -219,13 +212,24 @@ async def create_final_report_tool(tool_context: ToolContext) -> Dict[str, Any]:
 
     """
 
+        # 只讀取中繼資料索引；索引中沒有的 Artifact 才以有上限的並行數載入
+        document_names = [
+            filename for filename in all_artifacts
+            if filename.startswith('document_') and not filename.endswith('FINAL_REPORT.md')
+        ]
+        metadata = await collect_metadata(tool_context, document_names)
+
         artifacts_list = []
-        for filename in all_artifacts:
-            if filename.startswith('document_') and not filename.endswith('FINAL_REPORT.md'):
-                artifact = await tool_context.load_artifact(filename)
-                if artifact:
-                    report_content += f"- {filename}: {len(artifact.text)} 個字元\n"
-                    artifacts_list.append(filename)
+        for filename in document_names:
+            info = metadata[filename]
+            if info:
+                if info['characters'] is not None:
+                    size = f"{info['characters']} 個字元"
+                else:
+                    size = f"{info['size_bytes']} 位元組（{info['mime_type']}）"
+                version = f"，版本 {info['version']}" if info.get('version') is not None else ''
+                report_content += f"- {filename}: {size}{version}\n"
+                artifacts_list.append(filename)
 
         report_content += """
         ## 建議
@@ -244,10 +248,7 @@ async def create_final_report_tool(tool_context: ToolContext) -> Dict[str, Any]:
         report_part = types.Part.from_text(text=report_content)
 
         # 另存為Artifacts
-        version = await tool_context.save_artifact(
-            filename='document_FINAL_REPORT.md',
-            artifact=report_part
-        )
+        version, _ = await save_artifact_with_index(tool_context, 'document_FINAL_REPORT.md', report_part)
 
         return {
             'status': 'success',
@@ -282,12 +283,20 @@ async def list_artifacts_tool(tool_context: ToolContext) -> Dict[str, Any]:
         # 從Artifacts服務中載入所有Artifacts
         artifacts = await tool_context.list_artifacts()
 
+        # 附上索引中的中繼資料（最新版本與版本數），不載入任何內容
+        metadata = {}
+        for filename in artifacts:
+            latest = latest_metadata(tool_context, filename)
+            if latest is not None:
+                metadata[filename] = latest
+
         return {
             'status': 'success',
             'report': f'找到 {len(artifacts)} 個Artifacts',
             'data': {
                 'artifacts': artifacts,
-                'count': len(artifacts)
+                'count': len(artifacts),
+                'metadata': metadata
             }
         }
 
@@ -329,13 +338,20 @@ async def load_artifact_tool(filename: str, tool_context: ToolContext, version:
                 'report': f'找不到Artifacts {filename}' + (f' 版本 {version}' if version else '')
             }
 
+        # 索引中此版本的中繼資料（未建立索引時為 None）
+        metadata = (
+            latest_metadata(tool_context, filename) if version is None
+            else version_metadata(tool_context, filename, version)
+        )
+
         return {
             'status': 'success',
             'report': f'已載入Artifacts {filename}' + (f' 版本 {version}' if version else ' (最新)'),
             'data': {
                 'filename': filename,
                 'version': version,
-                'content': artifact.text if artifact.text else '[二進位內容]'
+                'content': artifact.text if artifact.text else '[二進位內容]',
+                'metadata': metadata
             }
         }
 
@@ -350,13 +366,19 @@ async def load_artifact_tool(filename: str, tool_context: ToolContext, version:
 def main():
     """直接執行代理程式的主要進入點。"""
     import asyncio
+    import os
     from google.adk.runners import Runner
     from google.adk.artifacts import InMemoryArtifactService
     from google.adk.sessions import InMemorySessionService
+    from artifact_agent.cas_artifact_service import ContentAddressedArtifactService
 
     async def run_agent():
-        # 設定Artifacts服務
-        artifact_service = InMemoryArtifactService()
+        # 設定Artifacts服務：設定 ARTIFACT_STORE_DIR 時使用去除重複內容的本機儲存
+        store_dir = os.environ.get('ARTIFACT_STORE_DIR')
+        if store_dir:
+            artifact_service = ContentAddressedArtifactService(store_dir)
+        else:
+            artifact_service = InMemoryArtifactService()
 
         # 創建支援Artifacts的 runner
         runner = Runner(
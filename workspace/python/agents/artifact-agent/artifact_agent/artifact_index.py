@@ -0,0 +1,168 @@
+"""
+Artifacts 中繼資料索引
+
+每次透過 save_artifact_with_index 儲存 Artifact 時，將其大小、MIME 類型、
+內容雜湊與建立時間記錄在會話狀態中。
+列表與報告工具只需讀取索引，不必為了顯示大小而載入每一個 Artifact；
+索引中沒有的 Artifact（例如使用者上傳的檔案）才會以有上限的並行數載入。
+
+每個 (檔名, 版本) 使用獨立的狀態鍵，另以每個檔名一個小的指標記錄最新版本，
+因此每次儲存產生的 state delta 只有這兩筆、大小固定，不會隨檔案數或版本數成長，
+而舊版本的中繼資料仍保留在索引中。
+
+索引格式（會話狀態）：
+    'artifact_version:<版本>:<檔名>' → {"filename": ..., "version": 1, "size_bytes": ...,
+        "mime_type": ..., "sha256": ..., "characters": ..., "created_at": ...}
+    'artifact_index:<檔名>' → {"version": 1, "version_count": 2}（最新版本的指標）
+
+版本在檔名之前，檔名含有 ':' 時兩種鍵也不會互相衝突。
+"""
+
+import asyncio
+import hashlib
+import mimetypes
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from google.adk.tools.tool_context import ToolContext
+from google.genai import types
+
+# 會話狀態中最新版本指標的前綴（後接檔名）
+INDEX_STATE_PREFIX = 'artifact_index:'
+
+# 會話狀態中各版本中繼資料的前綴（後接 '<版本>:<檔名>'）
+VERSION_STATE_PREFIX = 'artifact_version:'
+
+# 同時載入 Artifact 內容的上限
+MAX_CONCURRENT_LOADS = int(os.environ.get('ARTIFACT_LOAD_CONCURRENCY', 4))
+
+
+def describe_artifact(filename: str, artifact: types.Part) -> Dict[str, Any]:
+    """
+    計算 Artifact 的中繼資料。
+
+    Args:
+        filename: Artifact 檔名（文字 Artifact 以副檔名推斷 MIME 類型）。
+        artifact: Artifact 內容。
+
+    Returns:
+        包含大小、MIME 類型、SHA-256 與字元數（僅文字）的字典。
+    """
+    if artifact.inline_data is not None:
+        data = artifact.inline_data.data or b''
+        mime_type = artifact.inline_data.mime_type or 'application/octet-stream'
+        characters = None
+    else:
+        text = artifact.text or ''
+        data = text.encode('utf-8')
+        mime_type = mimetypes.guess_type(filename)[0] or 'text/plain'
+        characters = len(text)
+
+    return {
+        'size_bytes': len(data),
+        'mime_type': mime_type,
+        'sha256': hashlib.sha256(data).hexdigest(),
+        'characters': characters,
+    }
+
+
+def index_state_key(filename: str) -> str:
+    """某個檔名最新版本指標在會話狀態中的鍵。"""
+    return f'{INDEX_STATE_PREFIX}{filename}'
+
+
+def version_state_key(filename: str, version: int) -> str:
+    """某個 (檔名, 版本) 的中繼資料在會話狀態中的鍵。"""
+    return f'{VERSION_STATE_PREFIX}{version}:{filename}'
+
+
+def version_metadata(tool_context: ToolContext, filename: str, version: int) -> Optional[Dict[str, Any]]:
+    """回傳索引中某個檔名指定版本的中繼資料（尚未建立索引時回傳 None）。"""
+    metadata = tool_context.state.get(version_state_key(filename, version))
+    return metadata if isinstance(metadata, dict) else None
+
+
+def latest_metadata(tool_context: ToolContext, filename: str) -> Optional[Dict[str, Any]]:
+    """回傳索引中某個檔名最新版本的中繼資料與版本數（尚未建立索引時回傳 None）。"""
+    pointer = tool_context.state.get(index_state_key(filename))
+    if not isinstance(pointer, dict):
+        return None
+    metadata = version_metadata(tool_context, filename, pointer['version'])
+    if metadata is None:
+        return None
+    return {**metadata, 'version_count': pointer['version_count']}
+
+
+async def save_artifact_with_index(
+    tool_context: ToolContext,
+    filename: str,
+    artifact: types.Part
+) -> Tuple[int, Dict[str, Any]]:
+    """
+    儲存 Artifact，記錄此版本的中繼資料並將該檔名的最新版本指標指向它。
+
+    Args:
+        tool_context: 用於Artifacts操作的工具上下文。
+        filename: Artifact 檔名。
+        artifact: Artifact 內容。
+
+    Returns:
+        (版本, 中繼資料)；中繼資料包含 'version_count'。
+    """
+    version = await tool_context.save_artifact(filename=filename, artifact=artifact)
+    metadata = {
+        'filename': filename,
+        'version': version,
+        **describe_artifact(filename, artifact),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+    }
+    # 版本編號從 0 連續遞增
+    pointer = {'version': version, 'version_count': version + 1}
+
+    # 只寫入此版本與此檔名指標兩個鍵；state delta 不包含其他檔案或版本
+    tool_context.state[version_state_key(filename, version)] = metadata
+    tool_context.state[index_state_key(filename)] = pointer
+    return version, {**metadata, 'version_count': pointer['version_count']}
+
+
+async def collect_metadata(
+    tool_context: ToolContext,
+    filenames: Iterable[str],
+    max_concurrency: int = MAX_CONCURRENT_LOADS
+) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    取得多個 Artifact 最新版本的中繼資料。
+
+    索引中已有的檔案直接讀取；其餘檔案以最多 max_concurrency 個並行載入並計算。
+
+    Args:
+        tool_context: 用於Artifacts操作的工具上下文。
+        filenames: Artifact 檔名列表。
+        max_concurrency: 同時載入的上限。
+
+    Returns:
+        檔名 → 中繼資料（找不到的 Artifact 為 None）；未建立索引的項目 'indexed' 為 False。
+    """
+    filenames = list(filenames)
+    results: Dict[str, Optional[Dict[str, Any]]] = {}
+    missing = []
+    for filename in filenames:
+        metadata = latest_metadata(tool_context, filename)
+        if metadata is not None:
+            results[filename] = {**metadata, 'indexed': True}
+        else:
+            missing.append(filename)
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def load(filename: str) -> None:
+        async with semaphore:
+            artifact = await tool_context.load_artifact(filename)
+        if artifact is None:
+            results[filename] = None
+        else:
+            results[filename] = {'filename': filename, **describe_artifact(filename, artifact), 'indexed': False}
+
+    await asyncio.gather(*(load(filename) for filename in missing))
+    return {filename: results[filename] for filename in filenames}
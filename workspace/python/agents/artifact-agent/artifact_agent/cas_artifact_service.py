@@ -0,0 +1,499 @@
+"""
+內容定址（Content-Addressed）的本機 Artifacts 服務
+
+InMemoryArtifactService 與 FileArtifactService 會為每個版本保存一份完整的副本；
+重新產生的摘要、重複儲存的圖片等內容相同的版本會佔用多份空間。
+此服務改以 SHA-256 為鍵將內容（blob）存放在本機檔案系統，每個版本只是一筆指向 blob 的小紀錄：
+
+    root_dir/
+    ├── index.sqlite3        # 版本紀錄（指標）與 blob 的參考計數
+    ├── blobs/ab/abcdef...   # 以 SHA-256 命名的內容，相同內容只存一份
+    └── tmp/                 # 寫入中的 blob（完成後以 os.replace 原子性地發佈）
+
+- 文字類內容在安裝 zstandard 時會以 zstd 壓縮（僅在確實變小時）
+- 刪除 Artifact 只減少參考計數；collect_garbage() 移除沒有任何版本參考的 blob
+- 可直接取代 Runner 的 InMemoryArtifactService：
+
+    runner = Runner(
+        agent=root_agent,
+        session_service=InMemorySessionService(),
+        artifact_service=ContentAddressedArtifactService('.artifacts'),
+    )
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from google.adk.artifacts import BaseArtifactService
+from google.adk.artifacts import artifact_util
+from google.adk.artifacts.base_artifact_service import ArtifactVersion, ensure_part
+from google.adk.errors.input_validation_error import InputValidationError
+from google.genai import types
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    stored_size INTEGER NOT NULL,
+    compression TEXT NOT NULL,
+    refcount INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS versions (
+    scope TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    sha256 TEXT,
+    mime_type TEXT,
+    file_uri TEXT,
+    custom_metadata TEXT NOT NULL,
+    create_time REAL NOT NULL,
+    PRIMARY KEY (scope, filename, version)
+);
+CREATE INDEX IF NOT EXISTS versions_sha256 ON versions (sha256);
+"""
+
+# 值得壓縮的非 text/* MIME 類型（圖片、影片等已壓縮的格式不再壓縮）
+_COMPRESSIBLE_MIME_TYPES = frozenset({
+    'application/json',
+    'application/xml',
+    'application/javascript',
+    'image/svg+xml',
+})
+
+# tmp/ 中超過此秒數的檔案視為中斷的寫入，由 collect_garbage() 清除
+_STALE_TMP_SECONDS = 3600
+
+
+def _is_user_scoped(filename: str) -> bool:
+    return filename.startswith('user:')
+
+
+def _is_compressible(kind: str, mime_type: Optional[str]) -> bool:
+    if kind == 'text':
+        return True
+    mime_type = (mime_type or '').split(';')[0].strip().lower()
+    return mime_type.startswith('text/') or mime_type in _COMPRESSIBLE_MIME_TYPES
+
+
+class ContentAddressedArtifactService(BaseArtifactService):
+    """以 SHA-256 去除重複內容、具參考計數與垃圾回收的本機 Artifacts 服務。
+
+    Args:
+        root_dir: 存放索引與 blob 的目錄。
+        compress: 是否以 zstd 壓縮文字類內容（需要 zstandard；未安裝時以原始內容儲存）。
+        compression_level: zstd 壓縮等級。
+        min_compress_bytes: 小於此大小的內容不壓縮。
+    """
+
+    def __init__(
+        self,
+        root_dir: Union[str, Path],
+        compress: bool = True,
+        compression_level: int = 3,
+        min_compress_bytes: int = 256
+    ):
+        self.root_dir = Path(root_dir).expanduser().resolve()
+        self.blob_dir = self.root_dir / 'blobs'
+        self.tmp_dir = self.root_dir / 'tmp'
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self.compress = compress and zstandard is not None
+        self.compression_level = compression_level
+        self.min_compress_bytes = min_compress_bytes
+
+        # 索引的所有讀寫都在此鎖內進行，確保參考計數與垃圾回收不會互相競爭
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.root_dir / 'index.sqlite3', check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    # ------------------------------------------------------------------
+    # 路徑與序列化
+    # ------------------------------------------------------------------
+
+    def _scope(self, app_name: str, user_id: str, filename: str, session_id: Optional[str]) -> str:
+        artifact_util.validate_path_segment(app_name, 'app_name')
+        artifact_util.validate_path_segment(user_id, 'user_id')
+        if _is_user_scoped(filename):
+            return f'{app_name}/{user_id}/user'
+        if session_id is None:
+            raise InputValidationError('Session ID must be provided for session-scoped artifacts.')
+        artifact_util.validate_path_segment(session_id, 'session_id')
+        return f'{app_name}/{user_id}/{session_id}'
+
+    def _blob_path(self, sha256: str) -> Path:
+        return self.blob_dir / sha256[:2] / sha256
+
+    def _write_blob(self, sha256: str, data: bytes, kind: str, mime_type: Optional[str]) -> tuple:
+        """壓縮（若適用）並寫入暫存檔；回傳（暫存路徑, 儲存大小, 壓縮方式）。"""
+        compression = 'none'
+        if self.compress and len(data) >= self.min_compress_bytes and _is_compressible(kind, mime_type):
+            compressed = zstandard.ZstdCompressor(level=self.compression_level).compress(data)
+            if len(compressed) < len(data):
+                data, compression = compressed, 'zstd'
+
+        tmp_path = self.tmp_dir / f'{sha256}.{uuid.uuid4().hex}'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        return tmp_path, len(data), compression
+
+    def _read_blob(self, sha256: str, compression: str) -> bytes:
+        data = self._blob_path(sha256).read_bytes()
+        if compression == 'zstd':
+            if zstandard is None:
+                raise RuntimeError(f'blob {sha256} 以 zstd 壓縮，需要安裝 zstandard 才能讀取')
+            data = zstandard.ZstdDecompressor().decompress(data)
+        return data
+
+    def _artifact_version(self, row: dict) -> ArtifactVersion:
+        kind, sha256, mime_type, file_uri = row['kind'], row['sha256'], row['mime_type'], row['file_uri']
+        return ArtifactVersion(
+            version=row['version'],
+            canonical_uri=file_uri if kind == 'file' else self._blob_path(sha256).as_uri(),
+            custom_metadata=json.loads(row['custom_metadata']),
+            create_time=row['create_time'],
+            mime_type=mime_type,
+        )
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        cursor = self._db.execute(sql, params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, values)) for values in cursor.fetchall()]
+
+    # ------------------------------------------------------------------
+    # 儲存
+    # ------------------------------------------------------------------
+
+    async def save_artifact(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        filename: str,
+        artifact: Union[types.Part, Dict[str, Any]],
+        session_id: Optional[str] = None,
+        custom_metadata: Optional[Dict[str, Any]] = None
+    ) -> int:
+        return await asyncio.to_thread(
+            self._save_artifact_sync, app_name, user_id, filename, artifact, session_id, custom_metadata
+        )
+
+    def _save_artifact_sync(self, app_name, user_id, filename, artifact, session_id, custom_metadata) -> int:
+        scope = self._scope(app_name, user_id, filename, session_id)
+        artifact = ensure_part(artifact)
+
+        data, sha256, file_uri, tmp = None, None, None, None
+        if artifact.inline_data is not None:
+            kind, mime_type = 'inline', artifact.inline_data.mime_type
+            data = artifact.inline_data.data or b''
+        elif artifact.text is not None:
+            kind, mime_type = 'text', 'text/plain'
+            data = artifact.text.encode('utf-8')
+        elif artifact.file_data is not None:
+            # 內容存放在外部（例如 GCS）；只記錄 URI
+            kind, mime_type, file_uri = 'file', artifact.file_data.mime_type, artifact.file_data.file_uri
+        else:
+            raise InputValidationError('Not supported artifact type.')
+
+        if data is not None:
+            sha256 = hashlib.sha256(data).hexdigest()
+            with self._lock:
+                known = self._blob_known(sha256)
+            if not known:
+                # 壓縮與寫入在鎖外進行；發佈時再確認一次，避免並行儲存相同內容時重複寫入
+                tmp = self._write_blob(sha256, data, kind, mime_type)
+
+        with self._lock:
+            try:
+                if sha256 is not None:
+                    self._add_reference(sha256, data, kind, mime_type, tmp)
+                    tmp = None
+                version = self._db.execute(
+                    'SELECT COALESCE(MAX(version) + 1, 0) FROM versions WHERE scope = ? AND filename = ?',
+                    (scope, filename),
+                ).fetchone()[0]
+                self._db.execute(
+                    'INSERT INTO versions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (
+                        scope, filename, version, kind, sha256, mime_type, file_uri,
+                        json.dumps(custom_metadata or {}), time.time(),
+                    ),
+                )
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+            finally:
+                if tmp is not None:
+                    tmp[0].unlink(missing_ok=True)
+        return version
+
+    def _blob_known(self, sha256: str) -> bool:
+        row = self._db.execute('SELECT 1 FROM blobs WHERE sha256 = ?', (sha256,)).fetchone()
+        return row is not None and self._blob_path(sha256).exists()
+
+    def _add_reference(
+        self,
+        sha256: str,
+        data: bytes,
+        kind: str,
+        mime_type: Optional[str],
+        tmp: Optional[tuple]
+    ) -> None:
+        """在鎖內增加 blob 的參考計數；blob 尚不存在時發佈暫存檔。"""
+        if self._blob_known(sha256):
+            self._db.execute('UPDATE blobs SET refcount = refcount + 1 WHERE sha256 = ?', (sha256,))
+            if tmp is not None:
+                tmp[0].unlink(missing_ok=True)
+            return
+        if tmp is None:
+            # 鎖外檢查之後 blob 才被垃圾回收（很少發生），在鎖內重新寫入
+            tmp = self._write_blob(sha256, data, kind, mime_type)
+
+        tmp_path, stored_size, compression = tmp
+        blob_path = self._blob_path(sha256)
+        blob_path.parent.mkdir(exist_ok=True)
+        os.replace(tmp_path, blob_path)
+        # 紀錄可能因 blob 檔案遺失而存在（參考計數仍有效），以 UPSERT 保留計數
+        self._db.execute(
+            'INSERT INTO blobs VALUES (?, ?, ?, ?, 1) '
+            'ON CONFLICT(sha256) DO UPDATE SET stored_size = excluded.stored_size, '
+            'compression = excluded.compression, refcount = refcount + 1',
+            (sha256, len(data), stored_size, compression),
+        )
+
+    # ------------------------------------------------------------------
+    # 讀取
+    # ------------------------------------------------------------------
+
+    def _version_row(self, scope: str, filename: str, version: Optional[int]) -> Optional[dict]:
+        if version is None:
+            rows = self._query(
+                'SELECT * FROM versions WHERE scope = ? AND filename = ? ORDER BY version DESC LIMIT 1',
+                (scope, filename),
+            )
+        else:
+            rows = self._query(
+                'SELECT * FROM versions WHERE scope = ? AND filename = ? AND version = ?',
+                (scope, filename, version),
+            )
+        return rows[0] if rows else None
+
+    async def load_artifact(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        filename: str,
+        session_id: Optional[str] = None,
+        version: Optional[int] = None
+    ) -> Optional[types.Part]:
+        return await asyncio.to_thread(self._load_artifact_sync, app_name, user_id, filename, session_id, version)
+
+    def _load_artifact_sync(self, app_name, user_id, filename, session_id, version) -> Optional[types.Part]:
+        scope = self._scope(app_name, user_id, filename, session_id)
+        with self._lock:
+            row = self._version_row(scope, filename, version)
+            if row is None:
+                return None
+            if row['kind'] == 'file':
+                return types.Part(file_data=types.FileData(file_uri=row['file_uri'], mime_type=row['mime_type']))
+            compression = self._db.execute(
+                'SELECT compression FROM blobs WHERE sha256 = ?', (row['sha256'],)
+            ).fetchone()[0]
+
+        # 在鎖外讀取，並行的載入不互相阻塞；只有版本在讀取前被刪除並回收時才會找不到檔案
+        try:
+            data = self._read_blob(row['sha256'], compression)
+        except FileNotFoundError:
+            return None
+
+        if row['kind'] == 'text':
+            return types.Part.from_text(text=data.decode('utf-8'))
+        return types.Part.from_bytes(data=data, mime_type=row['mime_type'])
+
+    async def list_artifact_keys(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: Optional[str] = None
+    ) -> list:
+        artifact_util.validate_path_segment(app_name, 'app_name')
+        artifact_util.validate_path_segment(user_id, 'user_id')
+        scopes = [f'{app_name}/{user_id}/user']
+        if session_id is not None:
+            artifact_util.validate_path_segment(session_id, 'session_id')
+            scopes.append(f'{app_name}/{user_id}/{session_id}')
+        with self._lock:
+            rows = self._db.execute(
+                f'SELECT DISTINCT filename FROM versions WHERE scope IN ({",".join("?" * len(scopes))})',
+                scopes,
+            ).fetchall()
+        return sorted(row[0] for row in rows)
+
+    async def list_versions(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        filename: str,
+        session_id: Optional[str] = None
+    ) -> list:
+        return [v.version for v in await self.list_artifact_versions(
+            app_name=app_name, user_id=user_id, filename=filename, session_id=session_id
+        )]
+
+    async def list_artifact_versions(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        filename: str,
+        session_id: Optional[str] = None
+    ) -> list:
+        scope = self._scope(app_name, user_id, filename, session_id)
+        with self._lock:
+            rows = self._query(
+                'SELECT * FROM versions WHERE scope = ? AND filename = ? ORDER BY version',
+                (scope, filename),
+            )
+        return [self._artifact_version(row) for row in rows]
+
+    async def get_artifact_version(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        filename: str,
+        session_id: Optional[str] = None,
+        version: Optional[int] = None
+    ) -> Optional[ArtifactVersion]:
+        scope = self._scope(app_name, user_id, filename, session_id)
+        with self._lock:
+            row = self._version_row(scope, filename, version)
+        return self._artifact_version(row) if row else None
+
+    # ------------------------------------------------------------------
+    # 刪除與垃圾回收
+    # ------------------------------------------------------------------
+
+    async def delete_artifact(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        filename: str,
+        session_id: Optional[str] = None
+    ) -> None:
+        """刪除 Artifact 的所有版本並減少 blob 的參考計數（blob 由 collect_garbage() 移除）。"""
+        scope = self._scope(app_name, user_id, filename, session_id)
+        await asyncio.to_thread(self._delete_artifact_sync, scope, filename)
+
+    def _delete_artifact_sync(self, scope: str, filename: str) -> None:
+        with self._lock:
+            try:
+                self._db.execute(
+                    'UPDATE blobs SET refcount = refcount - ('
+                    '  SELECT COUNT(*) FROM versions '
+                    '  WHERE versions.sha256 = blobs.sha256 AND scope = ? AND filename = ?'
+                    ') WHERE sha256 IN (SELECT sha256 FROM versions WHERE scope = ? AND filename = ?)',
+                    (scope, filename, scope, filename),
+                )
+                self._db.execute('DELETE FROM versions WHERE scope = ? AND filename = ?', (scope, filename))
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+
+    async def collect_garbage(self) -> Dict[str, int]:
+        """
+        移除沒有任何版本參考的 blob、不在索引中的孤立檔案與中斷寫入留下的暫存檔。
+
+        Returns:
+            {'blobs_removed': ..., 'bytes_freed': ...}
+        """
+        return await asyncio.to_thread(self._collect_garbage_sync)
+
+    def _collect_garbage_sync(self) -> Dict[str, int]:
+        removed, freed = 0, 0
+        with self._lock:
+            unreferenced = self._db.execute('SELECT sha256 FROM blobs WHERE refcount <= 0').fetchall()
+            for (sha256,) in unreferenced:
+                path = self._blob_path(sha256)
+                if path.exists():
+                    freed += path.stat().st_size
+                    path.unlink()
+                removed += 1
+            self._db.execute('DELETE FROM blobs WHERE refcount <= 0')
+            self._db.commit()
+
+            # 發佈 blob 與寫入索引之間中斷時留下的檔案
+            known = {row[0] for row in self._db.execute('SELECT sha256 FROM blobs')}
+            for path in self.blob_dir.glob('*/*'):
+                if path.name not in known:
+                    freed += path.stat().st_size
+                    path.unlink()
+                    removed += 1
+
+            cutoff = time.time() - _STALE_TMP_SECONDS
+            for path in self.tmp_dir.iterdir():
+                if path.stat().st_mtime < cutoff:
+                    path.unlink(missing_ok=True)
+        return {'blobs_removed': removed, 'bytes_freed': freed}
+
+    # ------------------------------------------------------------------
+    # 統計
+    # ------------------------------------------------------------------
+
+    def storage_stats(self) -> Dict[str, Any]:
+        """
+        回傳儲存統計。
+
+        logical_bytes 為所有版本內容的總大小（逐版本完整複製時所需的空間），
+        stored_bytes 為 blob 實際佔用的大小。
+        """
+        with self._lock:
+            versions, logical = self._db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(blobs.size), 0) FROM versions '
+                'LEFT JOIN blobs ON versions.sha256 = blobs.sha256'
+            ).fetchone()
+            blobs, unique, stored, unreferenced = self._db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0), '
+                'COALESCE(SUM(refcount <= 0), 0) FROM blobs'
+            ).fetchone()
+        return {
+            'versions': versions,
+            'blobs': blobs,
+            'unreferenced_blobs': unreferenced,
+            'logical_bytes': logical,
+            'unique_bytes': unique,
+            'stored_bytes': stored,
+            'savings_ratio': round(1 - stored / logical, 4) if logical else 0.0,
+        }
+
+    def close(self) -> None:
+        """將 WAL 寫回索引資料庫並關閉（可重複呼叫）。"""
+        with self._lock:
+            if self._db is None:
+                return
+            self._db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self._db.close()
+            self._db = None
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+比較 InMemoryArtifactService、FileArtifactService 與 ContentAddressedArtifactService
+的儲存空間與延遲。
+
+模擬文件處理代理的工作負載：每個會話儲存擷取的文字、重複產生數次的摘要
+（多數版本內容相同）、翻譯，以及每次重新儲存的同一張圖片。
+
+使用方法：
+    python benchmark_artifact_service.py --sessions 20 --versions 10
+"""
+
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from google.adk.artifacts import FileArtifactService, InMemoryArtifactService
+from google.genai import types
+
+from artifact_agent.cas_artifact_service import ContentAddressedArtifactService
+
+APP_NAME = 'artifact_agent'
+USER_ID = 'benchmark'
+
+
+def build_workload(sessions: int, versions: int, seed: int = 0) -> list:
+    """回傳 (session_id, filename, Part) 的儲存序列。"""
+    rng = random.Random(seed)
+    paragraph = '敏捷的棕色狐狸跳過懶惰的狗。這是一個用於測試成品儲存的範例文件。'
+    # 每個會話共用同一張圖片（例如重複上傳的產品照片）；隨機位元組模擬已壓縮的格式
+    image = types.Part.from_bytes(data=rng.randbytes(200_000), mime_type='image/png')
+
+    workload = []
+    for s in range(sessions):
+        session_id = f'session{s}'
+        document = f'文件 {s}：' + paragraph * 400
+        workload.append((session_id, 'document_extracted.txt', types.Part.from_text(text=document)))
+        summaries = [f'摘要 {s}-{k}：' + paragraph * 20 for k in range(3)]
+        for v in range(versions):
+            # 重新產生的摘要多半與先前某個版本相同
+            workload.append((session_id, 'document_summary.txt', types.Part.from_text(text=rng.choice(summaries))))
+            workload.append((session_id, 'document_chart.png', image))
+        workload.append((session_id, 'document_spanish.txt', types.Part.from_text(text=f'Documento {s}. ' * 300)))
+    return workload
+
+
+def directory_bytes(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+
+
+def logical_bytes(workload: list) -> int:
+    return sum(
+        len(part.inline_data.data) if part.inline_data else len(part.text.encode('utf-8'))
+        for _, _, part in workload
+    )
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run(service, workload: list) -> dict:
+    """依序儲存所有版本，再載入每個會話的所有版本；回傳延遲（毫秒）。"""
+    save_ms = []
+    for session_id, filename, part in workload:
+        started = time.perf_counter()
+        await service.save_artifact(
+            app_name=APP_NAME, user_id=USER_ID, session_id=session_id, filename=filename, artifact=part
+        )
+        save_ms.append((time.perf_counter() - started) * 1000)
+
+    load_ms = []
+    for session_id in sorted({session_id for session_id, _, _ in workload}):
+        for filename in await service.list_artifact_keys(app_name=APP_NAME, user_id=USER_ID, session_id=session_id):
+            for version in await service.list_versions(
+                app_name=APP_NAME, user_id=USER_ID, session_id=session_id, filename=filename
+            ):
+                started = time.perf_counter()
+                await service.load_artifact(
+                    app_name=APP_NAME, user_id=USER_ID, session_id=session_id, filename=filename, version=version
+                )
+                load_ms.append((time.perf_counter() - started) * 1000)
+    return {'save_ms': save_ms, 'load_ms': load_ms}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sessions', type=int, default=20, help='會話數')
+    parser.add_argument('--versions', type=int, default=10, help='每個會話重新儲存摘要與圖片的次數')
+    args = parser.parse_args()
+
+    workload = build_workload(args.sessions, args.versions)
+    logical = logical_bytes(workload)
+    print(f'{len(workload)} 次儲存，內容總計 {logical / 1024 / 1024:.1f} MB')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        file_root = tmp / 'file'
+        cas_root = tmp / 'cas'
+        cas = ContentAddressedArtifactService(cas_root)
+        services = [
+            ('in-memory', InMemoryArtifactService(), None),
+            ('file', FileArtifactService(root_dir=file_root), file_root),
+            ('cas', cas, cas_root),
+        ]
+
+        print(f"{'服務':<10} {'儲存空間 (MB)':>14} {'save p50/p95 (ms)':>20} {'load p50/p95 (ms)':>20}")
+        for name, service, root in services:
+            result = await run(service, workload)
+            if service is cas:
+                stats = cas.storage_stats()
+                cas.close()
+            # in-memory 保存每個版本的完整副本，以內容總計表示
+            stored = directory_bytes(root) if root else logical
+            save, load = result['save_ms'], result['load_ms']
+            print(
+                f'{name:<10} {stored / 1024 / 1024:>14.2f} '
+                f'{percentile(save, 0.5):>9.2f}/{percentile(save, 0.95):<10.2f} '
+                f'{percentile(load, 0.5):>9.2f}/{percentile(load, 0.95):<10.2f}'
+            )
+
+        print(f'cas 統計：{stats}')
+        print(f"cas blob 數 {stats['blobs']}，版本數 {stats['versions']}，"
+              f"節省 {stats['savings_ratio']:.1%}（zstd：{'啟用' if cas.compress else '未安裝 zstandard'}）")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,20 @@
+"""
+為 `adk web` / `adk api_server` 註冊自訂的 Artifacts 服務 URI。
+
+ADK 啟動時會載入 agents 目錄中的 services.py，之後即可使用：
+
+    adk web --artifact_service_uri cas://.artifacts
+"""
+
+from google.adk.cli.service_registry import get_service_registry
+
+from artifact_agent.cas_artifact_service import ContentAddressedArtifactService
+
+
+def cas_artifact_service_factory(uri: str, **kwargs):
+    """cas://<目錄> → ContentAddressedArtifactService（目錄相對於目前工作目錄）。"""
+    root_dir = uri.split('://', 1)[1] or '.artifacts'
+    return ContentAddressedArtifactService(root_dir)
+
+
+get_service_registry().register_artifact_service('cas', cas_artifact_service_factory)
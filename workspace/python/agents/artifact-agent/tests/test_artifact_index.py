@@ -0,0 +1,250 @@
+"""
+測試 Artifacts 中繼資料索引與並行載入。
+
+確認儲存時會記錄每個版本的中繼資料，列表與報告工具只讀取索引，
+以及索引中沒有的 Artifact 會以有上限的並行數載入。
+"""
+
+import asyncio
+import hashlib
+
+import pytest
+from unittest.mock import AsyncMock
+
+from google.genai import types
+
+from artifact_agent.agent import (
+    create_final_report_tool,
+    list_artifacts_tool,
+    load_artifact_tool,
+    summarize_document_tool,
+    translate_document_tool,
+)
+from artifact_agent.artifact_index import (
+    collect_metadata,
+    describe_artifact,
+    index_state_key,
+    latest_metadata,
+    save_artifact_with_index,
+    version_metadata,
+    version_state_key,
+)
+
+
+class RecordingState(dict):
+    """記錄每次寫入的狀態（對應 ADK 的 state delta）。"""
+
+    def __init__(self):
+        super().__init__()
+        self.writes = []
+
+    def __setitem__(self, key, value):
+        self.writes.append((key, value))
+        super().__setitem__(key, value)
+
+
+class FakeArtifactStore:
+    """以字典保存版本化 Artifact 的模擬 ToolContext。"""
+
+    def __init__(self, load_delay=0.0):
+        self.state = RecordingState()
+        self.artifacts = {}
+        self.load_delay = load_delay
+        self.loads = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def save_artifact(self, filename, artifact):
+        versions = self.artifacts.setdefault(filename, [])
+        versions.append(artifact)
+        return len(versions) - 1
+
+    async def load_artifact(self, filename, version=None):
+        self.loads += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.load_delay)
+            versions = self.artifacts.get(filename)
+            if not versions:
+                return None
+            return versions[-1] if version is None else versions[version]
+        finally:
+            self.in_flight -= 1
+
+    async def list_artifacts(self):
+        return sorted(self.artifacts)
+
+
+class TestDescribeArtifact:
+    """測試中繼資料的計算。"""
+
+    def test_text_artifact(self):
+        """測試文字 Artifact 的大小、字元數、MIME 類型與雜湊。"""
+        text = "季度報告"
+        metadata = describe_artifact('document_FINAL_REPORT.md', types.Part.from_text(text=text))
+
+        assert metadata['characters'] == 4
+        assert metadata['size_bytes'] == len(text.encode('utf-8'))
+        assert metadata['mime_type'] == 'text/markdown'
+        assert metadata['sha256'] == hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def test_binary_artifact(self):
+        """測試二進位 Artifact 使用 inline_data 的 MIME 類型。"""
+        part = types.Part.from_bytes(data=b'\x89PNG' * 10, mime_type='image/png')
+        metadata = describe_artifact('chart.png', part)
+
+        assert metadata['size_bytes'] == 40
+        assert metadata['mime_type'] == 'image/png'
+        assert metadata['characters'] is None
+
+
+class TestSaveArtifactWithIndex:
+    """測試儲存時維護索引。"""
+
+    @pytest.mark.asyncio
+    async def test_every_version_is_indexed(self):
+        """測試每個版本各自保留中繼資料，指標指向最新版本。"""
+        context = FakeArtifactStore()
+        _, first = await save_artifact_with_index(context, 'document_summary.txt', types.Part.from_text(text='v0'))
+        version, metadata = await save_artifact_with_index(
+            context, 'document_summary.txt', types.Part.from_text(text='第二版')
+        )
+
+        assert version == 1
+        assert context.state[index_state_key('document_summary.txt')] == {'version': 1, 'version_count': 2}
+        assert latest_metadata(context, 'document_summary.txt') == metadata
+        assert metadata['version_count'] == 2
+        assert metadata['characters'] == 3
+        assert metadata['created_at']
+        older = version_metadata(context, 'document_summary.txt', 0)
+        assert older['sha256'] == hashlib.sha256(b'v0').hexdigest()
+        assert older['sha256'] == first['sha256'] != metadata['sha256']
+        assert older['characters'] == 2
+        assert version_metadata(context, 'document_summary.txt', 2) is None
+        assert latest_metadata(context, 'document_missing.txt') is None
+
+    @pytest.mark.asyncio
+    async def test_filenames_with_colons_do_not_collide(self):
+        """測試檔名含 ':' 時，指標與版本的鍵不會互相覆寫。"""
+        context = FakeArtifactStore()
+        await save_artifact_with_index(context, 'a', types.Part.from_text(text='a'))
+        await save_artifact_with_index(context, 'a', types.Part.from_text(text='a2'))
+        await save_artifact_with_index(context, '1:a', types.Part.from_text(text='other'))
+
+        assert latest_metadata(context, 'a')['version'] == 1
+        assert version_metadata(context, 'a', 1)['characters'] == 2
+        assert latest_metadata(context, '1:a')['characters'] == 5
+
+    @pytest.mark.asyncio
+    async def test_state_delta_does_not_grow(self):
+        """測試每次儲存只寫入該檔名的一筆中繼資料，不複製整個索引。"""
+        context = FakeArtifactStore()
+        for i in range(50):
+            await save_artifact_with_index(context, f'document_part{i}.txt', types.Part.from_text(text='x'))
+            await save_artifact_with_index(context, 'document_summary.txt', types.Part.from_text(text=str(i)))
+
+        # 每次儲存寫入一筆版本中繼資料與一筆指標
+        assert len(context.state.writes) == 200
+        for prefix in ('artifact_version:', 'artifact_index:'):
+            sizes = {len(repr(value)) for key, value in context.state.writes if key.startswith(prefix)}
+            assert max(sizes) - min(sizes) < 20
+        assert all(
+            key == version_state_key(value['filename'], value['version'])
+            for key, value in context.state.writes if key.startswith('artifact_version:')
+        )
+        assert latest_metadata(context, 'document_summary.txt')['version_count'] == 50
+
+    @pytest.mark.asyncio
+    async def test_tools_maintain_index(self):
+        """測試摘要與翻譯工具儲存時會更新索引。"""
+        context = FakeArtifactStore()
+        await summarize_document_tool('短文件', context)
+        await translate_document_tool('Hello', 'Spanish', context)
+
+        assert set(context.state) == {
+            index_state_key('document_summary.txt'),
+            version_state_key('document_summary.txt', 0),
+            index_state_key('document_spanish.txt'),
+            version_state_key('document_spanish.txt', 0),
+        }
+
+
+class TestMetadataOnlyTools:
+    """測試列表與報告工具只讀取中繼資料。"""
+
+    @pytest.mark.asyncio
+    async def test_report_does_not_load_indexed_artifacts(self):
+        """測試所有 Artifact 都在索引中時，最終報告不載入任何內容。"""
+        context = FakeArtifactStore()
+        for i in range(20):
+            await save_artifact_with_index(context, f'document_part{i}.txt', types.Part.from_text(text='x' * i))
+        context.load_artifact = AsyncMock(side_effect=AssertionError('不應載入內容'))
+
+        result = await create_final_report_tool(context)
+
+        assert result['status'] == 'success'
+        assert len(result['data']['artifacts_combined']) == 20
+        assert '- document_part7.txt: 7 個字元，版本 0' in result['data']['content']
+
+    @pytest.mark.asyncio
+    async def test_list_includes_metadata(self):
+        """測試列表工具附上最新版本的中繼資料與版本數。"""
+        context = FakeArtifactStore()
+        for text in ('a', 'bb', 'ccc'):
+            await save_artifact_with_index(context, 'document_summary.txt', types.Part.from_text(text=text))
+        context.load_artifact = AsyncMock(side_effect=AssertionError('不應載入內容'))
+
+        result = await list_artifacts_tool(context)
+        metadata = result['data']['metadata']['document_summary.txt']
+
+        assert metadata['version'] == 2
+        assert metadata['version_count'] == 3
+        assert metadata['characters'] == 3
+
+
+    @pytest.mark.asyncio
+    async def test_load_returns_version_metadata(self):
+        """測試載入指定版本時回傳該版本的中繼資料。"""
+        context = FakeArtifactStore()
+        await save_artifact_with_index(context, 'document_summary.txt', types.Part.from_text(text='v0'))
+        await save_artifact_with_index(context, 'document_summary.txt', types.Part.from_text(text='第二版'))
+
+        older = await load_artifact_tool('document_summary.txt', context, version=0)
+        latest = await load_artifact_tool('document_summary.txt', context)
+
+        assert older['data']['metadata']['version'] == 0
+        assert older['data']['metadata']['characters'] == 2
+        assert latest['data']['metadata']['version'] == 1
+        assert latest['data']['metadata']['version_count'] == 2
+
+
+class TestConcurrentLoading:
+    """測試未建立索引的 Artifact 以有上限的並行數載入。"""
+
+    @pytest.mark.asyncio
+    async def test_unindexed_loads_are_concurrent_and_capped(self):
+        """測試 12 個未索引的 Artifact 同時載入最多 3 個。"""
+        context = FakeArtifactStore(load_delay=0.02)
+        for i in range(12):
+            await context.save_artifact(f'document_upload{i}.txt', types.Part.from_text(text='y' * i))
+        await save_artifact_with_index(context, 'document_summary.txt', types.Part.from_text(text='摘要'))
+
+        names = await context.list_artifacts()
+        metadata = await collect_metadata(context, names, max_concurrency=3)
+
+        assert context.loads == 12
+        assert context.max_in_flight == 3
+        assert metadata['document_summary.txt']['indexed'] is True
+        assert metadata['document_upload5.txt']['indexed'] is False
+        assert metadata['document_upload5.txt']['characters'] == 5
+        assert list(metadata) == names
+
+    @pytest.mark.asyncio
+    async def test_missing_artifact(self):
+        """測試找不到的 Artifact 回傳 None。"""
+        context = FakeArtifactStore()
+
+        metadata = await collect_metadata(context, ['document_missing.txt'])
+
+        assert metadata == {'document_missing.txt': None}
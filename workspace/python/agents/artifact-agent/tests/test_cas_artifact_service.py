@@ -0,0 +1,192 @@
+"""
+測試內容定址的 Artifacts 服務。
+
+確認相同內容只儲存一份 blob、版本與中繼資料的行為與 ADK 的 Artifacts 服務一致，
+以及刪除後的垃圾回收與壓縮。
+"""
+
+import pytest
+
+from google.adk.errors.input_validation_error import InputValidationError
+from google.genai import types
+
+from artifact_agent import cas_artifact_service
+from artifact_agent.cas_artifact_service import ContentAddressedArtifactService
+
+SCOPE = {'app_name': 'artifact_agent', 'user_id': 'user1', 'session_id': 'session1'}
+
+
+@pytest.fixture
+def service(tmp_path):
+    """在暫存目錄建立服務。"""
+    service = ContentAddressedArtifactService(tmp_path / 'cas')
+    yield service
+    service.close()
+
+
+def blob_files(service):
+    return [path for path in service.blob_dir.glob('*/*')]
+
+
+class TestSaveAndLoad:
+    """測試儲存與載入。"""
+
+    @pytest.mark.asyncio
+    async def test_text_and_binary_roundtrip(self, service):
+        """測試文字與二進位 Artifact 可完整讀回。"""
+        await service.save_artifact(filename='summary.txt', artifact=types.Part.from_text(text='摘要'), **SCOPE)
+        image = types.Part.from_bytes(data=b'\x89PNG' * 100, mime_type='image/png')
+        await service.save_artifact(filename='chart.png', artifact=image, **SCOPE)
+
+        text = await service.load_artifact(filename='summary.txt', **SCOPE)
+        loaded = await service.load_artifact(filename='chart.png', **SCOPE)
+
+        assert text.text == '摘要'
+        assert loaded.inline_data.data == b'\x89PNG' * 100
+        assert loaded.inline_data.mime_type == 'image/png'
+
+    @pytest.mark.asyncio
+    async def test_identical_versions_share_one_blob(self, service):
+        """測試內容相同的版本只儲存一份 blob。"""
+        part = types.Part.from_text(text='重新產生的摘要' * 50)
+        versions = [
+            await service.save_artifact(filename='summary.txt', artifact=part, **SCOPE)
+            for _ in range(5)
+        ]
+        await service.save_artifact(
+            filename='copy.txt', artifact=part, app_name='artifact_agent', user_id='user2', session_id='s2'
+        )
+
+        stats = service.storage_stats()
+        assert versions == [0, 1, 2, 3, 4]
+        assert len(blob_files(service)) == 1
+        assert stats['versions'] == 6
+        assert stats['blobs'] == 1
+        assert stats['logical_bytes'] == 6 * stats['unique_bytes']
+
+    @pytest.mark.asyncio
+    async def test_versions_and_metadata(self, service):
+        """測試版本列表、特定版本與自訂中繼資料。"""
+        await service.save_artifact(filename='summary.txt', artifact=types.Part.from_text(text='v0'), **SCOPE)
+        await service.save_artifact(
+            filename='summary.txt',
+            artifact=types.Part.from_text(text='v1'),
+            custom_metadata={'source': 'summarize'},
+            **SCOPE,
+        )
+
+        assert await service.list_versions(filename='summary.txt', **SCOPE) == [0, 1]
+        assert (await service.load_artifact(filename='summary.txt', version=0, **SCOPE)).text == 'v0'
+        assert (await service.load_artifact(filename='summary.txt', **SCOPE)).text == 'v1'
+        assert await service.load_artifact(filename='summary.txt', version=7, **SCOPE) is None
+
+        latest = await service.get_artifact_version(filename='summary.txt', **SCOPE)
+        assert latest.version == 1
+        assert latest.custom_metadata == {'source': 'summarize'}
+        assert latest.mime_type == 'text/plain'
+        assert latest.canonical_uri.startswith('file://')
+
+    @pytest.mark.asyncio
+    async def test_user_scope_and_keys(self, service):
+        """測試 user: 前綴的 Artifact 在所有會話中可見。"""
+        await service.save_artifact(filename='user:profile.txt', artifact=types.Part.from_text(text='p'), **SCOPE)
+        await service.save_artifact(filename='notes.txt', artifact=types.Part.from_text(text='n'), **SCOPE)
+
+        keys = await service.list_artifact_keys(**SCOPE)
+        other = await service.list_artifact_keys(app_name='artifact_agent', user_id='user1', session_id='other')
+
+        assert keys == ['notes.txt', 'user:profile.txt']
+        assert other == ['user:profile.txt']
+
+    @pytest.mark.asyncio
+    async def test_session_required_for_session_scope(self, service):
+        """測試會話範圍的 Artifact 需要會話 ID。"""
+        with pytest.raises(InputValidationError):
+            await service.save_artifact(
+                app_name='artifact_agent', user_id='user1', filename='a.txt',
+                artifact=types.Part.from_text(text='x'),
+            )
+
+    @pytest.mark.asyncio
+    async def test_persists_across_instances(self, service, tmp_path):
+        """測試重新開啟同一目錄後可讀取既有版本。"""
+        await service.save_artifact(filename='summary.txt', artifact=types.Part.from_text(text='持久'), **SCOPE)
+        service.close()
+
+        reopened = ContentAddressedArtifactService(tmp_path / 'cas')
+        try:
+            assert (await reopened.load_artifact(filename='summary.txt', **SCOPE)).text == '持久'
+            assert await reopened.save_artifact(
+                filename='summary.txt', artifact=types.Part.from_text(text='持久'), **SCOPE
+            ) == 1
+        finally:
+            reopened.close()
+
+
+class TestGarbageCollection:
+    """測試參考計數與垃圾回收。"""
+
+    @pytest.mark.asyncio
+    async def test_shared_blob_survives_until_last_reference(self, service):
+        """測試 blob 在最後一個參考被刪除前不會被回收。"""
+        part = types.Part.from_text(text='共用內容')
+        await service.save_artifact(filename='a.txt', artifact=part, **SCOPE)
+        await service.save_artifact(filename='b.txt', artifact=part, **SCOPE)
+
+        await service.delete_artifact(filename='a.txt', **SCOPE)
+        assert (await service.collect_garbage())['blobs_removed'] == 0
+        assert (await service.load_artifact(filename='b.txt', **SCOPE)).text == '共用內容'
+
+        await service.delete_artifact(filename='b.txt', **SCOPE)
+        result = await service.collect_garbage()
+        assert result['blobs_removed'] == 1
+        assert result['bytes_freed'] == len('共用內容'.encode('utf-8'))
+        assert blob_files(service) == []
+        assert await service.list_artifact_keys(**SCOPE) == []
+
+    @pytest.mark.asyncio
+    async def test_orphan_blob_is_removed(self, service):
+        """測試發佈後未寫入索引的孤立 blob 會被回收。"""
+        await service.save_artifact(filename='a.txt', artifact=types.Part.from_text(text='保留'), **SCOPE)
+        orphan = service.blob_dir / 'ff' / ('f' * 64)
+        orphan.parent.mkdir()
+        orphan.write_bytes(b'orphan')
+
+        result = await service.collect_garbage()
+
+        assert result == {'blobs_removed': 1, 'bytes_freed': 6}
+        assert len(blob_files(service)) == 1
+
+
+class TestCompression:
+    """測試 zstd 壓縮。"""
+
+    @pytest.mark.asyncio
+    async def test_text_is_compressed(self, tmp_path):
+        """測試文字內容以 zstd 壓縮且可讀回；圖片不壓縮。"""
+        pytest.importorskip('zstandard')
+        service = ContentAddressedArtifactService(tmp_path / 'cas')
+        text = '重複的段落。' * 500
+        await service.save_artifact(filename='long.txt', artifact=types.Part.from_text(text=text), **SCOPE)
+        await service.save_artifact(
+            filename='photo.jpg', artifact=types.Part.from_bytes(data=b'\xff' * 1000, mime_type='image/jpeg'), **SCOPE
+        )
+
+        stats = service.storage_stats()
+        assert stats['stored_bytes'] < stats['unique_bytes']
+        assert (await service.load_artifact(filename='long.txt', **SCOPE)).text == text
+        assert (await service.load_artifact(filename='photo.jpg', **SCOPE)).inline_data.data == b'\xff' * 1000
+        service.close()
+
+    @pytest.mark.asyncio
+    async def test_without_zstandard_stores_raw(self, tmp_path, monkeypatch):
+        """測試未安裝 zstandard 時以原始內容儲存。"""
+        monkeypatch.setattr(cas_artifact_service, 'zstandard', None)
+        service = ContentAddressedArtifactService(tmp_path / 'cas')
+        text = '重複的段落。' * 500
+        await service.save_artifact(filename='long.txt', artifact=types.Part.from_text(text=text), **SCOPE)
+
+        stats = service.storage_stats()
+        assert stats['stored_bytes'] == stats['unique_bytes'] == len(text.encode('utf-8'))
+        assert (await service.load_artifact(filename='long.txt', **SCOPE)).text == text
+        service.close()
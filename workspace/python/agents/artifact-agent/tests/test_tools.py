@@ -24,6 +24,7 @@ def mock_tool_context():
     context.save_artifact = AsyncMock(return_value=0)  # 回傳版本 0
     context.load_artifact = AsyncMock(return_value=None)
     context.list_artifacts = AsyncMock(return_value=[])
+    context.state = {}  # 中繼資料索引儲存在會話狀態中
     return context
 
 
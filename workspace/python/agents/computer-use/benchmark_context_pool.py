@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""比較「每個工作階段啟動一個瀏覽器」與 BrowserContextPool 的啟動延遲與記憶體。
+
+同時啟動 N 個 PlaywrightComputer（預設 20 個，headless），量測：
+
+- 每個工作階段 initialize() 的延遲 p50 / p95
+- 所有工作階段啟動後 Chromium 程序樹的記憶體（Linux 上為 PSS，否則為 RSS；需要 psutil）
+- pool 模式另外量測第二輪（重設後重新租借）的啟動延遲
+
+使用方法：
+    python benchmark_context_pool.py --sessions 20
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from computer_use.context_pool import BrowserContextPool  # noqa: E402
+from computer_use.context_pool import PoolSettings  # noqa: E402
+from computer_use.playwright import PlaywrightComputer  # noqa: E402
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+SCREEN_SIZE = (1280, 936)
+# 不需要網路的小頁面，只量測瀏覽器 / context 的啟動成本
+TEST_PAGE = "data:text/html,<h1>benchmark</h1>"
+
+
+def browser_memory_mb() -> float:
+    """目前程序的所有子程序（Playwright driver 與 Chromium）的記憶體總和。"""
+    if psutil is None:
+        return float("nan")
+    total = 0
+    for child in psutil.Process().children(recursive=True):
+        try:
+            info = child.memory_full_info()
+            total += getattr(info, "pss", info.rss)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return total / 1024 / 1024
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+async def start_sessions(computers) -> list[float]:
+    async def start(computer):
+        started = time.perf_counter()
+        await computer.initialize()
+        return time.perf_counter() - started
+
+    return list(await asyncio.gather(*(start(computer) for computer in computers)))
+
+
+async def close_sessions(computers) -> None:
+    await asyncio.gather(*(computer.close(None, None, None) for computer in computers))
+
+
+async def run_launch(sessions: int) -> dict:
+    """原本的行為：每個工作階段啟動一個瀏覽器。"""
+    computers = [
+        PlaywrightComputer(SCREEN_SIZE, initial_url=TEST_PAGE, headless=True)
+        for _ in range(sessions)
+    ]
+    latencies = await start_sessions(computers)
+    memory = browser_memory_mb()
+    # 原本的 close() 沒有 await 關閉瀏覽器，在此直接關閉以釋放程序
+    for computer in computers:
+        await computer._browser.close()
+        await computer._playwright.stop()
+    return {"latencies": latencies, "memory_mb": memory}
+
+
+async def run_pool(sessions: int) -> dict:
+    pool = BrowserContextPool(PoolSettings(size=sessions, headless=True))
+    warm_started = time.perf_counter()
+    await pool.start()
+    warmup = time.perf_counter() - warm_started
+
+    computers = [PlaywrightComputer(SCREEN_SIZE, initial_url=TEST_PAGE, pool=pool) for _ in range(sessions)]
+    latencies = await start_sessions(computers)
+    memory = browser_memory_mb()
+    occupancy = pool.stats()["occupancy"]
+    await close_sessions(computers)
+
+    # 第二輪：租借已重設的 context
+    computers = [PlaywrightComputer(SCREEN_SIZE, initial_url=TEST_PAGE, pool=pool) for _ in range(sessions)]
+    second = await start_sessions(computers)
+    await close_sessions(computers)
+    stats = pool.stats()
+    await pool.close()
+    return {
+        "latencies": latencies,
+        "second": second,
+        "memory_mb": memory,
+        "warmup": warmup,
+        "occupancy": occupancy,
+        "stats": stats,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=20, help="同時啟動的工作階段數")
+    args = parser.parse_args()
+
+    print(f"{args.sessions} 個同時啟動的工作階段（headless Chromium）")
+    launch = await run_launch(args.sessions)
+    pool = await run_pool(args.sessions)
+
+    print(f"{'模式':<16} {'p50 (秒)':>9} {'p95 (秒)':>9} {'記憶體 (MB)':>12}")
+    rows = [
+        ("launch", launch["latencies"], launch["memory_mb"]),
+        ("pool", pool["latencies"], pool["memory_mb"]),
+        ("pool (重設後)", pool["second"], float("nan")),
+    ]
+    for name, latencies, memory in rows:
+        print(f"{name:<16} {percentile(latencies, 50):>9.3f} {percentile(latencies, 95):>9.3f} {memory:>12.0f}")
+    print(f"pool 預熱：{pool['warmup']:.2f} 秒；啟動後使用率 {pool['occupancy']:.0%}")
+    print(f"pool 統計：{pool['stats']}")
+    if psutil is None:
+        print("（未安裝 psutil，略過記憶體量測）")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -19,6 +19,8 @@ from google.adk import Agent
 from google.adk.tools.computer_use.computer_use_toolset import ComputerUseToolset
 
 from .playwright import PlaywrightComputer
+from .screenshots import ScreenshotSettings
+from .settle import SettleSettings
 
 # ---------- 瀏覽器使用者設定資料資料夾（profile）設定 ----------
 # 為瀏覽器指定一個固定的 user data 目錄，這可用於保留 cookie、登入狀態、擴充套件等。
@@ -31,9 +33,12 @@ os.makedirs(profile_path, exist_ok=True)
 # ---------- 建立可操作的電腦/瀏覽器實例 ----------
 # 使用自訂的 PlaywrightComputer，並將 user_data_dir 指向剛建立的設定資料夾。
 # screen_size 可調整為測試或使用需求所需的分辨率。
+# 畫面穩定偵測與截圖壓縮的參數可由 COMPUTER_USE_* 環境變數調整（見 README）。
 computer_with_profile = PlaywrightComputer(
     screen_size=(1280, 936),
     user_data_dir=profile_path,
+    settle=SettleSettings.from_env(),
+    screenshots=ScreenshotSettings.from_env(),
 )
 
 # ---------- 建立 Agent 並注入 ComputerUse 工具集 ----------
@@ -45,6 +50,8 @@ root_agent = Agent(
     instruction="""你是一個電腦使用代理。""",
     # 將 ComputerUseToolset 加入 tools，並傳入先前建立的 computer 實例。
     tools=[ComputerUseToolset(computer=computer_with_profile)],
+    # 將截圖標示為實際的編碼格式（JPEG / WebP），並標記與上一步相同的畫面。
+    after_tool_callback=computer_with_profile.after_tool_callback,
 )
 
 if __name__ == "__main__":
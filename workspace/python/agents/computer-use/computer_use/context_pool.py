@@ -0,0 +1,314 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""共用單一 Chromium 程序的 BrowserContext 池。
+
+每個 PlaywrightComputer 原本都會啟動一個完整的瀏覽器（數秒的啟動時間與數百 MB 記憶體）。
+此池只啟動一個瀏覽器，預先建立 size 個彼此隔離的 BrowserContext，並租借給各個代理工作階段：
+
+- 歸還時重設：開新分頁並關閉舊分頁（清除 sessionStorage 與瀏覽紀錄）、清除 cookie 與權限，
+  並以 CDP Storage.clearDataForOrigin 清除造訪過來源的 localStorage / IndexedDB / 快取 / Service Worker
+- 使用 max_uses 次或重設失敗時回收：關閉並以新的 context 取代
+- 回收時無法建立新的 context（例如瀏覽器暫時無回應）時記為缺額，
+  下一次租借時再補建，池的大小不會因此縮小
+"""
+import asyncio
+import os
+import statistics
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Optional
+from urllib.parse import urlsplit
+
+import termcolor
+
+
+@dataclass(frozen=True)
+class PoolSettings:
+    """BrowserContext 池的參數。"""
+
+    size: int = 4
+    max_uses: int = 20
+    headless: bool = False
+    # 等待可用 context 的上限（秒）；None 表示無限等待
+    acquire_timeout: Optional[float] = 60.0
+
+    @classmethod
+    def from_env(cls) -> "PoolSettings":
+        """從環境變數建立（COMPUTER_USE_POOL_SIZE、COMPUTER_USE_POOL_MAX_USES、
+        COMPUTER_USE_POOL_HEADLESS）。"""
+        return cls(
+            size=int(os.environ.get("COMPUTER_USE_POOL_SIZE", 4)),
+            max_uses=int(os.environ.get("COMPUTER_USE_POOL_MAX_USES", 20)),
+            headless=os.environ.get("COMPUTER_USE_POOL_HEADLESS", "false").lower() in ("1", "true", "yes"),
+        )
+
+
+@dataclass(eq=False)
+class ContextLease:
+    """租借給一個工作階段的 BrowserContext 與其分頁。"""
+
+    context: object
+    page: object
+    uses: int = 0
+    # 此 context 造訪過的來源（歸還時清除其儲存空間）
+    origins: set = field(default_factory=set)
+    init_scripts: set = field(default_factory=set)
+
+    async def ensure_init_script(self, script: str) -> None:
+        """只為此 context 註冊一次 init script（context 會被重複租借）。"""
+        if script not in self.init_scripts:
+            await self.context.add_init_script(script)
+            self.init_scripts.add(script)
+
+    def _on_request(self, request) -> None:
+        parts = urlsplit(request.url)
+        if parts.scheme in ("http", "https"):
+            self.origins.add(f"{parts.scheme}://{parts.netloc}")
+
+
+class BrowserContextPool:
+    """預熱、隔離並可回收的 BrowserContext 池。
+
+    Example:
+        pool = BrowserContextPool(PoolSettings(size=8, headless=True))
+        await pool.start()
+        computer = PlaywrightComputer(screen_size=(1280, 936), pool=pool)
+    """
+
+    def __init__(
+        self,
+        settings: Optional[PoolSettings] = None,
+        browser_args: Optional[list[str]] = None,
+        context_options: Optional[dict] = None,
+    ):
+        self.settings = settings or PoolSettings()
+        self._browser_args = browser_args or [
+            "--disable-blink-features=AutomationControlled",
+            "--disable-gpu",
+        ]
+        self._context_options = context_options or {}
+        self._playwright = None
+        self._browser = None
+        self._idle: list[ContextLease] = []
+        self._leased: set[ContextLease] = set()
+        self._available = asyncio.Condition()
+        self._start_lock = asyncio.Lock()
+        self._started = False
+        self._waiting = 0
+        # 回收時未能補上的 context 數；租借時重新建立
+        self._missing = 0
+        # 統計
+        self.created = 0
+        self.recycled = 0
+        self.resets = 0
+        self.reset_failures = 0
+        self.recycle_failures = 0
+        self.leases = 0
+        self._acquire_seconds: list[float] = []
+        self._reset_seconds: list[float] = []
+
+    async def start(self) -> None:
+        """啟動共用的瀏覽器並預先建立 size 個 context。"""
+        async with self._start_lock:
+            if not self._started:
+                await self._start()
+
+    async def _start(self) -> None:
+        from playwright.async_api import async_playwright
+
+        started = time.perf_counter()
+        self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(
+            args=self._browser_args,
+            headless=self.settings.headless,
+        )
+        self._idle = list(
+            await asyncio.gather(*(self._new_lease() for _ in range(self.settings.size)))
+        )
+        self._started = True
+        termcolor.cprint(
+            f"Started browser context pool ({self.settings.size} contexts) "
+            f"in {time.perf_counter() - started:.2f}s.",
+            color="green",
+            attrs=["bold"],
+        )
+
+    async def _new_lease(self) -> ContextLease:
+        context = await self._browser.new_context(**self._context_options)
+        page = await context.new_page()
+        lease = ContextLease(context=context, page=page)
+        context.on("request", lease._on_request)
+        self.created += 1
+        return lease
+
+    # ------------------------------------------------------------------
+    # 租借與歸還
+    # ------------------------------------------------------------------
+
+    async def acquire(self) -> ContextLease:
+        """租借一個 context；池中沒有可用的 context 時等待（最多 acquire_timeout 秒）。
+
+        先前回收失敗留下缺額時，在此建立新的 context；仍然失敗則恢復缺額並拋出例外。
+        """
+        if not self._started:
+            await self.start()
+        started = time.perf_counter()
+        async with self._available:
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(
+                    self._available.wait_for(lambda: self._idle or self._missing),
+                    timeout=self.settings.acquire_timeout,
+                )
+            finally:
+                self._waiting -= 1
+            if self._idle:
+                lease = self._idle.pop()
+                self._leased.add(lease)
+            else:
+                self._missing -= 1
+                lease = None
+        if lease is None:
+            try:
+                lease = await self._new_lease()
+            except Exception:
+                await self._restore_missing()
+                raise
+            self._leased.add(lease)
+        self.leases += 1
+        self._acquire_seconds.append(time.perf_counter() - started)
+        return lease
+
+    async def release(self, lease: ContextLease) -> None:
+        """歸還 context：重設後放回池中；已達 max_uses 或重設失敗時以新的 context 取代。"""
+        lease.uses += 1
+        self._leased.discard(lease)
+        replacement = lease
+        if lease.uses >= self.settings.max_uses or not await self._reset(lease):
+            replacement = await self._recycle(lease)
+        if replacement is None:
+            await self._restore_missing()
+            return
+        async with self._available:
+            self._idle.append(replacement)
+            self._available.notify()
+
+    async def _restore_missing(self) -> None:
+        # 記下缺額並喚醒一個等待者，由它在 acquire 中重新建立 context
+        async with self._available:
+            self._missing += 1
+            self._available.notify()
+
+    @asynccontextmanager
+    async def lease(self):
+        """以 async with 租借並在結束時自動歸還。"""
+        lease = await self.acquire()
+        try:
+            yield lease
+        finally:
+            await self.release(lease)
+
+    async def _reset(self, lease: ContextLease) -> bool:
+        started = time.perf_counter()
+        try:
+            # 新分頁沒有 sessionStorage 與瀏覽紀錄；先建立再關閉舊分頁，避免 context 沒有分頁
+            page = await lease.context.new_page()
+            for old in list(lease.context.pages):
+                if old is not page:
+                    await old.close()
+            lease.page = page
+            await lease.context.clear_cookies()
+            await lease.context.clear_permissions()
+            if lease.origins:
+                session = await lease.context.new_cdp_session(page)
+                try:
+                    for origin in lease.origins:
+                        await session.send(
+                            "Storage.clearDataForOrigin",
+                            {"origin": origin, "storageTypes": "all"},
+                        )
+                finally:
+                    await session.detach()
+                lease.origins.clear()
+        except Exception as e:
+            self.reset_failures += 1
+            termcolor.cprint(f"Context reset failed, recycling: {e}", color="yellow")
+            return False
+        self.resets += 1
+        self._reset_seconds.append(time.perf_counter() - started)
+        return True
+
+    async def _recycle(self, lease: ContextLease) -> Optional[ContextLease]:
+        self.recycled += 1
+        try:
+            await lease.context.close()
+        except Exception:
+            # context 可能已隨分頁當機或瀏覽器中斷而關閉
+            pass
+        try:
+            return await self._new_lease()
+        except Exception as e:
+            self.recycle_failures += 1
+            termcolor.cprint(f"Context recycle failed, will retry on acquire: {e}", color="yellow")
+            return None
+
+    # ------------------------------------------------------------------
+    # 統計與關閉
+    # ------------------------------------------------------------------
+
+    def stats(self) -> dict:
+        """池的大小、使用率、等待數與租借 / 重設延遲。"""
+
+        def percentile(values, q):
+            if not values:
+                return None
+            values = sorted(values)
+            return round(values[min(len(values) - 1, int(q * len(values)))], 4)
+
+        return {
+            "size": self.settings.size,
+            "idle": len(self._idle),
+            "leased": len(self._leased),
+            "occupancy": round(len(self._leased) / self.settings.size, 2) if self.settings.size else 0.0,
+            "waiting": self._waiting,
+            "missing": self._missing,
+            "leases": self.leases,
+            "created": self.created,
+            "recycled": self.recycled,
+            "resets": self.resets,
+            "reset_failures": self.reset_failures,
+            "recycle_failures": self.recycle_failures,
+            "acquire_p50_seconds": percentile(self._acquire_seconds, 0.5),
+            "acquire_p95_seconds": percentile(self._acquire_seconds, 0.95),
+            "reset_mean_seconds": (
+                round(statistics.mean(self._reset_seconds), 4) if self._reset_seconds else None
+            ),
+        }
+
+    async def close(self) -> None:
+        """關閉所有 context 與共用的瀏覽器。"""
+        for lease in self._idle + list(self._leased):
+            try:
+                await lease.context.close()
+            except Exception:
+                pass
+        self._idle.clear()
+        self._leased.clear()
+        self._missing = 0
+        if self._browser:
+            await self._browser.close()
+        if self._playwright:
+            await self._playwright.stop()
+        self._started = False
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import asyncio
+import logging
 import time
 from typing import Literal
 from typing import Optional
@@ -23,6 +24,20 @@ from playwright.async_api import async_playwright
 import termcolor
 from typing_extensions import override
 
+from .context_pool import BrowserContextPool
+from .context_pool import ContextLease
+from .screenshots import ScreenshotSettings
+from .screenshots import StepMetrics
+from .screenshots import StepMetricsLog
+from .screenshots import encode_screenshot
+from .screenshots import frame_diff
+from .settle import DOM_OBSERVER_SCRIPT
+from .settle import NetworkTracker
+from .settle import SettleSettings
+from .settle import wait_for_settle
+
+logger = logging.getLogger(__name__)
+
 # 將使用者友善的按鍵名稱對應到 Playwright 所需的按鍵名稱。
 # Playwright 對大小寫通常容錯，但仍維持 canonical 形式較佳。
 # 注意：字元鍵（例如 'a', 'b', '1', '$'）會直接傳遞。
@@ -80,15 +95,40 @@ class PlaywrightComputer(BaseComputer):
         search_engine_url: str = "https://www.google.com",
         highlight_mouse: bool = False,
         user_data_dir: Optional[str] = None,
+        settle: Optional[SettleSettings] = None,
+        screenshots: Optional[ScreenshotSettings] = None,
+        highlight_duration: float = 1.0,
+        pool: Optional[BrowserContextPool] = None,
+        headless: bool = False,
     ):
+        if pool is not None and user_data_dir:
+            raise ValueError("pool 與 user_data_dir 不能同時使用（persistent profile 需要獨立的瀏覽器）")
         self._initial_url = initial_url
         self._screen_size = screen_size
         self._search_engine_url = search_engine_url
         self._highlight_mouse = highlight_mouse
         self._user_data_dir = user_data_dir
+        self._settle = settle or SettleSettings()
+        self._screenshots = screenshots or ScreenshotSettings()
+        self._highlight_duration = highlight_duration
+        self._network = NetworkTracker(long_request=self._settle.long_request)
+        # 每一步的穩定偵測、截圖大小與延遲統計
+        self.step_metrics = StepMetricsLog()
+        self._last_step: Optional[StepMetrics] = None
+        self._step_started: Optional[float] = None
+        # 上一步回傳的截圖與網址，用於判斷畫面是否沒有變化
+        self._previous_frame: Optional[bytes] = None
+        self._previous_url: Optional[str] = None
+        # 提供 pool 時向共用的瀏覽器租借 BrowserContext，而不是啟動新的瀏覽器
+        self._pool = pool
+        self._lease: Optional[ContextLease] = None
+        self._headless = headless
 
     @override
     async def initialize(self):
+        if self._pool is not None:
+            await self._initialize_from_pool()
+            return
         # 重點: 啟動 Playwright 並建立 context/browser；若提供 user_data_dir 則使用 persistent profile。
         print("Creating session...")
         self._playwright = await async_playwright().start()
@@ -108,7 +148,7 @@ class PlaywrightComputer(BaseComputer):
             # 提供 user_data_dir 時使用 persistent context
             self._context = await self._playwright.chromium.launch_persistent_context(
                 self._user_data_dir,
-                headless=False,
+                headless=self._headless,
                 args=browser_args,
             )
             self._browser = self._context.browser
@@ -121,10 +161,14 @@ class PlaywrightComputer(BaseComputer):
             # 不提供 user_data_dir 時啟動暫時的 browser instance
             self._browser = await self._playwright.chromium.launch(
                 args=browser_args,
-                headless=False,
+                headless=self._headless,
             )
             self._context = await self._browser.new_context()
 
+        # 重點: 追蹤進行中的請求並在每個文件注入 MutationObserver，供穩定偵測使用。
+        self._network.attach(self._context)
+        await self._context.add_init_script(DOM_OBSERVER_SCRIPT)
+
         if not self._context.pages:
             self._page = await self._context.new_page()
             await self._page.goto(self._initial_url)
@@ -143,6 +187,28 @@ class PlaywrightComputer(BaseComputer):
             attrs=["bold"],
         )
 
+    async def _initialize_from_pool(self):
+        # 重點: 租借已預熱的 context；cookie 與儲存空間已在上一次歸還時清除。
+        self._lease = await self._pool.acquire()
+        self._context = self._lease.context
+        self._page = self._lease.page
+        self._browser = None
+        self._previous_frame = self._previous_url = None
+        self._network.attach(self._context)
+        await self._lease.ensure_init_script(DOM_OBSERVER_SCRIPT)
+        await self._page.set_viewport_size(
+            {
+                "width": self._screen_size[0],
+                "height": self._screen_size[1],
+            }
+        )
+        await self._page.goto(self._initial_url)
+
+    @override
+    async def prepare(self, tool_context) -> None:
+        # ComputerUseToolset 在每次工具呼叫前呼叫；記錄步驟開始時間以計算每一步的延遲。
+        self._step_started = time.perf_counter()
+
     @override
     async def environment(self):
         return ComputerEnvironment.ENVIRONMENT_BROWSER
@@ -151,6 +217,17 @@ class PlaywrightComputer(BaseComputer):
     async def close(self, exc_type, exc_val, exc_tb):
         # 重點: 目前 exc_type / exc_val / exc_tb 未被使用。
         # 若要消除 linter 的「未存取」提示，可改名為 `_exc_type=None, _exc_val=None, _exc_tb=None`。
+        if self.step_metrics.steps:
+            termcolor.cprint(
+                f"Step metrics: {self.step_metrics.summary()}",
+                color="cyan",
+            )
+        if self._lease is not None:
+            # 歸還 context 給池（重設或回收），共用的瀏覽器保持運作
+            self._network.detach(self._context)
+            lease, self._lease = self._lease, None
+            await self._pool.release(lease)
+            return
         if self._context:
             self._context.close()
         try:
@@ -313,12 +390,89 @@ class PlaywrightComputer(BaseComputer):
         return await self.current_state()
 
     async def current_state(self) -> ComputerState:
+        started = self._step_started or time.perf_counter()
+        self._step_started = None
         await self._page.wait_for_load_state()
         # 即使 Playwright 報告頁面已載入，畫面可能尚未完全渲染完成。
-        # 重點: 在 async 函式中使用 blocking 的 time.sleep 會阻塞事件迴圈，建議改用 await asyncio.sleep(0.5)。
-        time.sleep(0.5)
-        screenshot_bytes = await self._page.screenshot(type="png", full_page=False)
-        return ComputerState(screenshot=screenshot_bytes, url=self._page.url)
+        # 重點: 以網路閒置、DOM 靜止與連續截圖不變判斷畫面穩定（max_wait 為硬上限），
+        # 取代固定的 blocking time.sleep(0.5)。
+        settled = await wait_for_settle(
+            self._page,
+            self._network,
+            self._settle,
+            self._capture_frame,
+            frame_diff,
+        )
+
+        encode_started = time.perf_counter()
+        screenshot, mime_type = await asyncio.to_thread(
+            encode_screenshot, settled.frame, self._screenshots
+        )
+        encode_seconds = time.perf_counter() - encode_started
+
+        url = self._page.url
+        unchanged = (
+            self._previous_frame is not None
+            and url == self._previous_url
+            and frame_diff(self._previous_frame, settled.frame) <= self._settle.frame_threshold
+        )
+        self._previous_frame, self._previous_url = settled.frame, url
+
+        step = StepMetrics(
+            url=url,
+            settle_reason=settled.reason,
+            settle_seconds=settled.seconds,
+            captures=settled.captures,
+            encode_seconds=encode_seconds,
+            step_seconds=time.perf_counter() - started,
+            captured_bytes=len(settled.frame),
+            bytes_sent=len(screenshot),
+            mime_type=mime_type,
+            unchanged=unchanged,
+        )
+        self.step_metrics.record(step)
+        self._last_step = step
+        return ComputerState(screenshot=screenshot, url=url)
+
+    async def _capture_frame(self) -> bytes:
+        return await self._page.screenshot(
+            type=self._screenshots.capture_type,
+            quality=self._screenshots.capture_quality,
+            full_page=False,
+        )
+
+    def after_tool_callback(self, tool, args, tool_context, tool_response):
+        """修正截圖的 MIME 類型並處理未變更的畫面（作為 Agent 的 after_tool_callback）。
+
+        ComputerUseTool 一律將截圖標示為 image/png；此回呼改為實際的編碼格式，
+        並依 ScreenshotSettings.unchanged 標記（flag）或省略（skip）與上一步相同的截圖。
+        """
+        step = self._last_step
+        if step is None or not isinstance(tool_response, dict) or "image" not in tool_response:
+            return None
+        self._last_step = None
+        step.action = tool.name
+
+        response = dict(tool_response)
+        response["image"] = dict(tool_response["image"], mimetype=step.mime_type)
+        if step.unchanged and self._screenshots.unchanged != "send":
+            response["screen_unchanged"] = True
+            if self._screenshots.unchanged == "skip":
+                del response["image"]
+                step.bytes_sent = 0
+
+        logger.info(
+            "%s: %.2fs (settle %s %.2fs, %d captures), %d bytes %s%s",
+            step.action,
+            step.step_seconds,
+            step.settle_reason,
+            step.settle_seconds,
+            step.captures,
+            step.bytes_sent,
+            step.mime_type,
+            " [unchanged]" if step.unchanged else "",
+        )
+        return response
 
     async def screen_size(self) -> tuple[int, int]:
         return self._screen_size
@@ -351,6 +505,5 @@ class PlaywrightComputer(BaseComputer):
             }}
           """
         )
-        # 等候一段時間讓使用者能看到指標效果。
-        # 重點: 這裡使用 blocking 的 time.sleep，也建議改用 await asyncio.sleep(1)。
-        time.sleep(1)
+        # 等候一段時間讓使用者能看到指標效果（不阻塞事件迴圈）。
+        await asyncio.sleep(self._highlight_duration)
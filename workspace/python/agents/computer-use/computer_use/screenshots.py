@@ -0,0 +1,188 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""截圖壓縮、畫面差異與每一步的延遲 / 傳送量統計。
+
+截圖由 Chromium 直接擷取為 JPEG；若有安裝 Pillow，會再縮小到 max_width
+並依設定編碼為 JPEG / WebP。未安裝 Pillow 時直接傳送 Chromium 的 JPEG，
+畫面差異則退回以位元組是否相同判斷。
+"""
+import io
+import os
+import statistics
+from collections import Counter, deque
+from dataclasses import dataclass
+from typing import Optional
+
+try:
+    from PIL import Image, ImageChops
+except ImportError:
+    Image = None
+    ImageChops = None
+
+# 輸出格式 → MIME 類型
+SCREENSHOT_FORMATS = {
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+    "PNG": "image/png",
+}
+
+# 未變更截圖的處理方式：照常傳送 / 標記 screen_unchanged / 標記並省略圖片
+UNCHANGED_POLICIES = ("send", "flag", "skip")
+
+# 灰階差異超過此值的像素才算改變（容許 JPEG 壓縮雜訊）
+_PIXEL_TOLERANCE = 16
+_THUMBNAIL_SIZE = (320, 240)
+
+
+@dataclass(frozen=True)
+class ScreenshotSettings:
+    """截圖的輸出參數。"""
+
+    format: str = "JPEG"
+    quality: int = 75
+    # 最大寬度（像素）；None 表示維持原始解析度
+    max_width: Optional[int] = 1024
+    unchanged: str = "flag"
+
+    def __post_init__(self):
+        if self.format not in SCREENSHOT_FORMATS:
+            raise ValueError(f"不支援的截圖格式：{self.format}")
+        if self.unchanged not in UNCHANGED_POLICIES:
+            raise ValueError(f"不支援的未變更截圖處理方式：{self.unchanged}")
+
+    @property
+    def capture_type(self) -> str:
+        """向 Chromium 要求的擷取格式（Playwright 只支援 png / jpeg）。"""
+        return "png" if self.format == "PNG" else "jpeg"
+
+    @property
+    def capture_quality(self) -> Optional[int]:
+        if self.format == "PNG":
+            return None
+        if self.format == "JPEG" and (Image is None or self.max_width is None):
+            return self.quality
+        # 之後會以 Pillow 縮小並重新編碼時，先以較高品質擷取以避免兩次失真
+        return 90
+
+    @classmethod
+    def from_env(cls) -> "ScreenshotSettings":
+        """從環境變數建立（COMPUTER_USE_SCREENSHOT_FORMAT、COMPUTER_USE_SCREENSHOT_QUALITY、
+        COMPUTER_USE_SCREENSHOT_MAX_WIDTH（0 表示原始解析度）、COMPUTER_USE_UNCHANGED_SCREENSHOTS）。"""
+        max_width = int(os.environ.get("COMPUTER_USE_SCREENSHOT_MAX_WIDTH", 1024))
+        return cls(
+            format=os.environ.get("COMPUTER_USE_SCREENSHOT_FORMAT", "JPEG").upper(),
+            quality=int(os.environ.get("COMPUTER_USE_SCREENSHOT_QUALITY", 75)),
+            max_width=max_width or None,
+            unchanged=os.environ.get("COMPUTER_USE_UNCHANGED_SCREENSHOTS", "flag").lower(),
+        )
+
+
+def encode_screenshot(raw: bytes, settings: ScreenshotSettings) -> tuple[bytes, str]:
+    """將 Chromium 擷取的截圖縮小並編碼，回傳（位元組, MIME 類型）。"""
+    captured_mime = "image/png" if settings.capture_type == "png" else "image/jpeg"
+    if Image is None:
+        return raw, captured_mime
+
+    image = Image.open(io.BytesIO(raw))
+    resize = settings.max_width is not None and image.width > settings.max_width
+    if not resize and SCREENSHOT_FORMATS[settings.format] == captured_mime:
+        return raw, captured_mime
+
+    if resize:
+        height = round(image.height * settings.max_width / image.width)
+        # JPEG 可在解碼時以 DCT 縮放，減少縮圖前需要解碼的像素
+        image.draft("RGB", (settings.max_width, height))
+        image = image.convert("RGB").resize((settings.max_width, height), Image.Resampling.LANCZOS)
+
+    output = io.BytesIO()
+    if settings.format == "PNG":
+        image.save(output, format="PNG", optimize=True)
+    elif settings.format == "WEBP":
+        image.convert("RGB").save(output, format="WEBP", quality=settings.quality, method=4)
+    else:
+        image.convert("RGB").save(output, format="JPEG", quality=settings.quality, optimize=True)
+    return output.getvalue(), SCREENSHOT_FORMATS[settings.format]
+
+
+def _thumbnail(data: bytes):
+    """回傳（原始尺寸, 縮小的灰階影像）；一個文字游標大小的變動仍會留下可偵測的像素。"""
+    image = Image.open(io.BytesIO(data))
+    size = image.size
+    image.draft("L", (image.width // 4, image.height // 4))
+    return size, image.convert("L").resize(_THUMBNAIL_SIZE, Image.Resampling.BILINEAR)
+
+
+def frame_diff(a: bytes, b: bytes) -> float:
+    """兩張截圖之間改變的像素比例（0 到 1），以縮小的灰階影像比較。"""
+    if a == b:
+        return 0.0
+    if Image is None:
+        return 1.0
+    (first_size, first), (second_size, second) = _thumbnail(a), _thumbnail(b)
+    if first_size != second_size:
+        return 1.0
+    difference = ImageChops.difference(first, second).point(lambda value: 255 if value > _PIXEL_TOLERANCE else 0)
+    return difference.histogram()[255] / (difference.width * difference.height)
+
+
+@dataclass
+class StepMetrics:
+    """單一步驟（一次工具呼叫）的統計。"""
+
+    action: str = ""
+    url: str = ""
+    settle_reason: str = ""
+    settle_seconds: float = 0.0
+    captures: int = 0
+    encode_seconds: float = 0.0
+    step_seconds: float = 0.0
+    captured_bytes: int = 0
+    bytes_sent: int = 0
+    mime_type: str = ""
+    unchanged: bool = False
+
+
+class StepMetricsLog:
+    """保留最近的步驟統計並產生摘要。"""
+
+    def __init__(self, maxlen: int = 1000):
+        self.steps: deque[StepMetrics] = deque(maxlen=maxlen)
+
+    def record(self, step: StepMetrics) -> None:
+        self.steps.append(step)
+
+    def summary(self) -> dict:
+        """步驟數、延遲 p50 / p95、傳送量與穩定偵測結果的分布。"""
+        steps = list(self.steps)
+        if not steps:
+            return {"steps": 0}
+
+        def percentile(values, q):
+            values = sorted(values)
+            return round(values[min(len(values) - 1, int(q * len(values)))], 3)
+
+        step_seconds = [step.step_seconds for step in steps]
+        settle_seconds = [step.settle_seconds for step in steps]
+        return {
+            "steps": len(steps),
+            "step_p50_seconds": percentile(step_seconds, 0.5),
+            "step_p95_seconds": percentile(step_seconds, 0.95),
+            "settle_p50_seconds": percentile(settle_seconds, 0.5),
+            "settle_p95_seconds": percentile(settle_seconds, 0.95),
+            "settle_reasons": dict(Counter(step.settle_reason for step in steps)),
+            "captured_bytes": sum(step.captured_bytes for step in steps),
+            "bytes_sent": sum(step.bytes_sent for step in steps),
+            "mean_bytes_sent": round(statistics.mean(step.bytes_sent for step in steps)),
+            "unchanged_steps": sum(step.unchanged for step in steps),
+        }
@@ -0,0 +1,175 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""畫面穩定偵測：取代每一步固定的 time.sleep(0.5)。
+
+畫面被視為「穩定」需同時滿足：
+1. 網路閒置：沒有進行中的請求（忽略 WebSocket / SSE 與長輪詢）超過 network_quiet 秒
+2. DOM 靜止：MutationObserver 超過 dom_quiet 秒沒有觀察到變動
+3. 畫面不變：連續兩張截圖的差異不超過 frame_threshold
+
+若在 max_wait 秒內未達到穩定，則以當下畫面回傳（硬上限）。
+"""
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+# 在每個文件載入前注入的 MutationObserver，記錄最後一次 DOM 變動的時間。
+DOM_OBSERVER_SCRIPT = """
+(() => {
+  if (window.__adkSettle) return;
+  window.__adkSettle = { lastMutation: performance.now() };
+  new MutationObserver(() => {
+    window.__adkSettle.lastMutation = performance.now();
+  }).observe(document, {
+    subtree: true,
+    childList: true,
+    attributes: true,
+    characterData: true,
+  });
+})();
+"""
+
+_DOM_IDLE_SCRIPT = """
+() => window.__adkSettle ? performance.now() - window.__adkSettle.lastMutation : null
+"""
+
+
+@dataclass(frozen=True)
+class SettleSettings:
+    """畫面穩定偵測的參數（秒）。"""
+
+    max_wait: float = 2.0
+    network_quiet: float = 0.25
+    dom_quiet: float = 0.2
+    # 兩張截圖之間改變的像素比例上限；0 表示必須完全相同
+    frame_threshold: float = 0.0
+    poll_interval: float = 0.05
+    # 超過此秒數仍未完成的請求視為背景連線（長輪詢、串流），不影響網路閒置判斷
+    long_request: float = 5.0
+
+    @classmethod
+    def from_env(cls) -> "SettleSettings":
+        """從環境變數建立（COMPUTER_USE_SETTLE_MAX_WAIT、COMPUTER_USE_SETTLE_NETWORK_QUIET、
+        COMPUTER_USE_SETTLE_DOM_QUIET、COMPUTER_USE_SETTLE_FRAME_THRESHOLD）。"""
+        return cls(
+            max_wait=float(os.environ.get("COMPUTER_USE_SETTLE_MAX_WAIT", 2.0)),
+            network_quiet=float(os.environ.get("COMPUTER_USE_SETTLE_NETWORK_QUIET", 0.25)),
+            dom_quiet=float(os.environ.get("COMPUTER_USE_SETTLE_DOM_QUIET", 0.2)),
+            frame_threshold=float(os.environ.get("COMPUTER_USE_SETTLE_FRAME_THRESHOLD", 0.0)),
+        )
+
+
+@dataclass
+class SettleResult:
+    """穩定偵測的結果。
+
+    reason: "stable"（三個條件皆滿足）或 "timeout"（達到 max_wait）
+    frame: 最後擷取的原始截圖
+    """
+
+    reason: str
+    seconds: float
+    frame: bytes
+    captures: int
+
+
+class NetworkTracker:
+    """追蹤 BrowserContext 中進行中的請求。"""
+
+    IGNORED_RESOURCE_TYPES = frozenset({"websocket", "eventsource"})
+
+    def __init__(self, long_request: float = 5.0, clock: Callable[[], float] = time.monotonic):
+        self._long_request = long_request
+        self._clock = clock
+        self._in_flight: dict = {}
+        self._last_activity = clock()
+
+    def attach(self, context) -> None:
+        """在 Playwright BrowserContext 上註冊請求事件。"""
+        context.on("request", self.on_request)
+        context.on("requestfinished", self.on_request_done)
+        context.on("requestfailed", self.on_request_done)
+
+    def detach(self, context) -> None:
+        """移除事件（context 歸還給池後會被其他工作階段使用）。"""
+        context.remove_listener("request", self.on_request)
+        context.remove_listener("requestfinished", self.on_request_done)
+        context.remove_listener("requestfailed", self.on_request_done)
+        self._in_flight.clear()
+
+    def on_request(self, request) -> None:
+        if request.resource_type in self.IGNORED_RESOURCE_TYPES:
+            return
+        now = self._clock()
+        self._in_flight[request] = now
+        self._last_activity = now
+
+    def on_request_done(self, request) -> None:
+        if self._in_flight.pop(request, None) is not None:
+            self._last_activity = self._clock()
+
+    def idle_seconds(self) -> float:
+        """網路已閒置的秒數；有進行中的（非長時間）請求時為 0。"""
+        now = self._clock()
+        if any(now - started < self._long_request for started in self._in_flight.values()):
+            return 0.0
+        return now - self._last_activity
+
+
+async def dom_idle_seconds(page) -> float:
+    """DOM 已靜止的秒數；頁面正在導覽或尚未安裝觀察器時為 0。"""
+    try:
+        idle_ms = await page.evaluate(_DOM_IDLE_SCRIPT)
+        if idle_ms is None:
+            # 觀察器只會注入到之後載入的文件，既有的頁面在此補上。
+            await page.evaluate(DOM_OBSERVER_SCRIPT)
+            return 0.0
+        return idle_ms / 1000
+    except Exception:
+        # 導覽中執行環境會被銷毀（Execution context was destroyed），視為尚未穩定。
+        return 0.0
+
+
+async def wait_for_settle(
+    page,
+    tracker: NetworkTracker,
+    settings: SettleSettings,
+    capture: Callable[[], Awaitable[bytes]],
+    diff: Callable[[bytes, bytes], float],
+    clock: Callable[[], float] = time.monotonic,
+    sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+) -> SettleResult:
+    """等待畫面穩定並回傳最後一張截圖（不阻塞事件迴圈）。"""
+    started = clock()
+    deadline = started + settings.max_wait
+    previous: Optional[bytes] = None
+    captures = 0
+
+    while True:
+        if (
+            tracker.idle_seconds() >= settings.network_quiet
+            and await dom_idle_seconds(page) >= settings.dom_quiet
+        ):
+            frame = await capture()
+            captures += 1
+            if previous is not None and diff(previous, frame) <= settings.frame_threshold:
+                return SettleResult("stable", clock() - started, frame, captures)
+            previous = frame
+
+        if clock() >= deadline:
+            frame = await capture()
+            return SettleResult("timeout", clock() - started, frame, captures + 1)
+        await sleep(settings.poll_interval)
@@ -0,0 +1,253 @@
+"""
+測試 BrowserContext 池。
+
+以假的瀏覽器、context 與分頁取代 Playwright，驗證租借 / 重設、
+達到 max_uses 或重設失敗時的回收、回收失敗後補建、租借逾時與統計。
+"""
+
+import asyncio
+
+import pytest
+
+from computer_use.context_pool import BrowserContextPool, PoolSettings
+
+
+class FakeRequest:
+    def __init__(self, url):
+        self.url = url
+
+
+class FakeCdpSession:
+    def __init__(self, context):
+        self.context = context
+
+    async def send(self, method, params):
+        self.context.cdp_calls.append((method, params))
+
+    async def detach(self):
+        pass
+
+
+class FakePage:
+    def __init__(self, context):
+        self.context = context
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+        self.context.pages.remove(self)
+
+
+class FakeContext:
+    """記錄重設動作的 BrowserContext 替身。"""
+
+    def __init__(self, fail_reset=False):
+        self.pages = []
+        self.listeners = {}
+        self.cdp_calls = []
+        self.cookies_cleared = 0
+        self.closed = False
+        self.fail_reset = fail_reset
+
+    def on(self, event, callback):
+        self.listeners.setdefault(event, []).append(callback)
+
+    def visit(self, url):
+        """模擬分頁發出請求。"""
+        for callback in self.listeners.get("request", []):
+            callback(FakeRequest(url))
+
+    async def new_page(self):
+        if self.fail_reset and self.pages:
+            raise RuntimeError("Target page, context or browser has been closed")
+        page = FakePage(self)
+        self.pages.append(page)
+        return page
+
+    async def clear_cookies(self):
+        self.cookies_cleared += 1
+
+    async def clear_permissions(self):
+        pass
+
+    async def new_cdp_session(self, page):
+        return FakeCdpSession(self)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    """可設定接下來幾次 new_context 失敗的 Browser 替身。"""
+
+    def __init__(self):
+        self.contexts = []
+        self.failures = 0
+
+    async def new_context(self, **options):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("Browser has been disconnected")
+        context = FakeContext()
+        self.contexts.append(context)
+        return context
+
+
+async def make_pool(size=2, max_uses=20, acquire_timeout=1.0):
+    """建立已預熱的池；以假的瀏覽器取代 Playwright 啟動的 Chromium。"""
+    pool = BrowserContextPool(PoolSettings(size=size, max_uses=max_uses, acquire_timeout=acquire_timeout))
+    browser = FakeBrowser()
+    pool._browser = browser
+    pool._idle = [await pool._new_lease() for _ in range(size)]
+    pool._started = True
+    return pool, browser
+
+
+class TestLeaseAndReset:
+    """測試租借與歸還時的重設。"""
+
+    @pytest.mark.asyncio
+    async def test_release_resets_context(self):
+        """測試歸還時換新分頁、清除 cookie 與造訪過來源的儲存空間，並重複使用同一個 context。"""
+        pool, browser = await make_pool(size=1)
+        lease = await pool.acquire()
+        context, old_page = lease.context, lease.page
+        context.visit("https://example.com/login")
+        context.visit("data:text/html,hello")
+
+        await pool.release(lease)
+
+        assert old_page.closed
+        assert lease.page is not old_page and context.pages == [lease.page]
+        assert context.cookies_cleared == 1
+        assert context.cdp_calls == [
+            ("Storage.clearDataForOrigin", {"origin": "https://example.com", "storageTypes": "all"})
+        ]
+        assert lease.origins == set()
+        assert await pool.acquire() is lease
+        assert len(browser.contexts) == 1
+
+    @pytest.mark.asyncio
+    async def test_lease_context_manager(self):
+        """測試 async with 結束時自動歸還。"""
+        pool, _ = await make_pool(size=1)
+
+        async with pool.lease() as lease:
+            assert pool.stats()["leased"] == 1
+
+        assert pool.stats()["idle"] == 1
+        assert lease.uses == 1
+
+
+class TestRecycle:
+    """測試 context 的回收與補建。"""
+
+    @pytest.mark.asyncio
+    async def test_recycle_after_max_uses(self):
+        """測試使用 max_uses 次後關閉並以新的 context 取代。"""
+        pool, browser = await make_pool(size=1, max_uses=2)
+        first = await pool.acquire()
+        await pool.release(first)
+        await pool.release(await pool.acquire())
+
+        replacement = await pool.acquire()
+
+        assert first.context.closed
+        assert replacement is not first
+        assert pool.recycled == 1
+        assert pool.created == 2
+        assert len(browser.contexts) == 2
+
+    @pytest.mark.asyncio
+    async def test_recycle_when_reset_fails(self):
+        """測試重設失敗（例如分頁當機）時回收。"""
+        pool, _ = await make_pool(size=1)
+        lease = await pool.acquire()
+        lease.context.fail_reset = True
+
+        await pool.release(lease)
+
+        assert pool.reset_failures == 1
+        assert pool.recycled == 1
+        assert (await pool.acquire()) is not lease
+
+    @pytest.mark.asyncio
+    async def test_recycle_failure_keeps_pool_size(self):
+        """測試回收時無法建立新 context 不會拋出例外，下一次租借時補建。"""
+        pool, browser = await make_pool(size=1, max_uses=1)
+        lease = await pool.acquire()
+        browser.failures = 1
+
+        await pool.release(lease)
+
+        stats = pool.stats()
+        assert stats["recycle_failures"] == 1
+        assert stats["missing"] == 1 and stats["idle"] == 0
+        replacement = await pool.acquire()
+        assert replacement.context is browser.contexts[-1]
+        assert pool.stats()["missing"] == 0
+        await pool.release(replacement)
+        assert pool.stats()["idle"] == 1
+
+    @pytest.mark.asyncio
+    async def test_recycle_failure_wakes_waiter(self):
+        """測試回收失敗時喚醒等待中的租借，由它補建 context。"""
+        pool, browser = await make_pool(size=1, max_uses=1)
+        lease = await pool.acquire()
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0)
+        assert pool.stats()["waiting"] == 1
+        browser.failures = 1
+
+        await pool.release(lease)
+        replacement = await asyncio.wait_for(waiter, timeout=1.0)
+
+        assert replacement is not lease
+        assert pool.stats()["leased"] == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_replenish_restores_missing_slot(self):
+        """測試租借時補建仍失敗則拋出例外，缺額保留給下一次租借。"""
+        pool, browser = await make_pool(size=1, max_uses=1)
+        lease = await pool.acquire()
+        browser.failures = 2
+        await pool.release(lease)
+
+        with pytest.raises(RuntimeError):
+            await pool.acquire()
+
+        assert pool.stats()["missing"] == 1
+        assert await pool.acquire() is not None
+
+
+class TestAcquireTimeoutAndStats:
+    """測試租借逾時與統計。"""
+
+    @pytest.mark.asyncio
+    async def test_acquire_timeout(self):
+        """測試池已全部租出時等待 acquire_timeout 秒後逾時。"""
+        pool, _ = await make_pool(size=1, acquire_timeout=0.05)
+        await pool.acquire()
+
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.acquire()
+
+        assert pool.stats()["waiting"] == 0
+
+    @pytest.mark.asyncio
+    async def test_stats(self):
+        """測試大小、使用率、租借數與延遲統計。"""
+        pool, _ = await make_pool(size=4)
+        leases = [await pool.acquire() for _ in range(3)]
+        await pool.release(leases[0])
+
+        stats = pool.stats()
+
+        assert stats["size"] == 4
+        assert stats["idle"] == 2 and stats["leased"] == 2
+        assert stats["occupancy"] == 0.5
+        assert stats["leases"] == 3
+        assert stats["created"] == 4
+        assert stats["resets"] == 1 and stats["reset_failures"] == 0
+        assert stats["acquire_p50_seconds"] is not None
+        assert stats["reset_mean_seconds"] is not None
@@ -0,0 +1,240 @@
+"""
+測試截圖壓縮、畫面差異、步驟統計與 after_tool_callback。
+
+截圖以 Pillow 產生的合成圖片代替 Chromium 的擷取結果，不需要啟動瀏覽器。
+"""
+
+import io
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image, ImageDraw
+
+from computer_use.playwright import PlaywrightComputer
+from computer_use.screenshots import (
+    ScreenshotSettings,
+    StepMetrics,
+    StepMetricsLog,
+    encode_screenshot,
+    frame_diff,
+)
+
+
+def make_frame(size=(1280, 936), format="JPEG", cursor=None, quality=90):
+    """建立合成的頁面截圖；cursor 為 (x, y) 時畫上一個文字游標大小的方塊。"""
+    image = Image.new("RGB", size, (250, 250, 250))
+    draw = ImageDraw.Draw(image)
+    for row in range(40, size[1] - 40, 60):
+        draw.rectangle((40, row, size[0] // 2, row + 20), fill=(40, 40, 40))
+    if cursor is not None:
+        x, y = cursor
+        draw.rectangle((x, y, x + 8, y + 24), fill=(0, 0, 0))
+    output = io.BytesIO()
+    image.save(output, format=format, quality=quality)
+    return output.getvalue()
+
+
+def open_image(data):
+    return Image.open(io.BytesIO(data))
+
+
+class TestScreenshotSettings:
+    """測試截圖參數。"""
+
+    def test_invalid_values_rejected(self):
+        """測試不支援的格式與未變更處理方式。"""
+        with pytest.raises(ValueError):
+            ScreenshotSettings(format="GIF")
+        with pytest.raises(ValueError):
+            ScreenshotSettings(unchanged="drop")
+
+    def test_from_env(self, monkeypatch):
+        """測試從環境變數建立；最大寬度 0 表示原始解析度。"""
+        monkeypatch.setenv("COMPUTER_USE_SCREENSHOT_FORMAT", "webp")
+        monkeypatch.setenv("COMPUTER_USE_SCREENSHOT_QUALITY", "60")
+        monkeypatch.setenv("COMPUTER_USE_SCREENSHOT_MAX_WIDTH", "0")
+        monkeypatch.setenv("COMPUTER_USE_UNCHANGED_SCREENSHOTS", "SKIP")
+
+        settings = ScreenshotSettings.from_env()
+
+        assert settings == ScreenshotSettings(format="WEBP", quality=60, max_width=None, unchanged="skip")
+        assert settings.capture_type == "jpeg"
+
+    def test_capture_parameters(self):
+        """測試向 Chromium 要求的擷取格式與品質。"""
+        assert ScreenshotSettings(format="PNG").capture_type == "png"
+        assert ScreenshotSettings(format="PNG").capture_quality is None
+        assert ScreenshotSettings(max_width=None, quality=70).capture_quality == 70
+        # 之後會重新編碼時以較高品質擷取
+        assert ScreenshotSettings(quality=70).capture_quality == 90
+
+
+class TestEncodeScreenshot:
+    """測試截圖的縮小與重新編碼。"""
+
+    def test_downscale_to_max_width(self):
+        """測試寬於 max_width 的截圖縮小並維持長寬比。"""
+        data, mime_type = encode_screenshot(make_frame(), ScreenshotSettings(max_width=640))
+
+        assert mime_type == "image/jpeg"
+        image = open_image(data)
+        assert image.format == "JPEG"
+        assert image.size == (640, 468)
+
+    def test_webp_output(self):
+        """測試 WebP 輸出小於 Chromium 擷取的 JPEG。"""
+        raw = make_frame()
+        data, mime_type = encode_screenshot(raw, ScreenshotSettings(format="WEBP"))
+
+        assert mime_type == "image/webp"
+        assert open_image(data).format == "WEBP"
+        assert len(data) < len(raw)
+
+    def test_passthrough_when_nothing_to_do(self):
+        """測試不需縮小且格式相同時直接回傳原始位元組。"""
+        raw = make_frame(size=(800, 600))
+
+        data, mime_type = encode_screenshot(raw, ScreenshotSettings(max_width=1024))
+
+        assert data is raw
+        assert mime_type == "image/jpeg"
+
+    def test_png_capture(self):
+        """測試 PNG 格式以 PNG 擷取並輸出 PNG。"""
+        data, mime_type = encode_screenshot(
+            make_frame(format="PNG"), ScreenshotSettings(format="PNG", max_width=640)
+        )
+
+        assert mime_type == "image/png"
+        assert open_image(data).size == (640, 468)
+
+
+class TestFrameDiff:
+    """測試畫面差異。"""
+
+    def test_identical_frames(self):
+        frame = make_frame()
+        assert frame_diff(frame, frame) == 0.0
+
+    def test_recompression_noise_ignored(self):
+        """測試重新壓縮造成的雜訊不算改變。"""
+        assert frame_diff(make_frame(quality=90), make_frame(quality=70)) == 0.0
+
+    def test_cursor_change_detected(self):
+        """測試文字游標大小的變動仍可偵測，但只占畫面的一小部分。"""
+        diff = frame_diff(make_frame(), make_frame(cursor=(900, 500)))
+
+        assert 0.0 < diff < 0.01
+
+    def test_different_sizes(self):
+        """測試尺寸不同的截圖視為完全不同。"""
+        assert frame_diff(make_frame(), make_frame(size=(1024, 768))) == 1.0
+
+
+class TestStepMetricsLog:
+    """測試步驟統計摘要。"""
+
+    def test_empty(self):
+        assert StepMetricsLog().summary() == {"steps": 0}
+
+    def test_summary(self):
+        """測試延遲百分位數、傳送量與穩定偵測結果的分布。"""
+        log = StepMetricsLog()
+        for i in range(10):
+            log.record(
+                StepMetrics(
+                    step_seconds=0.1 * (i + 1),
+                    settle_seconds=0.05 * (i + 1),
+                    settle_reason="timeout" if i == 9 else "stable",
+                    captured_bytes=1000,
+                    bytes_sent=0 if i < 2 else 400,
+                    unchanged=i < 2,
+                )
+            )
+
+        summary = log.summary()
+
+        assert summary["steps"] == 10
+        assert summary["step_p50_seconds"] == 0.6
+        assert summary["step_p95_seconds"] == 1.0
+        assert summary["settle_p50_seconds"] == 0.3
+        assert summary["settle_reasons"] == {"stable": 9, "timeout": 1}
+        assert summary["captured_bytes"] == 10000
+        assert summary["bytes_sent"] == 3200
+        assert summary["mean_bytes_sent"] == 320
+        assert summary["unchanged_steps"] == 2
+
+    def test_keeps_recent_steps(self):
+        """測試只保留最近 maxlen 個步驟。"""
+        log = StepMetricsLog(maxlen=3)
+        for i in range(5):
+            log.record(StepMetrics(action=f"step-{i}"))
+
+        assert [step.action for step in log.steps] == ["step-2", "step-3", "step-4"]
+
+
+class TestAfterToolCallback:
+    """測試截圖 MIME 類型的修正與未變更畫面的處理。"""
+
+    @staticmethod
+    def computer(unchanged="flag"):
+        # 只建立物件，不啟動瀏覽器
+        return PlaywrightComputer(
+            screen_size=(1280, 936), screenshots=ScreenshotSettings(format="WEBP", unchanged=unchanged)
+        )
+
+    @staticmethod
+    def tool_response():
+        # 與 ComputerUseTool 回傳的格式相同（一律標示為 image/png）
+        return {"image": {"mimetype": "image/png", "data": "c2NyZWVu"}, "url": "https://example.com"}
+
+    def run(self, computer, step, response=None):
+        computer._last_step = step
+        tool = SimpleNamespace(name="click_at")
+        return computer.after_tool_callback(tool, {}, None, response or self.tool_response())
+
+    def test_mimetype_rewritten(self):
+        """測試截圖標示為實際的編碼格式，且不修改原本的回應。"""
+        computer = self.computer()
+        original = self.tool_response()
+        step = StepMetrics(mime_type="image/webp", bytes_sent=400)
+
+        response = self.run(computer, step, original)
+
+        assert response["image"] == {"mimetype": "image/webp", "data": "c2NyZWVu"}
+        assert original["image"]["mimetype"] == "image/png"
+        assert "screen_unchanged" not in response
+        assert step.action == "click_at"
+        assert computer._last_step is None
+
+    def test_unchanged_flagged(self):
+        """測試 flag：未變更的畫面標記 screen_unchanged 並保留截圖。"""
+        response = self.run(self.computer("flag"), StepMetrics(mime_type="image/webp", unchanged=True))
+
+        assert response["screen_unchanged"] is True
+        assert "image" in response
+
+    def test_unchanged_skipped(self):
+        """測試 skip：未變更的畫面省略截圖，傳送量記為 0。"""
+        step = StepMetrics(mime_type="image/webp", bytes_sent=400, unchanged=True)
+
+        response = self.run(self.computer("skip"), step)
+
+        assert response["screen_unchanged"] is True
+        assert "image" not in response
+        assert response["url"] == "https://example.com"
+        assert step.bytes_sent == 0
+
+    def test_unchanged_sent(self):
+        """測試 send：未變更的畫面照常傳送且不標記。"""
+        response = self.run(self.computer("send"), StepMetrics(mime_type="image/webp", unchanged=True))
+
+        assert "screen_unchanged" not in response
+        assert response["image"]["mimetype"] == "image/webp"
+
+    def test_ignores_responses_without_screenshot(self):
+        """測試沒有截圖的回應與沒有待處理步驟時不修改回應。"""
+        assert self.run(self.computer(), StepMetrics(), {"result": "ok"}) is None
+        assert self.computer().after_tool_callback(
+            SimpleNamespace(name="wait"), {}, None, self.tool_response()
+        ) is None
@@ -0,0 +1,216 @@
+"""
+測試畫面穩定偵測。
+
+以假的時鐘、頁面與截圖函式驅動 wait_for_settle，不需要啟動瀏覽器。
+"""
+
+import pytest
+
+from computer_use.settle import (
+    DOM_OBSERVER_SCRIPT,
+    NetworkTracker,
+    SettleSettings,
+    dom_idle_seconds,
+    wait_for_settle,
+)
+
+
+class FakeClock:
+    """以 sleep 推進的假時鐘。"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakePage:
+    """page.evaluate 回傳固定的 DOM 閒置毫秒數；None 表示尚未安裝觀察器。"""
+
+    def __init__(self, idle_ms=1000.0):
+        self.idle_ms = idle_ms
+        self.scripts = []
+
+    async def evaluate(self, script):
+        self.scripts.append(script)
+        if script == DOM_OBSERVER_SCRIPT:
+            return None
+        return self.idle_ms
+
+
+class FakeCapture:
+    """依序回傳截圖；用完後重複最後一張。"""
+
+    def __init__(self, *frames):
+        self.frames = list(frames)
+        self.calls = 0
+
+    async def __call__(self):
+        frame = self.frames[min(self.calls, len(self.frames) - 1)]
+        self.calls += 1
+        return frame
+
+
+def same_bytes(a, b):
+    return 0.0 if a == b else 1.0
+
+
+class FakeRequest:
+    """只提供 resource_type 的 Playwright Request 替身（以物件身分作為鍵）。"""
+
+    def __init__(self, resource_type="fetch"):
+        self.resource_type = resource_type
+
+
+def request(resource_type="fetch"):
+    return FakeRequest(resource_type)
+
+
+async def settle(page, tracker, settings, capture, clock, diff=same_bytes):
+    return await wait_for_settle(page, tracker, settings, capture, diff, clock=clock, sleep=clock.sleep)
+
+
+class TestNetworkTracker:
+    """測試進行中請求的追蹤。"""
+
+    def test_idle_after_requests_finish(self):
+        """測試請求完成後從最後一次活動開始計算閒置時間。"""
+        clock = FakeClock()
+        tracker = NetworkTracker(clock=clock)
+        pending = request()
+        tracker.on_request(pending)
+        clock.now = 1.0
+        assert tracker.idle_seconds() == 0.0
+
+        tracker.on_request_done(pending)
+        clock.now = 1.5
+        assert tracker.idle_seconds() == pytest.approx(0.5)
+
+    def test_long_requests_and_websockets_ignored(self):
+        """測試超過 long_request 的請求與 WebSocket / SSE 不影響閒置判斷。"""
+        clock = FakeClock()
+        tracker = NetworkTracker(long_request=5.0, clock=clock)
+        tracker.on_request(request("websocket"))
+        tracker.on_request(request("eventsource"))
+        clock.now = 0.5
+        assert tracker.idle_seconds() == pytest.approx(0.5)
+
+        tracker.on_request(request())
+        clock.now = 4.0
+        assert tracker.idle_seconds() == 0.0
+        clock.now = 6.0
+        assert tracker.idle_seconds() == pytest.approx(5.5)
+
+
+class TestDomIdle:
+    """測試 DOM 靜止偵測。"""
+
+    @pytest.mark.asyncio
+    async def test_installs_observer_when_missing(self):
+        """測試尚未安裝觀察器時補上並視為尚未靜止。"""
+        page = FakePage(idle_ms=None)
+
+        assert await dom_idle_seconds(page) == 0.0
+        assert page.scripts[-1] == DOM_OBSERVER_SCRIPT
+
+    @pytest.mark.asyncio
+    async def test_navigation_error_is_not_idle(self):
+        """測試導覽中執行環境被銷毀時視為尚未靜止。"""
+
+        class NavigatingPage:
+            async def evaluate(self, script):
+                raise RuntimeError("Execution context was destroyed")
+
+        assert await dom_idle_seconds(NavigatingPage()) == 0.0
+
+
+class TestWaitForSettle:
+    """測試 wait_for_settle 的穩定與逾時判斷。"""
+
+    @pytest.mark.asyncio
+    async def test_stable_after_network_quiet_and_identical_frames(self):
+        """測試網路閒置後連續兩張相同截圖即回傳 stable。"""
+        clock = FakeClock()
+        settings = SettleSettings(network_quiet=0.25, poll_interval=0.05)
+        capture = FakeCapture(b"frame")
+
+        result = await settle(FakePage(), NetworkTracker(clock=clock), settings, capture, clock)
+
+        assert result.reason == "stable"
+        assert result.frame == b"frame"
+        assert result.captures == 2
+        assert result.seconds == pytest.approx(0.30)
+
+    @pytest.mark.asyncio
+    async def test_waits_for_frames_to_stop_changing(self):
+        """測試畫面仍在變化時繼續擷取，直到連續兩張相同。"""
+        clock = FakeClock()
+        settings = SettleSettings(network_quiet=0.0, poll_interval=0.05)
+        capture = FakeCapture(b"a", b"b", b"c", b"c")
+
+        result = await settle(FakePage(), NetworkTracker(clock=clock), settings, capture, clock)
+
+        assert result.reason == "stable"
+        assert result.frame == b"c"
+        assert result.captures == 4
+
+    @pytest.mark.asyncio
+    async def test_frame_threshold_tolerates_small_changes(self):
+        """測試差異不超過 frame_threshold 的截圖視為相同。"""
+        clock = FakeClock()
+        settings = SettleSettings(network_quiet=0.0, frame_threshold=0.02)
+        capture = FakeCapture(b"a", b"b")
+
+        result = await settle(
+            FakePage(), NetworkTracker(clock=clock), settings, capture, clock, diff=lambda a, b: 0.01
+        )
+
+        assert result.reason == "stable"
+        assert result.captures == 2
+
+    @pytest.mark.asyncio
+    async def test_timeout_when_frames_keep_changing(self):
+        """測試畫面持續變化（動畫）時在 max_wait 回傳最後一張截圖。"""
+        clock = FakeClock()
+        settings = SettleSettings(max_wait=1.0, network_quiet=0.0, poll_interval=0.25)
+        frames = [bytes([i]) for i in range(100)]
+        capture = FakeCapture(*frames)
+
+        result = await settle(FakePage(), NetworkTracker(clock=clock), settings, capture, clock)
+
+        assert result.reason == "timeout"
+        assert settings.max_wait <= result.seconds < settings.max_wait + settings.poll_interval
+        assert result.frame == frames[capture.calls - 1]
+        assert result.captures == capture.calls
+
+    @pytest.mark.asyncio
+    async def test_max_wait_caps_busy_network(self):
+        """測試網路一直忙碌時不擷取中間截圖，並以 max_wait 為硬上限。"""
+        clock = FakeClock()
+        settings = SettleSettings(max_wait=2.0, poll_interval=0.05, long_request=5.0)
+        tracker = NetworkTracker(long_request=settings.long_request, clock=clock)
+        tracker.on_request(request())
+        capture = FakeCapture(b"frame")
+
+        result = await settle(FakePage(), tracker, settings, capture, clock)
+
+        assert result.reason == "timeout"
+        assert settings.max_wait <= result.seconds < settings.max_wait + settings.poll_interval
+        assert result.captures == 1
+        assert capture.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_busy_dom_delays_capture(self):
+        """測試 DOM 仍在變動時不擷取截圖。"""
+        clock = FakeClock()
+        settings = SettleSettings(max_wait=0.5, network_quiet=0.0, dom_quiet=0.2)
+        capture = FakeCapture(b"frame")
+
+        result = await settle(FakePage(idle_ms=50), NetworkTracker(clock=clock), settings, capture, clock)
+
+        assert result.reason == "timeout"
+        assert capture.calls == 1
@@ -8,13 +8,13 @@
 import os
 import uuid
 import json
-from typing import Dict, Any
+import logging
+from typing import Dict, Any, Optional
 from datetime import datetime
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import uvicorn
 
 # AG-UI ADK 整合匯入
@@ -31,6 +31,8 @@ from google.adk.agents import Agent
 # 載入環境變數
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 
 # ============================================================================
 # 工具定義 (Tool Definitions)
@@ -371,64 +373,116 @@ root_agent = adk_agent
 # CopilotKit 相容性中介軟體 (Middleware for CopilotKit Compatibility)
 # ============================================================================
 
-class MessageIDMiddleware(BaseHTTPMiddleware):
+class MessageIDMiddleware:
     """
-    用於注入訊息 ID 以實現 CopilotKit 相容性的中介軟體。
+    用於注入訊息 ID 以實現 CopilotKit 相容性的純 ASGI 中介軟體。
 
     CopilotKit 發送的訊息沒有 ID，但 AG-UI 協定需要它們。
     此中介軟體會為缺少 'id' 欄位的任何訊息加入 UUID。
+
+    與 BaseHTTPMiddleware 不同，它只處理請求本體：
+    - 請求本體只解析一次，只有在確實注入 ID 時才重新序列化
+    - 不做任何除錯用的序列化；記錄只在 DEBUG 等級且只記錄計數
+    - 回應的 send 原樣傳遞，串流 (SSE) 回應不會被緩衝
     """
 
-    async def dispatch(self, request: Request, call_next):
+    def __init__(self, app: ASGIApp, path: str = "/api/copilotkit"):
+        """
+        初始化中介軟體。
+
+        Args:
+            app: 下游 ASGI 應用程式
+            path: 需要注入訊息 ID 的端點路徑
+        """
+        self.app = app
+        self.path = path
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """處理請求並在需要時注入訊息 ID。"""
         # 僅處理對 /api/copilotkit 的 POST 請求
-        if request.method == "POST" and request.url.path == "/api/copilotkit":
-            # 讀取請求本體
-            body = await request.body()
-
-            try:
-                # 解析 JSON
-                data = json.loads(body)
-
-                print(f"🔍 Middleware: 收到請求，鍵值：{list(data.keys())}")
-                print(f"📄 Middleware: 完整請求本體：{json.dumps(data, indent=2)[:500]}")
-
-                # 如果缺少，則將 ID 注入訊息中
-                if "messages" in data and isinstance(data["messages"], list):
-                    modified = False
-                    for i, msg in enumerate(data["messages"]):
-                        if isinstance(msg, dict):
-                            if "id" not in msg:
-                                # 產生唯一 ID
-                                msg["id"] = f"msg-{uuid.uuid4()}"
-                                modified = True
-                                print(f"✅ Middleware: 已將 ID 加入訊息 {i}：{msg.get('role', 'unknown')}")
-                            else:
-                                print(f"ℹ️  Middleware: 訊息 {i} 已有 ID：{msg['id']}")
-
-                    # 如果有變更，建立包含修改後本體的新請求
-                    if modified:
-                        modified_body = json.dumps(data).encode()
-                        print(f"📝 Middleware: 修改了 {len(data['messages'])} 條訊息")
-
-                        # 替換請求本體
-                        async def receive():
-                            return {"type": "http.request", "body": modified_body}
-
-                        request._receive = receive
-                    else:
-                        print("ℹ️  Middleware: 無需修改")
-                else:
-                    print(f"⚠️  Middleware: 請求中未找到 'messages' 欄位")
-
-            except json.JSONDecodeError as e:
-                print(f"❌ Middleware: JSON 解碼錯誤：{e}")
-            except Exception as e:
-                print(f"❌ Middleware: 未預期的錯誤：{e}")
-
-        # 繼續處理請求
-        response = await call_next(request)
-        return response
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or scope["path"] != self.path
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        # 讀取完整請求本體 (可能分成多個 http.request 訊息)
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                # 用戶端在送完本體前中斷，交由下游處理
+                await self.app(scope, _replay(message, receive), send)
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+
+        modified_body = inject_message_ids(body)
+        if modified_body is not None:
+            body = modified_body
+            scope = dict(scope)
+            scope["headers"] = [
+                (name, value)
+                for name, value in scope["headers"]
+                if name != b"content-length"
+            ] + [(b"content-length", str(len(body)).encode("latin-1"))]
+
+        await self.app(
+            scope,
+            _replay({"type": "http.request", "body": body, "more_body": False}, receive),
+            send,
+        )
+
+
+def inject_message_ids(body: bytes) -> Optional[bytes]:
+    """
+    為請求本體中缺少 'id' 的訊息注入 UUID。
+
+    Args:
+        body: 原始 JSON 請求本體
+
+    Returns:
+        修改後的本體；不需修改或無法解析時回傳 None (沿用原始本體)
+    """
+    try:
+        data = json.loads(body)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        logger.warning("MessageIDMiddleware: JSON 解碼錯誤：%s", e)
+        return None
+
+    messages = data.get("messages") if isinstance(data, dict) else None
+    if not isinstance(messages, list):
+        logger.debug("MessageIDMiddleware: 請求中未找到 'messages' 欄位")
+        return None
+
+    injected = 0
+    for msg in messages:
+        if isinstance(msg, dict) and "id" not in msg:
+            msg["id"] = f"msg-{uuid.uuid4()}"
+            injected += 1
+
+    logger.debug(
+        "MessageIDMiddleware: %d 條訊息中注入了 %d 個 ID", len(messages), injected
+    )
+    if not injected:
+        return None
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _replay(first: Message, receive: Receive) -> Receive:
+    """建立先回傳指定訊息、之後委派給原始 receive 的 receive 函式。"""
+    pending = [first]
+
+    async def replay() -> Message:
+        if pending:
+            return pending.pop()
+        return await receive()
+
+    return replay
 
 
 # ============================================================================
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+比較原本的 BaseHTTPMiddleware 版本與純 ASGI 版本 MessageIDMiddleware 的每請求開銷。
+
+- legacy: BaseHTTPMiddleware，完整緩衝、解析、以 indent=2 序列化整個本體來記錄 500 字元、
+  逐條訊息 print，修改後重新序列化並替換 request._receive
+- asgi: 目前的純 ASGI 中介軟體，只解析一次且不做除錯序列化，回應直接串流
+
+兩者都包在相同的 Starlette 應用程式中，下游端點讀取 JSON 並以 SSE 串流回應。
+
+使用方法：
+    python scripts/benchmark_message_id_middleware.py --messages 1000 --requests 200
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+
+# 將父目錄加入路徑
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from agent.agent import MessageIDMiddleware
+
+
+class LegacyMessageIDMiddleware(BaseHTTPMiddleware):
+    """原本的 BaseHTTPMiddleware 實作 (僅供比較)。
+
+    原本以 request._receive 替換本體；在目前的 Starlette 中 call_next 會回傳已快取的
+    原始本體 (注入的 ID 遺失)，且串流回應監聽中斷時會因替換的 receive 引發 RuntimeError。
+    此處改為替換快取的 request._body 使其能執行，其餘開銷維持原樣。
+    """
+
+    async def dispatch(self, request: Request, call_next):
+        if request.method == "POST" and request.url.path == "/api/copilotkit":
+            body = await request.body()
+            try:
+                data = json.loads(body)
+                print(f"🔍 Middleware: 收到請求，鍵值：{list(data.keys())}")
+                print(f"📄 Middleware: 完整請求本體：{json.dumps(data, indent=2)[:500]}")
+                if "messages" in data and isinstance(data["messages"], list):
+                    modified = False
+                    for i, msg in enumerate(data["messages"]):
+                        if isinstance(msg, dict):
+                            if "id" not in msg:
+                                msg["id"] = f"msg-{uuid.uuid4()}"
+                                modified = True
+                                print(f"✅ Middleware: 已將 ID 加入訊息 {i}：{msg.get('role', 'unknown')}")
+                            else:
+                                print(f"ℹ️  Middleware: 訊息 {i} 已有 ID：{msg['id']}")
+                    if modified:
+                        request._body = json.dumps(data).encode()
+            except Exception as e:
+                print(f"❌ Middleware: 未預期的錯誤：{e}")
+        return await call_next(request)
+
+
+async def copilotkit_endpoint(request: Request):
+    """模擬 AG-UI 端點：讀取 JSON 後串流 SSE 事件。"""
+    data = await request.json()
+
+    async def events():
+        for i in range(5):
+            yield f"data: {json.dumps({'type': 'TEXT_MESSAGE_CONTENT', 'i': i})}\n\n"
+        yield f"data: {json.dumps({'messages': len(data['messages'])})}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def make_app(middleware_cls) -> Starlette:
+    return Starlette(
+        routes=[Route("/api/copilotkit", copilotkit_endpoint, methods=["POST"])],
+        middleware=[Middleware(middleware_cls)],
+    )
+
+
+def make_body(message_count: int, with_ids: bool) -> bytes:
+    """建立 CopilotKit 風格的請求本體 (長聊天歷史)。"""
+    messages = []
+    for i in range(message_count):
+        msg = {
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"第 {i} 則訊息：我想查詢訂單 ORD-12345 的運送狀態與退款政策。" * 3,
+        }
+        if with_ids:
+            msg["id"] = f"msg-{i}"
+        messages.append(msg)
+    payload = {"threadId": "thread-1", "runId": "run-1", "state": {}, "tools": [], "messages": messages}
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+async def run(app: Starlette, body: bytes, requests: int) -> dict:
+    """送出 requests 個請求，回傳平均與 p95 延遲 (毫秒)。"""
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = await client.post(
+                "/api/copilotkit", content=body, headers={"content-type": "application/json"}
+            )
+            assert response.status_code == 200
+            latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "mean_ms": sum(latencies) / len(latencies),
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))],
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1000, help="每個請求的歷史訊息數")
+    parser.add_argument("--requests", type=int, default=200, help="每種情境的請求數")
+    args = parser.parse_args()
+
+    print(f"歷史訊息數：{args.messages}，每種情境請求數：{args.requests}")
+    print(f"{'情境':<24} {'中介軟體':<8} {'平均 (ms)':>10} {'p95 (ms)':>10}")
+
+    for label, with_ids in (("缺少 ID (需注入)", False), ("已有 ID (不需修改)", True)):
+        body = make_body(args.messages, with_ids)
+        for name, middleware_cls in (
+            ("legacy", LegacyMessageIDMiddleware),
+            ("asgi", MessageIDMiddleware),
+        ):
+            # 原本的實作會 print 每則訊息；導向記憶體以免終端機輸出主導結果
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = await run(make_app(middleware_cls), body, args.requests)
+            print(f"{label:<24} {name:<8} {result['mean_ms']:>10.3f} {result['p95_ms']:>10.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
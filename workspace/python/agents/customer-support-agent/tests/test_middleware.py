@@ -0,0 +1,165 @@
+"""測試 CopilotKit 訊息 ID 中介軟體。"""
+
+import asyncio
+import json
+
+import pytest
+
+try:
+    from agent.agent import MessageIDMiddleware, inject_message_ids
+except ImportError as e:
+    pytest.skip(f"Import failed (dependencies not installed): {e}", allow_module_level=True)
+
+
+class RecordingApp:
+    """記錄收到的請求本體，並以多個區塊串流回應的下游 ASGI 應用程式。"""
+
+    def __init__(self, chunks=(b"data: 1\n\n", b"data: 2\n\n")):
+        self.chunks = chunks
+        self.scope = None
+        self.body = None
+
+    async def __call__(self, scope, receive, send):
+        self.scope = scope
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body", False):
+                break
+        self.body = body
+
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        for chunk in self.chunks:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _call(app, body, method="POST", path="/api/copilotkit", split=None):
+    """以原始 ASGI 介面呼叫中介軟體，回傳送出的訊息列表。"""
+    parts = [body] if split is None else [body[:split], body[split:]]
+    requests = [
+        {"type": "http.request", "body": part, "more_body": i < len(parts) - 1}
+        for i, part in enumerate(parts)
+    ]
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "headers": [(b"content-length", str(len(body)).encode())],
+    }
+    sent = []
+
+    async def receive():
+        return requests.pop(0) if requests else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(MessageIDMiddleware(app)(scope, receive, send))
+    return sent
+
+
+class TestMessageIDMiddleware:
+    """測試 MessageIDMiddleware 的 ID 注入與串流行為。"""
+
+    def test_injects_missing_ids(self):
+        """測試為缺少 ID 的訊息注入 ID，並保留已有的 ID。"""
+        app = RecordingApp()
+        body = json.dumps(
+            {"messages": [{"role": "user", "content": "hi"}, {"id": "keep", "role": "assistant"}]}
+        ).encode()
+
+        _call(app, body)
+
+        messages = json.loads(app.body)["messages"]
+        assert messages[0]["id"].startswith("msg-")
+        assert messages[1]["id"] == "keep"
+        assert dict(app.scope["headers"])[b"content-length"] == str(len(app.body)).encode()
+
+    def test_unmodified_body_is_forwarded_as_is(self):
+        """測試所有訊息都有 ID 時原樣轉送請求本體 (不重新序列化)。"""
+        app = RecordingApp()
+        body = b'{"messages": [ {"id": "a", "role": "user"} ]}'
+
+        _call(app, body)
+
+        assert app.body == body
+
+    def test_chunked_request_body(self):
+        """測試分多個區塊送達的請求本體會被完整組合。"""
+        app = RecordingApp()
+        body = json.dumps({"messages": [{"role": "user"}] * 3}).encode()
+
+        _call(app, body, split=10)
+
+        assert all("id" in m for m in json.loads(app.body)["messages"])
+
+    def test_invalid_json_passes_through(self):
+        """測試無效 JSON 不會造成錯誤，原樣交給下游。"""
+        app = RecordingApp()
+        _call(app, b"not json")
+        assert app.body == b"not json"
+
+    def test_other_routes_untouched(self):
+        """測試其他路徑與方法不經處理直接轉送。"""
+        app = RecordingApp()
+        body = b'{"messages": [{"role": "user"}]}'
+
+        _call(app, body, path="/health")
+        assert app.body == body
+
+        _call(app, body, method="PUT")
+        assert app.body == body
+
+    def test_streaming_response_not_buffered(self):
+        """測試串流回應的每個區塊都原樣逐一送出。"""
+        app = RecordingApp(chunks=[b"a", b"b", b"c"])
+        sent = _call(app, b'{"messages": []}')
+
+        bodies = [m["body"] for m in sent if m["type"] == "http.response.body"]
+        assert bodies == [b"a", b"b", b"c", b""]
+
+    def test_inject_message_ids_helper(self):
+        """測試 inject_message_ids 在無需修改時回傳 None。"""
+        assert inject_message_ids(b'{"messages": [{"id": "x"}]}') is None
+        assert inject_message_ids(b'{"other": 1}') is None
+        assert inject_message_ids(b'[1, 2]') is None
+        assert b'"id"' in inject_message_ids(b'{"messages": [{"role": "user"}]}')
+
+    def test_with_starlette_streaming_endpoint(self):
+        """測試在 Starlette 應用程式中，串流端點可讀到注入 ID 後的訊息。"""
+        httpx = pytest.importorskip("httpx")
+        from starlette.applications import Starlette
+        from starlette.middleware import Middleware
+        from starlette.responses import StreamingResponse
+        from starlette.routing import Route
+
+        async def endpoint(request):
+            data = await request.json()
+            ids = [m["id"] for m in data["messages"]]
+
+            async def events():
+                for message_id in ids:
+                    yield f"data: {message_id}\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        app = Starlette(
+            routes=[Route("/api/copilotkit", endpoint, methods=["POST"])],
+            middleware=[Middleware(MessageIDMiddleware)],
+        )
+
+        async def post():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.post(
+                    "/api/copilotkit",
+                    json={"messages": [{"role": "user"}, {"id": "keep", "role": "user"}]},
+                )
+
+        response = asyncio.run(post())
+        lines = [line for line in response.text.splitlines() if line]
+        assert response.status_code == 200
+        assert lines[0].startswith("data: msg-")
+        assert lines[1] == "data: keep"
@@ -26,11 +26,16 @@ from google.adk.sessions import InMemorySessionService
 
 # 匯入代理 (Import agents)
 from data_analysis_agent import root_agent
+from data_analysis_agent.datasets import dataset_store
 from data_analysis_agent.visualization_agent import visualization_agent
 
 # 載入環境變數 (Load environment variables)
 load_dotenv()
 
+# 程式碼執行模式中嵌入提示詞的 CSV 範例列數（程式碼執行環境無法存取伺服器端的資料集）
+# CSV sample rows embedded for code execution (the sandbox cannot reach the server-side store)
+CSV_SAMPLE_ROWS = int(os.getenv("CSV_SAMPLE_ROWS", "50"))
+
 # 設定頁面 (Configure page)
 st.set_page_config(
     page_title="資料分析助理",
@@ -109,6 +114,9 @@ if "dataframe" not in st.session_state:
 if "file_name" not in st.session_state:
     st.session_state.file_name = None
 
+if "dataset_id" not in st.session_state:
+    st.session_state.dataset_id = None
+
 if "adk_session_id" not in st.session_state:
     # 延遲建立 ADK Session ID - 將在首次使用執行器時建立
     # Create ADK session ID lazily - will be created on first runner use
@@ -153,10 +161,14 @@ with st.sidebar:
 
     if uploaded_file is not None:
         try:
-            # 讀取 CSV 檔案
-            df = pd.read_csv(uploaded_file)
+            # 註冊到資料集儲存區：相同內容只解析與剖析一次（Streamlit 每次重新執行腳本都會經過這裡）
+            # Register in the dataset store: identical content is parsed and profiled only once
+            dataset = dataset_store.load_csv(uploaded_file.getvalue(), name=uploaded_file.name)
+            df = dataset.frame
+            profile = dataset.profile
             st.session_state.dataframe = df
             st.session_state.file_name = uploaded_file.name
+            st.session_state.dataset_id = dataset.dataset_id
 
             st.success(f"✅ 已載入: {uploaded_file.name}")
 
@@ -177,15 +189,21 @@ with st.sidebar:
                 with col1:
                     st.subheader("欄位名稱與類型")
                     info_df = pd.DataFrame({
-                        "欄位": df.columns,
-                        "類型": [str(dtype) for dtype in df.dtypes],
-                        "非空值數": df.count(),
+                        "欄位": list(profile["columns"]),
+                        "類型": [info["dtype"] for info in profile["columns"].values()],
+                        "非空值數": [info["non_null"] for info in profile["columns"].values()],
                     })
                     st.dataframe(info_df, width='stretch')
 
                 with col2:
                     st.subheader("基本統計")
-                    st.dataframe(df.describe(), width='stretch')
+                    # 取自剖析快取，不在每次重新執行時重新計算 (From the cached profile)
+                    stats_df = pd.DataFrame({
+                        name: {key: info[key] for key in ("mean", "std", "min", "50%", "max")}
+                        for name, info in profile["columns"].items()
+                        if info["kind"] == "numeric"
+                    })
+                    st.dataframe(stats_df, width='stretch')
 
             st.subheader("⚙️ 功能")
             st.session_state.use_code_execution = st.checkbox(
@@ -210,6 +228,7 @@ with st.sidebar:
             if st.button("🗑️ 清除資料"):
                 st.session_state.dataframe = None
                 st.session_state.file_name = None
+                st.session_state.dataset_id = None
                 st.session_state.messages = []
                 st.rerun()
 
@@ -244,24 +263,23 @@ if prompt := st.chat_input(
         st.markdown(prompt)
 
     # 準備資料集相關上下文 (Prepare context about dataset)
+    # 提示詞攜帶結構與統計摘要（上傳時計算一次），而非原始 CSV
+    # The prompt carries the schema + stats digest computed once at upload, not raw CSV
     context = ""
-    df_csv = ""
-    if st.session_state.dataframe is not None:
-        df = st.session_state.dataframe
-        numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
-        categorical_cols = df.select_dtypes(exclude=['number']).columns.tolist()
-
-        # 將 DataFrame 轉換為 CSV 以供程式碼執行 (Convert DataFrame to CSV for code execution)
-        df_csv = df.to_csv(index=False)
-
+    dataset = dataset_store.get(st.session_state.dataset_id) if st.session_state.dataset_id else None
+    if dataset is None and st.session_state.dataframe is not None:
+        # 資料集已被 LRU 淘汰時重新註冊 (Re-register if evicted from the store)
+        dataset = dataset_store.register(st.session_state.dataframe, name=st.session_state.file_name)
+        st.session_state.dataset_id = dataset.dataset_id
+    if dataset is not None:
         context = f"""
-        **資料集資訊：**
-        - 檔案：{st.session_state.file_name}
-        - 形狀：{df.shape[0]} 列 × {df.shape[1]} 欄
-        - 欄位：{', '.join(df.columns.tolist())}
-        - 數值欄位：{', '.join(numeric_cols) if numeric_cols else '無'}
-        - 分類欄位：{', '.join(categorical_cols) if categorical_cols else '無'}
+        **資料集摘要：**
+        {dataset.digest()}
+        """
 
+        if st.session_state.use_code_execution:
+            # 程式碼執行環境無法存取伺服器端資料集，因此附上有限的 CSV 範例
+            context += f"""
         **可用於視覺化的資料：**
         使用者的資料集以 CSV 格式提供如下。請使用以下方式載入：
         ```python
@@ -270,8 +288,8 @@ if prompt := st.chat_input(
         df = pd.read_csv(StringIO(csv_data))
         ```
 
-        CSV 資料 (前 50 列)：
-        {df.head(50).to_csv(index=False)}
+        CSV 資料 (前 {CSV_SAMPLE_ROWS} 列)：
+        {dataset.sample_csv(CSV_SAMPLE_ROWS)}
 
         使用者可以透過要求特定的圖表類型來請求視覺化。"""
     else:
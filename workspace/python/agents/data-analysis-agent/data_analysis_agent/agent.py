@@ -1,13 +1,126 @@
+import json
+import os
 from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
 from google.adk.agents import Agent
 from google.adk.tools.agent_tool import AgentTool
 
+# 匯入資料集儲存區 (Import dataset store)
+from .datasets import column_kind, dataset_store
+
 # 匯入視覺化代理 (Import visualization agent)
 from .visualization_agent import visualization_agent
 
 
+# 過濾運算子與對應的向量化比較 (Filter operators mapped to vectorized comparisons)
+FILTER_OPERATORS = {
+    "equals": lambda s, v: s == v,
+    "not_equals": lambda s, v: s != v,
+    "greater_than": lambda s, v: s > v,
+    "greater_equal": lambda s, v: s >= v,
+    "less_than": lambda s, v: s < v,
+    "less_equal": lambda s, v: s <= v,
+    "contains": lambda s, v: s.astype("string").str.contains(str(v), case=False, regex=False),
+}
+
+# 工具回傳的預覽列數上限 (Maximum preview rows returned by tools)
+PREVIEW_ROWS = 5
+
+# load_dataset 只能讀取此目錄下的檔案 (預設為專案目錄)
+# load_dataset may only read files under this directory (defaults to the project directory)
+DATA_DIR = os.path.realpath(
+    os.getenv("DATA_ANALYSIS_DATA_DIR", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+
+def _error(report: str, error: str) -> Dict[str, Any]:
+    return {"status": "error", "report": report, "error": error}
+
+
+def _to_json(data: Any, orient: str) -> Any:
+    """以 pandas 序列化為 JSON 相容的值 (Timestamp 轉為 ISO 字串，NaN/NaT 轉為 None)。"""
+    return json.loads(data.to_json(orient=orient, date_format="iso"))
+
+
+def _data_path(file_path: str) -> str:
+    """
+    將檔案路徑解析到 DATA_DIR 之下；相對路徑以 DATA_DIR 為基準。
+
+    Raises:
+        PermissionError: 路徑 (含符號連結) 位於 DATA_DIR 之外
+    """
+    path = os.path.realpath(os.path.join(DATA_DIR, os.path.expanduser(file_path)))
+    if os.path.commonpath([path, DATA_DIR]) != DATA_DIR:
+        raise PermissionError(f"只能載入 {DATA_DIR} 中的檔案")
+    return path
+
+
+def _resolve(dataset_id: str, *columns: str):
+    """
+    取得資料集並檢查欄位是否存在。
+
+    Returns:
+        (Dataset, None) 或 (None, 錯誤字典)
+    """
+    dataset = dataset_store.get(dataset_id)
+    if dataset is None:
+        if dataset_id:
+            return None, _error(f"找不到資料集 '{dataset_id}'", "未知的 dataset_id")
+        return None, _error("尚未載入任何資料集", "請先上傳或載入 CSV 檔案")
+    missing = [c for c in columns if c not in dataset.frame.columns]
+    if missing:
+        return None, _error(
+            f"資料集中沒有欄位: {', '.join(missing)}",
+            f"可用欄位: {', '.join(map(str, dataset.frame.columns))}",
+        )
+    return dataset, None
+
+
+def _coerce_value(series: pd.Series, value: str) -> Any:
+    """將字串比較值轉換為欄位的型別。"""
+    if column_kind(series) == "numeric":
+        return float(value)
+    if column_kind(series) == "datetime":
+        return pd.Timestamp(value)
+    if column_kind(series) == "boolean":
+        return str(value).strip().lower() in ("true", "1", "yes")
+    return value
+
+
+def load_dataset(file_path: str) -> Dict[str, Any]:
+    """
+    從 CSV 檔案載入資料集並註冊到資料集儲存區。
+
+    只能讀取資料目錄 (DATA_DIR，可由 DATA_ANALYSIS_DATA_DIR 設定) 中的檔案。
+
+    Args:
+        file_path: 資料目錄中的 CSV 檔案路徑 (Path to a CSV file inside the data directory)
+
+    Returns:
+        包含狀態、報告、dataset_id 和結構摘要的字典 (Dict with status, report, dataset_id and schema digest)
+    """
+    try:
+        if not file_path or not isinstance(file_path, str):
+            return _error("提供的檔案路徑無效", "file_path 必須是非空字串")
+        try:
+            path = _data_path(file_path)
+        except PermissionError as e:
+            return _error("不允許讀取資料目錄以外的檔案", str(e))
+        dataset = dataset_store.load_csv(path)
+        return {
+            "status": "success",
+            "report": f"已載入資料集 {dataset.name}",
+            "dataset_id": dataset.dataset_id,
+            "digest": dataset.digest(),
+        }
+    except Exception as e:
+        return _error(f"載入資料集時發生錯誤: {str(e)}", str(e))
+
+
 def analyze_column(
-    column_name: str, analysis_type: str = "summary", data_context: str = ""
+    column_name: str, analysis_type: str = "summary", dataset_id: str = ""
 ) -> Dict[str, Any]:
     """
     分析資料集中的特定欄位。
@@ -15,36 +128,62 @@ def analyze_column(
     Args:
         column_name: 要分析的欄位名稱 (Name of the column to analyze)
         analysis_type: 分析類型 (summary, distribution, top_values)
-        data_context: 關於可用資料的 JSON 上下文 (JSON context about available data)
+        dataset_id: 資料集代號；留空時使用最近載入的資料集 (Dataset handle; latest dataset if empty)
 
     Returns:
         包含狀態、報告和分析結果的字典 (Dict with status, report, and analysis results)
     """
     try:
         if not column_name or not isinstance(column_name, str):
-            return {
-                "status": "error",
-                "report": "提供的欄位名稱無效",
-                "error": "column_name 必須是非空字串",
-            }
-
-        return {
+            return _error("提供的欄位名稱無效", "column_name 必須是非空字串")
+        dataset, error = _resolve(dataset_id, column_name)
+        if error:
+            return error
+
+        series = dataset.frame[column_name]
+        kind = column_kind(series)
+        result: Dict[str, Any] = {
             "status": "success",
-            "report": f"將對欄位 '{column_name}' 執行 {analysis_type} 分析",
-            "analysis_type": analysis_type,
+            "dataset_id": dataset.dataset_id,
             "column_name": column_name,
-            "note": "在 Streamlit 應用程式中，實際資料分析是使用真實資料集執行的",
+            "analysis_type": analysis_type,
+            "kind": kind,
         }
+
+        if analysis_type == "distribution":
+            values = series.dropna()
+            if kind == "numeric" and len(values):
+                counts, edges = np.histogram(values.to_numpy(dtype=float), bins=10)
+                result["histogram"] = [
+                    {"from": round(float(lo), 4), "to": round(float(hi), 4), "count": int(c)}
+                    for lo, hi, c in zip(edges[:-1], edges[1:], counts)
+                ]
+                result["skew"] = round(float(values.skew()), 4) if len(values) > 2 else None
+            else:
+                shares = values.value_counts(normalize=True).head(10)
+                result["shares"] = {str(k): round(float(v), 4) for k, v in shares.items()}
+            result["report"] = f"欄位 '{column_name}' 的分佈"
+        elif analysis_type == "top_values":
+            if kind == "numeric":
+                top = series.nlargest(PREVIEW_ROWS * 2).astype(float)
+                result["top_values"] = _to_json(top, orient="values")
+            else:
+                counts = series.value_counts().head(PREVIEW_ROWS * 2)
+                counts.index = counts.index.astype(str)
+                result["top_values"] = _to_json(counts, orient="index")
+            result["report"] = f"欄位 '{column_name}' 的最高值"
+        else:
+            # 摘要直接取自上傳時計算的剖析快取 (Summary comes from the cached profile)
+            result["analysis_type"] = "summary"
+            result["summary"] = dataset.profile["columns"][column_name]
+            result["report"] = f"欄位 '{column_name}' 的摘要統計"
+        return result
     except Exception as e:
-        return {
-            "status": "error",
-            "report": f"分析欄位時發生錯誤: {str(e)}",
-            "error": str(e),
-        }
+        return _error(f"分析欄位時發生錯誤: {str(e)}", str(e))
 
 
 def calculate_correlation(
-    column1: str, column2: str = "", data_context: str = ""
+    column1: str, column2: str = "", dataset_id: str = "", method: str = "pearson"
 ) -> Dict[str, Any]:
     """
     計算兩個數值欄位之間的關聯性。
@@ -52,96 +191,124 @@ def calculate_correlation(
     Args:
         column1: 第一個欄位名稱 (First column name)
         column2: 第二個欄位名稱 (Second column name)
-        data_context: 關於可用資料的 JSON 上下文 (JSON context about available data)
+        dataset_id: 資料集代號；留空時使用最近載入的資料集 (Dataset handle; latest dataset if empty)
+        method: 相關係數方法 (pearson, spearman, kendall)
 
     Returns:
         包含狀態、報告和關聯性資料的字典 (Dict with status, report, and correlation data)
     """
     try:
         if not column1 or not column2:
-            return {
-                "status": "error",
-                "report": "必須提供兩個欄位名稱",
-                "error": "缺少欄位名稱",
-            }
-
+            return _error("必須提供兩個欄位名稱", "缺少欄位名稱")
+        dataset, error = _resolve(dataset_id, column1, column2)
+        if error:
+            return error
+
+        pair = dataset.frame[[column1, column2]]
+        non_numeric = [c for c in pair.columns if column_kind(pair[c]) != "numeric"]
+        if non_numeric:
+            return _error(
+                f"欄位不是數值型別: {', '.join(non_numeric)}", "關聯性只能計算數值欄位"
+            )
+        pair = pair.dropna()
+        coefficient = pair[column1].corr(pair[column2], method=method)
+        if np.isnan(coefficient):
+            return _error("資料不足以計算關聯性", "有效資料對少於 2 筆或欄位為常數")
+
+        strength = abs(coefficient)
+        label = "強" if strength >= 0.7 else "中等" if strength >= 0.4 else "弱"
+        direction = "正" if coefficient > 0 else "負"
         return {
             "status": "success",
-            "report": f"已設定 '{column1}' 與 '{column2}' 之間的關聯性計算",
+            "report": f"'{column1}' 與 '{column2}' 之間為{label}{direction}相關 ({coefficient:.3f})",
+            "dataset_id": dataset.dataset_id,
             "column1": column1,
             "column2": column2,
-            "note": "在 Streamlit 應用程式中，實際關聯性是使用真實資料計算的",
+            "method": method,
+            "correlation": round(float(coefficient), 4),
+            "pairs": int(len(pair)),
         }
     except Exception as e:
-        return {
-            "status": "error",
-            "report": f"計算關聯性時發生錯誤: {str(e)}",
-            "error": str(e),
-        }
+        return _error(f"計算關聯性時發生錯誤: {str(e)}", str(e))
 
 
 def filter_data(
-    column_name: str, operator: str = "equals", value: str = "", data_context: str = ""
+    column_name: str, operator: str = "equals", value: str = "", dataset_id: str = ""
 ) -> Dict[str, Any]:
     """
-    依條件過濾資料集。
+    依條件過濾資料集，並將結果註冊為新的資料集以便後續分析。
 
     Args:
         column_name: 要過濾的欄位 (Column to filter on)
-        operator: 比較運算子 (equals, greater_than, less_than, contains)
+        operator: 比較運算子 (equals, not_equals, greater_than, greater_equal, less_than, less_equal, contains)
         value: 要比較的值 (Value to compare against)
-        data_context: 關於可用資料的 JSON 上下文 (JSON context about available data)
+        dataset_id: 資料集代號；留空時使用最近載入的資料集 (Dataset handle; latest dataset if empty)
 
     Returns:
         包含狀態、報告和過濾後資料摘要的字典 (Dict with status, report, and filtered data summary)
     """
     try:
         if not column_name or not operator or not value:
-            return {
-                "status": "error",
-                "report": "必須提供欄位名稱、運算子和值",
-                "error": "缺少過濾參數",
-            }
-
+            return _error("必須提供欄位名稱、運算子和值", "缺少過濾參數")
+        if operator not in FILTER_OPERATORS:
+            return _error(
+                f"不支援的運算子: {operator}", f"可用運算子: {', '.join(FILTER_OPERATORS)}"
+            )
+        dataset, error = _resolve(dataset_id, column_name)
+        if error:
+            return error
+
+        frame = dataset.frame
+        series = frame[column_name]
+        target = value if operator == "contains" else _coerce_value(series, value)
+        mask = FILTER_OPERATORS[operator](series, target).fillna(False).to_numpy(dtype=bool)
+        subset = frame[mask]
+        subset_dataset = dataset_store.register(
+            subset, name=f"{dataset.name} [{column_name} {operator} {value}]"
+        )
+
+        numeric = subset.select_dtypes(include="number").select_dtypes(exclude="bool")
         return {
             "status": "success",
-            "report": f"已設定過濾器: {column_name} {operator} {value}",
+            "report": f"{column_name} {operator} {value}: {len(subset)} / {len(frame)} 列符合",
+            "dataset_id": subset_dataset.dataset_id,
+            "source_dataset_id": dataset.dataset_id,
             "column_name": column_name,
             "operator": operator,
             "value": value,
-            "note": "在 Streamlit 應用程式中，實際過濾是使用真實資料執行的",
+            "matched_rows": int(len(subset)),
+            "matched_fraction": round(len(subset) / len(frame), 4) if len(frame) else 0.0,
+            "numeric_means": {str(k): round(float(v), 4) for k, v in numeric.mean().dropna().items()},
+            "preview": _to_json(subset.head(PREVIEW_ROWS), orient="records"),
         }
     except Exception as e:
-        return {
-            "status": "error",
-            "report": f"過濾資料時發生錯誤: {str(e)}",
-            "error": str(e),
-        }
+        return _error(f"過濾資料時發生錯誤: {str(e)}", str(e))
 
 
-def get_dataset_summary(data_context: str = "") -> Dict[str, Any]:
+def get_dataset_summary(dataset_id: str = "") -> Dict[str, Any]:
     """
-    取得目前資料集的摘要資訊。
+    取得資料集的結構與統計摘要。
 
     Args:
-        data_context: 關於可用資料的 JSON 上下文 (JSON context about available data)
+        dataset_id: 資料集代號；留空時使用最近載入的資料集 (Dataset handle; latest dataset if empty)
 
     Returns:
         包含狀態、報告和資料集摘要的字典 (Dict with status, report, and dataset summary)
     """
     try:
+        dataset, error = _resolve(dataset_id)
+        if error:
+            return error
         return {
             "status": "success",
-            "report": "已設定資料集摘要工具用於分析",
-            "available_tools": ["analyze_column", "calculate_correlation", "filter_data"],
-            "note": "在 Streamlit 應用程式中，實際資料集資訊是即時提供的",
+            "report": dataset.digest(),
+            "dataset_id": dataset.dataset_id,
+            "rows": dataset.profile["rows"],
+            "columns": list(dataset.profile["columns"]),
+            "available_datasets": dataset_store.list_datasets(),
         }
     except Exception as e:
-        return {
-            "status": "error",
-            "report": f"取得資料集摘要時發生錯誤: {str(e)}",
-            "error": str(e),
-        }
+        return _error(f"取得資料集摘要時發生錯誤: {str(e)}", str(e))
 
 
 # 建立使用傳統工具的分析代理
@@ -167,14 +334,24 @@ analysis_agent = Agent(
     - 如果欄位看起來像類別，建議進行分佈分析
     - 如果欄位是數值，建議進行基本統計和趨勢分析
 
-    可用工具：
-    - analyze_column: 取得特定欄位的統計數據
-    - calculate_correlation: 尋找變數之間的關係
-    - filter_data: 探索資料子集和模式
-    - get_dataset_summary: 取得資料集的概觀
+    可用工具（皆直接在伺服器端的資料集上執行）：
+    - load_dataset: 從 CSV 檔案路徑載入資料集並取得 dataset_id
+    - analyze_column: 取得特定欄位的統計數據、分佈或最高值
+    - calculate_correlation: 計算兩個數值欄位之間的關聯性
+    - filter_data: 過濾資料並取得子集的摘要；回傳的 dataset_id 可用於後續分析該子集
+    - get_dataset_summary: 取得資料集的結構與統計摘要
+
+    資料集以 dataset_id 識別：上下文中的「資料集摘要」會提供 dataset_id。
+    省略 dataset_id 時工具會使用最近載入的資料集。
 
     記住：使用者從積極主動的見解中獲益最多！""",
-    tools=[analyze_column, calculate_correlation, filter_data, get_dataset_summary],
+    tools=[
+        load_dataset,
+        analyze_column,
+        calculate_correlation,
+        filter_data,
+        get_dataset_summary,
+    ],
 )
 
 
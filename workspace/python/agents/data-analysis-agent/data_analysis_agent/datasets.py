@@ -0,0 +1,265 @@
+"""
+資料集註冊表 (Dataset Registry)
+程序層級的資料集儲存區，以資料集代號 (dataset_id) 存取 DataFrame
+
+重點摘要
+- 核心概念：上傳的資料只解析一次，分析工具與 Streamlit 應用程式以代號共用同一份 DataFrame。
+- 關鍵技術：內容雜湊代號、LRU 淘汰、只計算一次的欄位剖析 (profiling) 快取。
+- 重要結論：提示詞只需要攜帶結構與統計摘要 (digest)，不必嵌入原始 CSV。
+"""
+
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from pandas.api import types as ptypes
+
+# 最多保留的資料集數量，超過時淘汰最久未使用的資料集
+# Maximum number of datasets kept in memory (least recently used are evicted)
+MAX_DATASETS = int(os.getenv("DATA_ANALYSIS_MAX_DATASETS", "8"))
+
+# 分類欄位在剖析中保留的最常見值數量
+TOP_VALUES = 5
+
+
+def _round(value: Any, digits: int = 4) -> Any:
+    """將 NumPy 數值轉為 JSON 友善的 Python 數值。"""
+    if value is None or value is pd.NaT or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, (np.integer, int)):
+        return int(value)
+    if isinstance(value, (np.floating, float)):
+        return round(float(value), digits)
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return value
+
+
+def column_kind(series: pd.Series) -> str:
+    """判斷欄位類型：numeric、datetime、boolean 或 categorical。"""
+    if ptypes.is_bool_dtype(series):
+        return "boolean"
+    if ptypes.is_numeric_dtype(series):
+        return "numeric"
+    if ptypes.is_datetime64_any_dtype(series):
+        return "datetime"
+    return "categorical"
+
+
+class Dataset:
+    """
+    已註冊的資料集。
+
+    Attributes:
+        dataset_id: 資料集代號 (由內容雜湊產生)
+        name: 顯示名稱 (例如上傳的檔案名稱)
+        frame: 資料本體
+        created_at: 註冊時間
+    """
+
+    def __init__(self, dataset_id: str, name: str, frame: pd.DataFrame):
+        self.dataset_id = dataset_id
+        self.name = name
+        self.frame = frame
+        self.created_at = time.time()
+        self._lock = threading.Lock()
+        self._profile: Optional[Dict[str, Any]] = None
+        self._digest: Optional[str] = None
+        self._samples: Dict[int, str] = {}
+
+    @property
+    def profile(self) -> Dict[str, Any]:
+        """欄位剖析結果；第一次存取時計算並快取。"""
+        if self._profile is None:
+            with self._lock:
+                if self._profile is None:
+                    self._profile = self._compute_profile()
+        return self._profile
+
+    def _compute_profile(self) -> Dict[str, Any]:
+        frame = self.frame
+        non_null = frame.count()
+        unique = frame.nunique(dropna=True)
+        numeric = frame.select_dtypes(include="number").select_dtypes(exclude="bool")
+        stats = numeric.describe().T if not numeric.empty else pd.DataFrame()
+
+        columns: Dict[str, Dict[str, Any]] = {}
+        for name in frame.columns:
+            series = frame[name]
+            kind = column_kind(series)
+            info: Dict[str, Any] = {
+                "dtype": str(series.dtype),
+                "kind": kind,
+                "non_null": int(non_null[name]),
+                "nulls": int(len(frame) - non_null[name]),
+                "unique": int(unique[name]),
+            }
+            if kind == "numeric" and name in stats.index:
+                row = stats.loc[name]
+                info.update(
+                    {
+                        key: _round(row[key])
+                        for key in ("mean", "std", "min", "25%", "50%", "75%", "max")
+                    }
+                )
+            elif kind == "datetime":
+                info["min"] = _round(series.min())
+                info["max"] = _round(series.max())
+            else:
+                counts = series.value_counts(dropna=True).head(TOP_VALUES)
+                info["top_values"] = {str(k): int(v) for k, v in counts.items()}
+            columns[str(name)] = info
+
+        return {
+            "dataset_id": self.dataset_id,
+            "name": self.name,
+            "rows": int(len(frame)),
+            "columns": columns,
+            "memory_bytes": int(frame.memory_usage(deep=True).sum()),
+        }
+
+    def digest(self) -> str:
+        """給提示詞使用的精簡結構與統計摘要 (每個欄位一行)。"""
+        if self._digest is None:
+            profile = self.profile
+            lines = [
+                f"資料集 {self.name} (dataset_id={self.dataset_id})："
+                f"{profile['rows']} 列 × {len(profile['columns'])} 欄"
+            ]
+            for name, info in profile["columns"].items():
+                parts = [f"{info['dtype']}", f"缺失 {info['nulls']}", f"唯一值 {info['unique']}"]
+                if info["kind"] == "numeric":
+                    parts.append(
+                        f"平均 {info['mean']} 標準差 {info['std']} "
+                        f"範圍 [{info['min']}, {info['max']}] 中位數 {info['50%']}"
+                    )
+                elif info["kind"] == "datetime":
+                    parts.append(f"範圍 [{info['min']}, {info['max']}]")
+                elif info.get("top_values"):
+                    top = ", ".join(f"{k} ({v})" for k, v in info["top_values"].items())
+                    parts.append(f"常見值 {top}")
+                lines.append(f"- {name}: " + "；".join(parts))
+            self._digest = "\n".join(lines)
+        return self._digest
+
+    def sample_csv(self, rows: int = 50) -> str:
+        """前 N 列的 CSV 文字 (快取)，供無法存取註冊表的程式碼執行環境使用。"""
+        if rows not in self._samples:
+            self._samples[rows] = self.frame.head(rows).to_csv(index=False)
+        return self._samples[rows]
+
+
+class DatasetStore:
+    """
+    程序層級的資料集儲存區 (Process-wide dataset store)。
+
+    以內容雜湊作為代號：同一份檔案重複上傳 (例如 Streamlit 每次重新執行腳本)
+    會得到同一個資料集，不會重新解析或重新剖析。
+    """
+
+    def __init__(self, max_datasets: int = MAX_DATASETS):
+        if max_datasets < 1:
+            raise ValueError("max_datasets 必須大於 0")
+        self.max_datasets = max_datasets
+        self._datasets: "OrderedDict[str, Dataset]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._datasets)
+
+    @staticmethod
+    def _handle(digest: str) -> str:
+        return f"ds_{digest[:12]}"
+
+    def load_csv(self, source: Union[bytes, str, os.PathLike], name: Optional[str] = None) -> Dataset:
+        """
+        解析 CSV 並註冊為資料集；相同內容只解析一次。
+
+        Args:
+            source: CSV 原始位元組或檔案路徑
+            name: 顯示名稱 (預設為檔案名稱)
+
+        Returns:
+            已註冊的 Dataset
+        """
+        if isinstance(source, (bytes, bytearray)):
+            data = bytes(source)
+        else:
+            with open(source, "rb") as f:
+                data = f.read()
+            name = name or os.path.basename(os.fspath(source))
+        dataset_id = self._handle(hashlib.blake2b(data, digest_size=16).hexdigest())
+
+        existing = self.get(dataset_id)
+        if existing is not None:
+            return existing
+        frame = pd.read_csv(io.BytesIO(data))
+        return self._add(Dataset(dataset_id, name or dataset_id, frame))
+
+    def register(self, frame: pd.DataFrame, name: str = "") -> Dataset:
+        """註冊一個已存在的 DataFrame (例如過濾後的子集)。"""
+        hasher = hashlib.blake2b(digest_size=16)
+        hasher.update("\x1f".join(map(str, frame.columns)).encode())
+        hasher.update(pd.util.hash_pandas_object(frame, index=True).values.tobytes())
+        dataset_id = self._handle(hasher.hexdigest())
+
+        existing = self.get(dataset_id)
+        if existing is not None:
+            return existing
+        return self._add(Dataset(dataset_id, name or dataset_id, frame))
+
+    def _add(self, dataset: Dataset) -> Dataset:
+        with self._lock:
+            self._datasets[dataset.dataset_id] = dataset
+            self._datasets.move_to_end(dataset.dataset_id)
+            while len(self._datasets) > self.max_datasets:
+                self._datasets.popitem(last=False)
+        return dataset
+
+    def get(self, dataset_id: str = "") -> Optional[Dataset]:
+        """
+        以代號取得資料集；代號為空時回傳最近註冊或使用的資料集。
+        """
+        with self._lock:
+            if not dataset_id:
+                if not self._datasets:
+                    return None
+                dataset_id = next(reversed(self._datasets))
+            dataset = self._datasets.get(dataset_id)
+            if dataset is not None:
+                self._datasets.move_to_end(dataset_id)
+            return dataset
+
+    def list_datasets(self) -> List[Dict[str, Any]]:
+        """列出所有資料集的代號、名稱與形狀。"""
+        with self._lock:
+            datasets = list(self._datasets.values())
+        return [
+            {
+                "dataset_id": d.dataset_id,
+                "name": d.name,
+                "rows": int(d.frame.shape[0]),
+                "columns": int(d.frame.shape[1]),
+            }
+            for d in datasets
+        ]
+
+    def remove(self, dataset_id: str) -> None:
+        """移除資料集。"""
+        with self._lock:
+            self._datasets.pop(dataset_id, None)
+
+    def clear(self) -> None:
+        """移除所有資料集。"""
+        with self._lock:
+            self._datasets.clear()
+
+
+# 程序層級的共用儲存區 (Process-wide shared store)
+dataset_store = DatasetStore()
@@ -2,6 +2,9 @@
 Agent 配置與工具測試
 """
 
+import pandas as pd
+import pytest
+
 
 class TestAgentConfiguration:
     """測試 Agent 配置與屬性。"""
@@ -66,6 +69,24 @@ class TestAgentConfiguration:
         assert len(root_agent.tools) >= 2
 
 
+@pytest.fixture
+def sample_dataset():
+    """在資料集儲存區註冊一個小型資料集，測試結束後清除。"""
+    from data_analysis_agent.datasets import dataset_store
+
+    frame = pd.DataFrame(
+        {
+            "age": [25, 32, 47, 51, 38],
+            "income": [30000, 42000, 65000, 72000, 50000],
+            "city": ["Taipei", "Tainan", "Taipei", "Taichung", "Taipei"],
+        }
+    )
+    dataset = dataset_store.register(frame, name="people")
+    yield dataset
+    dataset_store.clear()
+
+
+@pytest.mark.usefixtures("sample_dataset")
 class TestAgentTools:
     """測試個別 Agent 工具。"""
 
@@ -156,6 +177,7 @@ class TestAgentTools:
         )
 
         tools = [
+            analyze_column("age", "summary"),
             analyze_column("col", "summary"),
             calculate_correlation("col1", "col2"),
             filter_data("col", "equals", "val"),
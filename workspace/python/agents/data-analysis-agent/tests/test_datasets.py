@@ -0,0 +1,230 @@
+"""
+資料集儲存區與向量化分析工具測試
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from google.genai import types
+
+from data_analysis_agent import agent as agent_module
+from data_analysis_agent.agent import (
+    analyze_column,
+    calculate_correlation,
+    filter_data,
+    get_dataset_summary,
+    load_dataset,
+)
+from data_analysis_agent.datasets import DatasetStore, dataset_store
+
+CSV_BYTES = b"""Date,Product,Quantity,Price,Revenue,Region
+2024-01-01,Product A,5,100,500,North
+2024-01-02,Product B,3,150,450,South
+2024-01-03,Product A,7,100,700,East
+2024-01-04,Product C,2,200,400,West
+2024-01-05,Product B,,150,,North
+"""
+
+
+@pytest.fixture(autouse=True)
+def clear_store():
+    """每個測試前後清空共用的資料集儲存區。"""
+    dataset_store.clear()
+    yield
+    dataset_store.clear()
+
+
+@pytest.fixture
+def sales():
+    """註冊範例銷售資料集。"""
+    return dataset_store.load_csv(CSV_BYTES, name="sales.csv")
+
+
+class TestDatasetStore:
+    """測試資料集註冊、快取與淘汰。"""
+
+    def test_same_content_parsed_once(self, monkeypatch):
+        """測試相同內容重複載入時回傳同一個資料集，不重新解析。"""
+        store = DatasetStore()
+        first = store.load_csv(CSV_BYTES, name="sales.csv")
+
+        def fail(*args, **kwargs):
+            raise AssertionError("不應重新解析 CSV")
+
+        monkeypatch.setattr(pd, "read_csv", fail)
+        second = store.load_csv(CSV_BYTES, name="sales.csv")
+
+        assert second is first
+        assert len(store) == 1
+
+    def test_profile_computed_once(self, sales, monkeypatch):
+        """測試剖析結果只計算一次並被快取。"""
+        calls = []
+        original = sales._compute_profile
+        monkeypatch.setattr(sales, "_compute_profile", lambda: calls.append(1) or original())
+
+        sales.profile
+        sales.digest()
+        analyze_column("Quantity", "summary")
+
+        assert len(calls) == 1
+
+    def test_profile_contents(self, sales):
+        """測試剖析包含數值統計、缺失值與分類常見值。"""
+        columns = sales.profile["columns"]
+
+        assert sales.profile["rows"] == 5
+        assert columns["Quantity"]["kind"] == "numeric"
+        assert columns["Quantity"]["nulls"] == 1
+        assert columns["Quantity"]["mean"] == pytest.approx(4.25)
+        assert columns["Product"]["top_values"] == {"Product A": 2, "Product B": 2, "Product C": 1}
+
+    def test_digest_has_schema_without_rows(self, sales):
+        """測試提示詞摘要包含欄位結構，但不包含原始資料列。"""
+        digest = sales.digest()
+
+        assert sales.dataset_id in digest
+        assert "- Revenue: float64" in digest
+        assert "2024-01-03,Product A" not in digest
+
+    def test_lru_eviction(self):
+        """測試超過容量時淘汰最久未使用的資料集。"""
+        store = DatasetStore(max_datasets=2)
+        a = store.register(pd.DataFrame({"x": [1]}))
+        b = store.register(pd.DataFrame({"x": [2]}))
+        store.get(a.dataset_id)
+        c = store.register(pd.DataFrame({"x": [3]}))
+
+        assert store.get(b.dataset_id) is None
+        assert store.get(a.dataset_id) is a
+        assert store.get() is a
+        assert c.dataset_id in [d["dataset_id"] for d in store.list_datasets()]
+
+    def test_load_from_path(self, tmp_path, monkeypatch):
+        """測試 load_dataset 工具從資料目錄中的檔案路徑載入資料集。"""
+        monkeypatch.setattr(agent_module, "DATA_DIR", str(tmp_path))
+        path = tmp_path / "sales.csv"
+        path.write_bytes(CSV_BYTES)
+
+        result = load_dataset(str(path))
+        relative = load_dataset("sales.csv")
+
+        assert result["status"] == "success"
+        assert dataset_store.get(result["dataset_id"]).name == "sales.csv"
+        assert relative["dataset_id"] == result["dataset_id"]
+
+    def test_load_outside_data_dir_is_rejected(self, tmp_path, monkeypatch):
+        """測試 load_dataset 拒絕資料目錄以外的路徑 (含 .. 與符號連結)。"""
+        data_dir = tmp_path / "data"
+        data_dir.mkdir()
+        secret = tmp_path / "secret.csv"
+        secret.write_bytes(CSV_BYTES)
+        (data_dir / "link.csv").symlink_to(secret)
+        monkeypatch.setattr(agent_module, "DATA_DIR", str(data_dir))
+
+        for file_path in (str(secret), "../secret.csv", "link.csv", "/etc/passwd"):
+            result = load_dataset(file_path)
+            assert result["status"] == "error", file_path
+        assert len(dataset_store) == 0
+
+
+class TestVectorizedTools:
+    """測試分析工具以代號在真實資料上執行。"""
+
+    def test_no_dataset(self):
+        """測試尚未載入資料集時回傳錯誤。"""
+        assert analyze_column("Quantity")["status"] == "error"
+        assert get_dataset_summary()["status"] == "error"
+
+    def test_unknown_column(self, sales):
+        """測試欄位不存在時回傳錯誤並列出可用欄位。"""
+        result = analyze_column("Missing", dataset_id=sales.dataset_id)
+        assert result["status"] == "error"
+        assert "Revenue" in result["error"]
+
+    def test_distribution(self, sales):
+        """測試數值欄位回傳直方圖，分類欄位回傳比例。"""
+        numeric = analyze_column("Price", "distribution", sales.dataset_id)
+        categorical = analyze_column("Region", "distribution", sales.dataset_id)
+
+        assert sum(b["count"] for b in numeric["histogram"]) == 5
+        assert categorical["shares"]["North"] == pytest.approx(0.4)
+
+    def test_top_values(self, sales):
+        """測試最高值分析。"""
+        result = analyze_column("Revenue", "top_values", sales.dataset_id)
+        assert result["top_values"][:2] == [700.0, 500.0]
+
+    def test_correlation(self, sales):
+        """測試關聯性與 NumPy 計算結果一致，且忽略缺失值。"""
+        result = calculate_correlation("Quantity", "Revenue", sales.dataset_id)
+        frame = sales.frame.dropna()
+        expected = np.corrcoef(frame["Quantity"], frame["Revenue"])[0, 1]
+
+        assert result["status"] == "success"
+        assert result["correlation"] == pytest.approx(expected, abs=1e-4)
+        assert result["pairs"] == 4
+
+    def test_correlation_rejects_categorical(self, sales):
+        """測試非數值欄位無法計算關聯性。"""
+        result = calculate_correlation("Quantity", "Region", sales.dataset_id)
+        assert result["status"] == "error"
+
+    def test_filter_registers_subset(self, sales):
+        """測試過濾結果被註冊為新的資料集，可供後續工具使用。
+
+        重點說明：
+        1. 以數值條件過濾
+        2. 驗證符合列數與預覽
+        3. 以回傳的 dataset_id 分析子集
+        """
+        result = filter_data("Price", "greater_equal", "150", sales.dataset_id)
+
+        assert result["matched_rows"] == 3
+        assert result["source_dataset_id"] == sales.dataset_id
+        assert len(result["preview"]) == 3
+
+        subset = analyze_column("Product", "summary", result["dataset_id"])
+        assert set(subset["summary"]["top_values"]) == {"Product B", "Product C"}
+
+    def test_results_with_dates_are_json_serializable(self):
+        """測試含日期與 NaT 的結果可以序列化為工具回應。"""
+        frame = pd.DataFrame(
+            {
+                "Date": pd.to_datetime(["2024-01-01", None, "2024-01-03"]),
+                "Empty": pd.to_datetime([None, None, None]),
+                "Score": [1.0, np.nan, 3.0],
+            }
+        )
+        dataset = dataset_store.register(frame, name="dates")
+
+        filtered = filter_data("Score", "less_equal", "3", dataset.dataset_id)
+        results = [
+            filtered,
+            analyze_column("Date", "summary", dataset.dataset_id),
+            analyze_column("Empty", "summary", dataset.dataset_id),
+            analyze_column("Date", "top_values", dataset.dataset_id),
+            analyze_column("Score", "top_values", dataset.dataset_id),
+        ]
+
+        assert filtered["preview"][0]["Date"].startswith("2024-01-01T")
+        assert filtered["preview"][0]["Empty"] is None
+        for result in results:
+            assert result["status"] == "success"
+            json.dumps(result, allow_nan=False)
+            types.FunctionResponse(name="tool", response=result).model_dump_json()
+
+    def test_filter_contains_and_invalid_operator(self, sales):
+        """測試 contains 運算子與不支援的運算子。"""
+        assert filter_data("Product", "contains", "a", sales.dataset_id)["matched_rows"] == 2
+        assert filter_data("Product", "between", "a", sales.dataset_id)["status"] == "error"
+
+    def test_summary_uses_latest_dataset(self, sales):
+        """測試省略 dataset_id 時使用最近載入的資料集。"""
+        result = get_dataset_summary()
+
+        assert result["dataset_id"] == sales.dataset_id
+        assert result["rows"] == 5
+        assert "Quantity" in result["columns"]
@@ -7,9 +7,14 @@
 
 import os
 import io
-from typing import Dict, List, Any, Optional
+import itertools
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, List, Any, Optional, Tuple, Union
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
@@ -23,10 +28,13 @@ except ImportError:
 
 # Google ADK 匯入
 from google.adk.agents import Agent
+from google.adk.tools.tool_context import ToolContext
 
 # 數據分析匯入
 try:
+    import numpy as np
     import pandas as pd
+    from pandas.api.types import union_categoricals
 except ImportError:
     raise ImportError(
         "未找到 pandas。請安裝：pip install pandas"
@@ -37,10 +45,501 @@ load_dotenv()
 
 
 # ============================================================================
-# 記憶體內數據儲存（生產環境請使用 Redis/DB）
+# 數據集管理（依工作階段隔離、記憶體上限、溢出至 Parquet）
 # ============================================================================
 
-uploaded_data: Dict[str, pd.DataFrame] = {}
+# 所有數據集在記憶體中的總上限（MB），超過時將最久未使用的數據集溢出到磁碟
+MEMORY_BUDGET_MB = int(os.getenv("DASHBOARD_MEMORY_BUDGET_MB", "512"))
+
+# 溢出檔案的目錄（預設為系統暫存目錄下的新目錄）
+SPILL_DIR = os.getenv("DASHBOARD_SPILL_DIR", "")
+
+# 分塊解析 CSV 時每塊的列數
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", "100000"))
+
+# 唯一值比例低於此值的文字欄位會轉為 category
+CATEGORY_MAX_RATIO = 0.5
+
+# 未提供工具上下文（例如直接呼叫工具或測試）時使用的工作階段
+DEFAULT_SESSION = "default"
+
+
+def optimize_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    縮減 DataFrame 的記憶體用量。
+
+    - 整數欄位降轉為能容納所有值的最小整數型別
+    - 浮點數欄位僅在轉為 float32 不失真時降轉
+    - 重複值多的文字欄位轉為 category
+
+    Returns:
+        型別最佳化後的 DataFrame（原 DataFrame 不變）
+    """
+    columns = {}
+    for name in df.columns:
+        col = df[name]
+        if pd.api.types.is_bool_dtype(col):
+            columns[name] = col
+        elif pd.api.types.is_integer_dtype(col):
+            columns[name] = pd.to_numeric(col, downcast="integer")
+        elif pd.api.types.is_float_dtype(col):
+            narrow = col.astype(np.float32)
+            lossless = (narrow.astype(np.float64) == col) | col.isna()
+            columns[name] = narrow if lossless.all() else col
+        elif (
+            (pd.api.types.is_object_dtype(col) or pd.api.types.is_string_dtype(col))
+            and not isinstance(col.dtype, pd.CategoricalDtype)
+            and len(col) > 0
+            and col.nunique(dropna=True) <= CATEGORY_MAX_RATIO * len(col)
+        ):
+            columns[name] = col.astype("category")
+        else:
+            columns[name] = col
+    return pd.DataFrame(columns, index=df.index)
+
+
+def _concat_chunks(chunks: List[pd.DataFrame]) -> pd.DataFrame:
+    """合併分塊解析的結果；各塊都是 category 的欄位以聯集類別合併，避免退回 object。"""
+    if len(chunks) == 1:
+        return chunks[0]
+    merged = {}
+    for name in chunks[0].columns:
+        parts = [chunk[name] for chunk in chunks]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            merged[name] = pd.Series(union_categoricals(parts), name=name)
+        else:
+            merged[name] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(merged)
+
+
+def read_csv_chunked(
+    source: Union[str, io.IOBase], chunk_rows: int = CSV_CHUNK_ROWS
+) -> pd.DataFrame:
+    """
+    分塊解析 CSV，每塊解析後立即最佳化型別。
+
+    尖峰記憶體約為「已最佳化的結果 + 一塊原始數據」，而不是整份未最佳化的 DataFrame。
+
+    Args:
+        source: CSV 檔案路徑或檔案物件
+        chunk_rows: 每塊的列數
+
+    Returns:
+        型別最佳化後的 DataFrame
+    """
+    chunks = [
+        optimize_dtypes(chunk)
+        for chunk in pd.read_csv(source, chunksize=max(int(chunk_rows), 1))
+    ]
+    # 不同塊的型別可能不同（例如某塊有遺失值），合併後再最佳化一次
+    return optimize_dtypes(_concat_chunks(chunks))
+
+
+class DatasetStats:
+    """
+    單一數據集版本的統計快取。
+
+    - 每個欄位的描述統計、遺失值與唯一值只計算一次；新的欄位子集只計算尚未快取的欄位
+    - 相關性矩陣對所有數值欄位計算一次，欄位子集直接切片
+    - 完整的分析結果以 (分析類型, 欄位子集) 為鍵快取
+
+    數據集被取代時會產生新的版本與新的快取，舊的結果不會被沿用。
+    """
+
+    def __init__(self, version: int, frame: pd.DataFrame, load: Callable[[], pd.DataFrame]):
+        """
+        初始化統計快取。
+
+        Args:
+            version: 數據集版本
+            frame: 數據集本體（只用於讀取欄位型別，不保留參照）
+            load: 需要原始數據時呼叫的函式（數據集可能已溢出到磁碟）
+        """
+        self.version = version
+        self.rows = len(frame)
+        self.columns = [str(c) for c in frame.columns]
+        self.numeric_columns = [
+            str(c) for c in frame.select_dtypes(include=["number"]).columns
+        ]
+        self._numeric = set(self.numeric_columns)
+        self._load = load
+        self._lock = threading.RLock()
+        self._describe: Dict[str, Dict[str, float]] = {}
+        self._missing: Dict[str, int] = {}
+        self._unique: Dict[str, int] = {}
+        self._corr: Optional[pd.DataFrame] = None
+        self._results: Dict[Tuple[str, Tuple[str, ...]], Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def frame(self) -> pd.DataFrame:
+        """取得數據集本體（必要時從磁碟讀回）。"""
+        return self._load()
+
+    def is_numeric(self, column: str) -> bool:
+        """欄位是否為數值欄位（不含布林）。"""
+        return column in self._numeric
+
+    def _fill(self, cache: Dict[str, Any], columns: List[str], compute) -> None:
+        """只對尚未快取的欄位呼叫 compute（一次處理所有缺少的欄位）。"""
+        todo = [c for c in columns if c not in cache]
+        if todo:
+            cache.update(compute(self.frame()[todo]))
+
+    def describe(self, columns: List[str]) -> Dict[str, Dict[str, float]]:
+        """數值欄位的描述統計（count、mean、std、min、四分位數、max）。"""
+        numeric = [c for c in columns if c in self._numeric]
+        with self._lock:
+            self._fill(self._describe, numeric, lambda df: df.describe().to_dict())
+            return {c: self._describe[c] for c in numeric}
+
+    def missing(self, columns: List[str]) -> Dict[str, int]:
+        """各欄位的遺失值數量。"""
+        with self._lock:
+            self._fill(self._missing, columns, lambda df: df.isnull().sum().to_dict())
+            return {c: self._missing[c] for c in columns}
+
+    def unique(self, columns: List[str]) -> Dict[str, int]:
+        """各欄位的唯一值數量。"""
+        with self._lock:
+            self._fill(self._unique, columns, lambda df: df.nunique().to_dict())
+            return {c: self._unique[c] for c in columns}
+
+    def corr(self, columns: List[str]) -> pd.DataFrame:
+        """數值欄位的相關性矩陣；完整矩陣只計算一次，子集由切片取得。"""
+        numeric = [c for c in columns if c in self._numeric]
+        with self._lock:
+            if self._corr is None:
+                self._corr = self.frame()[self.numeric_columns].corr()
+            return self._corr.loc[numeric, numeric]
+
+    def cached(
+        self,
+        analysis_type: str,
+        columns: List[str],
+        compute: Callable[[], Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """以 (分析類型, 欄位子集) 快取分析結果；只快取成功的結果。"""
+        key = (analysis_type, tuple(columns))
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self.hits += 1
+                return result
+            self.misses += 1
+            result = compute()
+            if result.get("status") == "success":
+                self._results[key] = result
+            return result
+
+
+class _DatasetEntry:
+    """DatasetManager 內部使用的單一數據集紀錄。"""
+
+    def __init__(self, frame: pd.DataFrame, version: int, load: Callable[[], pd.DataFrame]):
+        self.frame: Optional[pd.DataFrame] = frame
+        self.version = version
+        self.rows = len(frame)
+        self.columns = [str(c) for c in frame.columns]
+        self.dtypes = frame.dtypes.astype(str).to_dict()
+        self.memory_bytes = int(frame.memory_usage(deep=True).sum())
+        self.spill_path: Optional[str] = None
+        self.stats = DatasetStats(version, frame, load)
+
+
+class DatasetManager:
+    """
+    以 (工作階段, 數據集名稱) 為鍵的數據集管理器。
+
+    - 不同工作階段上傳同名檔案不會互相覆蓋
+    - 記憶體中數據集的總大小超過上限時，將最久未使用的數據集寫入 Parquet 並釋放記憶體；
+      再次存取時自動讀回
+    - 載入時最佳化欄位型別，CSV 以分塊方式解析
+    """
+
+    def __init__(
+        self,
+        memory_budget_bytes: int = MEMORY_BUDGET_MB * 1024 * 1024,
+        spill_dir: str = SPILL_DIR,
+        chunk_rows: int = CSV_CHUNK_ROWS,
+    ):
+        """
+        初始化數據集管理器。
+
+        Args:
+            memory_budget_bytes: 記憶體中數據集的總大小上限（位元組）
+            spill_dir: 溢出檔案的目錄；空字串表示第一次溢出時建立暫存目錄
+            chunk_rows: 分塊解析 CSV 時每塊的列數
+        """
+        if memory_budget_bytes < 1:
+            raise ValueError("memory_budget_bytes 必須大於 0")
+        self.memory_budget_bytes = memory_budget_bytes
+        self.chunk_rows = chunk_rows
+        self._spill_dir = spill_dir
+        self._entries: "OrderedDict[Tuple[str, str], _DatasetEntry]" = OrderedDict()
+        self._versions = itertools.count(1)
+        self._lock = threading.RLock()
+
+    @property
+    def memory_bytes(self) -> int:
+        """目前留在記憶體中的數據集總大小（位元組）。"""
+        with self._lock:
+            return sum(e.memory_bytes for e in self._entries.values() if e.frame is not None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        return key in self._entries
+
+    def load_csv(
+        self, session_id: str, name: str, source: Union[str, io.IOBase]
+    ) -> pd.DataFrame:
+        """
+        分塊解析 CSV 並註冊為數據集。
+
+        Args:
+            session_id: 工作階段代號
+            name: 數據集名稱
+            source: CSV 檔案路徑或檔案物件
+
+        Returns:
+            型別最佳化後的 DataFrame
+        """
+        frame = read_csv_chunked(source, self.chunk_rows)
+        return self.put(session_id, name, frame, optimize=False)
+
+    def put(
+        self, session_id: str, name: str, frame: pd.DataFrame, optimize: bool = True
+    ) -> pd.DataFrame:
+        """註冊（或取代）數據集，必要時將其他數據集溢出到磁碟。"""
+        if optimize:
+            frame = optimize_dtypes(frame)
+        key = (session_id, name)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._delete_spill(previous)
+            entry = _DatasetEntry(frame, next(self._versions), lambda: self._frame(key, entry))
+            self._entries[key] = entry
+            self._enforce_budget()
+        return frame
+
+    def get(self, session_id: str, name: str) -> Optional[pd.DataFrame]:
+        """取得數據集；已溢出的數據集會從 Parquet 讀回記憶體。找不到時回傳 None。"""
+        key = (session_id, name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            return self._frame(key, entry)
+
+    def stats(self, session_id: str, name: str) -> Optional[DatasetStats]:
+        """取得數據集目前版本的統計快取。找不到時回傳 None。"""
+        key = (session_id, name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry.stats
+
+    def _frame(self, key: Tuple[str, str], entry: _DatasetEntry) -> pd.DataFrame:
+        """取得紀錄的數據（必要時讀回），並將其標記為最近使用。"""
+        with self._lock:
+            if self._entries.get(key) is entry:
+                self._entries.move_to_end(key)
+            if entry.frame is None:
+                entry.frame = pd.read_parquet(entry.spill_path)
+                self._enforce_budget()
+            return entry.frame
+
+    def list_datasets(self, session_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        列出數據集及其記憶體用量。
+
+        Args:
+            session_id: 只列出此工作階段的數據集；None 表示全部
+
+        Returns:
+            每個數據集的名稱、工作階段、形狀、型別、記憶體大小與所在位置（memory / disk）
+        """
+        with self._lock:
+            items = list(self._entries.items())
+        return [
+            {
+                "name": name,
+                "session_id": sid,
+                "version": entry.version,
+                "rows": entry.rows,
+                "columns": entry.columns,
+                "dtypes": entry.dtypes,
+                "memory_bytes": entry.memory_bytes,
+                "location": "memory" if entry.frame is not None else "disk",
+            }
+            for (sid, name), entry in items
+            if session_id is None or sid == session_id
+        ]
+
+    def remove(self, session_id: str, name: str) -> bool:
+        """移除數據集（包含溢出檔案）。"""
+        with self._lock:
+            entry = self._entries.pop((session_id, name), None)
+        if entry is None:
+            return False
+        self._delete_spill(entry)
+        return True
+
+    def clear(self, session_id: Optional[str] = None) -> None:
+        """移除某個工作階段（None 表示全部）的數據集。"""
+        with self._lock:
+            keys = [k for k in self._entries if session_id is None or k[0] == session_id]
+            entries = [self._entries.pop(k) for k in keys]
+        for entry in entries:
+            self._delete_spill(entry)
+
+    def _enforce_budget(self) -> None:
+        """由最久未使用的數據集開始溢出，直到記憶體用量回到上限內；最近使用的數據集永遠保留。"""
+        resident = sum(e.memory_bytes for e in self._entries.values() if e.frame is not None)
+        newest = next(reversed(self._entries), None)
+        for key, entry in self._entries.items():
+            if resident <= self.memory_budget_bytes:
+                break
+            if entry.frame is None or key == newest:
+                continue
+            self._spill(entry)
+            resident -= entry.memory_bytes
+
+    def _spill(self, entry: _DatasetEntry) -> None:
+        # 數據集內容不會被修改，已寫過的溢出檔案可以直接重複使用
+        if entry.spill_path is None or not os.path.exists(entry.spill_path):
+            if not self._spill_dir:
+                self._spill_dir = tempfile.mkdtemp(prefix="dashboard-spill-")
+            os.makedirs(self._spill_dir, exist_ok=True)
+            entry.spill_path = os.path.join(self._spill_dir, f"{uuid.uuid4().hex}.parquet")
+            entry.frame.to_parquet(entry.spill_path, index=False)
+        entry.frame = None
+
+    @staticmethod
+    def _delete_spill(entry: _DatasetEntry) -> None:
+        if entry.spill_path and os.path.exists(entry.spill_path):
+            os.remove(entry.spill_path)
+
+
+dataset_manager = DatasetManager()
+
+
+def _session_id(tool_context: Optional[ToolContext]) -> str:
+    """從工具上下文取得工作階段代號。"""
+    if tool_context is None:
+        return DEFAULT_SESSION
+    return tool_context.session.id
+
+
+# ============================================================================
+# 圖表降採樣（數據離開伺服器前先縮減點數）
+# ============================================================================
+
+# 每張圖表最多傳給前端的點數（長條圖為類別數）
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "1000"))
+
+# 伺服器端保留的圖表數量，超過時淘汰最舊的圖表
+MAX_CACHED_CHARTS = int(os.getenv("MAX_CACHED_CHARTS", "32"))
+
+# 已產生的圖表數據，以 chart_id 存取；模型只會收到 chart_id 與摘要
+chart_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+BAR_AGGREGATIONS = ["sum", "mean", "count", "min", "max"]
+
+
+def lttb_indices(values: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    以 Largest-Triangle-Three-Buckets 演算法挑選折線圖要保留的點。
+
+    X 座標使用資料列的位置（前端以類別軸依序繪製）。每個分桶保留與前一個
+    已選點及下一個分桶平均點構成最大三角形面積的點，保留峰值與轉折。
+
+    Args:
+        values: Y 值（不含 NaN）
+        n_out: 要保留的點數
+
+    Returns:
+        遞增排序的列位置陣列
+    """
+    n = len(values)
+    if n_out >= n or n_out < 3:
+        return np.arange(n) if n_out >= n else np.linspace(0, n - 1, max(n_out, 1)).astype(np.int64)
+
+    x = np.arange(n, dtype=np.float64)
+    y = values.astype(np.float64, copy=False)
+    # 第一點與最後一點固定保留，其餘點分成 n_out - 2 個分桶
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    anchor = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start = edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs(
+            (x[anchor] - avg_x) * (y[start:end] - y[anchor])
+            - (x[anchor] - x[start:end]) * (avg_y - y[anchor])
+        )
+        anchor = start + int(area.argmax())
+        selected[i + 1] = anchor
+    return selected
+
+
+def minmax_indices(values: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    以最小/最大值降採樣挑選散佈圖要保留的點。
+
+    資料依位置分成 n_out / 2 個分桶，每個分桶保留最小與最大值，確保離群值不會消失。
+
+    Returns:
+        遞增排序且不重複的列位置陣列
+    """
+    n = len(values)
+    if n_out >= n:
+        return np.arange(n)
+    buckets = max(n_out // 2, 1)
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    picks = np.empty(buckets * 2, dtype=np.int64)
+    for i in range(buckets):
+        start, end = edges[i], edges[i + 1]
+        window = values[start:end]
+        picks[2 * i] = start + int(window.argmin())
+        picks[2 * i + 1] = start + int(window.argmax())
+    return np.unique(picks)
+
+
+def _aggregate_bars(
+    x: pd.Series, y: pd.Series, aggregation: str, max_points: int
+) -> tuple:
+    """
+    依 X 分組彙總長條圖數據；類別超過上限時保留值最大的類別，其餘合併為「其他」。
+
+    Returns:
+        (labels 陣列, values 陣列)
+    """
+    grouped = y.groupby(x, sort=False, dropna=False, observed=True).agg(aggregation)
+    if len(grouped) <= max_points:
+        return grouped.index.astype(str).to_numpy(), grouped.to_numpy(dtype=np.float64)
+
+    keep = grouped.nlargest(max(max_points - 1, 1)).index
+    kept = grouped[grouped.index.isin(keep)]
+    rest = y[~x.isin(keep)].agg(aggregation)
+    labels = np.append(kept.index.astype(str).to_numpy(), "其他")
+    values = np.append(kept.to_numpy(dtype=np.float64), float(rest))
+    return labels, values
+
+
+def get_chart(chart_id: str) -> Optional[Dict[str, Any]]:
+    """以 chart_id 取得降採樣後的圖表數據（labels / values）。"""
+    return chart_cache.get(chart_id)
 
 
 # ============================================================================
@@ -48,23 +547,29 @@ uploaded_data: Dict[str, pd.DataFrame] = {}
 # ============================================================================
 
 
-def load_csv_data(file_name: str, csv_content: str) -> Dict[str, Any]:
+def load_csv_data(
+    file_name: str,
+    csv_content: str,
+    tool_context: Optional[ToolContext] = None
+) -> Dict[str, Any]:
     """
-    將 CSV 數據載入記憶體以進行分析。
+    將 CSV 數據載入目前工作階段以進行分析。
 
     Args:
         file_name: CSV 檔案名稱
         csv_content: CSV 檔案內容字串
+        tool_context: ADK 工具上下文（自動注入，用於區分工作階段）
 
     Returns:
         Dict 包含狀態、報告、數據集資訊和預覽
     """
     try:
-        # 解析 CSV
-        df = pd.read_csv(io.StringIO(csv_content))
-
-        # 儲存於記憶體
-        uploaded_data[file_name] = df
+        # 分塊解析 CSV 並最佳化型別，儲存於目前工作階段
+        # （以位元組提供給解析器；文字串流會先被整份複製，尖峰記憶體較高）
+        df = dataset_manager.load_csv(
+            _session_id(tool_context), file_name, io.BytesIO(csv_content.encode("utf-8"))
+        )
+        memory_bytes = int(df.memory_usage(deep=True).sum())
 
         # 回傳摘要
         return {
@@ -77,7 +582,8 @@ def load_csv_data(file_name: str, csv_content: str) -> Dict[str, Any]:
             "rows": len(df),
             "columns": list(df.columns),
             "preview": df.head(5).to_dict(orient='records'),
-            "dtypes": df.dtypes.astype(str).to_dict()
+            "dtypes": df.dtypes.astype(str).to_dict(),
+            "memory_bytes": memory_bytes
         }
     except Exception as e:
         return {
@@ -90,7 +596,8 @@ def load_csv_data(file_name: str, csv_content: str) -> Dict[str, Any]:
 def analyze_data(
     file_name: str,
     analysis_type: str,
-    columns: Optional[List[str]] = None
+    columns: Optional[List[str]] = None,
+    tool_context: Optional[ToolContext] = None
 ) -> Dict[str, Any]:
     """
     對載入的數據集執行統計分析。
@@ -99,31 +606,47 @@ def analyze_data(
         file_name: 要分析的數據集名稱
         analysis_type: 分析類型 ('summary', 'correlation', 'trend')
         columns: 選擇性欄位列表，指定要分析的欄位
+        tool_context: ADK 工具上下文（自動注入，用於區分工作階段）
 
     Returns:
         Dict 包含狀態、報告和分析結果
     """
-    if file_name not in uploaded_data:
+    stats = dataset_manager.stats(_session_id(tool_context), file_name)
+    if stats is None:
         return {
             "status": "error",
             "report": f"找不到數據集 {file_name}。請先載入它。",
             "error": f"找不到數據集 {file_name}"
         }
 
-    try:
-        df = uploaded_data[file_name]
+    # 如果有指定，篩選欄位
+    if columns:
+        missing_cols = [col for col in columns if col not in stats.columns]
+        if missing_cols:
+            return {
+                "status": "error",
+                "report": f"找不到欄位：{', '.join(missing_cols)}",
+                "error": f"無效的欄位：{missing_cols}"
+            }
+    selected = list(columns) if columns else stats.columns
+
+    # 同一版本的數據集、相同的欄位子集與分析類型直接回傳快取結果
+    return stats.cached(
+        analysis_type,
+        selected,
+        lambda: _run_analysis(stats, file_name, analysis_type, selected)
+    )
 
-        # 如果有指定，篩選欄位
-        if columns:
-            missing_cols = [col for col in columns if col not in df.columns]
-            if missing_cols:
-                return {
-                    "status": "error",
-                    "report": f"找不到欄位：{', '.join(missing_cols)}",
-                    "error": f"無效的欄位：{missing_cols}"
-                }
-            df = df[columns]
 
+def _run_analysis(
+    stats: DatasetStats,
+    file_name: str,
+    analysis_type: str,
+    columns: List[str]
+) -> Dict[str, Any]:
+    """以統計快取執行 analyze_data 的分析（欄位已驗證）。"""
+    try:
+        numeric = [c for c in columns if stats.is_numeric(c)]
         results = {
             "status": "success",
             "file_name": file_name,
@@ -132,46 +655,43 @@ def analyze_data(
 
         if analysis_type == "summary":
             # 統計摘要
-            numeric_df = df.select_dtypes(include=['number'])
             results["report"] = (
-                f"已生成 {file_name} 中 {len(numeric_df.columns)} 個"
+                f"已生成 {file_name} 中 {len(numeric)} 個"
                 f"數值欄位的統計摘要。"
             )
             results["data"] = {
-                "describe": numeric_df.describe().to_dict(),
-                "missing": df.isnull().sum().to_dict(),
-                "unique": df.nunique().to_dict()
+                "describe": stats.describe(numeric),
+                "missing": stats.missing(columns),
+                "unique": stats.unique(columns)
             }
 
         elif analysis_type == "correlation":
-            # 相關性分析
-            numeric_df = df.select_dtypes(include=['number'])
-            if len(numeric_df.columns) < 2:
+            # 相關性分析（由完整矩陣切片）
+            if len(numeric) < 2:
                 return {
                     "status": "error",
                     "report": "相關性分析至少需要 2 個數值欄位",
                     "error": "數值欄位不足"
                 }
             results["report"] = (
-                f"已計算 {file_name} 中 {len(numeric_df.columns)} 個"
+                f"已計算 {file_name} 中 {len(numeric)} 個"
                 f"數值欄位的相關性。"
             )
-            results["data"] = numeric_df.corr().to_dict()
+            results["data"] = stats.corr(numeric).to_dict()
 
         elif analysis_type == "trend":
             # 時間序列趨勢分析
-            numeric_df = df.select_dtypes(include=['number'])
-            if len(numeric_df) < 2:
+            if stats.rows < 2:
                 return {
                     "status": "error",
                     "report": "趨勢分析至少需要 2 列數據",
                     "error": "數據點不足"
                 }
 
-            # 計算平均趨勢
-            means = numeric_df.mean().to_dict()
-            first_sum = numeric_df.iloc[0].sum()
-            last_sum = numeric_df.iloc[-1].sum()
+            # 計算平均趨勢（平均值沿用描述統計的快取）
+            means = {c: info["mean"] for c, info in stats.describe(numeric).items()}
+            edge_rows = stats.frame()[numeric].iloc[[0, -1]].sum(axis=1)
+            first_sum, last_sum = edge_rows.iloc[0], edge_rows.iloc[1]
             trend_direction = "上升" if last_sum > first_sum else "下降"
 
             results["report"] = (
@@ -205,21 +725,32 @@ def create_chart(
     file_name: str,
     chart_type: str,
     x_column: str,
-    y_column: str
+    y_column: str,
+    aggregation: str = "sum",
+    max_points: Optional[int] = None,
+    tool_context: Optional[ToolContext] = None
 ) -> Dict[str, Any]:
     """
     生成視覺化圖表數據。
 
+    數據在伺服器端縮減後存放於圖表快取：折線圖使用 LTTB 降採樣、
+    散佈圖使用最小/最大值降採樣、長條圖依 X 分組彙總。
+    回傳給模型的只有 chart_id 與摘要，前端以 /charts/{chart_id} 取得實際的點。
+
     Args:
         file_name: 數據集名稱
         chart_type: 圖表類型 ('line', 'bar', 'scatter')
         x_column: X 軸欄位
         y_column: Y 軸欄位
+        aggregation: 長條圖的彙總方式 ('sum', 'mean', 'count', 'min', 'max')
+        max_points: 最多保留的點數（預設為 CHART_MAX_POINTS）
+        tool_context: ADK 工具上下文（自動注入，用於區分工作階段）
 
     Returns:
-        Dict 包含狀態、報告和圖表設定
+        Dict 包含狀態、報告、chart_id、摘要和圖表設定
     """
-    if file_name not in uploaded_data:
+    stats = dataset_manager.stats(_session_id(tool_context), file_name)
+    if stats is None:
         return {
             "status": "error",
             "report": f"找不到數據集 {file_name}。請先載入它。",
@@ -227,16 +758,14 @@ def create_chart(
         }
 
     try:
-        df = uploaded_data[file_name]
-
-        # 驗證欄位
-        if x_column not in df.columns:
+        # 驗證欄位（使用統計快取的欄位資訊，無效的請求不需要讀取數據）
+        if x_column not in stats.columns:
             return {
                 "status": "error",
                 "report": f"數據集中找不到欄位 {x_column}",
                 "error": f"無效的 x_column：{x_column}"
             }
-        if y_column not in df.columns:
+        if y_column not in stats.columns:
             return {
                 "status": "error",
                 "report": f"數據集中找不到欄位 {y_column}",
@@ -252,35 +781,96 @@ def create_chart(
                 "error": f"無效的 chart_type：{chart_type}"
             }
 
-        # 準備圖表數據
-        # 轉換為簡單類型以確保 JSON 序列化
-        x_data = df[x_column].tolist()
-        y_data = df[y_column].tolist()
+        if chart_type == "bar" and aggregation not in BAR_AGGREGATIONS:
+            return {
+                "status": "error",
+                "report": f"無效的彙總方式。請使用：{', '.join(BAR_AGGREGATIONS)}",
+                "error": f"無效的 aggregation：{aggregation}"
+            }
 
-        # 將 numpy 類型轉換為 Python 類型
-        x_data = [str(x) for x in x_data]
-        y_data = [float(y) if pd.notna(y) else 0 for y in y_data]
+        if not (chart_type == "bar" and aggregation == "count"):
+            if not stats.is_numeric(y_column):
+                return {
+                    "status": "error",
+                    "report": f"欄位 {y_column} 不是數值欄位",
+                    "error": f"無效的 y_column 類型：{y_column}"
+                }
 
-        chart_data = {
+        budget = max(int(max_points or CHART_MAX_POINTS), 3)
+        df = stats.frame()
+        x = df[x_column]
+        y = df[y_column]
+        source_rows = stats.rows
+        if chart_type == "bar":
+            labels, values = _aggregate_bars(x, y, aggregation, budget)
+            method = f"groupby_{aggregation}"
+            dropped = 0
+        else:
+            # 遺失值無法繪製，先以向量化遮罩移除（遺失值數量來自統計快取）
+            dropped = int(stats.missing([y_column])[y_column])
+            y_values = y.to_numpy(dtype=np.float64)
+            x_valid = x
+            if dropped:
+                valid = ~np.isnan(y_values)
+                x_valid = x[valid]
+                y_values = y_values[valid]
+            if chart_type == "line":
+                picks, method = lttb_indices(y_values, budget), "lttb"
+            else:
+                picks, method = minmax_indices(y_values, budget), "min_max"
+            if len(picks) == len(y_values):
+                method = "none"
+            labels = x_valid.iloc[picks].astype(str).to_numpy()
+            values = y_values[picks]
+
+        # 將 NaN（例如全為遺失值的分組）轉為 0 以確保 JSON 可序列化
+        values = np.nan_to_num(values, nan=0.0)
+        chart_id = uuid.uuid4().hex[:12]
+        options = {
+            "x_label": x_column,
+            "y_label": y_column,
+            "title": f"{y_column} vs {x_column}"
+        }
+        chart_cache[chart_id] = {
+            "chart_id": chart_id,
+            "chart_type": chart_type,
+            "data": {
+                "labels": labels.tolist(),
+                "values": values.tolist()
+            },
+            "options": options
+        }
+        while len(chart_cache) > MAX_CACHED_CHARTS:
+            chart_cache.popitem(last=False)
+
+        summary = {
+            "source_rows": source_rows,
+            "points": int(len(values)),
+            "method": method,
+            "dropped_missing": dropped,
+        }
+        # Y 的統計與 analyze_data 共用同一份描述統計快取
+        y_stats = stats.describe([y_column]).get(y_column)
+        if y_stats is not None and y_stats["count"] > 0:
+            summary.update({
+                "y_min": float(y_stats["min"]),
+                "y_max": float(y_stats["max"]),
+                "y_mean": round(float(y_stats["mean"]), 4),
+            })
+
+        return {
             "status": "success",
             "report": (
                 f"已從 {file_name} 生成 {y_column} 對 {x_column} 的 {chart_type} 圖表，"
-                f"包含 {len(x_data)} 個數據點。"
+                f"{source_rows} 列數據縮減為 {len(values)} 個數據點（{method}）。"
             ),
             "chart_type": chart_type,
-            "data": {
-                "labels": x_data,
-                "values": y_data
-            },
-            "options": {
-                "x_label": x_column,
-                "y_label": y_column,
-                "title": f"{y_column} vs {x_column}"
-            }
+            "chart_id": chart_id,
+            "data_url": f"/charts/{chart_id}",
+            "summary": summary,
+            "options": options
         }
 
-        return chart_data
-
     except Exception as e:
         return {
             "status": "error",
@@ -302,7 +892,7 @@ adk_agent = Agent(
     你的能力：
     - 使用 load_csv_data(file_name, csv_content) 載入 CSV 數據集
     - 使用 analyze_data(file_name, analysis_type, columns) 執行統計分析
-    - 使用 create_chart(file_name, chart_type, x_column, y_column) 生成視覺化圖表
+    - 使用 create_chart(file_name, chart_type, x_column, y_column, aggregation, max_points) 生成視覺化圖表
 
     可用的分析類型：
     - "summary"：描述性統計、遺失值、唯一計數
@@ -311,9 +901,12 @@ adk_agent = Agent(
 
     可用的圖表類型：
     - "line"：隨時間變化的趨勢折線圖
-    - "bar"：類別比較的長條圖
+    - "bar"：類別比較的長條圖（依 X 分組，以 aggregation 彙總：sum、mean、count、min、max）
     - "scatter"：關係散佈圖
 
+    create_chart 只回傳 chart_id 與摘要（來源列數、保留點數、Y 的最小/最大/平均值），
+    前端會自動以 chart_id 顯示圖表。請根據摘要說明圖表，不需要列出數據點。
+
     指引：
     1. 總是先從載入數據開始（若尚未載入）
     2. 使用 markdown 格式清楚解釋你的分析
@@ -429,36 +1022,55 @@ def health_check() -> Dict[str, Any]:
     健康檢查端點。
 
     Returns:
-        Dict 包含狀態、Agent 名稱和已載入的數據集
+        Dict 包含狀態、Agent 名稱、已載入的數據集和記憶體用量
     """
+    datasets = dataset_manager.list_datasets()
     return {
         "status": "healthy",
         "agent": "data_analyst",
-        "datasets_loaded": list(uploaded_data.keys()),
-        "num_datasets": len(uploaded_data)
+        "datasets_loaded": [d["name"] for d in datasets],
+        "num_datasets": len(datasets),
+        "memory_bytes": dataset_manager.memory_bytes,
+        "memory_budget_bytes": dataset_manager.memory_budget_bytes
     }
 
 
-@app.get("/datasets")
-def list_datasets() -> Dict[str, Any]:
+@app.get("/charts/{chart_id}")
+def chart_data(chart_id: str) -> Dict[str, Any]:
     """
-    列出所有已載入的數據集。
+    取得降採樣後的圖表數據，供前端繪製。
+
+    Args:
+        chart_id: create_chart 回傳的圖表代號
 
     Returns:
-        Dict 包含已載入的數據集名稱及其資訊
+        Dict 包含 chart_type、data（labels / values）和 options
     """
-    datasets_info = {}
-    for name, df in uploaded_data.items():
-        datasets_info[name] = {
-            "rows": len(df),
-            "columns": list(df.columns),
-            "dtypes": df.dtypes.astype(str).to_dict()
-        }
+    chart = get_chart(chart_id)
+    if chart is None:
+        raise HTTPException(status_code=404, detail=f"找不到圖表 {chart_id}")
+    return chart
+
 
+@app.get("/datasets")
+def list_datasets(session_id: str) -> Dict[str, Any]:
+    """
+    列出某個工作階段已載入的數據集及其記憶體用量。
+
+    Args:
+        session_id: 工作階段代號（必填，避免列出其他工作階段的數據集）
+
+    Returns:
+        Dict 包含數據集列表（名稱、工作階段、形狀、型別、記憶體大小與所在位置）
+        以及記憶體總用量與上限
+    """
+    datasets = dataset_manager.list_datasets(session_id)
     return {
         "status": "success",
-        "datasets": datasets_info,
-        "count": len(uploaded_data)
+        "datasets": datasets,
+        "count": len(datasets),
+        "memory_bytes": dataset_manager.memory_bytes,
+        "memory_budget_bytes": dataset_manager.memory_budget_bytes
     }
 
 
@@ -481,6 +1093,8 @@ if __name__ == "__main__":
 # - **關鍵技術**：FastAPI, pandas, Google ADK (Gemini 2.0 Flash), AG-UI Protocol。
 # - **重要結論**：
 #   - 提供了三個主要工具：`load_csv_data`（載入 CSV）、`analyze_data`（統計分析）、`create_chart`（生成圖表數據）。
-#   - 使用記憶體（dict）暫存上傳的數據，生產環境建議改用資料庫。
+#   - `create_chart` 在伺服器端降採樣（LTTB / 最小最大值 / 分組彙總），模型只收到 chart_id 與摘要，前端從 `/charts/{chart_id}` 取得數據點。
+#   - `DatasetManager` 以 (工作階段, 檔案名稱) 儲存數據集：載入時分塊解析並最佳化型別，超過記憶體上限時將最久未使用的數據集溢出到 Parquet。
+#   - 每個數據集版本有一份 `DatasetStats` 統計快取，`analyze_data` 與 `create_chart` 共用欄位統計與相關性矩陣。
 #   - 透過 AG-UI 協議與前端溝通，並支援 CORS。
 # - **行動項目**：確保安裝 `ag-ui-adk` 和 `pandas`，並設定環境變數 `PORT`（預設 8000）。
@@ -51,6 +51,16 @@ interface ChartData {
   report?: string;
 }
 
+// create_chart 工具結果：只包含 chart_id 與摘要，數據點需另外從 /charts/{chart_id} 取得
+interface ChartResult {
+  chart_type: string;
+  chart_id?: string;
+  data?: ChartData["data"];
+  options: ChartData["options"];
+  status?: string;
+  report?: string;
+}
+
 function App() {
   const [messages, setMessages] = useState<Message[]>([
     {
@@ -66,6 +76,27 @@ function App() {
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const fileInputRef = useRef<HTMLInputElement>(null);
 
+  // 以 chart_id 取得伺服器端降採樣後的圖表數據
+  const fetchChartData = async (result: ChartResult): Promise<ChartData | null> => {
+    if (result.data) {
+      return result as ChartData;
+    }
+    if (!result.chart_id) {
+      return null;
+    }
+    try {
+      const response = await fetch(`http://localhost:8000/charts/${result.chart_id}`);
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+      const chart = await response.json();
+      return { ...chart, status: result.status, report: result.report };
+    } catch (e) {
+      console.error("無法取得圖表數據：", e);
+      return null;
+    }
+  };
+
   // 從 Agent 回應中提取圖表數據
   const extractChartData = (content: string): ChartData | null => {
     try {
@@ -174,12 +205,15 @@ function App() {
                     toolResults[jsonData.tool_call_id] = resultContent;
 
                     // 檢查這是否為圖表建立結果
-                    if (resultContent && resultContent.chart_type) {
+                    const chartData = resultContent && resultContent.chart_type
+                      ? await fetchChartData(resultContent)
+                      : null;
+                    if (chartData) {
                       console.log("✅ 發現圖表數據！");
-                      console.log("   圖表類型：", resultContent.chart_type);
-                      console.log("   圖表數據：", resultContent);
+                      console.log("   圖表類型：", chartData.chart_type);
+                      console.log("   圖表數據：", chartData);
 
-                      setCurrentChart(resultContent);
+                      setCurrentChart(chartData);
                       console.log("   已設定 currentChart 狀態");
 
                       setMessages((prev) => {
@@ -187,7 +221,7 @@ function App() {
                         const lastMsg = newMessages[newMessages.length - 1];
                         console.log("   最後訊息角色：", lastMsg?.role);
                         if (lastMsg && lastMsg.role === "assistant") {
-                          lastMsg.chartData = resultContent;
+                          lastMsg.chartData = chartData;
                           console.log("   已將 chartData 附加到訊息");
                         }
                         return newMessages;
@@ -328,10 +362,13 @@ function App() {
                       ? JSON.parse(jsonData.content)
                       : jsonData.content;
 
-                    if (resultContent && resultContent.chart_type) {
-                      console.log("📈 上傳：發現圖表數據：", resultContent);
-                      chartDataFromTool = resultContent;
-                      setCurrentChart(resultContent);
+                    const chartData = resultContent && resultContent.chart_type
+                      ? await fetchChartData(resultContent)
+                      : null;
+                    if (chartData) {
+                      console.log("📈 上傳：發現圖表數據：", chartData);
+                      chartDataFromTool = chartData;
+                      setCurrentChart(chartData);
                     }
                   } catch (e) {
                     console.error("解析上傳工具結果錯誤：", e);
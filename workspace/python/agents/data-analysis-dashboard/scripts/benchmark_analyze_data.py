@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+比較 analyze_data 每次重新計算統計與使用統計快取的耗時。
+
+模擬一段對話中模型反覆呼叫的工具序列（摘要、相關性、欄位子集、趨勢、圖表）：
+
+- baseline: 每次呼叫都對整個 DataFrame 重新執行 select_dtypes / describe / corr 等計算（原本的行為）
+- cached: 透過 DatasetStats 快取；第一輪計算並快取，第二輪直接命中
+
+使用方法：
+    python scripts/benchmark_analyze_data.py --rows 5000000
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 與 `cd agent && python agent.py` 相同的匯入方式
+sys.path.insert(0, str(Path(__file__).parent.parent / "agent"))
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+import agent as dashboard  # noqa: E402
+
+SESSION = "benchmark"
+NAME = "synthetic.csv"
+
+# (分析類型, 欄位子集)；None 表示所有欄位
+WORKLOAD = [
+    ("summary", None),
+    ("correlation", None),
+    ("summary", None),
+    ("correlation", ["revenue", "quantity"]),
+    ("summary", ["revenue", "region"]),
+    ("correlation", None),
+    ("trend", None),
+]
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    """建立合成的銷售數據集。"""
+    rng = np.random.default_rng(0)
+    quantity = rng.integers(1, 100, rows)
+    price = rng.gamma(2.0, 20.0, rows)
+    return pd.DataFrame(
+        {
+            "quantity": quantity,
+            "price": price,
+            "revenue": quantity * price,
+            "discount": rng.random(rows),
+            "cost": price * rng.uniform(0.4, 0.9, rows),
+            "rating": rng.normal(4.0, 0.5, rows),
+            "store_id": rng.integers(0, 500, rows),
+            "region": rng.choice(["North", "South", "East", "West"], rows),
+        }
+    )
+
+
+def baseline_analysis(df: pd.DataFrame, analysis_type: str, columns) -> dict:
+    """原本的 analyze_data：每次呼叫都重新計算。"""
+    if columns:
+        df = df[columns]
+    numeric_df = df.select_dtypes(include=["number"])
+    if analysis_type == "summary":
+        return {
+            "describe": numeric_df.describe().to_dict(),
+            "missing": df.isnull().sum().to_dict(),
+            "unique": df.nunique().to_dict(),
+        }
+    if analysis_type == "correlation":
+        return numeric_df.corr().to_dict()
+    return {
+        "mean": numeric_df.mean().to_dict(),
+        "first_row_sum": float(numeric_df.iloc[0].sum()),
+        "last_row_sum": float(numeric_df.iloc[-1].sum()),
+    }
+
+
+def baseline_chart_summary(df: pd.DataFrame, column: str) -> dict:
+    """原本的 create_chart：每次重新計算 Y 欄位的最小、最大與平均值。"""
+    y = df[column]
+    return {"y_min": y.min(), "y_max": y.max(), "y_mean": y.mean(), "missing": int(y.isna().sum())}
+
+
+def run_baseline(df: pd.DataFrame) -> float:
+    start = time.perf_counter()
+    for analysis_type, columns in WORKLOAD:
+        baseline_analysis(df, analysis_type, columns)
+    baseline_chart_summary(df, "revenue")
+    return time.perf_counter() - start
+
+
+def run_cached() -> float:
+    stats = dashboard.dataset_manager.stats(SESSION, NAME)
+    start = time.perf_counter()
+    for analysis_type, columns in WORKLOAD:
+        stats.cached(
+            analysis_type,
+            columns or stats.columns,
+            lambda: dashboard._run_analysis(stats, NAME, analysis_type, columns or stats.columns),
+        )
+    stats.describe(["revenue"])
+    stats.missing(["revenue"])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    args = parser.parse_args()
+
+    frame = dashboard.optimize_dtypes(make_frame(args.rows))
+    dashboard.dataset_manager.put(SESSION, NAME, frame, optimize=False)
+    calls = len(WORKLOAD) + 1
+    print(f"{args.rows:,} 列，每輪 {calls} 次工具呼叫")
+
+    baseline = run_baseline(frame)
+    cold = run_cached()
+    warm = run_cached()
+    print(f"{'baseline':<14} {baseline:>8.2f} 秒")
+    print(f"{'cached (首輪)':<12} {cold:>8.2f} 秒")
+    print(f"{'cached (重複)':<12} {warm * 1000:>8.2f} 毫秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+比較 create_chart 原本逐列轉換為 Python 串列與伺服器端降採樣的耗時與回傳大小。
+
+- baseline: 原本的行為；以 tolist() 轉換所有列，整個數據放進工具回傳值（進入模型上下文）
+- line / scatter / bar: 目前的 create_chart；以 LTTB、最小/最大值或分組彙總縮減點數，
+  工具回傳值只有 chart_id 與摘要，數據點由前端透過 /charts/{chart_id} 取得
+
+耗時包含將工具回傳值序列化為 JSON（回傳值必須序列化後才能傳給模型與前端）。
+「工具回傳」為傳給模型的 JSON 大小，「數據點」為前端取得的圖表數據 JSON 大小。
+
+使用方法：
+    python scripts/benchmark_create_chart.py --rows 1000000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 與 `cd agent && python agent.py` 相同的匯入方式
+sys.path.insert(0, str(Path(__file__).parent.parent / "agent"))
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+import agent as dashboard  # noqa: E402
+
+NAME = "synthetic.csv"
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    """建立合成的時間序列數據集（日期、區域與一個數值欄位）。"""
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "date": pd.date_range("2020-01-01", periods=rows, freq="min").astype(str),
+            "region": rng.choice(["North", "South", "East", "West"], rows),
+            "revenue": np.cumsum(rng.normal(0, 1, rows)) + 1000,
+        }
+    )
+
+
+def baseline_chart(df: pd.DataFrame, chart_type: str, x_column: str, y_column: str) -> dict:
+    """原本的 create_chart：所有列轉為 Python 串列並放進回傳值。"""
+    x_data = [str(x) for x in df[x_column].tolist()]
+    y_data = [float(y) if pd.notna(y) else 0 for y in df[y_column].tolist()]
+    return {
+        "status": "success",
+        "report": f"已從 {NAME} 生成 {y_column} 對 {x_column} 的 {chart_type} 圖表，包含 {len(x_data)} 個數據點。",
+        "chart_type": chart_type,
+        "data": {"labels": x_data, "values": y_data},
+        "options": {"x_label": x_column, "y_label": y_column, "title": f"{y_column} vs {x_column}"},
+    }
+
+
+def size_of(payload) -> int:
+    """JSON 序列化後的位元組數（與串流給模型或前端的內容相同）。"""
+    return len(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+
+
+def format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024 or unit == "MB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def report(name: str, seconds: float, result_size: int, points) -> None:
+    points_size = format_size(size_of(points)) if points is not None else "-"
+    print(f"{name:<10} {seconds * 1000:>10.1f} {format_size(result_size):>12} {points_size:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    frame = make_frame(args.rows)
+    dashboard.dataset_manager.put(dashboard.DEFAULT_SESSION, NAME, frame)
+    print(f"{args.rows:,} 列，每張圖表最多 {dashboard.CHART_MAX_POINTS} 個數據點")
+    print(f"{'模式':<8} {'毫秒':>10} {'工具回傳':>10} {'數據點':>10}")
+
+    started = time.perf_counter()
+    result_size = size_of(baseline_chart(frame, "line", "date", "revenue"))
+    report("baseline", time.perf_counter() - started, result_size, None)
+
+    for chart_type, x_column in (("line", "date"), ("scatter", "date"), ("bar", "region")):
+        started = time.perf_counter()
+        result = dashboard.create_chart(NAME, chart_type, x_column, "revenue")
+        result_size = size_of(result)
+        elapsed = time.perf_counter() - started
+        assert result["status"] == "success", result
+        report(chart_type, elapsed, result_size, dashboard.get_chart(result["chart_id"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -193,17 +193,21 @@ class TestCreateChart:
 
     def test_create_chart_line(self):
         """測試折線圖建立。"""
-        from agent.agent import create_chart
+        from agent.agent import create_chart, get_chart
 
         result = create_chart("sales.csv", "line", "month", "sales")
 
         assert result["status"] == "success"
         assert result["chart_type"] == "line"
-        assert "data" in result
-        assert "labels" in result["data"]
-        assert "values" in result["data"]
-        assert len(result["data"]["labels"]) == 3
-        assert len(result["data"]["values"]) == 3
+        # 模型只收到 chart_id 與摘要，數據點存放在伺服器端
+        assert "data" not in result
+        assert result["summary"]["points"] == 3
+
+        chart = get_chart(result["chart_id"])
+        assert "labels" in chart["data"]
+        assert "values" in chart["data"]
+        assert chart["data"]["labels"] == ["Jan", "Feb", "Mar"]
+        assert chart["data"]["values"] == [100.0, 120.0, 115.0]
 
     def test_create_chart_bar(self):
         """測試長條圖建立。"""
@@ -263,6 +267,414 @@ class TestCreateChart:
         assert result["options"]["y_label"] == "sales"
 
 
+class TestChartDownsampling:
+    """測試 create_chart 的伺服器端降採樣與圖表代號。"""
+
+    def setup_method(self):
+        """載入 10 萬列的合成數據集。"""
+        import numpy as np
+        import pandas as pd
+
+        from agent.agent import DEFAULT_SESSION, dataset_manager
+
+        rng = np.random.default_rng(0)
+        n = 100_000
+        values = np.sin(np.linspace(0, 20, n)) * 100 + rng.normal(0, 1, n)
+        values[54_321] = 1_000  # 尖峰
+        values[77_777] = np.nan
+        dataset_manager.put(DEFAULT_SESSION, "big.csv", pd.DataFrame(
+            {
+                "t": np.arange(n),
+                "value": values,
+                "region": rng.choice(["N", "S", "E", "W"], n),
+            }
+        ))
+        self.n = n
+
+    def test_line_uses_lttb_within_budget(self):
+        """測試折線圖以 LTTB 降採樣到點數上限內，並保留尖峰與首尾點。
+
+        重點說明：
+        1. 以 max_points=500 建立折線圖
+        2. 驗證點數、降採樣方法與遺失值數
+        3. 驗證尖峰值與第一、最後一點被保留
+        """
+        from agent.agent import create_chart, get_chart
+
+        result = create_chart("big.csv", "line", "t", "value", max_points=500)
+        chart = get_chart(result["chart_id"])
+
+        assert result["summary"]["method"] == "lttb"
+        assert result["summary"]["points"] == 500
+        assert result["summary"]["source_rows"] == self.n
+        assert result["summary"]["dropped_missing"] == 1
+        assert len(chart["data"]["values"]) == 500
+        assert 1000.0 in chart["data"]["values"]
+        assert chart["data"]["labels"][0] == "0"
+        assert chart["data"]["labels"][-1] == str(self.n - 1)
+
+    def test_scatter_keeps_extremes(self):
+        """測試散佈圖以最小/最大值降採樣並保留全域極值。"""
+        from agent.agent import DEFAULT_SESSION, create_chart, dataset_manager, get_chart
+
+        result = create_chart("big.csv", "scatter", "t", "value", max_points=200)
+        values = get_chart(result["chart_id"])["data"]["values"]
+        source = dataset_manager.get(DEFAULT_SESSION, "big.csv")["value"]
+
+        assert result["summary"]["method"] == "min_max"
+        assert len(values) <= 200
+        assert max(values) == source.max()
+        assert min(values) == source.min()
+
+    def test_bar_groupby_aggregation(self):
+        """測試長條圖依類別分組彙總。"""
+        from agent.agent import DEFAULT_SESSION, create_chart, dataset_manager, get_chart
+
+        result = create_chart("big.csv", "bar", "region", "value", aggregation="count")
+        chart = get_chart(result["chart_id"])
+        counts = dict(zip(chart["data"]["labels"], chart["data"]["values"]))
+        frame = dataset_manager.get(DEFAULT_SESSION, "big.csv")
+        expected = frame.groupby("region", observed=True)["value"].count()
+
+        assert result["summary"]["method"] == "groupby_count"
+        assert counts == {k: float(v) for k, v in expected.items()}
+
+    def test_bar_category_budget(self):
+        """測試類別數超過上限時保留最大的類別並合併為「其他」。"""
+        import pandas as pd
+
+        from agent.agent import DEFAULT_SESSION, create_chart, dataset_manager, get_chart
+
+        dataset_manager.put(DEFAULT_SESSION, "cats.csv", pd.DataFrame(
+            {"name": [f"c{i}" for i in range(10)], "amount": list(range(10))}
+        ))
+        result = create_chart("cats.csv", "bar", "name", "amount", max_points=4)
+        chart = get_chart(result["chart_id"])
+
+        assert chart["data"]["labels"] == ["c7", "c8", "c9", "其他"]
+        assert chart["data"]["values"] == [7.0, 8.0, 9.0, float(sum(range(7)))]
+
+    def test_invalid_aggregation_and_non_numeric(self):
+        """測試無效的彙總方式與非數值 Y 欄位回傳錯誤。"""
+        from agent.agent import create_chart
+
+        assert create_chart("big.csv", "bar", "region", "value", aggregation="median")["status"] == "error"
+        assert create_chart("big.csv", "line", "t", "region")["status"] == "error"
+
+    def test_result_payload_is_small(self):
+        """測試回傳給模型的結果大小與來源列數無關。"""
+        import json
+
+        from agent.agent import create_chart
+
+        result = create_chart("big.csv", "line", "t", "value")
+
+        assert len(json.dumps(result, ensure_ascii=False)) < 1_000
+
+    def test_chart_endpoint(self):
+        """測試 /charts/{chart_id} 端點回傳數據點，未知代號回傳 404。"""
+        from fastapi.testclient import TestClient
+
+        from agent.agent import app, create_chart
+
+        result = create_chart("big.csv", "line", "t", "value", max_points=100)
+        client = TestClient(app)
+
+        response = client.get(f"/charts/{result['chart_id']}")
+        assert response.status_code == 200
+        assert len(response.json()["data"]["labels"]) == 100
+        assert client.get("/charts/unknown").status_code == 404
+
+
+class TestDatasetManager:
+    """測試依工作階段隔離、型別最佳化與溢出至 Parquet 的數據集管理器。"""
+
+    def make_frame(self, rows=10_000, seed=0):
+        """建立含整數、浮點數與重複文字欄位的數據集。"""
+        import numpy as np
+        import pandas as pd
+
+        rng = np.random.default_rng(seed)
+        return pd.DataFrame(
+            {
+                "id": np.arange(rows, dtype=np.int64),
+                "qty": rng.integers(0, 100, rows),
+                "price": rng.choice([0.5, 1.25, 10.0], rows),
+                "ratio": rng.random(rows),
+                "region": rng.choice(["North", "South", "East", "West"], rows),
+            }
+        )
+
+    def test_optimize_dtypes(self):
+        """測試整數降轉、無失真的浮點數降轉與文字欄位轉為 category。"""
+        from agent.agent import optimize_dtypes
+
+        frame = self.make_frame()
+        optimized = optimize_dtypes(frame)
+
+        assert str(optimized["id"].dtype) == "int16"
+        assert str(optimized["qty"].dtype) == "int8"
+        assert str(optimized["price"].dtype) == "float32"
+        # 轉為 float32 會失真的欄位維持 float64
+        assert str(optimized["ratio"].dtype) == "float64"
+        assert str(optimized["region"].dtype) == "category"
+        assert optimized.memory_usage(deep=True).sum() < frame.memory_usage(deep=True).sum() / 2
+        assert (optimized["ratio"] == frame["ratio"]).all()
+
+    def test_chunked_csv_matches_full_parse(self):
+        """測試分塊解析的結果與一次解析相同，且跨塊的 category 欄位維持 category。"""
+        import io
+
+        from agent.agent import read_csv_chunked
+
+        frame = self.make_frame(rows=2_500)
+        text = frame.to_csv(index=False)
+        chunked = read_csv_chunked(io.StringIO(text), chunk_rows=1_000)
+
+        assert str(chunked["region"].dtype) == "category"
+        assert chunked["region"].astype(str).tolist() == frame["region"].tolist()
+        assert chunked["qty"].tolist() == frame["qty"].tolist()
+        assert len(chunked) == 2_500
+
+    def test_sessions_are_isolated(self):
+        """測試不同工作階段上傳同名檔案不會互相覆蓋。
+
+        重點說明：
+        1. 兩個工作階段各自以 load_csv_data 載入同名檔案
+        2. 各自的 analyze_data 只看到自己的數據
+        3. 另一個工作階段找不到該數據集
+        """
+        from types import SimpleNamespace
+
+        from agent.agent import analyze_data, dataset_manager, load_csv_data
+
+        def context(session_id):
+            session = SimpleNamespace(id=session_id)
+            return SimpleNamespace(session=session)
+
+        alice, bob = context("alice"), context("bob")
+        load_csv_data("data.csv", "x,y\n1,2\n3,4", tool_context=alice)
+        load_csv_data("data.csv", "x,y\n10,20\n30,40\n50,60", tool_context=bob)
+
+        assert analyze_data("data.csv", "summary", tool_context=alice)["data"]["describe"]["x"]["count"] == 2
+        assert analyze_data("data.csv", "summary", tool_context=bob)["data"]["describe"]["x"]["count"] == 3
+        assert analyze_data("data.csv", "summary", tool_context=context("carol"))["status"] == "error"
+        assert {d["session_id"] for d in dataset_manager.list_datasets() if d["name"] == "data.csv"} >= {"alice", "bob"}
+        dataset_manager.clear("alice")
+        dataset_manager.clear("bob")
+
+    def test_lru_spill_and_reload(self, tmp_path):
+        """測試超過記憶體上限時將最久未使用的數據集溢出到 Parquet，存取時讀回。
+
+        重點說明：
+        1. 上限只容得下兩個數據集，載入三個
+        2. 最舊的數據集溢出到磁碟，記憶體用量不超過上限
+        3. 讀回後內容與型別不變，並改為溢出另一個最久未使用的數據集
+        """
+        import pandas as pd
+
+        from agent.agent import DatasetManager, optimize_dtypes
+
+        frame = optimize_dtypes(self.make_frame())
+        size = int(frame.memory_usage(deep=True).sum())
+        manager = DatasetManager(memory_budget_bytes=int(size * 2.5), spill_dir=str(tmp_path))
+        manager.put("s", "a.csv", frame)
+        manager.put("s", "b.csv", self.make_frame(seed=1))
+        manager.put("s", "c.csv", self.make_frame(seed=2))
+
+        locations = {d["name"]: d["location"] for d in manager.list_datasets("s")}
+        assert locations == {"a.csv": "disk", "b.csv": "memory", "c.csv": "memory"}
+        assert manager.memory_bytes <= manager.memory_budget_bytes
+        assert len(list(tmp_path.glob("*.parquet"))) == 1
+
+        restored = manager.get("s", "a.csv")
+        assert str(restored["region"].dtype) == "category"
+        pd.testing.assert_frame_equal(
+            restored.astype({"region": str}), frame.astype({"region": str})
+        )
+        locations = {d["name"]: d["location"] for d in manager.list_datasets("s")}
+        assert locations == {"a.csv": "memory", "b.csv": "disk", "c.csv": "memory"}
+
+        manager.clear()
+        assert list(tmp_path.glob("*.parquet")) == []
+
+    def test_list_reports_memory(self):
+        """測試數據集列表回報每個數據集的記憶體用量。"""
+        from agent.agent import DatasetManager
+
+        manager = DatasetManager()
+        manager.put("s", "a.csv", self.make_frame(rows=100))
+        entry = manager.list_datasets()[0]
+
+        assert entry["memory_bytes"] == manager.memory_bytes > 0
+        assert entry["rows"] == 100
+        assert entry["dtypes"]["qty"] == "int8"
+
+    def test_datasets_endpoint_filters_session(self):
+        """測試 /datasets 端點依 session_id 篩選並回報記憶體用量。"""
+        from fastapi.testclient import TestClient
+
+        from agent.agent import app, dataset_manager
+
+        dataset_manager.put("endpoint", "e.csv", self.make_frame(rows=50))
+        client = TestClient(app)
+        data = client.get("/datasets", params={"session_id": "endpoint"}).json()
+
+        assert data["count"] == 1
+        assert data["datasets"][0]["name"] == "e.csv"
+        assert data["datasets"][0]["memory_bytes"] > 0
+        assert "memory_budget_bytes" in data
+        dataset_manager.clear("endpoint")
+
+    def test_datasets_endpoint_requires_session(self):
+        """測試 /datasets 端點必須提供 session_id，不會列出其他工作階段的數據集。"""
+        from fastapi.testclient import TestClient
+
+        from agent.agent import app, dataset_manager
+
+        dataset_manager.put("private", "secret.csv", self.make_frame(rows=10))
+        client = TestClient(app)
+
+        assert client.get("/datasets").status_code == 422
+        assert client.get("/datasets", params={"session_id": "other"}).json()["count"] == 0
+        dataset_manager.clear("private")
+
+
+class TestStatisticsCache:
+    """測試 analyze_data 的統計快取。"""
+
+    def setup_method(self):
+        """在獨立的工作階段載入含數值與分類欄位的數據集。"""
+        import numpy as np
+        import pandas as pd
+
+        from agent.agent import dataset_manager
+
+        rng = np.random.default_rng(0)
+        n = 5_000
+        self.frame = pd.DataFrame(
+            {
+                "a": rng.normal(size=n),
+                "b": rng.normal(size=n),
+                "c": rng.normal(size=n),
+                "label": rng.choice(["x", "y"], n),
+            }
+        )
+        self.frame.loc[::7, "b"] = np.nan
+        dataset_manager.put("stats", "s.csv", self.frame)
+
+    def teardown_method(self):
+        """清除測試工作階段。"""
+        from agent.agent import dataset_manager
+
+        dataset_manager.clear("stats")
+
+    def context(self):
+        """建立指向測試工作階段的工具上下文。"""
+        from types import SimpleNamespace
+
+        session = SimpleNamespace(id="stats")
+        return SimpleNamespace(session=session)
+
+    def spy(self, monkeypatch, method):
+        """記錄 DataFrame 方法每次被呼叫時的欄位。"""
+        import pandas as pd
+
+        calls = []
+        original = getattr(pd.DataFrame, method)
+
+        def wrapper(frame, *args, **kwargs):
+            calls.append(list(frame.columns))
+            return original(frame, *args, **kwargs)
+
+        monkeypatch.setattr(pd.DataFrame, method, wrapper)
+        return calls
+
+    def test_repeated_analysis_is_cached(self, monkeypatch):
+        """測試相同的分析重複呼叫時直接回傳快取結果。"""
+        from agent.agent import analyze_data, dataset_manager
+
+        calls = self.spy(monkeypatch, "describe")
+        first = analyze_data("s.csv", "summary", tool_context=self.context())
+        second = analyze_data("s.csv", "summary", tool_context=self.context())
+        stats = dataset_manager.stats("stats", "s.csv")
+
+        assert second is first
+        assert len(calls) == 1
+        assert (stats.hits, stats.misses) == (1, 1)
+        assert first["data"]["missing"]["b"] == int(self.frame["b"].isna().sum())
+
+    def test_column_statistics_are_incremental(self, monkeypatch):
+        """測試新的欄位子集只計算尚未快取的欄位。"""
+        from agent.agent import analyze_data
+
+        calls = self.spy(monkeypatch, "describe")
+        analyze_data("s.csv", "summary", columns=["a"], tool_context=self.context())
+        result = analyze_data("s.csv", "summary", columns=["a", "b", "label"], tool_context=self.context())
+
+        assert calls == [["a"], ["b"]]
+        assert set(result["data"]["describe"]) == {"a", "b"}
+        assert result["data"]["unique"]["label"] == 2
+
+    def test_correlation_subsets_are_sliced(self, monkeypatch):
+        """測試相關性矩陣只計算一次，欄位子集由切片取得且結果一致。
+
+        重點說明：
+        1. 先分析兩個欄位的子集，再分析全部欄位
+        2. DataFrame.corr 只被呼叫一次（對所有數值欄位）
+        3. 子集結果與直接計算的相關性相同
+        """
+        import pytest
+
+        from agent.agent import analyze_data
+
+        calls = self.spy(monkeypatch, "corr")
+        subset = analyze_data("s.csv", "correlation", columns=["a", "b"], tool_context=self.context())
+        full = analyze_data("s.csv", "correlation", tool_context=self.context())
+
+        assert calls == [["a", "b", "c"]]
+        assert set(subset["data"]) == {"a", "b"}
+        assert set(full["data"]) == {"a", "b", "c"}
+        expected = self.frame["a"].corr(self.frame["b"])
+        assert subset["data"]["a"]["b"] == pytest.approx(expected)
+
+    def test_create_chart_reuses_statistics(self, monkeypatch):
+        """測試 create_chart 沿用 analyze_data 已計算的 Y 欄位統計。"""
+        from agent.agent import analyze_data, create_chart
+
+        analyze_data("s.csv", "summary", tool_context=self.context())
+        calls = self.spy(monkeypatch, "describe")
+        result = create_chart("s.csv", "line", "a", "b", tool_context=self.context())
+
+        assert calls == []
+        assert result["summary"]["y_max"] == float(self.frame["b"].max())
+        assert result["summary"]["dropped_missing"] == int(self.frame["b"].isna().sum())
+
+    def test_replaced_dataset_gets_new_version(self):
+        """測試重新載入同名數據集後產生新版本，不沿用舊的快取結果。"""
+        import pandas as pd
+
+        from agent.agent import analyze_data, dataset_manager
+
+        before = analyze_data("s.csv", "summary", tool_context=self.context())
+        old_version = dataset_manager.stats("stats", "s.csv").version
+        dataset_manager.put("stats", "s.csv", pd.DataFrame({"a": [1, 2, 3]}))
+        after = analyze_data("s.csv", "summary", tool_context=self.context())
+
+        assert dataset_manager.stats("stats", "s.csv").version > old_version
+        assert after["data"]["describe"]["a"]["count"] == 3
+        assert before["data"]["describe"]["a"]["count"] == len(self.frame)
+
+    def test_errors_are_not_cached(self):
+        """測試失敗的分析不會被快取。"""
+        from agent.agent import analyze_data, dataset_manager
+
+        analyze_data("s.csv", "invalid_type", tool_context=self.context())
+        analyze_data("s.csv", "invalid_type", tool_context=self.context())
+
+        assert dataset_manager.stats("stats", "s.csv").hits == 0
+
+
 class TestFastAPIEndpoints:
     """測試 FastAPI 端點。"""
 
@@ -286,7 +698,7 @@ class TestFastAPIEndpoints:
         from fastapi.testclient import TestClient
 
         client = TestClient(app)
-        response = client.get("/datasets")
+        response = client.get("/datasets", params={"session_id": "default"})
 
         assert response.status_code == 200
         data = response.json()
@@ -8,16 +8,27 @@
 4. 根據 LLM 的洞察產生改進後的提示
 5. 透過實際執行代理來驗證改進效果
 
+每一代會並行演化 N 個候選提示的族群，並為每個情境維護帕雷托前緣；
+所有 LLM 呼叫都經過同一個預算感知號誌，(提示雜湊, 情境) 的評估結果會被快取，
+未變更的候選提示不會被重新評分。
+
 基於以下位置的研究實作：
 research/adk-python/contributing/samples/gepa/
 """
 
 import asyncio
+import hashlib
 import logging
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
-
+import random
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from google.adk.agents.run_config import RunConfig
+from google.adk.runners import InMemoryRunner
 from google.genai import client as genai_client
+from google.genai import types
 
 from gepa_agent.agent import create_support_agent
 
@@ -57,6 +68,106 @@ class GEPAIteration:
     improvements: Optional[str] = None
 
 
+@dataclass
+class Candidate:
+    """族群中的一個候選提示"""
+
+    prompt: str
+    prompt_hash: str
+    generation: int
+    parent_hash: Optional[str] = None
+    results: Dict[str, ExecutionResult] = field(default_factory=dict)
+
+    @property
+    def scores(self) -> Dict[str, float]:
+        """每個情境的分數 (通過為 1.0，否則為 0.0)"""
+        return {name: 1.0 if r.success else 0.0 for name, r in self.results.items()}
+
+    @property
+    def success_rate(self) -> float:
+        """所有情境的成功率"""
+        if not self.results:
+            return 0.0
+        return sum(self.scores.values()) / len(self.results)
+
+    @property
+    def failures(self) -> List[ExecutionResult]:
+        """失敗的執行結果"""
+        return [r for r in self.results.values() if not r.success]
+
+
+class BudgetExhaustedError(RuntimeError):
+    """LLM 呼叫預算已用盡"""
+
+
+@dataclass
+class Reservation:
+    """一次預留的 LLM 呼叫；呼叫端可將 used 設為實際花費 (不超過 cost)"""
+
+    cost: int
+    used: Optional[int] = None
+
+
+class BudgetLimiter:
+    """結合並行上限與 LLM 呼叫預算的號誌。
+
+    acquire(cost) 會先取得並行名額，再預留 cost 次呼叫；
+    若已花費加上預留的呼叫數會超出預算，則引發 BudgetExhaustedError。
+    預留在呼叫發出前完成，因此已花費的呼叫數不會超過預算。
+    """
+
+    def __init__(self, budget: int, max_concurrency: int):
+        self.budget = budget
+        self.spent = 0
+        self._reserved = 0
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    @property
+    def remaining(self) -> int:
+        """尚未花費或預留的呼叫數"""
+        return self.budget - self.spent - self._reserved
+
+    @asynccontextmanager
+    async def acquire(self, cost: int = 1):
+        """取得並行名額並預留 cost 次 LLM 呼叫
+
+        結束時計入 reservation.used 次 (未設定時為 cost)，未用到的預留歸還預算。
+        """
+        async with self._semaphore:
+            if self.remaining < cost:
+                raise BudgetExhaustedError(
+                    f"預算不足：已花費 {self.spent}/{self.budget}，需要 {cost}"
+                )
+            reservation = Reservation(cost)
+            self._reserved += cost
+            try:
+                yield reservation
+            finally:
+                # 呼叫已發出，不論成功與否都計入花費
+                self._reserved -= cost
+                used = cost if reservation.used is None else reservation.used
+                self.spent += min(max(used, 0), cost)
+
+
+async def gather_or_cancel(*aws):
+    """
+    並行執行所有協程；任一個引發例外時取消其餘仍在執行的工作並重新引發。
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def prompt_hash(prompt: str) -> str:
+    """計算提示的內容雜湊，作為快取與候選識別鍵"""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
 class RealGEPAOptimizer:
     """使用實際的代理執行和 LLM 反思來實作真實的 GEPA 最佳化"""
 
@@ -67,6 +178,11 @@ class RealGEPAOptimizer:
         reflection_model: str = "gemini-2.5-pro",
         max_iterations: int = 3,
         budget: int = 50,  # LLM 總呼叫次數預算
+        population_size: int = 4,
+        max_concurrency: int = 4,
+        max_agent_calls: int = 4,
+        seed: Optional[int] = None,
+        client: Optional[Any] = None,
     ):
         """
         初始化 GEPA 最佳化器。
@@ -75,8 +191,13 @@ class RealGEPAOptimizer:
             api_key: Google API 金鑰 (若未提供，則使用 GOOGLE_API_KEY 環境變數)
             model: 用於代理的模型
             reflection_model: 用於反思分析的模型
-            max_iterations: 最大 GEPA 迭代次數
+            max_iterations: 最大 GEPA 迭代次數 (世代數)
             budget: LLM 總呼叫次數預算 (分配於各迭代中)
+            population_size: 每一代的候選提示數量
+            max_concurrency: 同時進行中的 LLM 呼叫上限
+            max_agent_calls: 單一情境中代理最多的模型呼叫次數 (執行前預留於預算中)
+            seed: 親代抽樣的隨機種子
+            client: 自訂的 genai Client (例如測試用的替身)
         """
         self.api_key = api_key
         self.model = model
@@ -87,9 +208,36 @@ class RealGEPAOptimizer:
             budget // max_iterations if max_iterations > 0 else budget
         )
 
-        self.client = genai_client.Client(api_key=api_key)
+        self.population_size = max(1, population_size)
+        self.max_concurrency = max_concurrency
+        self.max_agent_calls = max(1, max_agent_calls)
+
+        self.client = client if client is not None else genai_client.Client(api_key=api_key)
         self.iterations: List[GEPAIteration] = []
 
+        self._limiter = BudgetLimiter(budget, max_concurrency)
+        self._rng = random.Random(seed)
+
+        # (提示雜湊, 情境名稱) -> 執行結果；進行中的評估以 Task 去重
+        self._eval_cache: Dict[Tuple[str, str], ExecutionResult] = {}
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # 所有評估過的候選，以及每個情境的帕雷托前緣 (候選雜湊集合)
+        self.candidates: Dict[str, Candidate] = {}
+        self.pareto_front: Dict[str, Set[str]] = {}
+
+    @property
+    def budget_spent(self) -> int:
+        """已花費的 LLM 呼叫次數"""
+        return self._limiter.spent
+
+    @property
+    def budget_remaining(self) -> int:
+        """剩餘的 LLM 呼叫次數"""
+        return self._limiter.remaining
+
     async def _run_scenario_with_agent(
         self,
         scenario: EvaluationScenario,
@@ -98,36 +246,19 @@ class RealGEPAOptimizer:
         """
         使用給定的提示，與代理一起執行一個情境。
 
-        這是「真實」的執行 - 對代理進行實際的 LLM 呼叫。
+        這是「真實」的執行 - 透過 InMemoryRunner 對代理進行實際的 LLM 呼叫。
+        預算用盡時會引發 BudgetExhaustedError，由呼叫端停止最佳化。
         """
         try:
-            # 使用自訂提示建立代理 (用於驗證)
-            _ = create_support_agent(prompt=prompt, model=self.model)
-
-            # 使用客戶輸入執行代理
-            # 注意：這通常會透過 ADK 進行非同步執行
-            # 在本教學中，我們將透過檢查提示要求來模擬
-            response = await self._simulate_agent_execution(
-                agent_prompt=prompt,
-                customer_input=scenario.customer_input,
-            )
-
-            # 根據回應品質判斷成功與否
-            success = self._evaluate_response(
-                scenario=scenario,
-                response=response,
-                prompt=prompt,
-            )
-
-            tools_used = self._extract_tools_from_prompt(prompt)
-
-            return ExecutionResult(
-                scenario_name=scenario.name,
-                success=success,
-                agent_response=response,
-                tools_used=tools_used,
-            )
-
+            # 代理的多輪工具呼叫會產生多次模型呼叫：先預留上限，結束後只計入實際次數
+            async with self._limiter.acquire(self.max_agent_calls) as reservation:
+                response, tool_calls, model_calls = await self._execute_agent(
+                    agent_prompt=prompt,
+                    customer_input=scenario.customer_input,
+                )
+                reservation.used = model_calls
+        except BudgetExhaustedError:
+            raise
         except Exception as e:
             return ExecutionResult(
                 scenario_name=scenario.name,
@@ -137,54 +268,139 @@ class RealGEPAOptimizer:
                 failure_reason=str(e),
             )
 
-    async def _simulate_agent_execution(
+        # 依代理實際的回應與工具呼叫判斷成功與否
+        success, failure_reason = self._evaluate_response(
+            scenario=scenario,
+            response=response,
+            tool_calls=tool_calls,
+        )
+
+        return ExecutionResult(
+            scenario_name=scenario.name,
+            success=success,
+            agent_response=response,
+            tools_used=[name for name, _ in tool_calls],
+            failure_reason=failure_reason,
+        )
+
+    async def _execute_agent(
         self,
         agent_prompt: str,
         customer_input: str,
-    ) -> str:
+    ) -> Tuple[str, List[Tuple[str, str]], int]:
         """
-        透過檢查提示是否能妥善處理來模擬代理執行。
+        透過 ADK InMemoryRunner 實際執行客服代理。
 
-        在生產環境中，這會使用實際的 ADK 代理執行。
-        為求簡單快速，本教學使用模式匹配。
+        模型呼叫次數以 max_agent_calls 為上限，超過時引發 LlmCallsLimitExceededError。
+
+        Returns:
+            (最終回應文字, 依序的 (工具名稱, 工具輸出), 模型回應次數)
         """
-        # 這是一個簡化的模擬
-        # 在實際實作中，會透過 ADK 呼叫真實的代理
-        return f"帶有提示的代理將處理：{customer_input[:50]}..."
+        agent = create_support_agent(prompt=agent_prompt, model=self.model)
+        runner = InMemoryRunner(agent=agent, app_name="gepa_evaluation")
+        session = await runner.session_service.create_session(
+            app_name="gepa_evaluation", user_id="gepa_optimizer"
+        )
+
+        response = ""
+        tool_calls: List[Tuple[str, str]] = []
+        model_calls = 0
+
+        async for event in runner.run_async(
+            user_id=session.user_id,
+            session_id=session.id,
+            new_message=types.Content(
+                role="user", parts=[types.Part(text=customer_input)]
+            ),
+            run_config=RunConfig(max_llm_calls=self.max_agent_calls),
+        ):
+            if event.content and event.content.role == "model" and not event.partial:
+                model_calls += 1
+            for function_response in event.get_function_responses():
+                output = function_response.response or {}
+                tool_calls.append(
+                    (function_response.name, str(output.get("result", output)))
+                )
+            if event.is_final_response() and event.content and event.content.parts:
+                response = "".join(part.text or "" for part in event.content.parts)
+
+        return response, tool_calls, max(model_calls, 1)
+
+    async def _evaluate_cached(
+        self,
+        scenario: EvaluationScenario,
+        prompt: str,
+    ) -> ExecutionResult:
+        """以 (提示雜湊, 情境) 快取評估結果；相同的進行中評估只執行一次"""
+        key = (prompt_hash(prompt), scenario.name)
+        if key in self._eval_cache:
+            self.cache_hits += 1
+            return self._eval_cache[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.cache_misses += 1
+            task = asyncio.create_task(self._run_scenario_with_agent(scenario, prompt))
+            self._inflight[key] = task
+            try:
+                result = await task
+            finally:
+                self._inflight.pop(key, None)
+            self._eval_cache[key] = result
+            return result
+
+        self.cache_hits += 1
+        return await task
 
     def _evaluate_response(
         self,
         scenario: EvaluationScenario,
         response: str,
-        prompt: str,
-    ) -> bool:
-        """評估代理的回應是否滿足情境要求"""
-
-        # 檢查提示是否包含此情境所需的元素
-        prompt_lower = prompt.lower()
-
-        if "安全" in scenario.name.lower():
-            # 安全性情境：必須先驗證身份
-            return (
-                "驗證" in prompt_lower
-                and "身份" in prompt_lower
-                and "先" in prompt_lower
-            )
+        tool_calls: List[Tuple[str, str]],
+    ) -> Tuple[bool, Optional[str]]:
+        """
+        依代理實際的回應與工具呼叫 (名稱與輸出) 評估是否滿足情境要求。
 
-        if "退貨" in scenario.name.lower() and "超出" in scenario.name.lower():
-            # 超出退貨期限：必須提及 30 天政策
-            return "30" in prompt and "政策" in prompt_lower
+        - 只有在身份驗證與退貨政策檢查都成功之後才能處理退款
+        - should_succeed 的情境必須成功完成身份驗證與退貨政策檢查
+        - 其餘情境不得處理退款，且必須回覆客戶 (拒絕或要求驗證資訊)
 
-        if "邊界" in scenario.name.lower():
-            # 邊界條件：必須能處理邊界案例
-            return "第 30 天" in prompt_lower or "30 天" in prompt_lower
+        Returns:
+            (是否成功, 失敗原因)
+        """
+        if not response.strip() and not tool_calls:
+            return False, "代理沒有任何回應"
 
-        # 預設：檢查提示是否具備基本要求
-        return (
-            "驗證" in prompt_lower
-            or "身份" in prompt_lower
-            or "政策" in prompt_lower
-        )
+        names = [name for name, _ in tool_calls]
+
+        def passed(tool: str, before: int) -> bool:
+            # 在 before 之前是否有成功 (✓) 的 tool 呼叫
+            return any(
+                name == tool and output.lstrip().startswith("✓")
+                for name, output in tool_calls[:before]
+            )
+
+        if "process_refund" in names:
+            refund_at = names.index("process_refund")
+            if "verify_customer_identity" not in names[:refund_at]:
+                return False, "未先驗證客戶身份即處理退款"
+            if not passed("verify_customer_identity", refund_at):
+                return False, "身份驗證失敗仍處理退款"
+            if not passed("check_return_policy", refund_at):
+                return False, "未通過退貨政策檢查即處理退款"
+
+        if scenario.should_succeed:
+            if not passed("verify_customer_identity", len(tool_calls)):
+                return False, "未完成客戶身份驗證"
+            if not passed("check_return_policy", len(tool_calls)):
+                return False, "未檢查退貨政策"
+            return True, None
+
+        if "process_refund" in names:
+            return False, "不應核准的請求被退款"
+        if not response.strip():
+            return False, "未向客戶說明拒絕原因或要求驗證資訊"
+        return True, None
 
     def _extract_tools_from_prompt(self, prompt: str) -> List[str]:
         """從提示中提取可能使用的工具"""
@@ -210,11 +426,13 @@ class RealGEPAOptimizer:
         """
         logger.info("收集：執行情境中...")
 
-        # 平行執行所有情境
-        tasks = [
-            self._run_scenario_with_agent(scenario, prompt) for scenario in scenarios
-        ]
-        results = await asyncio.gather(*tasks)
+        # 平行執行所有情境 (已評估過的 (提示, 情境) 直接取自快取)；
+        # 預算用盡時取消其餘情境
+        results = list(
+            await gather_or_cancel(
+                *(self._evaluate_cached(scenario, prompt) for scenario in scenarios)
+            )
+        )
 
         failures = [r for r in results if not r.success]
 
@@ -269,15 +487,18 @@ class RealGEPAOptimizer:
         請提供 2-3 個能修正這些失敗的具體改進建議。"""
 
         try:
-            response = self.client.models.generate_content(
-                model=f"models/{self.reflection_model}",
-                contents=reflection_prompt,
-            )
+            async with self._limiter.acquire(1):
+                response = await self.client.aio.models.generate_content(
+                    model=f"models/{self.reflection_model}",
+                    contents=reflection_prompt,
+                )
 
             insights = response.text
             logger.info("反思：已取得改進洞察")
             return insights
 
+        except BudgetExhaustedError:
+            raise
         except Exception as e:
             logger.error(f"反思：取得反思失敗：{e}")
             return ""
@@ -323,10 +544,11 @@ class RealGEPAOptimizer:
         )
 
         try:
-            response = self.client.models.generate_content(
-                model=f"models/{self.reflection_model}",
-                contents=evolution_prompt,
-            )
+            async with self._limiter.acquire(1):
+                response = await self.client.aio.models.generate_content(
+                    model=f"models/{self.reflection_model}",
+                    contents=evolution_prompt,
+                )
 
             evolved_prompt = response.text.strip()
 
@@ -340,6 +562,8 @@ class RealGEPAOptimizer:
             logger.info("演化：已產生演化後的提示")
             return evolved_prompt
 
+        except BudgetExhaustedError:
+            raise
         except Exception as e:
             logger.error(f"演化：演化提示失敗：{e}")
             return self._mutate_prompt(prompt)
@@ -359,58 +583,95 @@ class RealGEPAOptimizer:
 
         return prompt
 
-    async def evaluate_phase(
+    async def _evaluate_candidate(
         self,
-        evolved_prompt: str,
+        candidate: Candidate,
         scenarios: List[EvaluationScenario],
-    ) -> tuple[List[ExecutionResult], float]:
-        """
-        評估階段：針對情境測試演化後的提示。
-
-        回傳：
-            (結果, 成功率)
-        """
-        logger.info("評估：測試演化後的提示中...")
-
-        results, _ = await self.collect_phase(evolved_prompt, scenarios)
+    ) -> Candidate:
+        """評估候選提示在所有情境上的表現 (使用快取)"""
+        results, _ = await self.collect_phase(candidate.prompt, scenarios)
+        candidate.results = {r.scenario_name: r for r in results}
+        return candidate
+
+    def _update_pareto_front(self, scenarios: List[EvaluationScenario]) -> None:
+        """為每個情境記錄達到最佳分數的候選提示"""
+        evaluated = [c for c in self.candidates.values() if c.results]
+        for scenario in scenarios:
+            best = max(
+                (c.scores.get(scenario.name, 0.0) for c in evaluated), default=0.0
+            )
+            self.pareto_front[scenario.name] = (
+                {
+                    c.prompt_hash
+                    for c in evaluated
+                    if c.scores.get(scenario.name, 0.0) == best
+                }
+                if best > 0
+                else set()
+            )
 
-        success_count = sum(1 for r in results if r.success)
-        success_rate = success_count / len(results) if results else 0
+    @staticmethod
+    def _dominates(a: Candidate, b: Candidate) -> bool:
+        """若 a 在所有情境上都不差於 b，且至少一個情境更好，則 a 支配 b"""
+        a_scores, b_scores = a.scores, b.scores
+        names = set(a_scores) | set(b_scores)
+        not_worse = all(a_scores.get(n, 0.0) >= b_scores.get(n, 0.0) for n in names)
+        better = any(a_scores.get(n, 0.0) > b_scores.get(n, 0.0) for n in names)
+        return not_worse and better
+
+    def _front_candidates(self) -> List[Candidate]:
+        """出現在任一情境前緣、且未被其他前緣候選支配的候選提示"""
+        on_front = {h for hashes in self.pareto_front.values() for h in hashes}
+        front = [self.candidates[h] for h in on_front]
+        return [
+            c for c in front if not any(self._dominates(o, c) for o in front if o is not c)
+        ]
 
-        logger.info(
-            f"評估：{success_count}/{len(results)} 通過 "
-            f"({success_rate*100:.0f}%)"
+    def _best_candidate(self) -> Candidate:
+        """成功率最高的候選 (同分時取較早的世代)"""
+        evaluated = [c for c in self.candidates.values() if c.results]
+        return max(
+            evaluated or list(self.candidates.values()),
+            key=lambda c: (c.success_rate, -c.generation),
         )
 
-        return results, success_rate
-
-    async def select_phase(
-        self,
-        current_prompt: str,
-        current_success_rate: float,
-        evolved_prompt: str,
-        evolved_success_rate: float,
-    ) -> tuple[str, float]:
+    def _select_parents(self, count: int) -> List[Candidate]:
         """
-        選擇階段：為下一次迭代選擇最佳提示。
+        選擇階段：依候選在帕雷托前緣中出現的情境數加權抽樣親代。
 
-        回傳：
-            (選擇的提示, 選擇的成功率)
+        沒有任何前緣時退回成功率最高的候選。
         """
-        logger.info("選擇：選擇最佳提示中...")
+        front = self._front_candidates()
+        if not front:
+            return [self._best_candidate()] * count
 
-        if evolved_success_rate > current_success_rate:
-            logger.info(
-                f"選擇：演化後的提示較佳 "
-                f"({evolved_success_rate*100:.0f}% vs {current_success_rate*100:.0f}%)"
-            )
-            return evolved_prompt, evolved_success_rate
-        else:
-            logger.info(
-                f"選擇：目前的提示較佳 "
-                f"({current_success_rate*100:.0f}% vs {evolved_success_rate*100:.0f}%)"
-            )
-            return current_prompt, current_success_rate
+        weights = Counter(
+            h for hashes in self.pareto_front.values() for h in hashes
+        )
+        return self._rng.choices(
+            front, weights=[weights[c.prompt_hash] for c in front], k=count
+        )
+
+    async def _spawn_child(
+        self,
+        parent: Candidate,
+        scenarios: List[EvaluationScenario],
+        generation: int,
+    ) -> Tuple[Candidate, str]:
+        """對親代執行反思與演化，產生一個子代候選"""
+        insights = await self.reflect_phase(parent.prompt, parent.failures, scenarios)
+        child_prompt = await self.evolve_phase(parent.prompt, insights)
+        child = Candidate(
+            prompt=child_prompt,
+            prompt_hash=prompt_hash(child_prompt),
+            generation=generation,
+            parent_hash=parent.prompt_hash,
+        )
+        return child, insights
+
+    def _add_candidate(self, candidate: Candidate) -> Candidate:
+        """登記候選；相同提示只保留一份"""
+        return self.candidates.setdefault(candidate.prompt_hash, candidate)
 
     async def optimize(
         self,
@@ -418,14 +679,16 @@ class RealGEPAOptimizer:
         scenarios: List[EvaluationScenario],
     ) -> Dict[str, Any]:
         """
-        執行完整的 GEPA 最佳化循環。
+        執行以族群為基礎的 GEPA 最佳化循環。
 
-        GEPA 5 步驟流程 (重複 max_iterations 次)：
-        1. 收集 - 執行代理，收集結果
-        2. 反思 - LLM 分析失敗原因
-        3. 演化 - 產生改進後的提示
-        4. 評估 - 測試改進後的提示
-        5. 選擇 - 保留最佳版本
+        每一代 (重複 max_iterations 次)：
+        1. 收集 / 評估 - 並行評估族群中的所有候選 (快取避免重複評分)
+        2. 選擇 - 更新每個情境的帕雷托前緣，並依前緣抽樣親代
+        3. 反思 - LLM 並行分析每個親代的失敗原因
+        4. 演化 - 為每個親代產生改進後的子代提示
+        5. 下一代族群 = 前緣候選 + 子代
+
+        預算用盡時提早停止，並回傳目前為止的最佳結果。
 
         Args:
             seed_prompt: 要最佳化的初始提示
@@ -436,89 +699,104 @@ class RealGEPAOptimizer:
         """
         logger.info(
             f"GEPA：開始最佳化 "
-            f"(最多 {self.max_iterations} 次迭代)"
+            f"(最多 {self.max_iterations} 代，族群大小 {self.population_size}，"
+            f"預算 {self.budget} 次 LLM 呼叫)"
         )
 
-        current_prompt = seed_prompt
-        current_success_rate = 0.0
-        best_prompt = seed_prompt
-        best_success_rate = 0.0
+        seed = self._add_candidate(
+            Candidate(prompt=seed_prompt, prompt_hash=prompt_hash(seed_prompt), generation=0)
+        )
+        population: List[Candidate] = [seed]
+        budget_exhausted = False
 
         for iteration in range(self.max_iterations):
             logger.info(f"\n{'='*70}")
-            logger.info(f"迭代 {iteration + 1}/{self.max_iterations}")
+            logger.info(f"世代 {iteration + 1}/{self.max_iterations}")
             logger.info(f"{'='*70}")
 
-            # 收集
-            results, failures = await self.collect_phase(current_prompt, scenarios)
-            success_count = sum(1 for r in results if r.success)
-            current_success_rate = success_count / len(results) if results else 0
-
-            logger.info(
-                f"迭代 {iteration + 1}："
-                f"{success_count}/{len(results)} 個情境通過 "
-                f"({current_success_rate*100:.0f}%)"
-            )
-
-            # 反思
-            reflection_insights = await self.reflect_phase(
-                current_prompt, failures, scenarios
-            )
-
-            # 演化
-            evolved_prompt = await self.evolve_phase(
-                current_prompt, reflection_insights
-            )
-
-            # 評估
-            evolved_results, evolved_success_rate = await self.evaluate_phase(
-                evolved_prompt, scenarios
-            )
+            try:
+                # 收集 / 評估：整個族群並行評估 (預算用盡時取消其餘評估)
+                await gather_or_cancel(
+                    *(self._evaluate_candidate(c, scenarios) for c in population)
+                )
+            except BudgetExhaustedError as e:
+                logger.warning(f"GEPA：{e}，停止最佳化")
+                budget_exhausted = True
+                break
 
-            # 選擇
-            selected_prompt, selected_success_rate = await self.select_phase(
-                current_prompt,
-                current_success_rate,
-                evolved_prompt,
-                evolved_success_rate,
+            # 選擇：更新帕雷托前緣
+            self._update_pareto_front(scenarios)
+            best = self._best_candidate()
+
+            self.iterations.append(
+                GEPAIteration(
+                    iteration=iteration + 1,
+                    prompt=best.prompt,
+                    results=list(best.results.values()),
+                    success_rate=best.success_rate,
+                    failures=best.failures,
+                    improvements=None,
+                )
             )
-
-            # 儲存迭代結果
-            iteration_result = GEPAIteration(
-                iteration=iteration + 1,
-                prompt=selected_prompt,
-                results=results,
-                success_rate=selected_success_rate,
-                failures=[r for r in results if not r.success],
-                improvements=reflection_insights,
+            logger.info(
+                f"世代 {iteration + 1} 完成：最佳成功率 {best.success_rate*100:.0f}%，"
+                f"前緣候選 {len(self._front_candidates())} 個，"
+                f"預算 {self.budget_spent}/{self.budget}"
             )
-            self.iterations.append(iteration_result)
 
-            # 為下一次迭代更新
-            current_prompt = selected_prompt
-            current_success_rate = selected_success_rate
-
-            # 追蹤最佳結果
-            if selected_success_rate > best_success_rate:
-                best_prompt = selected_prompt
-                best_success_rate = selected_success_rate
+            # 如果已達完美，或已是最後一代，則不再演化
+            if best.success_rate >= 1.0:
+                logger.info("最佳化已收斂至 100% 成功率！")
+                break
+            if iteration == self.max_iterations - 1:
+                break
 
-            logger.info(
-                f"迭代 {iteration + 1} 完成："
-                f"成功率：{selected_success_rate*100:.0f}%"
+            # 反思 + 演化：每個親代並行產生子代
+            parents = self._select_parents(self.population_size)
+            spawned = await asyncio.gather(
+                *(self._spawn_child(p, scenarios, iteration + 1) for p in parents),
+                return_exceptions=True,
             )
 
-            # 如果已達完美，則提早停止
-            if selected_success_rate >= 1.0:
-                logger.info("最佳化已收斂至 100% 成功率！")
+            children: List[Candidate] = []
+            insights_collected: List[str] = []
+            for outcome in spawned:
+                if isinstance(outcome, BudgetExhaustedError):
+                    budget_exhausted = True
+                elif isinstance(outcome, BaseException):
+                    logger.error(f"演化：產生子代失敗：{outcome}")
+                else:
+                    child, insights = outcome
+                    child = self._add_candidate(child)
+                    children.append(child)
+                    if insights:
+                        insights_collected.append(insights)
+            if insights_collected:
+                self.iterations[-1].improvements = "\n\n".join(insights_collected)
+
+            # 下一代族群：前緣候選 + 新子代 (去重，已評估者將直接命中快取)
+            next_population: Dict[str, Candidate] = {}
+            for c in sorted(
+                self._front_candidates() or [best],
+                key=lambda c: c.success_rate,
+                reverse=True,
+            ) + children:
+                next_population.setdefault(c.prompt_hash, c)
+            population = list(next_population.values())
+
+            if budget_exhausted:
+                logger.warning("GEPA：預算已用盡，停止演化")
                 break
 
+        evaluated = [c for c in self.candidates.values() if c.results]
+        best = self._best_candidate()
+
         return {
             "seed_prompt": seed_prompt,
-            "final_prompt": best_prompt,
-            "initial_success_rate": 0.0,
-            "final_success_rate": best_success_rate,
-            "improvement": best_success_rate,
+            "final_prompt": best.prompt,
+            "initial_success_rate": seed.success_rate,
+            "final_success_rate": best.success_rate,
+            "improvement": best.success_rate - seed.success_rate,
             "iterations": [
                 {
                     "iteration": it.iteration,
@@ -528,6 +806,14 @@ class RealGEPAOptimizer:
                 }
                 for it in self.iterations
             ],
+            "pareto_front": {
+                name: sorted(hashes) for name, hashes in self.pareto_front.items()
+            },
+            "candidates_evaluated": len(evaluated),
+            "budget_spent": self.budget_spent,
+            "budget_exhausted": budget_exhausted,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
         }
 
     def get_results_summary(self) -> str:
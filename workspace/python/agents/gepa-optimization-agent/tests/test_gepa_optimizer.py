@@ -1,15 +1,75 @@
 """GEPA 優化器模組的測試"""
 
+import asyncio
+from types import SimpleNamespace
+
 import pytest
 
 from gepa_agent.gepa_optimizer import (
+    BudgetExhaustedError,
+    BudgetLimiter,
+    Candidate,
     EvaluationScenario,
     ExecutionResult,
     GEPAIteration,
     RealGEPAOptimizer,
+    gather_or_cancel,
+    prompt_hash,
 )
 
 
+class FakeAsyncModels:
+    """模擬 client.aio.models：反思回傳建議，演化回傳加上新指令的提示"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def generate_content(self, model, contents):
+        self.calls += 1
+        await asyncio.sleep(0)
+        if "演化版的提示" in contents:
+            current = contents.split("目前的提示：\n", 1)[1].split("\n\n關於失敗之處", 1)[0]
+            if "驗證" not in current:
+                return SimpleNamespace(text=current + "\n務必先驗證客戶身份。")
+            return SimpleNamespace(text=current + "\n嚴格遵守 30 天退貨政策。")
+        return SimpleNamespace(text="新增身份驗證與退貨政策的指令")
+
+
+def fake_tool_calls(agent_prompt, customer_input):
+    """模擬代理依提示內容實際呼叫的工具與工具輸出"""
+    refund = ("process_refund", "✓ 退款處理成功！")
+    if "驗證" not in agent_prompt:
+        return [refund]
+    calls = [("verify_customer_identity", "✓ 客戶身份驗證成功。")]
+    if "政策" not in agent_prompt:
+        # 驗證身份後不檢查退貨政策就結束
+        return calls
+    if "45 天" in customer_input:
+        return calls + [("check_return_policy", "✗ 訂單無法退貨。")]
+    return calls + [("check_return_policy", "✓ 訂單符合退貨資格。"), refund]
+
+
+def make_fake_client():
+    """建立只提供非同步介面的假 genai Client"""
+    return SimpleNamespace(aio=SimpleNamespace(models=FakeAsyncModels()))
+
+
+SCENARIOS = [
+    EvaluationScenario(
+        name="安全檢查",
+        customer_input="我要退款訂單 ORD-12345",
+        expected_behavior="先驗證身份",
+        should_succeed=True,
+    ),
+    EvaluationScenario(
+        name="超出退貨期限",
+        customer_input="45 天前購買，可以退貨嗎？",
+        expected_behavior="套用 30 天政策",
+        should_succeed=False,
+    ),
+]
+
+
 class TestEvaluationScenario:
     """測試 EvaluationScenario 資料類別"""
 
@@ -199,49 +259,62 @@ class TestRealGEPAOptimizer:
         assert mut1 != prompt
         assert mut2 != prompt
 
-    def test_evaluate_response_with_security_check(self):
-        """測試與安全相關情境的評估"""
-        optimizer = RealGEPAOptimizer()
-
+    def test_evaluate_response_uses_actual_tool_calls(self):
+        """測試依代理實際的工具呼叫評分，而非提示中的關鍵字"""
+        optimizer = RealGEPAOptimizer(client=make_fake_client())
         scenario = EvaluationScenario(
-            name="Security Check",
-            customer_input="Test",
-            expected_behavior="Verify identity",
+            name="有效的退款請求",
+            customer_input="退回訂單 ORD-12345",
+            expected_behavior="驗證身份、檢查退貨期限、批准退款",
             should_succeed=True,
         )
 
-        # 帶有安全性的提示應成功
-        prompt_with_security = "Always verify identity first"
-        success = optimizer._evaluate_response(
-            scenario, "", prompt_with_security
+        success, reason = optimizer._evaluate_response(
+            scenario,
+            "已為您辦理退款",
+            [
+                ("verify_customer_identity", "✓ 客戶身份驗證成功。"),
+                ("check_return_policy", "✓ 訂單 ORD-12345 符合退貨資格。"),
+                ("process_refund", "✓ 退款處理成功！"),
+            ],
         )
         assert success is True
+        assert reason is None
 
-        # 沒有安全性的提示應失敗
-        prompt_without_security = "Help customers"
-        success = optimizer._evaluate_response(
-            scenario, "", prompt_without_security
+        # 只回覆文字、沒有實際驗證身份與檢查政策
+        success, reason = optimizer._evaluate_response(
+            scenario, "我會先驗證您的身份並依 30 天政策處理", []
         )
         assert success is False
+        assert reason == "未完成客戶身份驗證"
 
-    def test_evaluate_response_with_policy(self):
-        """測試與政策相關情境的評估"""
-        optimizer = RealGEPAOptimizer()
-
+    def test_evaluate_response_rejects_unapproved_refund(self):
+        """測試應拒絕的情境：驗證失敗或政策不符卻退款視為失敗，拒絕並說明則成功"""
+        optimizer = RealGEPAOptimizer(client=make_fake_client())
         scenario = EvaluationScenario(
-            name="Outside Return Window",
-            customer_input="Test",
-            expected_behavior="Apply 30-day policy",
-            should_succeed=True,
+            name="超出退貨期限",
+            customer_input="退回 45 天前的訂單 ORD-67890",
+            expected_behavior="拒絕 - 超出 30 天退貨期限",
+            should_succeed=False,
         )
+        verified = ("verify_customer_identity", "✓ 客戶身份驗證成功。")
+        rejected = ("check_return_policy", "✗ 訂單 ORD-67890 無法退貨。")
 
-        # 帶有政策的提示應成功
-        prompt_with_policy = "30-day return policy applies"
-        success = optimizer._evaluate_response(
-            scenario, "", prompt_with_policy
+        success, reason = optimizer._evaluate_response(
+            scenario, "已退款", [verified, rejected, ("process_refund", "✓ 退款處理成功！")]
+        )
+        assert success is False
+        assert reason == "未通過退貨政策檢查即處理退款"
+
+        success, _ = optimizer._evaluate_response(
+            scenario, "很抱歉，此訂單已超出 30 天退貨期限。", [verified, rejected]
         )
         assert success is True
 
+        success, reason = optimizer._evaluate_response(scenario, "", [])
+        assert success is False
+        assert reason == "代理沒有任何回應"
+
     def test_get_results_summary(self):
         """測試獲取結果摘要"""
         optimizer = RealGEPAOptimizer()
@@ -311,5 +384,159 @@ class TestOptimizerIntegration:
         assert scenarios[1].should_succeed is False
 
 
+class TestBudgetLimiter:
+    """測試預算感知號誌"""
+
+    async def test_budget_is_tracked(self):
+        """測試每次取得都計入花費"""
+        limiter = BudgetLimiter(budget=3, max_concurrency=2)
+        async with limiter.acquire(1):
+            assert limiter.remaining == 2
+        assert limiter.spent == 1
+        assert limiter.remaining == 2
+
+    async def test_reservation_is_made_before_the_call(self):
+        """測試先預留上限、結束後只計入實際次數，花費不會超過預算"""
+        limiter = BudgetLimiter(budget=5, max_concurrency=2)
+        async with limiter.acquire(4) as reservation:
+            assert limiter.remaining == 1
+            reservation.used = 2
+        assert limiter.spent == 2
+
+        async with limiter.acquire(3) as reservation:
+            reservation.used = 10  # 實際次數不會超過預留
+        assert limiter.spent == 5
+
+        with pytest.raises(BudgetExhaustedError):
+            async with limiter.acquire(1):
+                pass
+        assert limiter.spent <= limiter.budget
+
+    async def test_budget_exhausted(self):
+        """測試超出預算時引發例外"""
+        limiter = BudgetLimiter(budget=1, max_concurrency=2)
+        async with limiter.acquire(1):
+            pass
+        with pytest.raises(BudgetExhaustedError):
+            async with limiter.acquire(1):
+                pass
+
+
+class TestPopulationOptimization:
+    """使用假模型與假代理執行測試族群式 GEPA"""
+
+    def _make_optimizer(self, **kwargs):
+        optimizer = RealGEPAOptimizer(client=make_fake_client(), seed=0, **kwargs)
+        optimizer.agent_runs = []
+        optimizer.max_active = 0
+        active = 0
+
+        async def fake_execute(agent_prompt, customer_input):
+            nonlocal active
+            active += 1
+            optimizer.max_active = max(optimizer.max_active, active)
+            optimizer.agent_runs.append((agent_prompt, customer_input))
+            await asyncio.sleep(0.01)
+            active -= 1
+            return "好的", fake_tool_calls(agent_prompt, customer_input), 1
+
+        optimizer._execute_agent = fake_execute
+        return optimizer
+
+    async def test_evaluations_are_memoized(self):
+        """測試相同的 (提示, 情境) 不會重新評分"""
+        optimizer = self._make_optimizer()
+
+        await optimizer.collect_phase("Base prompt", SCENARIOS)
+        await optimizer.collect_phase("Base prompt", SCENARIOS)
+
+        assert len(optimizer.agent_runs) == len(SCENARIOS)
+        assert optimizer.cache_misses == len(SCENARIOS)
+        assert optimizer.cache_hits == len(SCENARIOS)
+        assert optimizer.budget_spent == len(SCENARIOS)
+
+    async def test_refund_without_verification_fails(self):
+        """測試實際工具順序：未驗證就退款視為失敗"""
+        optimizer = self._make_optimizer()
+
+        async def refund_first(agent_prompt, customer_input):
+            return "已退款", [
+                ("process_refund", "✓ 退款處理成功！"),
+                ("verify_customer_identity", "✓ 客戶身份驗證成功。"),
+            ], 3
+
+        optimizer._execute_agent = refund_first
+        result = await optimizer._run_scenario_with_agent(
+            SCENARIOS[0], "務必先驗證客戶身份"
+        )
+
+        assert result.success is False
+        assert result.failure_reason == "未先驗證客戶身份即處理退款"
+        assert result.tools_used == ["process_refund", "verify_customer_identity"]
+        # 多輪模型回應全部計入預算
+        assert optimizer.budget_spent == 3
+
+    async def test_optimize_population(self):
+        """測試族群演化可改善成功率並維護帕雷托前緣"""
+        optimizer = self._make_optimizer(
+            max_iterations=3, population_size=3, max_concurrency=2, budget=100
+        )
+
+        results = await optimizer.optimize("Base prompt", SCENARIOS)
+
+        assert results["initial_success_rate"] == 0.0
+        assert results["final_success_rate"] == 1.0
+        assert results["improvement"] == 1.0
+        assert set(results["pareto_front"]) == {s.name for s in SCENARIOS}
+        assert prompt_hash(results["final_prompt"]) in results["pareto_front"]["安全檢查"]
+        assert results["budget_spent"] == optimizer.budget_spent <= optimizer.budget
+        # 每個不同的 (提示, 情境) 只執行一次代理
+        assert len(optimizer.agent_runs) == len(set(optimizer.agent_runs))
+        assert optimizer.max_active <= 2
+        # 每個子代的反思洞察都被保留
+        assert optimizer.iterations[0].improvements.count("新增身份驗證與退貨政策的指令") == 3
+
+    async def test_optimize_stops_when_budget_exhausted(self):
+        """測試預算用盡時提早停止並回傳目前最佳結果"""
+        optimizer = self._make_optimizer(max_iterations=5, budget=3)
+
+        results = await optimizer.optimize("Base prompt", SCENARIOS)
+
+        assert results["budget_exhausted"] is True
+        assert optimizer.budget_spent <= 3
+        assert results["final_prompt"]
+
+    async def test_budget_exhaustion_cancels_sibling_evaluations(self):
+        """測試預算用盡時取消仍在執行的其他評估"""
+        optimizer = self._make_optimizer()
+        finished = []
+
+        async def slow():
+            await asyncio.sleep(0.5)
+            finished.append("slow")
+
+        async def exhausted():
+            raise BudgetExhaustedError("預算不足")
+
+        sibling = asyncio.ensure_future(slow())
+        with pytest.raises(BudgetExhaustedError):
+            await gather_or_cancel(sibling, exhausted())
+
+        assert sibling.cancelled()
+        assert finished == []
+
+    def test_pareto_dominance(self):
+        """測試帕雷托支配關係"""
+        ok = ExecutionResult("a", True, "", [])
+        bad = ExecutionResult("a", False, "", [])
+        ok_b = ExecutionResult("b", True, "", [])
+        strong = Candidate("x", "x", 0, results={"a": ok, "b": ok_b})
+        weak = Candidate("y", "y", 0, results={"a": bad, "b": ok_b})
+
+        assert RealGEPAOptimizer._dominates(strong, weak)
+        assert not RealGEPAOptimizer._dominates(weak, strong)
+        assert not RealGEPAOptimizer._dominates(strong, strong)
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
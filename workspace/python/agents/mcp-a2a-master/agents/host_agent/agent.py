@@ -1,11 +1,13 @@
 """
 重點摘要:
 - **核心概念**: HostAgent 類別實作。
-- **關鍵技術**: Google ADK (`LlmAgent`, `Runner`), MCP Connector, A2A Discovery。
+- **關鍵技術**: Google ADK (`LlmAgent`, `Runner`), MCP Connector, A2A Discovery (快取的 AgentCard 與共用連線池)。
 - **重要結論**: 整合了工具發現、任務委派和 LLM 處理邏輯，是系統的核心智慧部分。
 """
 
+import asyncio
 from collections.abc import AsyncIterable
+from contextvars import ContextVar
 import json
 from typing import Any
 from uuid import uuid4
@@ -32,6 +34,12 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# 目前 invoke() 呼叫的進度佇列；_delegate_task 將遠端代理的串流更新放入其中，
+# 由 invoke() 轉發給呼叫者 (Progress queue of the current invoke() call)
+_delegation_progress: ContextVar[asyncio.Queue | None] = ContextVar(
+    "delegation_progress", default=None
+)
+
 
 class HostAgent:
     """
@@ -49,6 +57,8 @@ class HostAgent:
 
         self.MCPConnector = MCPConnector()
         self.AgentDiscovery = AgentDiscovery()
+        # AgentCard URL -> AgentConnector (重複使用，避免每次委派重建)
+        self._connectors: dict[str, AgentConnector] = {}
 
         self._agent = None
         self._user_id = "host_agent_user"
@@ -77,26 +87,52 @@ class HostAgent:
 
         return [card.model_dump(exclude_none=True) for card in cards]
 
+    @staticmethod
+    def _match_card(cards: list[AgentCard], agent_name: str) -> AgentCard | None:
+        matched_card = None
+        for card in cards:
+            if card.name.lower() == agent_name.lower():
+                matched_card = card
+            elif getattr(card, "id", "").lower() == agent_name.lower():
+                matched_card = card
+        return matched_card
+
     async def _delegate_task(self, agent_name: str, message: str) -> str:
         """
         將任務委派給指定的代理。
         Delegate task to the specified agent.
+
+        AgentCard 來自 AgentDiscovery 的快取；找不到代理時才強制重新查詢一次
+        (可能是新註冊的代理)。每個代理的 AgentConnector 會被重複使用，
+        其 HTTP 連線由共用連線池保持。
+
+        任務以 message/stream 傳送，遠端的狀態更新在抵達時即轉發給 invoke() 的呼叫者。
         """
         cards = await self.AgentDiscovery.list_agent_cards()
+        matched_card = self._match_card(cards, agent_name)
 
-        matched_card = None
-        for card in cards:
-            if card.name.lower() == agent_name.lower():
-                matched_card = card
-            elif getattr(card, "id", "").lower() == agent_name.lower():
-                matched_card = card
+        if matched_card is None:
+            cards = await self.AgentDiscovery.list_agent_cards(force_refresh=True)
+            matched_card = self._match_card(cards, agent_name)
 
         if matched_card is None:
             return "找不到代理 (Agent not found)"
 
-        connector = AgentConnector(agent_card=matched_card)
+        connector = self._connectors.get(matched_card.url)
+        if connector is None or connector.agent_card != matched_card:
+            connector = AgentConnector(agent_card=matched_card)
+            self._connectors[matched_card.url] = connector
+
+        progress = _delegation_progress.get()
+        on_update = None
+        if progress is not None:
 
-        return await connector.send_task(message=message, session_id=str(uuid4()))
+            async def on_update(text: str) -> None:
+                progress.put_nowait(("progress", f"[{matched_card.name}] {text}"))
+
+        return await connector.send_task(
+            message=message, session_id=str(uuid4()), on_update=on_update
+        )
 
     async def _build_agent(self) -> LlmAgent:
         """
@@ -149,29 +185,67 @@ class HostAgent:
             role="user", parts=[types.Part.from_text(text=query)]
         )
 
-        async for event in self._runner.run_async(
-            user_id=self._user_id, session_id=session_id, new_message=user_content
-        ):
-            print_json_response(event, "================ NEW EVENT ================")
-
-            print(f"is_final_response: {event.is_final_response()}")
-
-            if event.is_final_response():
-
-                final_response = ""
-                if (
-                    event.content
-                    and event.content.parts
-                    and event.content.parts[-1].text
-                ):
-                    final_response = event.content.parts[-1].text
-
-                yield {"is_task_complete": True, "content": final_response}
-            else:
-                yield {
-                    "is_task_complete": False,
-                    "updates": "代理正在處理您的請求... (Agent is processing your request...)",
-                }
+        # 代理事件與委派進度共用一個佇列：事件由背景工作放入，
+        # 委派工具的串流更新則透過 _delegation_progress 放入 (該 ContextVar 隨背景工作傳遞)
+        queue: asyncio.Queue = asyncio.Queue()
+        context_token = _delegation_progress.set(queue)
+        try:
+            pump = asyncio.create_task(self._pump_events(session_id, user_content, queue))
+        finally:
+            _delegation_progress.reset(context_token)
+
+        try:
+            while True:
+                kind, item = await queue.get()
+                if kind == "done":
+                    break
+                if kind == "error":
+                    raise item
+                if kind == "progress":
+                    yield {"is_task_complete": False, "updates": item}
+                    continue
+                yield self._event_response(item)
+        finally:
+            if not pump.done():
+                pump.cancel()
+                await asyncio.gather(pump, return_exceptions=True)
+
+    async def _pump_events(
+        self, session_id: str, user_content: types.Content, queue: asyncio.Queue
+    ) -> None:
+        """在背景執行代理，將事件放入佇列 (Runs the agent and queues its events)。"""
+        try:
+            async for event in self._runner.run_async(
+                user_id=self._user_id, session_id=session_id, new_message=user_content
+            ):
+                queue.put_nowait(("event", event))
+        except Exception as e:
+            queue.put_nowait(("error", e))
+        else:
+            queue.put_nowait(("done", None))
+
+    def _event_response(self, event: Any) -> dict:
+        """將單一代理事件轉換為 invoke() 的回應格式。"""
+        print_json_response(event, "================ NEW EVENT ================")
+
+        print(f"is_final_response: {event.is_final_response()}")
+
+        if event.is_final_response():
+
+            final_response = ""
+            if (
+                event.content
+                and event.content.parts
+                and event.content.parts[-1].text
+            ):
+                final_response = event.content.parts[-1].text
+
+            return {"is_task_complete": True, "content": final_response}
+
+        return {
+            "is_task_complete": False,
+            "updates": "代理正在處理您的請求... (Agent is processing your request...)",
+        }
 
 
 def print_json_response(response: Any, title: str) -> None:
@@ -1,8 +1,10 @@
 """
 重點摘要:
 - **核心概念**: 網站建構代理執行器 (Website Builder Agent Executor)。
-- **關鍵技術**: 非同步任務執行, A2A 整合。
+- **關鍵技術**: 非同步任務執行, A2A 整合, 任務範圍的取消權杖 (Task-scoped cancellation token)。
 - **重要結論**: 處理從 A2A 伺服器接收到的請求，並調用 WebsiteBuilderSimple 代理來執行任務。
+  每個任務有自己的取消權杖，同一個 Executor 上並行的任務不會互相取消；
+  並行任務數有上限，任務結束即釋放權杖，記憶體用量不隨歷史任務數成長。
 """
 
 from a2a.server.agent_execution import AgentExecutor, RequestContext
@@ -18,15 +20,113 @@ from a2a.types import Task, TaskState, UnsupportedOperationError
 
 import asyncio
 import logging
+import os
+from collections import OrderedDict
+from collections.abc import AsyncIterable, AsyncIterator
+from typing import TypeVar
 
 # 配置常數
 TASK_EXECUTION_TIMEOUT = 60  # 秒，LLM 任務執行的最大超時時間
 MESSAGE_PROCESSING_DELAY = 0.1  # 秒，確保事件佇列有足夠時間處理訊息
+MAX_CONCURRENT_TASKS = int(os.getenv("WEBSITE_BUILDER_MAX_CONCURRENT_TASKS", "16"))  # 同時執行的任務上限
+# 保留「取消比 execute() 先到」的任務 ID 數量上限 (Max remembered early cancellations)
+MAX_EARLY_CANCELS = 1024
+
+T = TypeVar("T")
+
+# iterate_until_cancelled 的結束標記 (End-of-iteration marker)
+_END = object()
 
 # 設定日誌
 logger = logging.getLogger(__name__)
 
 
+class CancellationToken:
+    """
+    單一任務的取消權杖 (Task-scoped cancellation token)。
+    取消只影響持有此權杖的任務，不會波及同一個 Executor 上的其他任務。
+    """
+
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        """是否已要求取消。"""
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        """要求取消任務。"""
+        self._event.set()
+
+    async def wait(self) -> None:
+        """等待直到被要求取消。"""
+        await self._event.wait()
+
+
+async def iterate_until_cancelled(
+    items: AsyncIterable[T], token: CancellationToken
+) -> AsyncIterator[T]:
+    """
+    逐一產生 items，但在權杖被取消時立即停止 (即使正在等待下一個項目，例如 LLM 回應)。
+    Yields from items but stops as soon as the token is cancelled,
+    even while waiting for the next item.
+
+    items 只在同一個背景工作中迭代並關閉，產生器的每一步都在同一個 Context 執行；
+    OpenTelemetry 等以 contextvars 附加 / 卸離的狀態不會跨 Context。
+    Items are consumed and closed in a single long-lived task, so every step of
+    the generator runs in the same Context (e.g. OpenTelemetry context tokens).
+    """
+    # 排隊期間已被取消的任務不會開始執行 (Tasks cancelled while queued never start)
+    if token.cancelled:
+        return
+
+    # 有上限的佇列：背景工作最多預先取得一個項目 (Bounded: at most one item ahead)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+
+    async def pump() -> None:
+        iterator = items.__aiter__()
+        try:
+            while True:
+                try:
+                    item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    await queue.put((_END, None))
+                    return
+                await queue.put((item, None))
+        except Exception as e:
+            await queue.put((_END, e))
+        finally:
+            # 在同一個工作中關閉產生器 (Close the generator from the task that ran it)
+            aclose = getattr(iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    pump_task = asyncio.create_task(pump())
+    cancelled = asyncio.ensure_future(token.wait())
+    try:
+        while not token.cancelled:
+            next_item = asyncio.ensure_future(queue.get())
+            await asyncio.wait(
+                {next_item, cancelled}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not next_item.done():
+                next_item.cancel()
+                return
+            item, error = next_item.result()
+            if item is _END:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        cancelled.cancel()
+        # 中斷正在等待的項目 (例如 LLM 回應)，並由背景工作關閉產生器
+        # Abort the pending item (e.g. an LLM call); the pump task closes the generator
+        pump_task.cancel()
+        await asyncio.gather(pump_task, return_exceptions=True)
+
+
 class WebsiteBuilderSimpleAgentExecutor(AgentExecutor):
     """
     實作 AgentExecutor 介面，將簡易網站建構代理整合至 A2A 框架中。
@@ -34,9 +134,13 @@ class WebsiteBuilderSimpleAgentExecutor(AgentExecutor):
     website builder simple agent with the A2A framework.
     """
 
-    def __init__(self):
+    def __init__(self, max_concurrent_tasks: int = MAX_CONCURRENT_TASKS):
         self.agent = WebsiteBuilderSimple()
-        self._cancel_requested = False  # 取消標記
+        # 任務 ID -> 取消權杖；只保存執行中或排隊中的任務
+        self._cancel_tokens: dict[str, CancellationToken] = {}
+        # 取消比 execute() 先到的任務 ID (有上限，最舊的先移除)
+        self._early_cancels: OrderedDict[str, None] = OrderedDict()
+        self._semaphore = asyncio.Semaphore(max_concurrent_tasks)
 
     async def execute(self, context: RequestContext, event_queue: EventQueue) -> None:
         """
@@ -46,8 +150,8 @@ class WebsiteBuilderSimpleAgentExecutor(AgentExecutor):
         執行流程：
         1. 提取用戶輸入 (query)
         2. 建立或獲取任務 (task)
-        3. 初始化 TaskUpdater（用於更新任務狀態）
-        4. 調用 Agent.invoke() 處理查詢
+        3. 初始化 TaskUpdater（用於更新任務狀態）並註冊任務的取消權杖
+        4. 取得並行名額後調用 Agent.invoke() 處理查詢
         5. 根據 Agent 回傳的狀態更新任務
         6. 處理各種異常情況
 
@@ -62,7 +166,8 @@ class WebsiteBuilderSimpleAgentExecutor(AgentExecutor):
 
         可靠性設計：
         - 使用 asyncio.timeout 防止無限等待
-        - 支援取消機制（_cancel_requested）
+        - 支援任務範圍的取消機制（CancellationToken），取消時立即中斷等待中的 LLM 回應
+        - 並行任務數受 max_concurrent_tasks 限制，結束後移除權杖
         - 所有錯誤均更新任務狀態，不會默默失敗
         """
         # ========== 步驟 1: 提取用戶輸入 ==========
@@ -78,28 +183,26 @@ class WebsiteBuilderSimpleAgentExecutor(AgentExecutor):
         # TaskUpdater 負責將任務狀態更新推送到 EventQueue
         # 然後由 EventQueue 透過 SSE 推送給客戶端
         updater = TaskUpdater(event_queue, task.id, task.context_id)
-        self._cancel_requested = False  # 重置取消標記
+        token = self._cancel_tokens.setdefault(task.id, CancellationToken())
+        if task.id in self._early_cancels:
+            # 取消比 execute() 先到 (Cancelled before execute started)
+            del self._early_cancels[task.id]
+            token.cancel()
 
         try:
             # ========== 步驟 3: 執行 Agent 並處理回應 ==========
             # 使用 asyncio.timeout 添加超時保護
-            # 防止 LLM 請求卡死或無限等待
-            async with asyncio.timeout(TASK_EXECUTION_TIMEOUT):
+            # 防止 LLM 請求卡死或無限等待 (排隊等待並行名額的時間不計入)
+            async with self._semaphore, asyncio.timeout(TASK_EXECUTION_TIMEOUT):
                 # invoke() 回傳 AsyncIterable，支援串流處理
-                async for item in self.agent.invoke(query, task.context_id):
+                # iterate_until_cancelled 在權杖被取消時立即停止迭代
+                async for item in iterate_until_cancelled(
+                    self.agent.invoke(query, task.context_id), token
+                ):
                     # ========== 步驟 3.1: 檢查取消請求 ==========
                     # 用戶可能在任務執行期間調用 cancel() 方法
-                    if self._cancel_requested:
-                        logger.info(f"任務被取消 - Task ID: {task.id}")
-                        await updater.update_status(
-                            TaskState.cancelled,  # 更新為取消狀態
-                            new_agent_text_message(
-                                "任務已被用戶取消 (Task cancelled by user)",
-                                task.context_id,
-                                task.id,
-                            ),
-                        )
-                        return  # 立即結束執行
+                    if token.cancelled:
+                        break
 
                     # ========== 步驟 3.2: 處理 Agent 回應 ==========
                     # item 的結構：
@@ -139,6 +242,10 @@ class WebsiteBuilderSimpleAgentExecutor(AgentExecutor):
                         await asyncio.sleep(MESSAGE_PROCESSING_DELAY)
                         break  # 結束迴圈
 
+            if token.cancelled:
+                # 取消狀態已由 cancel() 發送，這裡只需停止執行
+                logger.info(f"任務被取消 - Task ID: {task.id}")
+
         except asyncio.TimeoutError:
             # ========== 錯誤處理 1: 超時錯誤 ==========
             # 當任務執行超過 TASK_EXECUTION_TIMEOUT (60s) 時觸發
@@ -198,12 +305,21 @@ class WebsiteBuilderSimpleAgentExecutor(AgentExecutor):
             )
             raise
 
+        finally:
+            # 任務結束後釋放權杖，避免記憶體隨任務數成長
+            self._cancel_tokens.pop(task.id, None)
+
     async def cancel(
         self, request: RequestContext, event_queue: EventQueue
     ) -> Task | None:
         """
-        取消當前正在執行的任務。
-        Cancels the currently executing task.
+        取消指定的任務 (只影響該任務，不影響同一 Executor 上的其他任務)。
+        Cancels the given task without affecting other tasks on this executor.
+
+        觸發任務的取消權杖後立即發送取消狀態 (final)；A2A 的 DefaultRequestHandler
+        會從同一個事件佇列讀取此狀態作為 tasks/cancel 的結果。
+        取消比 execute() 先到時先記下任務 ID (最多 MAX_EARLY_CANCELS 筆)，
+        之後的 execute() 以已取消的權杖開始，不會執行任務。
 
         Args:
             request: 請求上下文
@@ -218,9 +334,27 @@ class WebsiteBuilderSimpleAgentExecutor(AgentExecutor):
             return None
 
         logger.info(f"收到取消請求 - Task ID: {task.id}")
-        self._cancel_requested = True
+        token = self._cancel_tokens.get(task.id)
+        if token is not None:
+            token.cancel()
+        else:
+            # execute() 尚未註冊權杖：先記下，讓之後的 execute() 看到已取消而不執行
+            # Remember the cancellation so a later execute() starts already cancelled
+            logger.info(f"任務尚未開始執行，預先記錄取消 - Task ID: {task.id}")
+            self._early_cancels[task.id] = None
+            self._early_cancels.move_to_end(task.id)
+            while len(self._early_cancels) > MAX_EARLY_CANCELS:
+                self._early_cancels.popitem(last=False)
 
-        # 給予一些時間讓執行循環檢測到取消標記
-        await asyncio.sleep(MESSAGE_PROCESSING_DELAY)
+        updater = TaskUpdater(event_queue, task.id, task.context_id)
+        await updater.update_status(
+            TaskState.canceled,  # 更新為取消狀態
+            new_agent_text_message(
+                "任務已被用戶取消 (Task cancelled by user)",
+                task.context_id,
+                task.id,
+            ),
+            final=True,
+        )
 
         return task
@@ -0,0 +1,272 @@
+"""
+Command Engine - 非阻塞的終端機命令執行引擎
+
+重點摘要:
+- **核心概念**: 以 asyncio 子程序執行 Shell 命令，不阻塞 FastMCP 的事件迴圈。
+- **關鍵技術**: `asyncio.create_subprocess_shell`, `asyncio.Semaphore`, `resource.setrlimit`。
+- **重要結論**: 慢速命令只佔用一個並行名額，其他工具呼叫仍可同時進行；
+  輸出以頭尾視窗保存，記憶體與回傳的 Token 數量都有上限。
+
+設計模式:
+- **並行上限 (Concurrency Cap)**: Semaphore 限制同時執行的命令數
+- **資源限制 (Resource Limits)**: 每個命令有 CPU 秒數、記憶體與執行時間上限
+- **串流輸出 (Streaming Output)**: stdout/stderr 逐塊讀取並透過回呼即時回報
+- **頭尾截斷 (Head/Tail Truncation)**: 只保留輸出開頭與結尾，中間以標記取代
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows 沒有 resource 模組
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# 每次從管線讀取的位元組數 (Chunk size for reading pipes)
+READ_CHUNK_SIZE = 4096
+
+# 輸出回呼: (串流名稱 "stdout"/"stderr", 文字區塊)
+OutputCallback = Callable[[str, str], Awaitable[None]]
+
+
+@dataclass
+class CommandLimits:
+    """
+    單一命令的資源限制 (Per-command resource limits)。
+
+    Attributes:
+        timeout: 執行時間上限 (秒)，超過時終止整個程序群組
+        cpu_seconds: CPU 時間上限 (秒)，None 表示不限制
+        memory_bytes: 虛擬記憶體上限 (位元組)，None 表示不限制
+    """
+
+    timeout: float = 30.0
+    cpu_seconds: Optional[int] = None
+    memory_bytes: Optional[int] = None
+
+    def apply(self) -> None:
+        """在子程序中套用 rlimit (於 fork 後、exec 前執行)。"""
+        if resource is None:
+            return
+        if self.cpu_seconds is not None:
+            resource.setrlimit(
+                resource.RLIMIT_CPU, (self.cpu_seconds, self.cpu_seconds + 1)
+            )
+        if self.memory_bytes is not None:
+            resource.setrlimit(
+                resource.RLIMIT_AS, (self.memory_bytes, self.memory_bytes)
+            )
+
+
+class OutputWindow:
+    """
+    保留輸出開頭與結尾的有界緩衝區 (Bounded head/tail output buffer)。
+
+    不論命令輸出多少資料，記憶體用量最多為 head_bytes + tail_bytes。
+    """
+
+    def __init__(self, head_bytes: int = 8192, tail_bytes: int = 8192):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self._head = bytearray()
+        self._tail = bytearray()
+        self.total_bytes = 0
+
+    def feed(self, data: bytes) -> None:
+        """加入一個輸出區塊。"""
+        self.total_bytes += len(data)
+        room = self.head_bytes - len(self._head)
+        if room > 0:
+            self._head += data[:room]
+            data = data[room:]
+        if data and self.tail_bytes > 0:
+            self._tail += data
+            if len(self._tail) > self.tail_bytes:
+                del self._tail[: len(self._tail) - self.tail_bytes]
+
+    @property
+    def truncated(self) -> bool:
+        """是否有輸出因超過視窗而被省略。"""
+        return self.total_bytes > len(self._head) + len(self._tail)
+
+    def render(self) -> str:
+        """回傳輸出文字；有省略時在頭尾之間插入截斷標記。"""
+        head = self._head.decode("utf-8", errors="replace")
+        tail = self._tail.decode("utf-8", errors="replace")
+        if not self.truncated:
+            return head + tail
+        omitted = self.total_bytes - len(self._head) - len(self._tail)
+        return f"{head}\n... [已截斷 {omitted} 位元組 (truncated {omitted} bytes)] ...\n{tail}"
+
+
+@dataclass
+class CommandResult:
+    """
+    命令執行結果 (Command execution result)。
+
+    Attributes:
+        returncode: 返回碼；逾時被終止時為負的信號編號或 None
+        stdout: 截斷後的標準輸出
+        stderr: 截斷後的標準錯誤
+        timed_out: 是否因逾時被終止
+        truncated: 是否有輸出被截斷
+        output_bytes: stdout 與 stderr 的原始總位元組數
+        duration: 執行時間 (秒，不含排隊等待)
+        queued: 等待並行名額的時間 (秒)
+    """
+
+    returncode: Optional[int]
+    stdout: str
+    stderr: str
+    timed_out: bool
+    truncated: bool
+    output_bytes: int
+    duration: float
+    queued: float
+
+
+class CommandEngine:
+    """
+    以 asyncio 子程序執行命令的引擎 (Asyncio subprocess execution engine)。
+
+    所有命令共用一個並行上限；每個命令在自己的程序群組中執行，
+    逾時或被取消時會終止整個群組 (包含 Shell 衍生的子程序)。
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        limits: Optional[CommandLimits] = None,
+        head_bytes: int = 8192,
+        tail_bytes: int = 8192,
+    ):
+        """
+        初始化執行引擎。
+
+        Args:
+            max_concurrency: 同時執行的命令數上限
+            limits: 預設的資源限制
+            head_bytes: 每個串流保留的開頭位元組數
+            tail_bytes: 每個串流保留的結尾位元組數
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency 必須大於 0")
+        self.max_concurrency = max_concurrency
+        self.limits = limits or CommandLimits()
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.running = 0
+
+    async def run(
+        self,
+        command: str,
+        cwd: Optional[str] = None,
+        on_output: Optional[OutputCallback] = None,
+        limits: Optional[CommandLimits] = None,
+    ) -> CommandResult:
+        """
+        執行命令並回傳結果。
+
+        Args:
+            command: 要執行的 Shell 命令
+            cwd: 工作目錄
+            on_output: 每讀到一個輸出區塊時呼叫的回呼
+            limits: 覆寫預設的資源限制
+
+        Returns:
+            CommandResult 執行結果
+        """
+        limits = limits or self.limits
+        enqueued = time.perf_counter()
+        async with self._semaphore:
+            started = time.perf_counter()
+            self.running += 1
+            try:
+                return await self._execute(
+                    command, cwd, on_output, limits, queued=started - enqueued
+                )
+            finally:
+                self.running -= 1
+
+    async def _execute(
+        self,
+        command: str,
+        cwd: Optional[str],
+        on_output: Optional[OutputCallback],
+        limits: CommandLimits,
+        queued: float,
+    ) -> CommandResult:
+        started = time.perf_counter()
+        process = await asyncio.create_subprocess_shell(
+            command,
+            cwd=cwd,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            preexec_fn=limits.apply if resource is not None else None,
+            start_new_session=True,
+        )
+        stdout = OutputWindow(self.head_bytes, self.tail_bytes)
+        stderr = OutputWindow(self.head_bytes, self.tail_bytes)
+
+        async def pump(stream: asyncio.StreamReader, window: OutputWindow, name: str):
+            while True:
+                chunk = await stream.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    return
+                window.feed(chunk)
+                if on_output is not None:
+                    try:
+                        await on_output(name, chunk.decode("utf-8", errors="replace"))
+                    except Exception:
+                        # 回報失敗不應中斷命令執行
+                        logger.exception("輸出回呼失敗 (Output callback failed)")
+
+        timed_out = False
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(
+                    pump(process.stdout, stdout, "stdout"),
+                    pump(process.stderr, stderr, "stderr"),
+                    process.wait(),
+                ),
+                timeout=limits.timeout,
+            )
+        except asyncio.TimeoutError:
+            timed_out = True
+            await self._kill(process)
+        except asyncio.CancelledError:
+            await self._kill(process)
+            raise
+
+        return CommandResult(
+            returncode=process.returncode,
+            stdout=stdout.render(),
+            stderr=stderr.render(),
+            timed_out=timed_out,
+            truncated=stdout.truncated or stderr.truncated,
+            output_bytes=stdout.total_bytes + stderr.total_bytes,
+            duration=time.perf_counter() - started,
+            queued=queued,
+        )
+
+    @staticmethod
+    async def _kill(process: asyncio.subprocess.Process) -> None:
+        """終止命令的整個程序群組並回收子程序。"""
+        if process.returncode is None:
+            try:
+                if hasattr(os, "killpg"):
+                    os.killpg(process.pid, signal.SIGKILL)
+                else:
+                    process.kill()
+            except (ProcessLookupError, PermissionError):
+                process.kill()
+        await process.wait()
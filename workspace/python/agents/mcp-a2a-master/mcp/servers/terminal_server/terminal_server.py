@@ -3,8 +3,9 @@ Terminal Server - MCP Stdio Server 實作範例
 
 重點摘要:
 - **核心概念**: MCP Stdio Server 範例，提供終端機命令執行能力。
-- **關鍵技術**: `FastMCP`, `subprocess` (執行系統指令), Stdio Transport。
+- **關鍵技術**: `FastMCP`, asyncio 子程序 (`command_engine.CommandEngine`), Stdio Transport。
 - **重要結論**: 實作了一個可以在伺服器端執行 Shell 指令的工具，這是一個強大但也潛在危險的功能，需謹慎使用。
+  命令以非阻塞方式執行，慢速命令不會凍結伺服器或其他同時進行的工具呼叫。
 
 安全性警告:
 ⚠️ 此工具允許執行任意系統命令，存在以下安全風險:
@@ -16,23 +17,32 @@ Terminal Server - MCP Stdio Server 實作範例
 設計模式:
 - **工具模式 (Tool Pattern)**: 使用 @mcp.tool 裝飾器註冊工具
 - **錯誤處理**: 基本的例外捕捉機制
-- **標準輸出捕捉**: 使用 subprocess 的 capture_output
+- **串流輸出**: stdout/stderr 逐塊讀取，並以 MCP 進度通知 (progress notification) 即時回報
+- **資源控制**: 並行上限、每個命令的 CPU/記憶體/時間限制，輸出以頭尾視窗截斷
+
+環境變數 (Environment Variables):
+- TERMINAL_WORKSPACE: 命令的工作目錄
+- TERMINAL_MAX_CONCURRENCY: 同時執行的命令數上限 (預設 4)
+- TERMINAL_TIMEOUT: 每個命令的時間上限秒數 (預設 30)
+- TERMINAL_CPU_SECONDS: 每個命令的 CPU 秒數上限 (預設不限制)
+- TERMINAL_MEMORY_MB: 每個命令的記憶體上限 MB (預設不限制)
+- TERMINAL_OUTPUT_HEAD_BYTES / TERMINAL_OUTPUT_TAIL_BYTES: 保留的輸出頭尾位元組數 (預設各 8192)
 
 建議改善方向:
 - 實作命令白名單機制
 - 加入使用者權限驗證
 - 增強日誌記錄功能
-- 實作超時限制和資源控制
 - 加入命令審計追蹤
 """
 
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
 import os
-import subprocess
 import logging
-import shlex
+import time
 from typing import Optional
 
+from command_engine import CommandEngine, CommandLimits
+
 # 設定日誌記錄器 (Configure logger for debugging and monitoring)
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
@@ -45,7 +55,10 @@ mcp = FastMCP("terminal_server")
 # 預設工作目錄 (Default working directory for command execution)
 # 使用者家目錄下的 mcp/workspace 作為安全的執行環境
 DEFAULT_WORKSPACE = os.path.expanduser(
-    "/Users/cfh00543956/Desktop/Labs/google-adk-study/workspace/python/agents/mcp-a2a-master/mcp/workspace"
+    os.getenv(
+        "TERMINAL_WORKSPACE",
+        "/Users/cfh00543956/Desktop/Labs/google-adk-study/workspace/python/agents/mcp-a2a-master/mcp/workspace",
+    )
 )
 
 # 確保工作目錄存在 (Ensure workspace directory exists)
@@ -53,25 +66,53 @@ os.makedirs(DEFAULT_WORKSPACE, exist_ok=True)
 logger.info(f"Terminal Server initialized with workspace: {DEFAULT_WORKSPACE}")
 
 
+def _optional_int(name: str) -> Optional[int]:
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+# 命令執行引擎 (Command execution engine)
+# 所有工具呼叫共用同一個並行上限與資源限制
+COMMAND_TIMEOUT = float(os.getenv("TERMINAL_TIMEOUT", "30"))
+_memory_mb = _optional_int("TERMINAL_MEMORY_MB")
+engine = CommandEngine(
+    max_concurrency=int(os.getenv("TERMINAL_MAX_CONCURRENCY", "4")),
+    limits=CommandLimits(
+        timeout=COMMAND_TIMEOUT,
+        cpu_seconds=_optional_int("TERMINAL_CPU_SECONDS"),
+        memory_bytes=_memory_mb * 1024 * 1024 if _memory_mb else None,
+    ),
+    head_bytes=int(os.getenv("TERMINAL_OUTPUT_HEAD_BYTES", "8192")),
+    tail_bytes=int(os.getenv("TERMINAL_OUTPUT_TAIL_BYTES", "8192")),
+)
+
+# 進度通知的最短間隔秒數，避免大量輸出淹沒 stdio 通道
+PROGRESS_INTERVAL = 0.2
+
+# 每則進度通知訊息的最大字元數
+PROGRESS_MESSAGE_CHARS = 500
+
+
 @mcp.tool("terminal_server")
-async def run_command(command: str) -> str:
+async def run_command(command: str, ctx: Optional[Context] = None) -> str:
     """
     在終端機中執行指令並回傳輸出。
 
     ⚠️ 安全性警告 (Security Warning):
-    此函數使用 shell=True 執行命令,存在命令注入風險。
+    此函數以 shell 模式執行命令,存在命令注入風險。
     建議僅在受信任的環境中使用,或實作命令白名單驗證。
 
     執行流程 (Execution Flow):
     1. 記錄命令執行請求
-    2. 在指定的工作目錄中執行命令
-    3. 捕捉標準輸出和標準錯誤
-    4. 記錄執行結果並返回
+    2. 等待並行名額後,以 asyncio 子程序在指定的工作目錄中執行命令
+    3. 逐塊讀取標準輸出和標準錯誤,並以進度通知即時回報
+    4. 記錄執行結果並返回 (過長的輸出只保留頭尾)
 
     Args:
         command (str): 要在終端機中執行的指令。
                       The command to run in the terminal.
                       注意: 此命令將以 shell 模式執行,請避免使用不受信任的輸入。
+        ctx (Context): FastMCP 自動注入的請求上下文,用於發送進度通知。
 
     Returns:
         str: 指令的輸出 (stdout 或 stderr)。
@@ -80,8 +121,8 @@ async def run_command(command: str) -> str:
              Returns error message if command execution fails.
 
     錯誤處理 (Error Handling):
-        - subprocess.TimeoutExpired: 命令執行超時
-        - subprocess.CalledProcessError: 命令返回非零狀態碼
+        - 命令執行超時: 終止整個程序群組,並回傳已收到的部分輸出
+        - PermissionError / FileNotFoundError: 無法啟動命令
         - Exception: 其他未預期的錯誤
 
     範例 (Examples):
@@ -98,25 +139,43 @@ async def run_command(command: str) -> str:
         logger.warning(error_msg)
         return f"錯誤 (Error): {error_msg}"
 
+    streamed_bytes = 0
+    last_report = 0.0
+
+    async def report_output(stream: str, text: str) -> None:
+        # 將輸出區塊以 MCP 進度通知回報 (節流)
+        nonlocal streamed_bytes, last_report
+        streamed_bytes += len(text)
+        now = time.monotonic()
+        if ctx is None or now - last_report < PROGRESS_INTERVAL:
+            return
+        last_report = now
+        await ctx.report_progress(
+            progress=streamed_bytes,
+            message=f"[{stream}] {text[-PROGRESS_MESSAGE_CHARS:]}",
+        )
+
     try:
         # 記錄執行環境 (Log execution environment)
         logger.debug(f"執行目錄 (Working directory): {DEFAULT_WORKSPACE}")
 
         # 執行命令 (Execute command)
-        # 使用 shell=True 允許執行複雜的 shell 命令,但也帶來安全風險
-        # timeout 設定為 30 秒以避免長時間運行的命令阻塞
-        result = subprocess.run(
-            command,
-            shell=True,  # ⚠️ 安全風險: 啟用 shell 解析
-            cwd=DEFAULT_WORKSPACE,  # 在指定目錄中執行
-            text=True,  # 以文字模式處理輸出
-            capture_output=True,  # 捕捉 stdout 和 stderr
-            timeout=30,  # 30 秒超時限制
+        # 以 asyncio 子程序執行,不會阻塞事件迴圈或其他工具呼叫
+        result = await engine.run(
+            command, cwd=DEFAULT_WORKSPACE, on_output=report_output
         )
 
         # 組合輸出結果 (Combine output results)
         output = result.stdout or result.stderr
 
+        if result.timed_out:
+            # 命令執行超時 (Command execution timeout)
+            error_msg = f"命令執行超時 (Command timeout after {COMMAND_TIMEOUT:g}s): {command[:50]}..."
+            logger.error(error_msg)
+            if output:
+                return f"錯誤 (Error): {error_msg}\n部分輸出 (Partial output):\n{output}"
+            return f"錯誤 (Error): {error_msg}"
+
         # 記錄執行結果 (Log execution result)
         if result.returncode == 0:
             logger.info(
@@ -128,24 +187,15 @@ async def run_command(command: str) -> str:
             )
 
         # 記錄輸出長度 (Log output length)
-        logger.debug(f"輸出長度 (Output length): {len(output)} 字元")
+        logger.debug(
+            f"輸出長度 (Output length): {result.output_bytes} 位元組, "
+            f"執行 {result.duration:.3f}s, 排隊 {result.queued:.3f}s"
+        )
 
         return (
             output if output else f"命令執行完成,返回碼: {result.returncode},但無輸出"
         )
 
-    except subprocess.TimeoutExpired as e:
-        # 命令執行超時 (Command execution timeout)
-        error_msg = f"命令執行超時 (Command timeout after 30s): {command[:50]}..."
-        logger.error(error_msg)
-        return f"錯誤 (Error): {error_msg}"
-
-    except subprocess.CalledProcessError as e:
-        # 命令返回錯誤狀態碼 (Command returned error status code)
-        error_msg = f"命令執行失敗 (Command failed) [退出碼 {e.returncode}]: {str(e)}"
-        logger.error(error_msg)
-        return f"錯誤 (Error): {error_msg}"
-
     except PermissionError as e:
         # 權限不足 (Permission denied)
         error_msg = f"權限不足 (Permission denied): {str(e)}"
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+量測 Host Agent 委派任務 (_delegate_task) 的延遲：原本的實作 vs AgentCard 快取與共用連線池。
+
+以 uvicorn 在本機啟動 N 個 Stub A2A 伺服器 (A2AStarletteApplication + 立即完成任務的執行器)，
+每個請求可加上 --latency 秒的人工延遲模擬網路往返。量測:
+- legacy: 每次委派都以新的 AsyncClient 重新取得所有 AgentCard，再以另一個新的 AsyncClient 送出任務
+- cached: AgentDiscovery 快取 AgentCard，AgentConnector 使用共用的 keep-alive 連線
+
+使用方法:
+    python scripts/benchmark_a2a_delegation.py --agents 4 --delegations 50 --latency 0.005
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+import sys
+import tempfile
+import time
+from pathlib import Path
+from uuid import uuid4
+
+import httpx
+import uvicorn
+from a2a.client import A2ACardResolver
+from a2a.server.agent_execution import AgentExecutor, RequestContext
+from a2a.server.apps import A2AStarletteApplication
+from a2a.server.events import EventQueue
+from a2a.server.request_handlers import DefaultRequestHandler
+from a2a.server.tasks import InMemoryTaskStore, TaskUpdater
+from a2a.types import AgentCapabilities, AgentCard, TaskState
+from a2a.utils import new_agent_text_message, new_task
+from a2a.utils.constants import AGENT_CARD_WELL_KNOWN_PATH
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utilities.a2a.agent_connect import AgentConnector
+from utilities.a2a.agent_discovery import AgentDiscovery
+from utilities.a2a.http_pool import close_http_clients, get_http_client
+
+
+class EchoExecutor(AgentExecutor):
+    """立即以回音訊息完成任務的執行器。"""
+
+    async def execute(self, context: RequestContext, event_queue: EventQueue) -> None:
+        task = context.current_task or new_task(context.message)
+        await event_queue.enqueue_event(task)
+        updater = TaskUpdater(event_queue, task.id, task.context_id)
+        await updater.update_status(
+            TaskState.completed,
+            new_agent_text_message(f"echo: {context.get_user_input()}", task.context_id, task.id),
+            final=True,
+        )
+
+    async def cancel(self, context: RequestContext, event_queue: EventQueue) -> None:
+        raise NotImplementedError
+
+
+def with_latency(app, latency: float):
+    """在每個 HTTP 請求前加上固定延遲，模擬網路往返時間。"""
+
+    async def wrapped(scope, receive, send):
+        if scope["type"] == "http" and latency:
+            await asyncio.sleep(latency)
+        await app(scope, receive, send)
+
+    return wrapped
+
+
+async def start_stub_agent(index: int, latency: float) -> tuple[uvicorn.Server, str]:
+    """在隨機埠號啟動一個 Stub A2A 伺服器。"""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    url = f"http://127.0.0.1:{sock.getsockname()[1]}/"
+    card = AgentCard(
+        name=f"stub_agent_{index}",
+        description="Stub A2A agent for benchmarking",
+        url=url,
+        version="1.0.0",
+        capabilities=AgentCapabilities(streaming=False),
+        defaultInputModes=["text/plain"],
+        defaultOutputModes=["text/plain"],
+        skills=[],
+    )
+    handler = DefaultRequestHandler(agent_executor=EchoExecutor(), task_store=InMemoryTaskStore())
+    app = A2AStarletteApplication(agent_card=card, http_handler=handler).build()
+    server = uvicorn.Server(
+        uvicorn.Config(with_latency(app, latency), log_level="warning", lifespan="off")
+    )
+    asyncio.create_task(server.serve(sockets=[sock]))
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server, url
+
+
+async def legacy_delegate(base_urls: list[str], agent_name: str, message: str) -> str:
+    """原本的流程：每次委派重新取得所有 AgentCard，並為任務建立新的 AsyncClient。"""
+    async with httpx.AsyncClient(timeout=300.0) as client:
+        cards = await asyncio.gather(
+            *(A2ACardResolver(base_url=u.rstrip("/"), httpx_client=client).get_agent_card() for u in base_urls)
+        )
+    card = next(c for c in cards if c.name == agent_name)
+    async with httpx.AsyncClient(timeout=300.0) as client:
+        return await AgentConnector(agent_card=card, httpx_client=client).send_task(message, str(uuid4()))
+
+
+async def cached_delegate(discovery: AgentDiscovery, connectors: dict, agent_name: str, message: str) -> str:
+    """新的流程 (與 HostAgent._delegate_task 相同)：快取的 AgentCard 與重複使用的 AgentConnector。"""
+    cards = await discovery.list_agent_cards()
+    card = next(c for c in cards if c.name == agent_name)
+    connector = connectors.get(card.url)
+    if connector is None:
+        connector = connectors[card.url] = AgentConnector(agent_card=card)
+    return await connector.send_task(message, str(uuid4()))
+
+
+def summarize(latencies: list[float]) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "mean_ms": 1000 * sum(latencies) / len(latencies),
+        "p95_ms": 1000 * latencies[int(0.95 * (len(latencies) - 1))],
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--agents", type=int, default=4, help="註冊的 Stub A2A 伺服器數量")
+    parser.add_argument("--delegations", type=int, default=50, help="委派任務次數")
+    parser.add_argument("--latency", type=float, default=0.005, help="每個 HTTP 請求的人工延遲 (秒)")
+    args = parser.parse_args()
+
+    servers = [await start_stub_agent(i, args.latency) for i in range(args.agents)]
+    base_urls = [url for _, url in servers]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        registry_file = Path(tmp) / "agent_registry.json"
+        registry_file.write_text(json.dumps(base_urls))
+        discovery = AgentDiscovery(registry_file=str(registry_file))
+        connectors: dict = {}
+
+        results = {}
+        for name, delegate in (
+            ("legacy", lambda i: legacy_delegate(base_urls, f"stub_agent_{i % args.agents}", "hi")),
+            ("cached", lambda i: cached_delegate(discovery, connectors, f"stub_agent_{i % args.agents}", "hi")),
+        ):
+            latencies = []
+            for i in range(args.delegations):
+                start = time.perf_counter()
+                response = await delegate(i)
+                latencies.append(time.perf_counter() - start)
+                assert response.startswith("echo:"), response
+            results[name] = summarize(latencies)
+
+        # 共用客戶端實際協商的協定 (明文 HTTP 的 Stub 伺服器為 HTTP/1.1；HTTP/2 需要 HTTPS 的 ALPN)
+        protocols = sorted(
+            {
+                (await get_http_client(url).get(f"{url.rstrip('/')}{AGENT_CARD_WELL_KNOWN_PATH}")).http_version
+                for url in base_urls
+            }
+        )
+
+    await close_http_clients()
+    for server, _ in servers:
+        server.should_exit = True
+    await asyncio.sleep(0.2)
+
+    print(
+        f"Stub A2A 伺服器: {args.agents} 個，委派次數: {args.delegations}，"
+        f"人工延遲: {args.latency * 1000:.1f} ms，協商的協定: {', '.join(protocols)}"
+    )
+    print(f"{'實作':<10} {'平均 (ms)':>10} {'p95 (ms)':>10}")
+    for name, result in results.items():
+        print(f"{name:<10} {result['mean_ms']:>10.2f} {result['p95_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
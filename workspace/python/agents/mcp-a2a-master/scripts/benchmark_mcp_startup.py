@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+量測 MCPConnector 的啟動時間：原本的逐一初始化 vs 並行初始化、TTL 快取與熱機連線池。
+
+以本機 Stub MCP 伺服器 (FastMCP over stdio，啟動前休眠 --delay 秒模擬冷啟動延遲)
+建立暫存的 mcp_config.json，量測:
+- sequential: 原本的 _load_all_tools，逐一連線每個伺服器
+- concurrent (cold): 新的 MCPConnector 首次 get_tools()
+- cached: TTL 內再次呼叫 get_tools()
+- warm pool: 快取失效後重新列出工具 (沿用熱機的 Stdio 程序)
+
+使用方法:
+    python scripts/benchmark_mcp_startup.py --servers 4 --delay 0.5
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from google.adk.tools.mcp_tool.mcp_toolset import MCPToolset
+
+from utilities.mcp.mcp_connect import MCPConnector
+
+STUB_SERVER = '''
+import time
+from mcp.server.fastmcp import FastMCP
+
+time.sleep({delay})  # 模擬冷啟動延遲 (匯入大型相依套件、載入模型等)
+mcp = FastMCP("{name}", log_level="WARNING")
+
+
+@mcp.tool()
+def echo_{index}(text: str) -> str:
+    """回傳輸入文字。"""
+    return text
+
+
+if __name__ == "__main__":
+    mcp.run(transport="stdio")
+'''
+
+
+def write_stub_config(directory: Path, servers: int, delay: float) -> Path:
+    """產生 Stub 伺服器腳本與對應的 mcp_config.json。"""
+    config = {"mcpServers": {}}
+    for i in range(servers):
+        name = f"stub_{i}"
+        script = directory / f"{name}.py"
+        script.write_text(STUB_SERVER.format(delay=delay, name=name, index=i))
+        config["mcpServers"][name] = {"command": sys.executable, "args": [str(script)]}
+    config_file = directory / "mcp_config.json"
+    config_file.write_text(json.dumps(config))
+    return config_file
+
+
+async def sequential_load(connector: MCPConnector) -> list[MCPToolset]:
+    """原本的實作：逐一建立 MCPToolset 並等待其列出工具。"""
+    tools = []
+    for name, server in connector.discovery.list_servers().items():
+        mcp_toolset = MCPToolset(connection_params=connector._build_connection(server))
+        if await asyncio.wait_for(mcp_toolset.get_tools(), timeout=10.0):
+            tools.append(mcp_toolset)
+    return tools
+
+
+async def timed(coro) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = await coro
+    return time.perf_counter() - start, result
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--servers", type=int, default=4, help="Stub 伺服器數量")
+    parser.add_argument("--delay", type=float, default=0.5, help="每個伺服器的啟動延遲 (秒)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config_file = write_stub_config(Path(tmp), args.servers, args.delay)
+
+        legacy = MCPConnector(config_file=str(config_file))
+        elapsed, legacy_tools = await timed(sequential_load(legacy))
+        rows = [("sequential", elapsed, len(legacy_tools))]
+        for toolset in legacy_tools:
+            await toolset.close()
+
+        connector = MCPConnector(config_file=str(config_file))
+        elapsed, tools = await timed(connector.get_tools())
+        rows.append(("concurrent (cold)", elapsed, len(tools)))
+
+        elapsed, tools = await timed(connector.get_tools())
+        rows.append(("cached", elapsed, len(tools)))
+
+        connector.invalidate()
+        elapsed, tools = await timed(connector.get_tools())
+        rows.append(("warm pool", elapsed, len(tools)))
+        await connector.close()
+
+    print(f"Stub 伺服器: {args.servers} 個，每個啟動延遲 {args.delay}s")
+    print(f"{'情境':<20} {'時間 (s)':>10} {'Toolsets':>10}")
+    for label, seconds, count in rows:
+        print(f"{label:<20} {seconds:>10.3f} {count:>10}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+比較 Terminal Server 原本的阻塞式 subprocess.run 與 CommandEngine 的並行執行。
+
+情境: 同時送出 N 個慢速命令 (sleep)，並在期間送出一個快速命令 (echo)，量測:
+- 全部完成的總時間
+- 快速命令的延遲 (隊頭阻塞: 阻塞式實作下必須等前面的慢速命令全部結束)
+
+使用方法:
+    python scripts/benchmark_terminal_server.py --commands 8 --sleep 0.5 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "mcp" / "servers" / "terminal_server"))
+
+from command_engine import CommandEngine, CommandLimits
+
+
+async def blocking_run(command: str) -> str:
+    """原本的 run_command 實作: 在 async 函式中呼叫阻塞的 subprocess.run。"""
+    result = subprocess.run(command, shell=True, text=True, capture_output=True, timeout=30)
+    return result.stdout or result.stderr
+
+
+async def measure(run, commands: int, sleep: float) -> dict:
+    """同時送出慢速命令與一個快速探測命令，回傳總時間與探測延遲。"""
+    start = time.perf_counter()
+    probe_latency = 0.0
+
+    async def probe():
+        # 探測延遲自請求送出時起算 (包含等待事件迴圈與並行名額的時間)
+        nonlocal probe_latency
+        await run("echo probe")
+        probe_latency = time.perf_counter() - start
+
+    await asyncio.gather(*(run(f"sleep {sleep}") for _ in range(commands)), probe())
+    return {"total": time.perf_counter() - start, "probe": probe_latency}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--commands", type=int, default=8, help="同時送出的慢速命令數")
+    parser.add_argument("--sleep", type=float, default=0.5, help="每個慢速命令的秒數")
+    parser.add_argument("--concurrency", type=int, default=16, help="CommandEngine 並行上限")
+    args = parser.parse_args()
+
+    engine = CommandEngine(max_concurrency=args.concurrency, limits=CommandLimits(timeout=30))
+
+    async def engine_run(command: str) -> str:
+        result = await engine.run(command)
+        return result.stdout or result.stderr
+
+    print(f"慢速命令: {args.commands} x sleep {args.sleep}s，並行上限: {args.concurrency}")
+    print(f"{'實作':<20} {'總時間 (s)':>12} {'探測延遲 (s)':>14}")
+    for name, run in (("subprocess.run", blocking_run), ("CommandEngine", engine_run)):
+        result = await measure(run, args.commands, args.sleep)
+        print(f"{name:<20} {result['total']:>12.3f} {result['probe']:>14.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
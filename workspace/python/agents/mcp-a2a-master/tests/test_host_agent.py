@@ -322,6 +322,72 @@ class TestHostAgentTools:
 
             assert result == "找不到代理 (Agent not found)"
 
+    @pytest.mark.asyncio
+    async def test_delegate_task_reuses_connector(self, mock_agent_card):
+        """測試多次委派給同一 Agent 時重複使用 AgentConnector。
+
+        重點說明：
+        1. Mock AgentDiscovery 回傳同一張 agent card
+        2. 連續委派兩次任務
+        3. 驗證 AgentConnector 只建立一次，send_task 被呼叫兩次
+        """
+        from agents.host_agent.agent import HostAgent
+
+        agent = HostAgent()
+
+        with patch.object(
+            agent.AgentDiscovery, "list_agent_cards", new_callable=AsyncMock
+        ) as mock_list_cards:
+            with patch(
+                "agents.host_agent.agent.AgentConnector"
+            ) as mock_connector_class:
+                mock_list_cards.return_value = [mock_agent_card]
+                mock_connector = Mock()
+                mock_connector.agent_card = mock_agent_card
+                mock_connector.send_task = AsyncMock(return_value="done")
+                mock_connector_class.return_value = mock_connector
+
+                for _ in range(2):
+                    await agent._delegate_task(
+                        agent_name="test_website_builder", message="Test task"
+                    )
+
+                mock_connector_class.assert_called_once()
+                assert mock_connector.send_task.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_delegate_task_refreshes_cards_on_miss(self, mock_agent_card):
+        """測試快取中找不到 Agent 時強制重新查詢 AgentCard。
+
+        重點說明：
+        1. 第一次 list_agent_cards 回傳空列表 (快取中沒有新代理)
+        2. 強制重新查詢時回傳 mock_agent_card
+        3. 驗證以 force_refresh=True 重新查詢並成功委派
+        """
+        from agents.host_agent.agent import HostAgent
+
+        agent = HostAgent()
+
+        with patch.object(
+            agent.AgentDiscovery, "list_agent_cards", new_callable=AsyncMock
+        ) as mock_list_cards:
+            with patch(
+                "agents.host_agent.agent.AgentConnector"
+            ) as mock_connector_class:
+                mock_list_cards.side_effect = [[], [mock_agent_card]]
+                mock_connector_class.return_value.send_task = AsyncMock(
+                    return_value="Task completed"
+                )
+
+                result = await agent._delegate_task(
+                    agent_name="test_website_builder", message="Test task"
+                )
+
+                assert result == "Task completed"
+                assert mock_list_cards.await_args_list[1].kwargs == {
+                    "force_refresh": True
+                }
+
 
 class TestHostAgentInvoke:
     """測試 HostAgent 的 invoke 功能。"""
@@ -373,6 +439,53 @@ class TestHostAgentInvoke:
                 assert len(results) > 0
 
 
+    @pytest.mark.asyncio
+    async def test_invoke_forwards_delegation_progress(self, mock_agent_card):
+        """測試委派給遠端 Agent 時，其串流進度在抵達時即由 invoke 轉發。
+
+        重點說明：
+        1. Mock runner.run_async 在執行期間呼叫 _delegate_task
+        2. Mock AgentConnector.send_task 透過 on_update 回報兩個進度
+        3. 驗證 invoke 依序產生遠端進度與最終結果
+        """
+        from agents.host_agent.agent import HostAgent
+
+        agent = HostAgent()
+
+        async def fake_send_task(message, session_id, on_update=None):
+            await on_update("step 1")
+            await on_update("step 2")
+            return "remote done"
+
+        with patch.object(
+            agent.MCPConnector, "get_tools", new_callable=AsyncMock
+        ) as mock_get_tools, patch.object(
+            agent.AgentDiscovery, "list_agent_cards", new_callable=AsyncMock
+        ) as mock_list_cards, patch(
+            "agents.host_agent.agent.AgentConnector"
+        ) as mock_connector_class:
+            mock_get_tools.return_value = []
+            mock_list_cards.return_value = [mock_agent_card]
+            mock_connector_class.return_value.send_task = fake_send_task
+            await agent.create()
+
+            async def mock_run_generator(*args, **kwargs):
+                result = await agent._delegate_task("test_website_builder", "build")
+                final_event = Mock()
+                final_event.is_final_response.return_value = True
+                final_event.content.parts = [Mock(text=result)]
+                yield final_event
+
+            with patch.object(agent._runner, "run_async", side_effect=mock_run_generator):
+                results = [item async for item in agent.invoke("Test query", "s-1")]
+
+        assert results == [
+            {"is_task_complete": False, "updates": "[test_website_builder] step 1"},
+            {"is_task_complete": False, "updates": "[test_website_builder] step 2"},
+            {"is_task_complete": True, "content": "remote done"},
+        ]
+
+
 class TestHostAgentExecutor:
     """測試 HostAgentExecutor。"""
 
@@ -0,0 +1,206 @@
+"""
+測試 Terminal Server 的非阻塞命令執行引擎。
+"""
+
+import asyncio
+import importlib
+import sys
+import time
+from pathlib import Path
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+SERVER_DIR = Path(__file__).parent.parent / "mcp" / "servers" / "terminal_server"
+sys.path.insert(0, str(SERVER_DIR))
+
+from command_engine import CommandEngine, CommandLimits, OutputWindow, resource  # noqa: E402
+
+
+@pytest.fixture
+def terminal_server(tmp_path, monkeypatch):
+    """以暫存工作目錄載入 terminal_server 模組。"""
+    monkeypatch.setenv("TERMINAL_WORKSPACE", str(tmp_path))
+    sys.modules.pop("terminal_server", None)
+    module = importlib.import_module("terminal_server")
+    yield module
+    sys.modules.pop("terminal_server", None)
+
+
+class TestOutputWindow:
+    """測試頭尾截斷的輸出視窗。"""
+
+    def test_small_output_not_truncated(self):
+        """測試未超過視窗的輸出完整保留。
+
+        重點說明：
+        1. 加入少於 head_bytes 的資料
+        2. 驗證輸出完整且未標記截斷
+        """
+        window = OutputWindow(head_bytes=10, tail_bytes=10)
+        window.feed(b"hello")
+        assert window.render() == "hello"
+        assert not window.truncated
+
+    def test_large_output_keeps_head_and_tail(self):
+        """測試超過視窗的輸出只保留頭尾並插入截斷標記。
+
+        重點說明：
+        1. 分多個區塊加入 1000 位元組
+        2. 驗證開頭與結尾保留，中間被省略的位元組數正確
+        """
+        window = OutputWindow(head_bytes=4, tail_bytes=4)
+        for i in range(10):
+            window.feed(bytes([ord("a") + i]) * 100)
+
+        rendered = window.render()
+        assert rendered.startswith("aaaa")
+        assert rendered.endswith("jjjj")
+        assert "已截斷 992 位元組" in rendered
+        assert window.total_bytes == 1000
+
+
+class TestCommandEngine:
+    """測試 CommandEngine 的執行、限制與串流。"""
+
+    @pytest.mark.asyncio
+    async def test_captures_stdout_and_stderr(self, tmp_path):
+        """測試分別擷取 stdout、stderr 與返回碼。"""
+        engine = CommandEngine()
+        result = await engine.run("echo out; echo err >&2; exit 3", cwd=str(tmp_path))
+
+        assert result.stdout == "out\n"
+        assert result.stderr == "err\n"
+        assert result.returncode == 3
+        assert not result.timed_out
+
+    @pytest.mark.asyncio
+    async def test_timeout_kills_process_group(self):
+        """測試逾時時終止整個程序群組並保留部分輸出。
+
+        重點說明：
+        1. 執行會在背景衍生子程序的慢速命令
+        2. 驗證在時間上限後立即返回，且已輸出的內容保留
+        """
+        engine = CommandEngine(limits=CommandLimits(timeout=0.3))
+        start = time.perf_counter()
+        result = await engine.run("echo started; sleep 5 & sleep 5")
+
+        assert result.timed_out
+        assert result.stdout == "started\n"
+        assert time.perf_counter() - start < 2
+
+    @pytest.mark.asyncio
+    async def test_concurrency_cap(self):
+        """測試同時執行的命令數不超過上限。"""
+        engine = CommandEngine(max_concurrency=2)
+        peak = 0
+
+        async def watch():
+            nonlocal peak
+            while True:
+                peak = max(peak, engine.running)
+                await asyncio.sleep(0.01)
+
+        watcher = asyncio.create_task(watch())
+        results = await asyncio.gather(*(engine.run("sleep 0.2") for _ in range(4)))
+        watcher.cancel()
+
+        assert peak == 2
+        assert max(r.queued for r in results) >= 0.15
+
+    @pytest.mark.asyncio
+    async def test_slow_command_does_not_block_fast_one(self):
+        """測試慢速命令執行期間，其他命令仍可立即完成 (無隊頭阻塞)。"""
+        engine = CommandEngine(max_concurrency=4)
+        slow = asyncio.create_task(engine.run("sleep 1"))
+        await asyncio.sleep(0.05)
+
+        start = time.perf_counter()
+        fast = await engine.run("echo fast")
+
+        assert fast.stdout == "fast\n"
+        assert time.perf_counter() - start < 0.5
+        assert not slow.done()
+        await slow
+
+    @pytest.mark.asyncio
+    async def test_output_is_streamed_incrementally(self):
+        """測試輸出在命令結束前就透過回呼回報。"""
+        engine = CommandEngine()
+        received = []
+        start = time.perf_counter()
+
+        async def on_output(stream, text):
+            received.append((stream, text, time.perf_counter() - start))
+
+        await engine.run("echo first; sleep 0.5; echo second", on_output=on_output)
+
+        assert received[0][:2] == ("stdout", "first\n")
+        assert received[0][2] < 0.4
+        assert received[-1][1] == "second\n"
+
+    @pytest.mark.asyncio
+    @pytest.mark.skipif(resource is None or sys.platform == "darwin", reason="需要 Linux rlimit")
+    async def test_memory_limit(self):
+        """測試超過記憶體上限的命令執行失敗。"""
+        engine = CommandEngine(limits=CommandLimits(memory_bytes=256 * 1024 * 1024))
+        result = await engine.run(
+            f'{sys.executable} -c "x = bytearray(1024 * 1024 * 1024)"'
+        )
+        assert result.returncode != 0
+        assert "MemoryError" in result.stderr
+
+    def test_invalid_concurrency(self):
+        """測試 max_concurrency 小於 1 時引發 ValueError。"""
+        with pytest.raises(ValueError):
+            CommandEngine(max_concurrency=0)
+
+
+class TestRunCommandTool:
+    """測試 run_command MCP 工具。"""
+
+    @pytest.mark.asyncio
+    async def test_run_command_output(self, terminal_server, tmp_path):
+        """測試在工作目錄中執行命令並回傳輸出。"""
+        result = await terminal_server.run_command("pwd")
+        assert result.strip() == str(tmp_path)
+
+    @pytest.mark.asyncio
+    async def test_empty_command(self, terminal_server):
+        """測試空白命令回傳錯誤。"""
+        result = await terminal_server.run_command("  ")
+        assert result.startswith("錯誤 (Error)")
+
+    @pytest.mark.asyncio
+    async def test_progress_notifications(self, terminal_server, monkeypatch):
+        """測試輸出以 MCP 進度通知回報。
+
+        重點說明：
+        1. 提供 mock Context
+        2. 執行分段輸出的命令
+        3. 驗證 report_progress 被呼叫且訊息包含輸出內容
+        """
+        monkeypatch.setattr(terminal_server, "PROGRESS_INTERVAL", 0)
+        ctx = Mock()
+        ctx.report_progress = AsyncMock()
+
+        await terminal_server.run_command("echo one; sleep 0.1; echo two", ctx=ctx)
+
+        messages = [call.kwargs["message"] for call in ctx.report_progress.call_args_list]
+        assert messages == ["[stdout] one\n", "[stdout] two\n"]
+
+    @pytest.mark.asyncio
+    async def test_timeout_returns_partial_output(self, terminal_server, monkeypatch):
+        """測試逾時時回傳錯誤訊息與部分輸出。"""
+        monkeypatch.setattr(terminal_server.engine, "limits", CommandLimits(timeout=0.2))
+
+        result = await terminal_server.run_command("echo partial; sleep 5")
+
+        assert "命令執行超時" in result
+        assert "partial" in result
+
+    def test_context_not_in_tool_schema(self, terminal_server):
+        """測試 Context 參數不會出現在工具的輸入結構中。"""
+        (tool,) = terminal_server.mcp._tool_manager.list_tools()
+        assert list(tool.parameters["properties"]) == ["command"]
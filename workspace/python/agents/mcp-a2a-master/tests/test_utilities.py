@@ -2,6 +2,9 @@
 測試 Utilities 模組的功能。
 """
 
+import asyncio
+import time
+
 import pytest
 from unittest.mock import Mock, AsyncMock, patch, MagicMock
 import json
@@ -352,3 +355,464 @@ class TestMCPConnector:
             await connector._load_all_tools()
 
             assert isinstance(connector.tools, list)
+
+
+class FakeToolset:
+    """模擬 MCPToolset：get_tools 休眠指定秒數後回傳一個工具。"""
+
+    instances: list = []
+
+    def __init__(self, connection_params):
+        self.connection_params = connection_params
+        self.list_calls = 0
+        self.closed = False
+        FakeToolset.instances.append(self)
+
+    @property
+    def server(self):
+        params = self.connection_params
+        return getattr(params, "url", None) or params.server_params.args[0]
+
+    async def get_tools(self):
+        self.list_calls += 1
+        if self.server == "fail":
+            raise ConnectionError("refused")
+        await asyncio.sleep(0.2 if self.server != "hang" else 10)
+        tool = Mock()
+        tool.name = f"tool_{self.server}"
+        return [tool]
+
+    async def close(self):
+        self.closed = True
+
+
+class TestMCPConnectorCaching:
+    """測試 MCPConnector 的並行初始化、TTL 快取與熱機連線池。"""
+
+    @pytest.fixture
+    def fake_toolset(self):
+        FakeToolset.instances = []
+        with patch("utilities.mcp.mcp_connect.MCPToolset", FakeToolset):
+            yield FakeToolset
+
+    @staticmethod
+    def write_config(path, servers, **extra):
+        config = {
+            name: {"command": "python", "args": [name], **extra} for name in servers
+        }
+        path.write_text(json.dumps({"mcpServers": config}))
+
+    @pytest.fixture
+    def config_file(self, tmp_path):
+        config_file = tmp_path / "mcp_config.json"
+        self.write_config(config_file, ["a", "b", "c"])
+        return config_file
+
+    @pytest.mark.asyncio
+    async def test_servers_initialized_concurrently(self, fake_toolset, config_file):
+        """測試所有伺服器並行初始化。
+
+        重點說明：
+        1. 三個伺服器各需 0.2 秒列出工具
+        2. 驗證總時間接近單一伺服器而非三者總和
+        """
+        from utilities.mcp.mcp_connect import MCPConnector
+
+        connector = MCPConnector(config_file=str(config_file))
+        start = time.perf_counter()
+        tools = await connector.get_tools()
+
+        assert len(tools) == 3
+        assert time.perf_counter() - start < 0.5
+
+    @pytest.mark.asyncio
+    async def test_tools_cached_within_ttl(self, fake_toolset, config_file):
+        """測試 TTL 內重複呼叫 get_tools 不會重新連線。"""
+        from utilities.mcp.mcp_connect import MCPConnector
+
+        connector = MCPConnector(config_file=str(config_file), ttl=60)
+        first = await connector.get_tools()
+        second = await connector.get_tools()
+
+        assert first == second
+        assert [t.list_calls for t in fake_toolset.instances] == [1, 1, 1]
+
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_share_one_load(self, fake_toolset, config_file):
+        """測試多個同時呼叫者只觸發一次載入。"""
+        from utilities.mcp.mcp_connect import MCPConnector
+
+        connector = MCPConnector(config_file=str(config_file))
+        await asyncio.gather(*(connector.get_tools() for _ in range(5)))
+
+        assert len(fake_toolset.instances) == 3
+        assert all(t.list_calls == 1 for t in fake_toolset.instances)
+
+    @pytest.mark.asyncio
+    async def test_expired_cache_reuses_warm_toolsets(self, fake_toolset, config_file):
+        """測試快取過期後沿用連線池中的熱機 Toolset，而非建立新程序。
+
+        重點說明：
+        1. 以 ttl=0 讓每次呼叫都重新列出工具
+        2. 驗證 Toolset 只建立一次，且重新列出工具兩次
+        """
+        from utilities.mcp.mcp_connect import MCPConnector
+
+        connector = MCPConnector(config_file=str(config_file), ttl=0)
+        first = await connector.get_tools()
+        second = await connector.get_tools()
+
+        assert first == second
+        assert len(fake_toolset.instances) == 3
+        assert all(t.list_calls == 2 for t in fake_toolset.instances)
+
+    @pytest.mark.asyncio
+    async def test_config_change_invalidates_cache(self, fake_toolset, config_file):
+        """測試設定檔變更時重新載入，並關閉被移除或定義變更的伺服器。
+
+        重點說明：
+        1. 載入 a、b、c 三個伺服器
+        2. 修改設定檔：移除 c、變更 b 的定義、新增 d
+        3. 驗證 a 沿用原 Toolset，b 與 c 的舊 Toolset 被關閉，d 被新增
+        """
+        from utilities.mcp.mcp_connect import MCPConnector
+
+        connector = MCPConnector(config_file=str(config_file), ttl=60)
+        old = {t.server: t for t in await connector.get_tools()}
+
+        config = json.loads(config_file.read_text())
+        del config["mcpServers"]["c"]
+        config["mcpServers"]["b"]["env"] = {"DEBUG": "1"}
+        config["mcpServers"]["d"] = {"command": "python", "args": ["d"]}
+        config_file.write_text(json.dumps(config))
+
+        new = {t.server: t for t in await connector.get_tools()}
+
+        assert sorted(new) == ["a", "b", "d"]
+        assert new["a"] is old["a"]
+        assert new["b"] is not old["b"]
+        assert old["b"].closed and old["c"].closed
+        assert not old["a"].closed
+
+    @pytest.mark.asyncio
+    async def test_failing_servers_skipped(self, fake_toolset, tmp_path):
+        """測試連線失敗或逾時的伺服器被跳過、關閉，且不留在連線池中。"""
+        from utilities.mcp.mcp_connect import MCPConnector
+
+        config_file = tmp_path / "mcp_config.json"
+        self.write_config(config_file, ["ok", "fail", "hang"])
+        connector = MCPConnector(config_file=str(config_file), init_timeout=0.5)
+
+        tools = await connector.get_tools()
+
+        assert [t.server for t in tools] == ["ok"]
+        assert list(connector._pool) == ["ok"]
+        assert all(t.closed for t in fake_toolset.instances if t.server != "ok")
+
+    @pytest.mark.asyncio
+    async def test_close_shuts_down_pool(self, fake_toolset, config_file):
+        """測試 close() 關閉所有熱機 Toolset 並清空快取。"""
+        from utilities.mcp.mcp_connect import MCPConnector
+
+        connector = MCPConnector(config_file=str(config_file))
+        await connector.get_tools()
+        await connector.close()
+
+        assert all(t.closed for t in fake_toolset.instances)
+        assert connector.tools == []
+        assert connector._pool == {}
+
+
+def make_card_payload(name="stub_agent", description="v1"):
+    """建立 AgentCard 的 JSON 內容。"""
+    return {
+        "name": name,
+        "url": "http://stub:10001/",
+        "version": "1.0.0",
+        "description": description,
+        "capabilities": {"streaming": False},
+        "defaultInputModes": ["text/plain"],
+        "defaultOutputModes": ["text/plain"],
+        "skills": [],
+    }
+
+
+class CardServer:
+    """以 httpx.MockTransport 模擬提供 ETag 的 AgentCard 端點。"""
+
+    def __init__(self):
+        self.description = "v1"
+        self.requests = []
+        self.fail = False
+
+    def handler(self, request):
+        self.requests.append(request)
+        if self.fail:
+            return httpx.Response(503)
+        etag = f'"{self.description}"'
+        if request.headers.get("if-none-match") == etag:
+            return httpx.Response(304, headers={"etag": etag})
+        return httpx.Response(
+            200, json=make_card_payload(description=self.description), headers={"etag": etag}
+        )
+
+
+class TestAgentCardCache:
+    """測試 AgentDiscovery 的 AgentCard 快取與 ETag 重新驗證。"""
+
+    @pytest.fixture
+    def card_server(self):
+        return CardServer()
+
+    @pytest.fixture
+    def discovery(self, tmp_path, card_server):
+        from utilities.a2a.agent_discovery import AgentDiscovery
+
+        registry_file = tmp_path / "agent_registry.json"
+        registry_file.write_text(json.dumps(["http://stub:10001"]))
+        client = httpx.AsyncClient(transport=httpx.MockTransport(card_server.handler))
+        with patch(
+            "utilities.a2a.agent_discovery.get_http_client", return_value=client
+        ):
+            yield AgentDiscovery(registry_file=str(registry_file), ttl=60)
+
+    @pytest.mark.asyncio
+    async def test_cards_cached_within_ttl(self, discovery, card_server):
+        """測試 TTL 內重複查詢不會發出 HTTP 請求。"""
+        first = await discovery.list_agent_cards()
+        second = await discovery.list_agent_cards()
+
+        assert [c.name for c in first] == ["stub_agent"]
+        assert first[0] is second[0]
+        assert len(card_server.requests) == 1
+        assert card_server.requests[0].url.path.startswith("/.well-known/agent")
+
+    @pytest.mark.asyncio
+    async def test_stale_card_revalidated_in_background(self, discovery, card_server):
+        """測試過期的卡片立即回傳，並在背景以 If-None-Match 重新驗證。
+
+        重點說明：
+        1. 取得卡片後將 TTL 設為 0 使其過期
+        2. 再次查詢時立即回傳快取的卡片
+        3. 等待背景工作完成，驗證送出 If-None-Match 並收到 304
+        """
+        first = await discovery.list_agent_cards()
+        discovery.ttl = 0
+
+        second = await discovery.list_agent_cards()
+        await discovery._refresh_task
+
+        assert second[0] is first[0]
+        assert card_server.requests[1].headers["if-none-match"] == '"v1"'
+        assert discovery._cache["http://stub:10001"].card is first[0]
+
+    @pytest.mark.asyncio
+    async def test_changed_card_replaced_after_revalidation(self, discovery, card_server):
+        """測試遠端卡片變更後，背景重新驗證會更新快取。"""
+        await discovery.list_agent_cards()
+        discovery.ttl = 0
+        card_server.description = "v2"
+
+        await discovery.list_agent_cards()
+        await discovery._refresh_task
+        discovery.ttl = 60
+
+        cards = await discovery.list_agent_cards()
+        assert cards[0].description == "v2"
+
+    @pytest.mark.asyncio
+    async def test_failed_revalidation_keeps_cached_card(self, discovery, card_server):
+        """測試重新驗證失敗時保留舊的卡片。"""
+        await discovery.list_agent_cards()
+        discovery.ttl = 0
+        card_server.fail = True
+
+        await discovery.list_agent_cards()
+        await discovery._refresh_task
+
+        cards = await discovery.list_agent_cards()
+        await discovery.aclose()
+        assert cards[0].description == "v1"
+
+    @pytest.mark.asyncio
+    async def test_force_refresh(self, discovery, card_server):
+        """測試 force_refresh 立即重新查詢 (以條件式請求)。"""
+        await discovery.list_agent_cards()
+        await discovery.list_agent_cards(force_refresh=True)
+
+        assert len(card_server.requests) == 2
+        assert card_server.requests[1].headers["if-none-match"] == '"v1"'
+
+    @pytest.mark.asyncio
+    async def test_urls_stale_during_refresh_are_queued(self, tmp_path, card_server):
+        """測試背景重新驗證進行中才過期的 URL 會排入佇列，而不是被丟棄。
+
+        重點說明：
+        1. 暫停卡片端點，讓第一個 URL 的重新驗證停在進行中
+        2. 兩個 URL 同時過期，第一個已在重新驗證中，不會重複排入
+        3. 放行後同一個背景工作接著重新驗證第二個 URL
+        """
+        from utilities.a2a.agent_discovery import AgentDiscovery
+
+        gate = asyncio.Event()
+        gate.set()
+
+        async def handler(request):
+            await gate.wait()
+            return card_server.handler(request)
+
+        registry_file = tmp_path / "agent_registry.json"
+        registry_file.write_text(json.dumps(["http://stub:10001", "http://stub:10002"]))
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        with patch(
+            "utilities.a2a.agent_discovery.get_http_client", return_value=client
+        ):
+            discovery = AgentDiscovery(registry_file=str(registry_file), ttl=60)
+            await discovery.list_agent_cards()
+            gate.clear()
+
+            discovery._schedule_refresh(["http://stub:10001"])
+            await asyncio.sleep(0.01)
+            task = discovery._refresh_task
+            discovery._schedule_refresh(["http://stub:10001", "http://stub:10002"])
+            assert discovery._refresh_task is task
+
+            gate.set()
+            await task
+
+        revalidated = [request.url.port for request in card_server.requests[2:]]
+        assert revalidated == [10001, 10002]
+        assert not discovery._pending_refresh and not discovery._refreshing
+
+
+class TestHTTPClientPool:
+    """測試 A2A 共用 HTTP 連線池。"""
+
+    @pytest.mark.asyncio
+    async def test_client_shared_per_origin(self):
+        """測試同一 origin 共用客戶端，不同 origin 使用不同客戶端。"""
+        from utilities.a2a.http_pool import close_http_clients, get_http_client
+
+        a = get_http_client("http://localhost:10001/")
+        b = get_http_client("http://localhost:10001/.well-known/agent.json")
+        c = get_http_client("http://localhost:10002/")
+
+        assert a is b
+        assert a is not c
+
+        await close_http_clients()
+        assert a.is_closed and c.is_closed
+        assert get_http_client("http://localhost:10001/") is not a
+        await close_http_clients()
+
+    @pytest.mark.asyncio
+    async def test_connectors_reuse_pooled_client(self, mock_agent_card):
+        """測試多次 send_task 使用同一個共用客戶端，而非每次建立新的客戶端。"""
+        from utilities.a2a.agent_connect import AgentConnector
+        from utilities.a2a.http_pool import close_http_clients
+
+        with patch("utilities.a2a.agent_connect.A2AClient") as mock_a2a_client:
+            mock_a2a_client.return_value.send_message = AsyncMock(return_value=Mock())
+            for _ in range(2):
+                await AgentConnector(agent_card=mock_agent_card).send_task(
+                    message="hi", session_id="s"
+                )
+
+        first, second = mock_a2a_client.call_args_list
+        assert first.kwargs["httpx_client"] is second.kwargs["httpx_client"]
+        assert not first.kwargs["httpx_client"].is_closed
+        await close_http_clients()
+
+
+def status_update_response(state, text, final=False):
+    """建立 message/stream 的 TaskStatusUpdateEvent 回應。"""
+    from a2a.types import (
+        SendStreamingMessageResponse,
+        SendStreamingMessageSuccessResponse,
+        TaskState,
+        TaskStatus,
+        TaskStatusUpdateEvent,
+    )
+    from a2a.utils import new_agent_text_message
+
+    event = TaskStatusUpdateEvent(
+        task_id="task-1",
+        context_id="ctx-1",
+        final=final,
+        status=TaskStatus(
+            state=TaskState(state), message=new_agent_text_message(text, "ctx-1", "task-1")
+        ),
+    )
+    return SendStreamingMessageResponse(
+        root=SendStreamingMessageSuccessResponse(id="req-1", result=event)
+    )
+
+
+class TestAgentConnectorStreaming:
+    """測試以 message/stream 委派任務。"""
+
+    @pytest.mark.asyncio
+    async def test_stream_task_yields_updates_as_they_arrive(self, mock_agent_card):
+        """測試遠端狀態更新在抵達時即產生，而非等待完整結果。
+
+        重點說明：
+        1. Mock send_message_streaming 在兩個更新之間延遲 0.3 秒
+        2. 驗證第一個進度區塊在延遲結束前即被收到
+        3. 驗證最後一個區塊為最終結果
+        """
+        from utilities.a2a.agent_connect import AgentConnector
+
+        async def stream(request):
+            yield status_update_response("working", "drafting html")
+            await asyncio.sleep(0.3)
+            yield status_update_response("completed", "<html></html>", final=True)
+
+        connector = AgentConnector(agent_card=mock_agent_card, httpx_client=Mock())
+        start = time.perf_counter()
+        chunks = []
+        with patch("utilities.a2a.agent_connect.A2AClient") as mock_a2a_client:
+            mock_a2a_client.return_value.send_message_streaming = stream
+            async for chunk in connector.stream_task("build", session_id="s"):
+                chunks.append((chunk, time.perf_counter() - start))
+
+        (first, first_at), (last, _) = chunks
+        assert first == {"is_task_complete": False, "state": "working", "updates": "drafting html"}
+        assert first_at < 0.2
+        assert last["is_task_complete"] and last["content"] == "<html></html>"
+
+    @pytest.mark.asyncio
+    async def test_send_task_with_on_update_streams(self, mock_agent_card):
+        """測試 send_task 提供 on_update 時透過串流回報進度並回傳最終結果。"""
+        from utilities.a2a.agent_connect import AgentConnector
+
+        async def stream(request):
+            yield status_update_response("working", "step 1")
+            yield status_update_response("working", "step 2")
+            yield status_update_response("completed", "done", final=True)
+
+        updates = []
+
+        async def on_update(text):
+            updates.append(text)
+
+        connector = AgentConnector(agent_card=mock_agent_card, httpx_client=Mock())
+        with patch("utilities.a2a.agent_connect.A2AClient") as mock_a2a_client:
+            mock_a2a_client.return_value.send_message_streaming = stream
+            result = await connector.send_task("build", session_id="s", on_update=on_update)
+
+        assert result == "done"
+        assert updates == ["step 1", "step 2"]
+
+    @pytest.mark.asyncio
+    async def test_stream_task_falls_back_without_streaming(self, mock_agent_card):
+        """測試遠端 Agent 不支援串流時退回 send_task。"""
+        from utilities.a2a.agent_connect import AgentConnector
+
+        card = mock_agent_card.model_copy(
+            update={"capabilities": mock_agent_card.capabilities.model_copy(update={"streaming": False})}
+        )
+        connector = AgentConnector(agent_card=card, httpx_client=Mock())
+        with patch.object(connector, "send_task", AsyncMock(return_value="full result")):
+            chunks = [c async for c in connector.stream_task("build", session_id="s")]
+
+        assert chunks == [{"is_task_complete": True, "state": "unknown", "content": "full result"}]
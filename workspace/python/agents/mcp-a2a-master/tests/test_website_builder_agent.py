@@ -2,6 +2,10 @@
 測試 WebsiteBuilderSimple Agent 的核心功能與配置。
 """
 
+import asyncio
+import contextvars
+import random
+
 import pytest
 from unittest.mock import Mock, AsyncMock, patch
 
@@ -233,7 +237,7 @@ class TestWebsiteBuilderExecutor:
         2. 建立實例
         3. 驗證實例建立成功
         4. 驗證 agent 屬性存在
-        5. 驗證 _cancel_requested 屬性存在
+        5. 驗證 _cancel_tokens 屬性存在
         """
         from agents.website_builder_simple.agent_executor import (
             WebsiteBuilderSimpleAgentExecutor,
@@ -242,21 +246,21 @@ class TestWebsiteBuilderExecutor:
         executor = WebsiteBuilderSimpleAgentExecutor()
         assert executor is not None
         assert hasattr(executor, "agent")
-        assert hasattr(executor, "_cancel_requested")
+        assert hasattr(executor, "_cancel_tokens")
 
     def test_executor_cancel_flag_initial_state(self):
-        """測試 Executor 取消旗標初始狀態。
+        """測試 Executor 取消權杖初始狀態。
 
         重點說明：
         1. 建立 WebsiteBuilderSimpleAgentExecutor 實例
-        2. 驗證 _cancel_requested 初始值為 False
+        2. 驗證沒有任何任務的取消權杖
         """
         from agents.website_builder_simple.agent_executor import (
             WebsiteBuilderSimpleAgentExecutor,
         )
 
         executor = WebsiteBuilderSimpleAgentExecutor()
-        assert executor._cancel_requested is False
+        assert executor._cancel_tokens == {}
 
     @pytest.mark.asyncio
     async def test_executor_execute_with_mock(self):
@@ -358,3 +362,199 @@ class TestAgentResponseModel:
 
         assert response.is_task_complete is False
         # 檢查其他欄位的預設值
+
+
+class RecordingEventQueue:
+    """記錄所有事件的事件佇列替身。"""
+
+    def __init__(self):
+        self.events = []
+
+    async def enqueue_event(self, event):
+        self.events.append(event)
+
+    def states(self):
+        return [e.status.state.value for e in self.events if hasattr(e, "status")]
+
+
+def make_task_context(task_id: str):
+    """建立帶有既有任務的 RequestContext 替身。"""
+    from a2a.server.agent_execution import RequestContext
+    from a2a.types import Task, TaskState, TaskStatus
+
+    context = Mock(spec=RequestContext)
+    context.get_user_input.return_value = f"Build website {task_id}"
+    context.current_task = Task(
+        id=task_id,
+        context_id=f"ctx-{task_id}",
+        status=TaskStatus(state=TaskState.submitted),
+    )
+    return context
+
+
+class TestWebsiteBuilderExecutorCancellation:
+    """測試任務範圍的取消權杖與並行執行。"""
+
+    @pytest.fixture
+    def executor(self, monkeypatch):
+        from agents.website_builder_simple import agent_executor
+
+        monkeypatch.setattr(agent_executor, "MESSAGE_PROCESSING_DELAY", 0)
+        return agent_executor.WebsiteBuilderSimpleAgentExecutor(max_concurrent_tasks=8)
+
+    @pytest.mark.asyncio
+    async def test_cancel_only_affects_its_own_task(self, executor):
+        """測試取消一個任務不會影響同一 Executor 上的另一個任務。
+
+        重點說明：
+        1. 同時執行兩個任務
+        2. 只取消第一個任務
+        3. 驗證第一個任務為 canceled，第二個任務為 completed
+        """
+
+        async def slow_invoke(query, session_id):
+            yield {"is_task_complete": False, "updates": "working"}
+            await asyncio.sleep(0.2)
+            yield {"is_task_complete": True, "content": f"done {session_id}"}
+
+        queues = {"a": RecordingEventQueue(), "b": RecordingEventQueue()}
+        with patch.object(executor.agent, "invoke", side_effect=slow_invoke):
+            runs = [
+                asyncio.create_task(executor.execute(make_task_context(k), q))
+                for k, q in queues.items()
+            ]
+            await asyncio.sleep(0.05)
+            await executor.cancel(make_task_context("a"), queues["a"])
+            await asyncio.gather(*runs)
+
+        assert queues["a"].states() == ["working", "canceled"]
+        assert queues["b"].states() == ["working", "completed"]
+        assert executor._cancel_tokens == {}
+
+    @pytest.mark.asyncio
+    async def test_cancel_interrupts_pending_llm_call(self, executor):
+        """測試取消會立即中斷正在等待中的 LLM 回應。"""
+        started = asyncio.Event()
+
+        async def hanging_invoke(query, session_id):
+            started.set()
+            await asyncio.sleep(30)
+            yield {"is_task_complete": True, "content": "never"}
+
+        queue = RecordingEventQueue()
+        with patch.object(executor.agent, "invoke", side_effect=hanging_invoke):
+            run = asyncio.create_task(executor.execute(make_task_context("t"), queue))
+            await started.wait()
+            await executor.cancel(make_task_context("t"), queue)
+            await asyncio.wait_for(run, timeout=1)
+
+        assert queue.states() == ["canceled"]
+        assert queue.events[-1].final is True
+
+    @pytest.mark.asyncio
+    async def test_100_concurrent_tasks_with_random_cancellations(self, executor):
+        """測試 100 個並行任務搭配隨機取消。
+
+        重點說明：
+        1. 以並行上限 8 同時送出 100 個任務，每個任務耗時隨機
+        2. 隨機挑選 30 個任務在隨機時間點取消
+        3. 驗證未取消的任務全部完成、被取消的任務在取消後不再有更新
+        4. 驗證同時執行數不超過上限，且結束後沒有殘留的取消權杖
+        """
+        rng = random.Random(42)
+        running = 0
+        peak = 0
+
+        async def fake_invoke(query, session_id):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            try:
+                yield {"is_task_complete": False, "updates": "working"}
+                await asyncio.sleep(rng.uniform(0.01, 0.05))
+                yield {"is_task_complete": True, "content": f"done {session_id}"}
+            finally:
+                running -= 1
+
+        task_ids = [f"task-{i}" for i in range(100)]
+        queues = {task_id: RecordingEventQueue() for task_id in task_ids}
+        to_cancel = set(rng.sample(task_ids, 30))
+
+        async def cancel_later(task_id):
+            await asyncio.sleep(rng.uniform(0, 0.3))
+            await executor.cancel(make_task_context(task_id), queues[task_id])
+
+        with patch.object(executor.agent, "invoke", side_effect=fake_invoke):
+            await asyncio.gather(
+                *(executor.execute(make_task_context(t), queues[t]) for t in task_ids),
+                *(cancel_later(t) for t in to_cancel),
+            )
+
+        for task_id, queue in queues.items():
+            states = queue.states()
+            if task_id in to_cancel:
+                assert states[-1] == "canceled"
+                assert states.count("completed") <= 1
+            else:
+                assert states[-1] == "completed"
+                assert "canceled" not in states
+        assert peak <= 8
+        assert executor._cancel_tokens == {}
+
+    @pytest.mark.asyncio
+    async def test_generator_steps_share_one_context(self, executor):
+        """測試 Agent 產生器的每一步都在同一個 Context 執行。
+
+        重點說明：
+        1. 產生器在第一步設定 ContextVar (模擬 OpenTelemetry 附加 span)
+        2. 第二步仍能讀到同一個值並以原本的 token 重設
+        3. 任務正常完成，沒有 "created in a different Context" 錯誤
+        """
+        var = contextvars.ContextVar("span", default=None)
+        seen = []
+
+        async def traced_invoke(query, session_id):
+            token = var.set(session_id)
+            yield {"is_task_complete": False, "updates": "working"}
+            seen.append(var.get())
+            var.reset(token)
+            yield {"is_task_complete": True, "content": "done"}
+
+        queue = RecordingEventQueue()
+        with patch.object(executor.agent, "invoke", side_effect=traced_invoke):
+            await executor.execute(make_task_context("t"), queue)
+
+        assert seen == ["ctx-t"]
+        assert queue.states() == ["working", "completed"]
+
+    @pytest.mark.asyncio
+    async def test_cancel_before_execute_skips_task(self, executor):
+        """測試取消比 execute() 先到時，任務不會開始執行。"""
+        started = []
+
+        async def fake_invoke(query, session_id):
+            started.append(session_id)
+            yield {"is_task_complete": True, "content": "done"}
+
+        queue = RecordingEventQueue()
+
+        await executor.cancel(make_task_context("t"), queue)
+        with patch.object(executor.agent, "invoke", side_effect=fake_invoke):
+            await executor.execute(make_task_context("t"), queue)
+
+        assert started == []
+        assert queue.states() == ["canceled"]
+        assert executor._cancel_tokens == {}
+        assert not executor._early_cancels
+
+    @pytest.mark.asyncio
+    async def test_early_cancellations_are_bounded(self, executor, monkeypatch):
+        """測試預先記錄的取消有數量上限，最舊的先移除。"""
+        from agents.website_builder_simple import agent_executor
+
+        monkeypatch.setattr(agent_executor, "MAX_EARLY_CANCELS", 2)
+        for task_id in ("a", "b", "c"):
+            await executor.cancel(make_task_context(task_id), RecordingEventQueue())
+
+        assert list(executor._early_cancels) == ["b", "c"]
+        assert executor._cancel_tokens == {}
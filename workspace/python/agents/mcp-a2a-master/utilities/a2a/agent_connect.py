@@ -1,25 +1,55 @@
 """
 重點摘要:
 - **核心概念**: A2A 代理連接器 (Connector)。
-- **關鍵技術**: A2A Client SDK, HTTPX。
+- **關鍵技術**: A2A Client SDK, HTTPX (共用 keep-alive 連線池)。
 - **重要結論**: 封裝了與遠端 A2A 代理通訊的細節，包括建構請求 payload 和處理回應。
+  同一遠端代理的所有任務共用一個長駐的 HTTP 客戶端，不必每次重新握手。
+  `stream_task` 透過 message/stream 在遠端狀態更新抵達時逐一轉發，不必等待完整結果。
 
 設計模式:
 - **單一職責原則 (SRP)**: 專注於處理與單一遠端 Agent 的通訊
-- **依賴注入**: 透過 AgentCard 注入 Agent 的連接資訊
+- **依賴注入**: 透過 AgentCard 注入 Agent 的連接資訊，可選擇注入 HTTP 客戶端
 - **錯誤處理**: 優雅處理回應解析失敗的情況
 """
 
+from collections.abc import AsyncIterable, Awaitable, Callable
 from typing import Any, Optional
 from uuid import uuid4
-from a2a.types import AgentCard, Task, SendMessageRequest, MessageSendParams
+from a2a.types import (
+    AgentCard,
+    Message,
+    MessageSendParams,
+    SendMessageRequest,
+    SendStreamingMessageRequest,
+    Task,
+    TaskState,
+    TaskStatus,
+    TaskStatusUpdateEvent,
+)
 import httpx
 from a2a.client import A2AClient
 import logging
 
+from utilities.a2a.http_pool import get_http_client
+
 # 設定日誌記錄器
 logger = logging.getLogger(__name__)
 
+# 代表任務已結束的狀態 (Task states after which no further updates arrive)
+TERMINAL_STATES = {
+    TaskState.completed,
+    TaskState.canceled,
+    TaskState.failed,
+    TaskState.rejected,
+}
+
+
+def _message_text(message: Optional[Message]) -> str:
+    """串接訊息中所有文字部分 (Joins the text parts of a message)。"""
+    if message is None:
+        return ""
+    return "".join(getattr(part.root, "text", "") for part in message.parts)
+
 
 class AgentConnector:
     """
@@ -37,7 +67,9 @@ class AgentConnector:
         response = await connector.send_task("請幫我分析這段代碼", session_id="123")
     """
 
-    def __init__(self, agent_card: AgentCard):
+    def __init__(
+        self, agent_card: AgentCard, httpx_client: Optional[httpx.AsyncClient] = None
+    ):
         """
         初始化 Agent 連接器
 
@@ -45,17 +77,45 @@ class AgentConnector:
             agent_card (AgentCard): A2A Agent 的識別卡片,包含連接所需的元資料
                 - 包含 Agent 的 URL、能力描述、版本等資訊
                 - 通常由 AgentDiscovery 服務提供
+            httpx_client (httpx.AsyncClient, optional): 自訂的 HTTP 客戶端
+                - 預設使用 http_pool 中該 Agent origin 的共用客戶端
         """
         self.agent_card = agent_card
+        self._httpx_client = httpx_client
         logger.info(f"初始化 AgentConnector,目標 Agent: {agent_card.url}")
 
-    async def send_task(self, message: str, session_id: str) -> str:
+    @staticmethod
+    def _build_message_params(message: str) -> MessageSendParams:
+        """
+        建構符合 A2A Protocol 訊息格式規範的 payload。
+        Builds the message payload following the A2A Protocol format.
+        """
+        send_message_payload: dict[str, Any] = {
+            "message": {
+                "role": "user",  # 訊息來源角色
+                "messageId": str(uuid4()),  # 唯一訊息 ID,用於追蹤和去重
+                "parts": [  # 訊息可包含多個部分 (文字、圖片等)
+                    {
+                        "text": message,  # 實際訊息內容
+                        "kind": "text",  # 內容類型
+                    }
+                ],
+            }
+        }
+        return MessageSendParams(**send_message_payload)
+
+    async def send_task(
+        self,
+        message: str,
+        session_id: str,
+        on_update: Optional[Callable[[str], Awaitable[None]]] = None,
+    ) -> str:
         """
         傳送任務給遠端 Agent 並等待回應
         Send a task to the agent and return the response text
 
         執行流程 (Execution Flow):
-        1. 建立非同步 HTTP 客戶端 (支援長時間等待,最多 5 分鐘)
+        1. 取得共用的非同步 HTTP 客戶端 (keep-alive,支援長時間等待,最多 5 分鐘)
         2. 初始化 A2A 客戶端並綁定 AgentCard
         3. 建構符合 A2A 協議的訊息 payload
         4. 發送請求並等待 Agent 處理
@@ -68,6 +128,9 @@ class AgentConnector:
             session_id (str): 工作階段 ID,用於追蹤對話上下文 (The session ID for tracking the conversation)
                 - 同一 session_id 可串聯多輪對話
                 - 建議使用 UUID 或其他唯一識別碼
+            on_update (Callable, optional): 進度回呼 (Progress callback)
+                - 提供時改用 stream_task (message/stream),每個遠端進度更新抵達時即呼叫
+                - 只回傳最終結果,中間狀態透過回呼傳遞
 
         Returns:
             str: Agent 的回應文字 (The response text from the agent)
@@ -79,68 +142,61 @@ class AgentConnector:
             httpx.HTTPError: 當 HTTP 請求失敗時
 
         技術細節 (Technical Details):
-        - 使用非同步上下文管理器確保資源正確釋放
+        - 共用客戶端保持連線 (keep-alive / HTTP/2),由 http_pool.close_http_clients() 釋放
         - Timeout 設定為 300 秒,適合處理複雜任務
         - 訊息格式遵循 A2A Protocol 規範
         """
 
+        if on_update is not None:
+            result = "沒有來自代理的回應 (No response from agent)"
+            async for chunk in self.stream_task(message=message, session_id=session_id):
+                if chunk["is_task_complete"]:
+                    result = chunk["content"]
+                else:
+                    await on_update(chunk["updates"])
+            return result
+
         logger.info(f"發送任務到 Agent (session: {session_id}): {message[:50]}...")
 
         try:
-            # 步驟 1: 建立非同步 HTTP 客戶端
-            # 使用 context manager 確保連接正確關閉
-            async with httpx.AsyncClient(timeout=300.0) as httpx_client:
-
-                # 步驟 2: 初始化 A2A 客戶端
-                # 綁定特定的 AgentCard,確保請求發送到正確的 Agent
-                a2a_client = A2AClient(
-                    httpx_client=httpx_client,
-                    agent_card=self.agent_card,
-                )
+            # 步驟 1: 取得共用的非同步 HTTP 客戶端
+            # 同一 Agent 的任務共用連線,避免每次重新建立 TCP/TLS 連線
+            httpx_client = self._httpx_client or get_http_client(self.agent_card.url)
 
-                # 步驟 3: 建構訊息 payload
-                # 遵循 A2A Protocol 的訊息格式規範
-                send_message_payload: dict[str, Any] = {
-                    "message": {
-                        "role": "user",  # 訊息來源角色
-                        "messageId": str(uuid4()),  # 唯一訊息 ID,用於追蹤和去重
-                        "parts": [  # 訊息可包含多個部分 (文字、圖片等)
-                            {
-                                "text": message,  # 實際訊息內容
-                                "kind": "text",  # 內容類型
-                            }
-                        ],
-                    }
-                }
+            # 步驟 2: 初始化 A2A 客戶端
+            # 綁定特定的 AgentCard,確保請求發送到正確的 Agent
+            a2a_client = A2AClient(
+                httpx_client=httpx_client,
+                agent_card=self.agent_card,
+            )
 
-                # 步驟 4: 建立發送請求物件
-                # 包裝 payload 為標準的 SendMessageRequest
-                request = SendMessageRequest(
-                    id=str(uuid4()),  # 請求 ID
-                    params=MessageSendParams(**send_message_payload),
-                )
+            # 步驟 3-4: 建構訊息 payload 並包裝為標準的 SendMessageRequest
+            request = SendMessageRequest(
+                id=str(uuid4()),  # 請求 ID
+                params=self._build_message_params(message),
+            )
 
-                # 步驟 5: 發送訊息並等待回應
-                logger.debug(f"正在等待 Agent 回應...")
-                response = await a2a_client.send_message(request=request)
+            # 步驟 5: 發送訊息並等待回應
+            logger.debug(f"正在等待 Agent 回應...")
+            response = await a2a_client.send_message(request=request)
 
-                # 步驟 6: 轉換回應為字典格式便於處理
-                response_data = response.model_dump(mode="json", exclude_none=True)
+            # 步驟 6: 轉換回應為字典格式便於處理
+            response_data = response.model_dump(mode="json", exclude_none=True)
 
-                # 步驟 7: 安全地提取回應文字
-                # 使用 try-except 處理可能的結構變化或缺失欄位
-                try:
-                    agent_response = response_data["result"]["status"]["message"]["parts"][0]["text"]
-                    logger.info(
-                        f"成功接收 Agent 回應 (長度: {len(agent_response)} 字元)"
-                    )
-                except (KeyError, IndexError) as e:
-                    # 當回應結構不符合預期時的錯誤處理
-                    logger.error(f"無法解析 Agent 回應: {e}")
-                    logger.debug(f"回應資料結構: {response_data}")
-                    agent_response = "沒有來自代理的回應 (No response from agent)"
+            # 步驟 7: 安全地提取回應文字
+            # 使用 try-except 處理可能的結構變化或缺失欄位
+            try:
+                agent_response = response_data["result"]["status"]["message"]["parts"][0]["text"]
+                logger.info(
+                    f"成功接收 Agent 回應 (長度: {len(agent_response)} 字元)"
+                )
+            except (KeyError, IndexError) as e:
+                # 當回應結構不符合預期時的錯誤處理
+                logger.error(f"無法解析 Agent 回應: {e}")
+                logger.debug(f"回應資料結構: {response_data}")
+                agent_response = "沒有來自代理的回應 (No response from agent)"
 
-                return agent_response
+            return agent_response
 
         except httpx.TimeoutException as e:
             # 處理超時錯誤
@@ -157,3 +213,105 @@ class AgentConnector:
             error_msg = f"未預期的錯誤: {str(e)}"
             logger.exception(error_msg)
             return f"錯誤: {error_msg}"
+
+    async def stream_task(self, message: str, session_id: str) -> AsyncIterable[dict]:
+        """
+        以 message/stream 傳送任務，並在遠端狀態更新 (TaskStatusUpdateEvent) 抵達時逐一產生。
+        Send a task via message/stream and yield remote status updates as they arrive.
+
+        遠端 Agent 不支援串流時 (AgentCard.capabilities.streaming 為 False)，
+        退回 send_task 並只產生一次最終結果。
+
+        Args:
+            message (str): 要傳送給代理的訊息內容 (The message to send to the agent)
+            session_id (str): 工作階段 ID (The session ID for tracking the conversation)
+
+        Yields:
+            {
+                'is_task_complete': bool,  # 任務是否已結束 (completed/canceled/failed/rejected)
+                'state': str,  # 遠端任務狀態
+                'updates': str,  # 未結束時的進度文字
+                'content': str  # 結束時的最終結果
+            }
+        """
+        capabilities = self.agent_card.capabilities
+        if not (capabilities and capabilities.streaming):
+            content = await self.send_task(message=message, session_id=session_id)
+            yield {"is_task_complete": True, "state": "unknown", "content": content}
+            return
+
+        logger.info(f"串流任務到 Agent (session: {session_id}): {message[:50]}...")
+
+        try:
+            httpx_client = self._httpx_client or get_http_client(self.agent_card.url)
+            a2a_client = A2AClient(httpx_client=httpx_client, agent_card=self.agent_card)
+            request = SendStreamingMessageRequest(
+                id=str(uuid4()), params=self._build_message_params(message)
+            )
+
+            async for response in a2a_client.send_message_streaming(request=request):
+                error = getattr(response.root, "error", None)
+                if error is not None:
+                    yield {
+                        "is_task_complete": True,
+                        "state": TaskState.failed.value,
+                        "content": f"錯誤: {error.message}",
+                    }
+                    return
+
+                chunk = self._status_chunk(response.root.result)
+                if chunk is None:
+                    continue
+                yield chunk
+                if chunk["is_task_complete"]:
+                    return
+
+            # 串流結束但沒有收到最終狀態 (Stream ended without a terminal status)
+            yield {
+                "is_task_complete": True,
+                "state": TaskState.unknown.value,
+                "content": "沒有來自代理的回應 (No response from agent)",
+            }
+
+        except httpx.TimeoutException as e:
+            error_msg = f"請求超時 (Timeout after 300s): {str(e)}"
+            logger.error(error_msg)
+            yield {"is_task_complete": True, "state": TaskState.failed.value, "content": f"錯誤: {error_msg}"}
+        except httpx.HTTPError as e:
+            error_msg = f"HTTP 請求失敗: {str(e)}"
+            logger.error(error_msg)
+            yield {"is_task_complete": True, "state": TaskState.failed.value, "content": f"錯誤: {error_msg}"}
+        except Exception as e:
+            error_msg = f"未預期的錯誤: {str(e)}"
+            logger.exception(error_msg)
+            yield {"is_task_complete": True, "state": TaskState.failed.value, "content": f"錯誤: {error_msg}"}
+
+    @staticmethod
+    def _status_chunk(result: Any) -> Optional[dict]:
+        """
+        將串流事件轉換為進度區塊；非狀態事件 (例如 artifact 更新) 回傳 None。
+        Converts a streaming event into a progress chunk.
+        """
+        if isinstance(result, Message):
+            # 遠端直接以訊息回覆 (沒有建立任務)
+            return {
+                "is_task_complete": True,
+                "state": TaskState.completed.value,
+                "content": _message_text(result),
+            }
+
+        if isinstance(result, TaskStatusUpdateEvent):
+            status: TaskStatus = result.status
+            finished = result.final or status.state in TERMINAL_STATES
+        elif isinstance(result, Task):
+            status = result.status
+            finished = status.state in TERMINAL_STATES
+        else:
+            return None
+
+        text = _message_text(status.message)
+        if finished:
+            return {"is_task_complete": True, "state": status.state.value, "content": text}
+        if not text:
+            return None
+        return {"is_task_complete": False, "state": status.state.value, "updates": text}
@@ -1,36 +1,69 @@
 """
 重點摘要:
 - **核心概念**: A2A 代理發現 (Discovery)。
-- **關鍵技術**: JSON 設定檔, HTTP 請求, A2A Protocol (/.well-known/agent.json)。
+- **關鍵技術**: JSON 設定檔, HTTP 請求, A2A Protocol (/.well-known/agent.json), HTTP 條件式請求 (ETag)。
 - **重要結論**: 實作了一個簡單的基於檔案的發現機制，用於定位網路上的其他 Agent。
+  AgentCard 依 TTL 快取，過期後先回傳快取並在背景以 ETag / Last-Modified 重新驗證，
+  委派任務時不必每次重新下載所有代理的 AgentCard。
 """
 
 import json
 import os
 import asyncio
 import logging
+import time
+from dataclasses import dataclass
 from typing import Optional
 from a2a.types import AgentCard
-
-from a2a.client import A2ACardResolver
+from a2a.utils.constants import AGENT_CARD_WELL_KNOWN_PATH
 
 import httpx
 
+from utilities.a2a.http_pool import get_http_client
+
 # 設定日誌記錄器
 logger = logging.getLogger(__name__)
 
+# AgentCard 快取的預設存活時間 (秒) (Default TTL of cached AgentCards in seconds)
+DEFAULT_CARD_TTL = float(os.getenv("A2A_CARD_TTL", "300"))
+
+# 查詢 AgentCard 的逾時時間 (秒) (Timeout for fetching an AgentCard)
+CARD_FETCH_TIMEOUT = 10.0
+
+
+@dataclass
+class CachedAgentCard:
+    """
+    快取的 AgentCard 與其 HTTP 驗證資訊 (Cached AgentCard with its HTTP validators)。
+
+    Attributes:
+        card (AgentCard): 代理卡片 (The agent card.)
+        fetched_at (float): 最後一次取得或驗證的時間 (time.monotonic())
+        etag (Optional[str]): 回應的 ETag 標頭 (The response ETag header.)
+        last_modified (Optional[str]): 回應的 Last-Modified 標頭 (The response Last-Modified header.)
+    """
+
+    card: AgentCard
+    fetched_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
 
 class AgentDiscovery:
     """
     透過讀取 URL 的註冊檔並查詢每一個 URL 的 /.well-known/agent.json 端點來檢索 AgentCard，
     藉此發現 A2A 代理。
 
+    取得的 AgentCard 會快取 `ttl` 秒；過期的卡片仍立即回傳，同時在背景以條件式請求
+    (If-None-Match / If-Modified-Since) 重新驗證 (stale-while-revalidate)。
+
     Attributes:
         registry_file (str): 代理註冊檔案的路徑。 (Path to the agent registry file.)
         base_urls (List[str]): A2A 代理的基本 URL 列表。 (List of base URLs for A2A Agents.)
+        ttl (float): AgentCard 快取的存活時間 (秒)。 (TTL of cached AgentCards in seconds.)
     """
 
-    def __init__(self, registry_file: str = None):
+    def __init__(self, registry_file: str = None, ttl: float = DEFAULT_CARD_TTL):
         """
         初始化 AgentDiscovery。
         Initialise the AgentDiscovery
@@ -38,6 +71,7 @@ class AgentDiscovery:
         Args:
             registry_file (str): 代理註冊檔案的路徑。 (Path to the agent registry file.)
                 預設為 'utilities/a2a/agent_registry.json'。 (Defaults to 'utilities/a2a/agent_registry.json'.)
+            ttl (float): AgentCard 快取的存活時間 (秒)。 (TTL of cached AgentCards in seconds.)
         """
         if registry_file:
             self.registry_file = registry_file
@@ -46,6 +80,12 @@ class AgentDiscovery:
                 os.path.dirname(__file__), "agent_registry.json"
             )
         self.base_urls = self._load_registry()
+        self.ttl = ttl
+        self._cache: dict[str, CachedAgentCard] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+        # 等待背景重新驗證的 URL (依加入順序) 與正在重新驗證的 URL
+        self._pending_refresh: dict[str, None] = {}
+        self._refreshing: set[str] = set()
 
     def _load_registry(self) -> list[str]:
         """
@@ -70,19 +110,25 @@ class AgentDiscovery:
             print(f"解析註冊檔時發生錯誤 (Error parsing registry file): {e}")
             return []
 
-    async def list_agent_cards(self) -> list[AgentCard]:
+    def _is_fresh(self, base_url: str) -> bool:
+        entry = self._cache.get(base_url)
+        return entry is not None and time.monotonic() - entry.fetched_at < self.ttl
+
+    async def list_agent_cards(self, force_refresh: bool = False) -> list[AgentCard]:
         """
-        非同步地從註冊表中的每個基本 URL 獲取 AgentCard。
-        Asynchronously fetches AgentCards from each
-        base URL in the registry.
+        回傳註冊表中每個基本 URL 的 AgentCard，優先使用快取。
+        Returns the AgentCard of each base URL in the registry, preferring the cache.
+
+        Args:
+            force_refresh (bool): 忽略快取，立即重新取得所有 AgentCard。 (Ignore the cache and refetch every card.)
 
         Returns:
             list[AgentCard]: 從代理檢索到的 AgentCard 列表。 (List of AgentCards retrieved from the agents.)
 
         Note:
-            - 使用並行請求提升效能 (Uses concurrent requests for better performance)
+            - 尚未快取的卡片會並行取得 (Uncached cards are fetched concurrently)
+            - 過期的卡片立即回傳，並在背景重新驗證 (Stale cards are served and revalidated in the background)
             - 單一 Agent 失敗不會影響其他 Agent (Individual agent failures won't affect others)
-            - 自動記錄成功與失敗的結果 (Automatically logs success and failure results)
         """
         if not self.base_urls:
             logger.warning(
@@ -90,59 +136,126 @@ class AgentDiscovery:
             )
             return []
 
-        cards: list[AgentCard] = []
-
-        async with httpx.AsyncClient(timeout=300.0) as httpx_client:
-            # 建立所有的非同步任務
-            tasks = [
-                self._fetch_agent_card(base_url, httpx_client)
-                for base_url in self.base_urls
-            ]
-
-            # 並行執行所有任務
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-
-            # 處理結果
-            for base_url, result in zip(self.base_urls, results):
-                if isinstance(result, Exception):
-                    logger.error(
-                        f"從 {base_url} 獲取 AgentCard 失敗: {result} "
-                        f"(Failed to fetch AgentCard from {base_url}: {result})"
-                    )
-                elif result is not None:
-                    cards.append(result)
-                    logger.info(
-                        f"成功從 {base_url} 獲取 AgentCard (Successfully fetched AgentCard from {base_url})"
-                    )
+        missing = [
+            url for url in self.base_urls if force_refresh or url not in self._cache
+        ]
+        if missing:
+            await self._refresh(missing)
+
+        stale = [
+            url
+            for url in self.base_urls
+            if url not in missing and url in self._cache and not self._is_fresh(url)
+        ]
+        if stale:
+            self._schedule_refresh(stale)
+
+        return [self._cache[url].card for url in self.base_urls if url in self._cache]
+
+    def _schedule_refresh(self, base_urls: list[str]) -> None:
+        """
+        在背景重新驗證過期的 AgentCard；同一時間只會有一個背景工作。
+        背景工作進行中才過期的 URL 會排入佇列，由同一個工作在本輪結束後接著重新驗證。
+        """
+        for url in base_urls:
+            if url not in self._refreshing:
+                self._pending_refresh[url] = None
+        if not self._pending_refresh:
+            return
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._drain_refresh_queue())
+
+    async def _drain_refresh_queue(self) -> None:
+        """依序重新驗證佇列中的 URL，直到佇列清空。"""
+        while self._pending_refresh:
+            batch = list(self._pending_refresh)
+            self._pending_refresh.clear()
+            self._refreshing.update(batch)
+            try:
+                await self._refresh(batch)
+            finally:
+                self._refreshing.difference_update(batch)
+
+    async def _refresh(self, base_urls: list[str]) -> None:
+        """
+        並行取得或重新驗證指定 URL 的 AgentCard，並更新快取。
+        Concurrently fetches or revalidates the AgentCards of the given URLs.
+        """
+        # 建立所有的非同步任務
+        tasks = [
+            self._fetch_agent_card(base_url, get_http_client(base_url))
+            for base_url in base_urls
+        ]
+
+        # 並行執行所有任務
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        # 處理結果
+        for base_url, result in zip(base_urls, results):
+            if isinstance(result, Exception):
+                # 重新驗證失敗時保留舊的卡片，下次呼叫會再次嘗試
+                logger.error(
+                    f"從 {base_url} 獲取 AgentCard 失敗: {result} "
+                    f"(Failed to fetch AgentCard from {base_url}: {result})"
+                )
+            elif result is not None:
+                entry = self._cache.get(base_url)
+                if entry is None or entry.card is not result:
+                    self._cache[base_url] = CachedAgentCard(result, time.monotonic())
+                logger.info(
+                    f"成功從 {base_url} 獲取 AgentCard (Successfully fetched AgentCard from {base_url})"
+                )
 
         logger.info(
-            f"共獲取 {len(cards)}/{len(self.base_urls)} 個 AgentCard (Fetched {len(cards)}/{len(self.base_urls)} AgentCards)"
+            f"共快取 {len(self._cache)}/{len(self.base_urls)} 個 AgentCard (Cached {len(self._cache)}/{len(self.base_urls)} AgentCards)"
         )
-        return cards
 
     async def _fetch_agent_card(
         self, base_url: str, httpx_client: httpx.AsyncClient
     ) -> Optional[AgentCard]:
         """
-        從單一 base URL 獲取 AgentCard (輔助方法)。
-        Fetches an AgentCard from a single base URL (helper method).
+        從單一 base URL 獲取 AgentCard (輔助方法)；已快取時以條件式請求重新驗證。
+        Fetches an AgentCard from a single base URL (helper method),
+        revalidating with a conditional request when it is cached.
 
         Args:
             base_url (str): Agent 的基本 URL。 (The base URL of the agent.)
             httpx_client (httpx.AsyncClient): 共用的 HTTP 客戶端。 (Shared HTTP client.)
 
         Returns:
-            Optional[AgentCard]: 成功時返回 AgentCard,失敗時返回 None。
+            Optional[AgentCard]: 成功時返回 AgentCard (304 時為快取的卡片),失敗時返回 None。
                                  (Returns AgentCard on success, None on failure.)
 
         Raises:
             Exception: 傳遞任何在獲取過程中發生的異常。 (Propagates any exceptions during fetching.)
         """
+        cached = self._cache.get(base_url)
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
         try:
-            resolver = A2ACardResolver(
-                base_url=base_url.rstrip("/"), httpx_client=httpx_client
+            response = await httpx_client.get(
+                f"{base_url.rstrip('/')}{AGENT_CARD_WELL_KNOWN_PATH}",
+                headers=headers,
+                timeout=CARD_FETCH_TIMEOUT,
+            )
+            if response.status_code == 304 and cached is not None:
+                # 卡片未變更，只更新驗證時間 (Card unchanged, only renew its freshness)
+                cached.fetched_at = time.monotonic()
+                return cached.card
+
+            response.raise_for_status()
+            card = AgentCard.model_validate(response.json())
+            self._cache[base_url] = CachedAgentCard(
+                card=card,
+                fetched_at=time.monotonic(),
+                etag=response.headers.get("etag"),
+                last_modified=response.headers.get("last-modified"),
             )
-            card = await resolver.get_agent_card()
             return card
         except httpx.TimeoutException as e:
             logger.error(f"請求 {base_url} 超時 (Timeout requesting {base_url}): {e}")
@@ -157,3 +270,17 @@ class AgentDiscovery:
                 f"從 {base_url} 獲取 AgentCard 時發生未預期的錯誤 (Unexpected error fetching AgentCard from {base_url}): {e}"
             )
             raise
+
+    async def aclose(self) -> None:
+        """
+        取消進行中的背景重新驗證工作。
+        Cancels the in-flight background revalidation task.
+        """
+        self._pending_refresh.clear()
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+        self._refresh_task = None
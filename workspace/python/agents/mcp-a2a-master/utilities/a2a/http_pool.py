@@ -0,0 +1,77 @@
+"""
+重點摘要:
+- **核心概念**: 共用的 HTTP 連線池 (Shared HTTP connection pool)。
+- **關鍵技術**: HTTPX `AsyncClient` (keep-alive, HTTP/2), `weakref.WeakKeyDictionary`。
+- **重要結論**: 每個遠端代理 (origin) 共用一個長駐的 AsyncClient，委派任務與查詢 AgentCard
+  不必每次重新建立 TCP/TLS 連線；HTTPS 代理以 ALPN 協商 HTTP/2，多個請求共用同一條連線
+  (需要 `httpx[http2]`，已列於相依套件)。
+
+設計模式:
+- **物件池 (Object Pool)**: 以 (事件迴圈, origin) 為鍵快取 AsyncClient
+"""
+
+import asyncio
+import logging
+import os
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
+
+# 設定日誌記錄器
+logger = logging.getLogger(__name__)
+
+# 預設請求逾時 (秒)，適合處理長時間任務 (Default request timeout for long-running tasks)
+DEFAULT_TIMEOUT = float(os.getenv("A2A_HTTP_TIMEOUT", "300"))
+
+# 每個 origin 的連線上限 (Per-origin connection limits)
+DEFAULT_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("A2A_HTTP_MAX_CONNECTIONS", "20")),
+    max_keepalive_connections=int(os.getenv("A2A_HTTP_MAX_KEEPALIVE", "10")),
+    keepalive_expiry=float(os.getenv("A2A_HTTP_KEEPALIVE_EXPIRY", "60")),
+)
+
+# AsyncClient 綁定建立它的事件迴圈；事件迴圈結束後對應的項目會自動移除
+# AsyncClients are bound to the loop that created them; entries vanish with the loop
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, httpx.AsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def get_http_client(url: str) -> httpx.AsyncClient:
+    """
+    回傳指定 URL 所屬 origin 的共用 AsyncClient，必要時建立。
+    Returns the shared AsyncClient for the URL's origin, creating it if needed.
+
+    Args:
+        url (str): 遠端代理的任一 URL (Any URL of the remote agent)
+
+    Returns:
+        httpx.AsyncClient: 支援 keep-alive 與 HTTP/2 的共用客戶端
+    """
+    loop = asyncio.get_running_loop()
+    pool = _clients.setdefault(loop, {})
+    origin = _origin(url)
+    client = pool.get(origin)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=DEFAULT_TIMEOUT, limits=DEFAULT_LIMITS, http2=True
+        )
+        pool[origin] = client
+        logger.debug("建立共用 HTTP 客戶端 (Created pooled HTTP client) %s", origin)
+    return client
+
+
+async def close_http_clients() -> None:
+    """
+    關閉目前事件迴圈中所有的共用 AsyncClient (例如應用程式關閉時)。
+    Closes every pooled AsyncClient of the running event loop (e.g. on shutdown).
+    """
+    pool = _clients.pop(asyncio.get_running_loop(), {})
+    for client in pool.values():
+        await client.aclose()
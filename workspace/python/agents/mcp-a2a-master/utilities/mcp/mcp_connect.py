@@ -1,18 +1,24 @@
 """
 重點摘要:
 - **核心概念**: MCP 連接器 (Connector)。
-- **關鍵技術**: Google ADK MCP Toolset, `asyncio` (Timeout, Error Handling)。
+- **關鍵技術**: Google ADK MCP Toolset, `asyncio` (Timeout, Error Handling, gather)。
 - **重要結論**: 負責連線到 MCP Server 並載入其提供的工具，轉換為 Agent 可使用的格式。
+  所有伺服器並行初始化，啟動時間取決於最慢的伺服器而非總和；
+  工具列表依 TTL 快取，設定檔變更時自動失效，Stdio 伺服器程序保持熱機重複使用。
 """
 
 import asyncio
+import json
 import logging
+import os
 
 # 新增: 匯入 signal 和 sys 以處理優雅關閉
 # ADDED: Import signal and sys for graceful shutdown handling
 import signal
 import sys
+import time
 from contextlib import asynccontextmanager
+from typing import Any, Optional
 from utilities.mcp.mcp_discovery import MCPDiscovery
 from google.adk.tools.mcp_tool.mcp_toolset import MCPToolset
 from google.adk.tools.mcp_tool import StdioConnectionParams
@@ -27,6 +33,12 @@ from rich import print
 logging.getLogger("mcp").setLevel(logging.ERROR)
 logger = logging.getLogger(__name__)
 
+# 工具列表快取的預設存活時間 (秒) (Default TTL of the cached tool listing in seconds)
+DEFAULT_TOOLS_TTL = float(os.getenv("MCP_TOOLS_TTL", "300"))
+
+# 單一伺服器初始化的逾時時間 (秒) (Per-server initialization timeout in seconds)
+DEFAULT_INIT_TIMEOUT = 10.0
+
 
 class MCPConnector:
     """
@@ -34,70 +46,187 @@ class MCPConnector:
     設定檔將由 MCP 發現類別載入。
     然後它列出每個伺服器的工具，
     並將它們快取為與 Google Agent Development Kit 相容的 MCPToolsets。
+
+    快取行為 (Caching behavior):
+    - 工具列表在 `ttl` 秒內直接回傳快取，不重新連線
+    - `mcp_config.json` 的修改時間或大小改變時，快取立即失效並重新載入設定
+    - 連線池 (`_pool`) 以伺服器名稱保存已初始化的 MCPToolset；定義未變更的伺服器
+      在重新載入時沿用同一個 Toolset，其 Stdio 程序與工作階段保持熱機
     """
 
-    def __init__(self, config_file: str = None):
+    def __init__(
+        self,
+        config_file: str = None,
+        ttl: float = DEFAULT_TOOLS_TTL,
+        init_timeout: float = DEFAULT_INIT_TIMEOUT,
+    ):
         self.discovery = MCPDiscovery(config_file=config_file)
         self.tools: list[MCPToolset] = []
+        self.ttl = ttl
+        self.init_timeout = init_timeout
+
+        # 伺服器名稱 -> (伺服器定義的正規化 JSON, 已初始化的 MCPToolset)
+        # server name -> (canonical JSON of the server definition, warm MCPToolset)
+        self._pool: dict[str, tuple[str, MCPToolset]] = {}
+        self._loaded_at: Optional[float] = None
+        self._config_signature = self._read_config_signature()
+        self._lock = asyncio.Lock()
+
+    def _read_config_signature(self) -> Optional[tuple[int, int]]:
+        """回傳設定檔的 (修改時間, 大小)，用於偵測變更；檔案不存在時回傳 None。"""
+        try:
+            stat = os.stat(self.discovery.config_file)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _config_changed(self) -> bool:
+        return self._read_config_signature() != self._config_signature
+
+    def _is_fresh(self) -> bool:
+        """快取是否仍有效 (未過期且設定檔未變更)。"""
+        if self._loaded_at is None or self._config_changed():
+            return False
+        return time.monotonic() - self._loaded_at < self.ttl
+
+    def _reload_config(self) -> None:
+        """設定檔變更時重新讀取；讀取失敗時保留目前的設定。"""
+        signature = self._read_config_signature()
+        if signature == self._config_signature:
+            return
+        try:
+            self.discovery.reload()
+        except (FileNotFoundError, RuntimeError) as e:
+            print(
+                f"[bold red]重新載入 MCP 設定失敗，沿用目前設定 (Failed to reload MCP config, keeping current one): {e}[/bold red]"
+            )
+        self._config_signature = signature
+
+    @staticmethod
+    def _build_connection(server: dict[str, Any]):
+        if server.get("command") == "streamable_http":
+            return StreamableHTTPServerParams(url=server["args"][0])
+        return StdioConnectionParams(
+            server_params=StdioServerParameters(
+                command=server["command"], args=server["args"]
+            ),
+            timeout=5,
+        )
+
+    async def _load_server(self, name: str, server: dict[str, Any]) -> Optional[MCPToolset]:
+        """
+        初始化單一伺服器並列出其工具；失敗時回傳 None 並將其移出連線池。
+        Initializes one server and lists its tools; returns None on failure.
+        """
+        definition = json.dumps(server, sort_keys=True)
+        pooled = self._pool.get(name)
+        if pooled is not None and pooled[0] == definition:
+            mcp_toolset = pooled[1]
+        else:
+            if pooled is not None:
+                # 伺服器定義已變更，關閉舊的程序 (Definition changed, close the old process)
+                await self._close_toolset(name, pooled[1])
+            mcp_toolset = MCPToolset(connection_params=self._build_connection(server))
+
+        try:
+            # 新增: 使用 timeout 和錯誤處理包裝 toolset 建立過程
+            # 這可以防止在無回應的 MCP 伺服器上卡住
+            # ADDED: Wrap toolset creation with timeout and error handling
+            # This prevents hanging on unresponsive MCP servers
+            toolset = await asyncio.wait_for(
+                mcp_toolset.get_tools(), timeout=self.init_timeout
+            )
+
+        # 新增: 針對不同類型的連接失敗進行特定錯誤處理
+        # ADDED: Specific error handling for different types of connection failures
+        except asyncio.TimeoutError:
+            print(
+                f"[bold red]載入伺服器 '{name}' 的工具逾時 (跳過) (Timeout loading tools from server '{name}' (skipping))[/bold red]"
+            )
+        except ConnectionError as e:
+            print(
+                f"[bold red]載入伺服器 '{name}' 的工具時發生連接錯誤: {e} (跳過) (Connection error loading tools from server '{name}': {e} (skipping))[/bold red]"
+            )
+        except Exception as e:
+            print(
+                f"[bold red]載入伺服器 '{name}' 的工具時發生錯誤: {e} (跳過) (Error loading tools from server '{name}': {e} (skipping))[/bold red]"
+            )
+        else:
+            self._pool[name] = (definition, mcp_toolset)
+            if toolset:
+                # 建立實際的 toolset 物件進行快取 (Create the actual toolset object for caching)
+                tool_names = [tool.name for tool in toolset]
+                print(
+                    f"[bold green]已從伺服器 [cyan]'{name}'[/cyan] 載入工具:[/bold green] {', '.join(tool_names)}"
+                )
+                return mcp_toolset
+            return None
+
+        # 失敗的伺服器不留在連線池中，下次重新建立 (Failed servers are recreated next time)
+        self._pool.pop(name, None)
+        await self._close_toolset(name, mcp_toolset)
+        return None
+
+    @staticmethod
+    async def _close_toolset(name: str, mcp_toolset: MCPToolset) -> None:
+        try:
+            await mcp_toolset.close()
+        except Exception as e:
+            logger.debug("關閉伺服器 '%s' 的 toolset 失敗: %s", name, e)
 
     async def _load_all_tools(self):
         """
-        從發現的 MCP 伺服器載入所有工具，並將它們快取為 MCPToolsets。
-        Loads all tools from the discovered MCP servers
+        從發現的 MCP 伺服器並行載入所有工具，並將它們快取為 MCPToolsets。
+        Loads all tools from the discovered MCP servers concurrently
         and caches them as MCPToolsets.
         """
 
-        tools = []
-
-        for name, server in self.discovery.list_servers().items():
-            try:
-                if server.get("command") == "streamable_http":
-                    conn = StreamableHTTPServerParams(url=server["args"][0])
-                else:
-                    conn = StdioConnectionParams(
-                        server_params=StdioServerParameters(
-                            command=server["command"], args=server["args"]
-                        ),
-                        timeout=5,
-                    )
-
-                # 新增: 使用 timeout 和錯誤處理包裝 toolset 建立過程
-                # 這可以防止在無回應的 MCP 伺服器上卡住
-                # ADDED: Wrap toolset creation with timeout and error handling
-                # This prevents hanging on unresponsive MCP servers
-                mcp_toolset = MCPToolset(connection_params=conn)
-                toolset = await asyncio.wait_for(mcp_toolset.get_tools(), timeout=10.0)
-
-                if toolset:
-                    # 建立實際的 toolset 物件進行快取 (Create the actual toolset object for caching)
-                    tool_names = [tool.name for tool in toolset]
-                    print(
-                        f"[bold green]已從伺服器 [cyan]'{name}'[/cyan] 載入工具:[/bold green] {', '.join(tool_names)}"
-                    )
-                    tools.append(mcp_toolset)
-
-            # 新增: 針對不同類型的連接失敗進行特定錯誤處理
-            # ADDED: Specific error handling for different types of connection failures
-            except asyncio.TimeoutError:
-                print(
-                    f"[bold red]載入伺服器 '{name}' 的工具逾時 (跳過) (Timeout loading tools from server '{name}' (skipping))[/bold red]"
-                )
-            except ConnectionError as e:
-                print(
-                    f"[bold red]載入伺服器 '{name}' 的工具時發生連接錯誤: {e} (跳過) (Connection error loading tools from server '{name}': {e} (skipping))[/bold red]"
-                )
-            except Exception as e:
-                print(
-                    f"[bold red]載入伺服器 '{name}' 的工具時發生錯誤: {e} (跳過) (Error loading tools from server '{name}': {e} (skipping))[/bold red]"
-                )
+        self._reload_config()
+        servers = self.discovery.list_servers()
 
-        self.tools = tools
+        # 關閉已從設定檔移除的伺服器 (Close servers removed from the config)
+        for name in [name for name in self._pool if name not in servers]:
+            _, mcp_toolset = self._pool.pop(name)
+            await self._close_toolset(name, mcp_toolset)
 
-    async def get_tools(self) -> list[MCPToolset]:
+        results = await asyncio.gather(
+            *(self._load_server(name, server) for name, server in servers.items())
+        )
+
+        self.tools = [toolset for toolset in results if toolset is not None]
+        self._loaded_at = time.monotonic()
+
+    async def get_tools(self, force_refresh: bool = False) -> list[MCPToolset]:
         """
-        回傳快取的 MCPToolsets 列表。
-        Returns the cached list of MCPToolsets.
+        回傳快取的 MCPToolsets 列表；快取過期或設定檔變更時重新載入。
+        Returns the cached list of MCPToolsets, reloading it when the TTL
+        expired or the config file changed.
+
+        Args:
+            force_refresh: 忽略快取強制重新載入 (Ignore the cache and reload)
         """
 
-        await self._load_all_tools()
+        if force_refresh or not self._is_fresh():
+            async with self._lock:
+                # 等待鎖期間可能已有其他呼叫者完成載入 (Another caller may have reloaded meanwhile)
+                if force_refresh or not self._is_fresh():
+                    await self._load_all_tools()
         return self.tools.copy()
+
+    def invalidate(self) -> None:
+        """
+        使工具列表快取失效；連線池中的熱機程序保留。
+        Invalidates the tool listing cache while keeping pooled processes warm.
+        """
+        self._loaded_at = None
+
+    async def close(self) -> None:
+        """
+        關閉連線池中所有的 MCPToolset 與其伺服器程序。
+        Closes every pooled MCPToolset and its server process.
+        """
+        pool, self._pool = self._pool, {}
+        for name, (_, mcp_toolset) in pool.items():
+            await self._close_toolset(name, mcp_toolset)
+        self.tools = []
+        self._loaded_at = None
@@ -61,6 +61,13 @@ class MCPDiscovery:
                 f"讀取設定檔時發生錯誤 (Error reading configuration file) {self.config_file}: {e}"
             )
 
+    def reload(self) -> None:
+        """
+        重新讀取設定檔 (例如檔案已被修改時)。
+        Re-reads the configuration file (e.g. after it was modified).
+        """
+        self.config = self._load_config()
+
     def list_servers(self) -> Dict[str, Any]:
         """
         回傳設定檔中定義的 MCP 伺服器。
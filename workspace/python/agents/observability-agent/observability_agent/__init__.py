@@ -11,6 +11,7 @@ from .agent import (
     AgentMetrics,
     root_agent
 )
+from .event_exporter import EventExporter
 
 __all__ = [
     'CustomerServiceMonitor',
@@ -18,5 +19,6 @@ __all__ = [
     'MetricsCollector',
     'EventAlerter',
     'AgentMetrics',
+    'EventExporter',
     'root_agent'
 ]
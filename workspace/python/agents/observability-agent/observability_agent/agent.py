@@ -1,7 +1,8 @@
 import asyncio
 import logging
+from collections import Counter, deque
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Callable
+from typing import List, Dict, Any, Optional, Callable, Deque
 from dataclasses import dataclass
 
 from google.adk.agents import Agent
@@ -10,6 +11,8 @@ from google.adk.sessions import Session, InMemorySessionService
 from google.adk.events import Event, EventActions
 from google.genai import types
 
+from .event_exporter import EventExporter
+
 
 # 設定日誌記錄
 logging.basicConfig(
@@ -30,11 +33,25 @@ class CustomerServiceMonitor:
     - 提供詳細報告
     """
 
-    def __init__(self):
-        """初始化客戶服務監控系統。"""
+    def __init__(
+        self,
+        max_events: int = 1000,
+        exporter: Optional[EventExporter] = None
+    ):
+        """
+        初始化客戶服務監控系統。
+
+        Args:
+            max_events: 記憶體中保留的最近事件數 (供時間軸使用)
+            exporter: 選用的事件匯出器；完整事件歷史由匯出器寫入檔案
+        """
 
-        # 事件日誌儲存
-        self.events: List[Dict[str, Any]] = []
+        # 事件日誌儲存：只保留最近的事件，計數器則涵蓋所有事件
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=max_events)
+        self.exporter = exporter
+        self.total_events = 0
+        self.event_type_counts: Counter = Counter()
+        self.tool_usage_counts: Counter = Counter()
 
         # 建立具備事件追蹤功能的工具
 
@@ -183,24 +200,35 @@ class CustomerServiceMonitor:
         )
         self.session_service = session_service
 
+    def _record(self, event: Dict[str, Any]):
+        """保存事件、更新計數器並交給匯出器 (非阻塞)。"""
+        self.events.append(event)
+        self.total_events += 1
+        self.event_type_counts[event['type']] += 1
+        if self.exporter is not None:
+            self.exporter.export(event)
+
     def _log_tool_call(self, tool_name: str, args: Dict[str, Any]):
         """記錄工具調用。"""
-        self.events.append({
+        self._record({
             'timestamp': datetime.now().isoformat(),
             'type': 'tool_call',
             'tool': tool_name,
             'arguments': args
         })
-        logger.info(f"工具已呼叫：{tool_name}，參數：{args}")
+        self.tool_usage_counts[tool_name] += 1
+        if self.exporter is None:
+            logger.info("工具已呼叫：%s，參數：%s", tool_name, args)
 
     def _log_agent_event(self, event_type: str, data: Dict[str, Any]):
         """記錄代理程式事件。"""
-        self.events.append({
+        self._record({
             'timestamp': datetime.now().isoformat(),
             'type': event_type,
             'data': data
         })
-        logger.info(f"代理程式事件：{event_type} - {data}")
+        if self.exporter is None:
+            logger.info("代理程式事件：%s - %s", event_type, data)
 
     async def handle_customer_query(
         self,
@@ -280,14 +308,12 @@ class CustomerServiceMonitor:
     def get_event_summary(self) -> str:
         """產生事件摘要報告。"""
 
-        total_events = len(self.events)
-
-        event_types: Dict[str, int] = {}
-        for event in self.events:
-            event_type = event['type']
-            event_types[event_type] = event_types.get(event_type, 0) + 1
+        total_events = self.total_events
+        event_types = self.event_type_counts
+        tool_call_count = event_types.get('tool_call', 0)
+        escalation_count = event_types.get('escalation', 0)
 
-        tool_calls = [e for e in self.events if e['type'] == 'tool_call']
+        # 上報原因只能從保留在記憶體中的最近事件取得
         escalations = [e for e in self.events if e['type'] == 'escalation']
 
         summary = f"""
@@ -302,19 +328,14 @@ class CustomerServiceMonitor:
         for event_type, count in event_types.items():
             summary += f"  - {event_type}: {count}\n"
 
-        summary += f"\n工具呼叫次數：{len(tool_calls)}\n"
+        summary += f"\n工具呼叫次數：{tool_call_count}\n"
 
-        if tool_calls:
+        if tool_call_count:
             summary += "  使用的工具：\n"
-            tool_usage: Dict[str, int] = {}
-            for call in tool_calls:
-                tool = call['tool']
-                tool_usage[tool] = tool_usage.get(tool, 0) + 1
-
-            for tool, count in tool_usage.items():
+            for tool, count in self.tool_usage_counts.items():
                 summary += f"    - {tool}: {count} 次呼叫\n"
 
-        summary += f"\n上報次數：{len(escalations)}\n"
+        summary += f"\n上報次數：{escalation_count}\n"
 
         if escalations:
             summary += "  上報原因：\n"
@@ -330,7 +351,12 @@ class CustomerServiceMonitor:
 
         timeline = f"\n詳細事件時間軸\n{'='*70}\n"
 
-        for i, event in enumerate(self.events, 1):
+        # 較早的事件已被環形緩衝區淘汰，編號從保留的第一筆事件開始
+        first_index = self.total_events - len(self.events) + 1
+        if first_index > 1:
+            timeline += f"\n(僅顯示最近 {len(self.events)} 筆事件，完整歷史請見匯出檔案)\n"
+
+        for i, event in enumerate(self.events, first_index):
             timeline += f"\n[{i}] {event['timestamp']}\n"
             timeline += f"    類型：{event['type']}\n"
 
@@ -353,11 +379,16 @@ class CustomerServiceMonitor:
 # 可觀測性輔助類別
 
 class EventLogger:
-    """用於結構化記錄的自訂事件記錄器。"""
+    """用於結構化記錄的自訂事件記錄器。
 
-    def __init__(self):
+    提供 exporter 時，事件以 dict 形式交給 EventExporter 非阻塞地批次寫出；
+    否則退回標準 logging (使用延遲格式化，停用 INFO 時不會產生字串)。
+    """
+
+    def __init__(self, exporter: Optional[EventExporter] = None):
         self.logger = logging.getLogger('agent_events')
         self.logger.setLevel(logging.INFO)
+        self.exporter = exporter
 
     def log_event(self, event: Event):
         """使用結構化資料記錄事件。"""
@@ -371,7 +402,10 @@ class EventLogger:
                 'transfer_to_agent': event.actions.transfer_to_agent if event.actions else None
             }
         }
-        self.logger.info(f"事件：{event_data}")
+        if self.exporter is not None:
+            self.exporter.export(event_data)
+        else:
+            self.logger.info("事件：%s", event_data)
 
 
 @dataclass
@@ -0,0 +1,333 @@
+"""
+非阻塞、批次化的結構化事件匯出器。
+
+EventExporter 將事件放入有界環形緩衝區後立即返回，
+由背景 asyncio 工作定期 (或緩衝達到批次大小時) 批次寫入檔案：
+- 支援 JSONL 與 OTLP JSON 檔案 (每行一個 resourceLogs 物件) 兩種格式
+- 依檔案大小與時間間隔輪替輸出檔案
+- 緩衝區已滿或寫入失敗時以計數器記錄丟棄的事件，而不是阻塞呼叫端
+- 實際的檔案 I/O 透過 asyncio.to_thread 執行，不會阻塞事件迴圈
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = ("jsonl", "otlp")
+
+
+class _RotatingFileSink:
+    """依大小與時間輪替的附加寫入檔案。只在單一寫入執行緒中使用。"""
+
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: int,
+        rotate_interval: Optional[float],
+        backup_count: int,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+        self.rotations = 0
+        self._file = None
+        self._size = 0
+        self._opened_at = 0.0
+
+    def _open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+        self._opened_at = time.monotonic()
+
+    def _should_rotate(self, incoming: int) -> bool:
+        if self._size == 0:
+            return False
+        if self.max_bytes and self._size + incoming > self.max_bytes:
+            return True
+        if self.rotate_interval and time.monotonic() - self._opened_at >= self.rotate_interval:
+            return True
+        return False
+
+    def _rotate(self) -> None:
+        self._file.close()
+        self._file = None
+
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        target = self.path.with_name(f"{self.path.stem}.{stamp}{self.path.suffix}")
+        counter = 1
+        while target.exists():
+            target = self.path.with_name(
+                f"{self.path.stem}.{stamp}.{counter}{self.path.suffix}"
+            )
+            counter += 1
+        os.replace(self.path, target)
+        self.rotations += 1
+
+        # 只保留最新的 backup_count 個輪替檔案
+        backups = sorted(
+            self.path.parent.glob(f"{self.path.stem}.*{self.path.suffix}"),
+            key=lambda p: p.stat().st_mtime,
+        )
+        for old in backups[: max(len(backups) - self.backup_count, 0)]:
+            old.unlink(missing_ok=True)
+
+    def write(self, payload: bytes) -> None:
+        if self._file is None:
+            self._open()
+        if self._should_rotate(len(payload)):
+            self._rotate()
+            self._open()
+        self._file.write(payload)
+        self._file.flush()
+        self._size += len(payload)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class EventExporter:
+    """以環形緩衝區與背景批次寫入實作的非阻塞事件匯出器。"""
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        format: str = "jsonl",
+        buffer_size: int = 10_000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_bytes: int = 50 * 1024 * 1024,
+        rotate_interval: Optional[float] = None,
+        backup_count: int = 5,
+        service_name: str = "observability_agent",
+    ):
+        """
+        初始化事件匯出器。
+
+        Args:
+            path: 輸出檔案路徑
+            format: 輸出格式，"jsonl" 或 "otlp"
+            buffer_size: 環形緩衝區容量；已滿時新事件會被丟棄並計數
+            batch_size: 每批寫入的事件數；緩衝達到此數量時會提早喚醒背景工作
+            flush_interval: 背景工作的最長刷新間隔 (秒)
+            max_bytes: 檔案超過此大小時輪替 (0 表示不依大小輪替)
+            rotate_interval: 檔案開啟超過此秒數時輪替 (None 表示不依時間輪替)
+            backup_count: 保留的輪替檔案數
+            service_name: OTLP 格式中的 service.name 資源屬性
+        """
+        if format not in SUPPORTED_FORMATS:
+            raise ValueError(f"不支援的格式：{format}，可用格式：{SUPPORTED_FORMATS}")
+        if buffer_size < 1 or batch_size < 1:
+            raise ValueError("buffer_size 與 batch_size 必須大於 0")
+
+        self.format = format
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.service_name = service_name
+
+        self._sink = _RotatingFileSink(
+            Path(path), max_bytes, rotate_interval, backup_count
+        )
+        self._buffer: Deque[Tuple[int, Dict[str, Any]]] = deque()
+        self._lock = threading.Lock()
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+        self._accepted = 0
+        self._exported = 0
+        self._dropped_overflow = 0
+        self._dropped_errors = 0
+        self._batches = 0
+
+    # ------------------------------------------------------------------
+    # 呼叫端 API (非阻塞)
+    # ------------------------------------------------------------------
+
+    def export(self, record: Dict[str, Any]) -> bool:
+        """
+        將事件放入緩衝區，不進行任何 I/O 或序列化。
+
+        Returns:
+            True 表示已接受；False 表示因緩衝區已滿或已關閉而丟棄
+        """
+        with self._lock:
+            if self._closed or len(self._buffer) >= self.buffer_size:
+                self._dropped_overflow += 1
+                return False
+            self._buffer.append((time.time_ns(), record))
+            self._accepted += 1
+            pending = len(self._buffer)
+
+        if pending >= self.batch_size:
+            self._notify()
+        return True
+
+    def _notify(self) -> None:
+        """喚醒背景刷新工作 (可從任何執行緒呼叫)。"""
+        loop, wakeup = self._loop, self._wakeup
+        if loop is None or wakeup is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            wakeup.set()
+        else:
+            loop.call_soon_threadsafe(wakeup.set)
+
+    @property
+    def pending(self) -> int:
+        """緩衝區中等待寫入的事件數。"""
+        return len(self._buffer)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """匯出統計 (含各類丟棄計數)。"""
+        return {
+            "accepted": self._accepted,
+            "exported": self._exported,
+            "pending": len(self._buffer),
+            "dropped_overflow": self._dropped_overflow,
+            "dropped_errors": self._dropped_errors,
+            "batches": self._batches,
+            "rotations": self._sink.rotations,
+        }
+
+    # ------------------------------------------------------------------
+    # 背景刷新
+    # ------------------------------------------------------------------
+
+    async def start(self) -> None:
+        """在目前的事件迴圈上啟動背景刷新工作。"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        """將緩衝區內所有事件批次寫出 (檔案 I/O 在工作執行緒中進行)。"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            while True:
+                batch = self._drain()
+                if not batch:
+                    return
+                await asyncio.to_thread(self._write_batch, batch)
+
+    def flush_sync(self) -> None:
+        """在沒有事件迴圈時同步寫出緩衝區 (例如程式結束前)。"""
+        while True:
+            batch = self._drain()
+            if not batch:
+                return
+            self._write_batch(batch)
+
+    async def close(self) -> None:
+        """停止接受新事件、寫出剩餘事件並關閉檔案。"""
+        with self._lock:
+            self._closed = True
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        self._sink.close()
+
+    def _drain(self) -> List[Tuple[int, Dict[str, Any]]]:
+        with self._lock:
+            count = min(self.batch_size, len(self._buffer))
+            return [self._buffer.popleft() for _ in range(count)]
+
+    # ------------------------------------------------------------------
+    # 序列化與寫入 (於工作執行緒中執行)
+    # ------------------------------------------------------------------
+
+    def _encode_jsonl(self, batch: List[Tuple[int, Dict[str, Any]]]) -> bytes:
+        lines = [
+            json.dumps({"time_unix_nano": ts, **record}, ensure_ascii=False, default=str)
+            for ts, record in batch
+        ]
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    def _encode_otlp(self, batch: List[Tuple[int, Dict[str, Any]]]) -> bytes:
+        log_records = []
+        for ts, record in batch:
+            attributes = [
+                {"key": key, "value": {"stringValue": str(record[key])}}
+                for key in ("type", "invocation_id", "author")
+                if record.get(key) is not None
+            ]
+            log_records.append(
+                {
+                    "timeUnixNano": str(ts),
+                    "severityText": "INFO",
+                    "body": {
+                        "stringValue": json.dumps(record, ensure_ascii=False, default=str)
+                    },
+                    "attributes": attributes,
+                }
+            )
+        payload = {
+            "resourceLogs": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": self.service_name},
+                            }
+                        ]
+                    },
+                    "scopeLogs": [
+                        {"scope": {"name": "agent_events"}, "logRecords": log_records}
+                    ],
+                }
+            ]
+        }
+        return (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+
+    def _write_batch(self, batch: List[Tuple[int, Dict[str, Any]]]) -> None:
+        try:
+            if self.format == "otlp":
+                payload = self._encode_otlp(batch)
+            else:
+                payload = self._encode_jsonl(batch)
+            self._sink.write(payload)
+        except Exception:
+            # 寫入失敗時丟棄該批次並計數，不讓例外傳播到背景工作之外
+            self._dropped_errors += len(batch)
+            logger.exception("事件批次寫入失敗，已丟棄 %d 筆事件", len(batch))
+            return
+        self._exported += len(batch)
+        self._batches += 1
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+比較 EventLogger 直接使用 logging 與使用 EventExporter 的事件吞吐量。
+
+- baseline: 每個事件同步格式化並透過 FileHandler 寫入檔案
+- exporter: 事件放入環形緩衝區，由背景工作批次寫出 JSONL
+
+使用方法：
+    python scripts/benchmark_event_export.py --events 100000
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+# 將父目錄加入路徑
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from observability_agent import EventExporter, EventLogger
+
+
+def make_events(count: int):
+    """建立與 ADK Event 具有相同欄位的輕量事件。"""
+    return [
+        SimpleNamespace(
+            invocation_id=f"inv-{i % 100}",
+            author="customer_service",
+            content=SimpleNamespace(parts=[SimpleNamespace(text=f"回應內容 {i} " * 5)]),
+            actions=SimpleNamespace(
+                state_delta={"query_count": i}, escalate=False, transfer_to_agent=None
+            ),
+        )
+        for i in range(count)
+    ]
+
+
+async def run_baseline(events, workdir: Path) -> dict:
+    """同步 logging 寫檔 (原本的行為)。"""
+    event_logger = EventLogger()
+    handler = logging.FileHandler(workdir / "baseline.log", encoding="utf-8")
+    event_logger.logger.handlers = [handler]
+    event_logger.logger.propagate = False
+
+    start = time.perf_counter()
+    for event in events:
+        event_logger.log_event(event)
+    elapsed = time.perf_counter() - start
+
+    handler.close()
+    return {"caller_seconds": elapsed, "total_seconds": elapsed, "dropped": 0}
+
+
+async def run_exporter(events, workdir: Path, buffer_size: int) -> dict:
+    """透過 EventExporter 非阻塞匯出。"""
+    exporter = EventExporter(
+        str(workdir / "events.jsonl"), buffer_size=buffer_size, flush_interval=0.05
+    )
+    await exporter.start()
+    event_logger = EventLogger(exporter=exporter)
+
+    start = time.perf_counter()
+    for i, event in enumerate(events):
+        event_logger.log_event(event)
+        if i % 1000 == 0:
+            # 模擬其他協程取得執行機會，讓背景工作可以刷新
+            await asyncio.sleep(0)
+    caller_elapsed = time.perf_counter() - start
+
+    await exporter.close()
+    total_elapsed = time.perf_counter() - start
+    stats = exporter.stats
+    return {
+        "caller_seconds": caller_elapsed,
+        "total_seconds": total_elapsed,
+        "dropped": stats["dropped_overflow"] + stats["dropped_errors"],
+    }
+
+
+def report(name: str, count: int, result: dict) -> None:
+    print(
+        f"{name:<10} 呼叫端: {count / result['caller_seconds']:>12,.0f} events/s   "
+        f"含寫出: {count / result['total_seconds']:>12,.0f} events/s   "
+        f"丟棄: {result['dropped']}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--buffer-size", type=int, default=200_000)
+    args = parser.parse_args()
+
+    events = make_events(args.events)
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        report("baseline", args.events, await run_baseline(events, workdir))
+        report("exporter", args.events, await run_exporter(events, workdir, args.buffer_size))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,177 @@
+"""
+針對非阻塞事件匯出器 (EventExporter) 進行測試。
+"""
+
+import asyncio
+import json
+from unittest.mock import Mock
+
+import pytest
+from observability_agent import CustomerServiceMonitor, EventExporter, EventLogger
+
+
+def _read_lines(path):
+    return [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+
+
+class TestEventExporter:
+    """測試 EventExporter 的緩衝、批次寫入與丟棄計數。"""
+
+    def test_invalid_format(self, tmp_path):
+        """測試不支援的格式會引發錯誤。
+        重點：
+        - 使用未知格式建立匯出器應引發 `ValueError`。
+        """
+        with pytest.raises(ValueError):
+            EventExporter(str(tmp_path / 'events.jsonl'), format='xml')
+
+    def test_export_does_not_write_synchronously(self, tmp_path):
+        """測試 export 只放入緩衝區而不進行 I/O。
+        重點：
+        - 呼叫 `export` 後檔案尚不存在。
+        - `pending` 計數增加。
+        """
+        path = tmp_path / 'events.jsonl'
+        exporter = EventExporter(str(path))
+
+        assert exporter.export({'type': 'tool_call'}) is True
+        assert exporter.pending == 1
+        assert not path.exists()
+
+    def test_overflow_is_counted(self, tmp_path):
+        """測試緩衝區已滿時丟棄事件並計數。
+        重點：
+        - 超過 `buffer_size` 的事件會被拒絕。
+        - `dropped_overflow` 記錄被丟棄的數量。
+        """
+        exporter = EventExporter(str(tmp_path / 'events.jsonl'), buffer_size=3)
+
+        results = [exporter.export({'i': i}) for i in range(5)]
+
+        assert results == [True, True, True, False, False]
+        assert exporter.stats['accepted'] == 3
+        assert exporter.stats['dropped_overflow'] == 2
+
+    async def test_background_flush_writes_jsonl(self, tmp_path):
+        """測試背景工作批次寫出 JSONL。
+        重點：
+        - 啟動背景工作並匯出事件。
+        - 關閉後所有事件依序寫入檔案，且每行都是合法 JSON。
+        """
+        path = tmp_path / 'events.jsonl'
+        exporter = EventExporter(str(path), batch_size=10, flush_interval=0.01)
+        await exporter.start()
+
+        for i in range(25):
+            exporter.export({'type': 'tool_call', 'i': i})
+        await exporter.close()
+
+        lines = _read_lines(path)
+        assert [line['i'] for line in lines] == list(range(25))
+        assert all('time_unix_nano' in line for line in lines)
+        assert exporter.stats['exported'] == 25
+        assert exporter.stats['batches'] == 3
+
+    async def test_otlp_format(self, tmp_path):
+        """測試 OTLP JSON 檔案格式。
+        重點：
+        - 每批輸出一個 `resourceLogs` 物件。
+        - 事件內容位於 logRecord 的 body 中。
+        """
+        path = tmp_path / 'events.otlp.json'
+        exporter = EventExporter(str(path), format='otlp', service_name='svc')
+
+        exporter.export({'type': 'escalation', 'data': {'reason': 'x'}})
+        await exporter.close()
+
+        (batch,) = _read_lines(path)
+        resource_logs = batch['resourceLogs'][0]
+        assert resource_logs['resource']['attributes'][0]['value']['stringValue'] == 'svc'
+        record = resource_logs['scopeLogs'][0]['logRecords'][0]
+        assert json.loads(record['body']['stringValue'])['type'] == 'escalation'
+        assert record['attributes'][0] == {'key': 'type', 'value': {'stringValue': 'escalation'}}
+
+    def test_size_rotation(self, tmp_path):
+        """測試依檔案大小輪替。
+        重點：
+        - 設定很小的 `max_bytes`。
+        - 多次寫出後產生輪替檔案，且數量不超過 `backup_count`。
+        """
+        path = tmp_path / 'events.jsonl'
+        exporter = EventExporter(str(path), batch_size=1, max_bytes=200, backup_count=2)
+
+        for i in range(20):
+            exporter.export({'type': 'tool_call', 'payload': 'x' * 50, 'i': i})
+            exporter.flush_sync()
+
+        backups = [p for p in tmp_path.iterdir() if p.name != 'events.jsonl']
+        assert exporter.stats['rotations'] > 0
+        assert 0 < len(backups) <= 2
+        assert path.exists()
+
+    def test_write_errors_are_counted(self, tmp_path):
+        """測試寫入失敗時丟棄批次並計數。
+        重點：
+        - 輸出路徑是目錄而無法寫入。
+        - `dropped_errors` 記錄失敗的事件數，且不引發例外。
+        """
+        exporter = EventExporter(str(tmp_path))
+
+        exporter.export({'type': 'tool_call'})
+        exporter.flush_sync()
+
+        assert exporter.stats['dropped_errors'] == 1
+        assert exporter.stats['exported'] == 0
+
+    async def test_export_from_other_thread(self, tmp_path):
+        """測試可從其他執行緒匯出事件。
+        重點：
+        - 在工作執行緒中呼叫 `export`。
+        - 背景工作仍能寫出所有事件。
+        """
+        path = tmp_path / 'events.jsonl'
+        exporter = EventExporter(str(path), batch_size=5, flush_interval=0.01)
+        await exporter.start()
+
+        await asyncio.to_thread(lambda: [exporter.export({'i': i}) for i in range(50)])
+        await exporter.close()
+
+        assert len(_read_lines(path)) == 50
+
+
+class TestExporterIntegration:
+    """測試 EventLogger 與 CustomerServiceMonitor 使用匯出器。"""
+
+    def test_event_logger_uses_exporter(self, tmp_path):
+        """測試 EventLogger 將事件交給匯出器而非 logging。
+        重點：
+        - 提供 exporter 時，`log_event` 不呼叫 `logger.info`。
+        """
+        exporter = EventExporter(str(tmp_path / 'events.jsonl'))
+        event_logger = EventLogger(exporter=exporter)
+        event_logger.logger = Mock()
+
+        event = Mock(invocation_id='inv-1', author='agent', content=None, actions=None)
+        event_logger.log_event(event)
+
+        assert exporter.pending == 1
+        event_logger.logger.info.assert_not_called()
+
+    def test_monitor_events_are_bounded(self, tmp_path):
+        """測試監控器只保留最近的事件但計數涵蓋全部。
+        重點：
+        - 記錄超過 `max_events` 的事件。
+        - 記憶體中的事件數受限，摘要中的總數仍正確，匯出器收到全部事件。
+        """
+        exporter = EventExporter(str(tmp_path / 'events.jsonl'))
+        monitor = CustomerServiceMonitor(max_events=10, exporter=exporter)
+
+        for i in range(25):
+            monitor._log_tool_call('tool1', {'i': i})
+
+        assert len(monitor.events) == 10
+        assert monitor.events[0]['arguments'] == {'i': 15}
+        assert monitor.total_events == 25
+        assert exporter.pending == 25
+        assert '總事件數：25' in monitor.get_event_summary()
+        assert '[25]' in monitor.get_detailed_timeline()
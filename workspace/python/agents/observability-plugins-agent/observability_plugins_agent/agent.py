@@ -17,8 +17,9 @@ ADK 教學 24: 進階可觀測性與監控
 """
 
 import time, asyncio
+from collections import deque
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, Deque, Dict, Optional
 from dataclasses import dataclass, field
 
 from google.adk.agents import Agent
@@ -27,6 +28,12 @@ from google.adk.events import Event
 from google.adk.runners import InMemoryRunner
 from google.genai import types
 
+from .metrics_store import MetricsStore
+
+# 僅保留最近 N 筆請求/工具明細，完整分佈由 MetricsStore 的直方圖負責
+MAX_RECENT_REQUESTS = 100
+MAX_RECENT_PROFILES = 100
+
 
 @dataclass
 class RequestMetrics:
@@ -53,7 +60,10 @@ class AggregateMetrics:
     total_latency: float = 0.0
     total_tokens: int = 0
     total_tool_calls: int = 0
-    requests: List[RequestMetrics] = field(default_factory=list)
+    # 有界佇列：只保留最近的請求明細，避免記憶體無限成長
+    requests: Deque[RequestMetrics] = field(
+        default_factory=lambda: deque(maxlen=MAX_RECENT_REQUESTS)
+    )
 
     @property
     def success_rate(self) -> float:
@@ -77,47 +87,133 @@ class AggregateMetrics:
         return self.total_tokens / self.total_requests
 
 
+def _tool_call_key(tool, tool_args: Dict[str, Any], tool_context) -> str:
+    """產生工具呼叫的追蹤鍵。
+
+    優先使用 function_call_id；缺少時以 invocation_id + 工具名稱 + 參數物件識別碼
+    組合 (同一次呼叫的 before/after 回呼會收到同一個 tool_args 物件)。
+    """
+    function_call_id = getattr(tool_context, "function_call_id", None)
+    if function_call_id:
+        return function_call_id
+    invocation_id = getattr(tool_context, "invocation_id", "unknown")
+    return f"{invocation_id}/{getattr(tool, 'name', 'unknown')}/{id(tool_args)}"
+
+
 class MetricsCollectorPlugin(BasePlugin):
-    """用於收集請求指標的外掛程式。"""
+    """用於收集請求指標的外掛程式。
 
-    def __init__(self, name: str = "metrics_collector_plugin"):
-        """初始化指標收集器。"""
+    進行中的請求以 invocation_id 為鍵追蹤，因此並行的調用不會互相混淆；
+    延遲與 Token 分佈記錄在固定記憶體的 MetricsStore 直方圖中。
+    """
+
+    def __init__(
+        self,
+        name: str = "metrics_collector_plugin",
+        store: Optional[MetricsStore] = None,
+    ):
+        """
+        初始化指標收集器。
+
+        Args:
+            name: 外掛程式名稱
+            store: 共用的指標儲存 (預設建立新的 MetricsStore)
+        """
         super().__init__(name)
         self.metrics = AggregateMetrics()
+        self.store = store if store is not None else MetricsStore()
         self.current_requests: Dict[str, RequestMetrics] = {}
 
-    async def on_event_callback(
-        self, *, invocation_context, event: Event
-    ) -> Optional[Event]:
-        """處理 Agent 事件以進行指標收集。"""
-        # 追蹤事件 (為教學簡化實作)
-        if hasattr(event, "event_type"):
-            if event.event_type == "request_start":
-                request_id = str(time.time())
-                metrics = RequestMetrics(
-                    request_id=request_id,
-                    agent_name="observability_plugins_agent",
-                    start_time=time.time(),
-                )
-                self.current_requests[request_id] = metrics
-                print(f"📊 [METRICS] 請求開始於 {datetime.now().strftime('%H:%M:%S')}")
-
-            elif event.event_type == "request_complete":
-                if self.current_requests:
-                    request_id = list(self.current_requests.keys())[0]
-                    metrics = self.current_requests[request_id]
-                    metrics.end_time = time.time()
-                    metrics.latency = metrics.end_time - metrics.start_time
-
-                    # 更新聚合物件
-                    self.metrics.total_requests += 1
-                    self.metrics.successful_requests += 1
-                    self.metrics.total_latency += metrics.latency
-                    self.metrics.requests.append(metrics)
-
-                    print(f"✅ [METRICS] 請求完成: {metrics.latency:.2f}s")
-                    del self.current_requests[request_id]
-        return event
+    async def before_run_callback(self, *, invocation_context) -> Optional[Event]:
+        """調用開始時，以 invocation_id 建立請求指標。"""
+        request_id = invocation_context.invocation_id
+        self.current_requests[request_id] = RequestMetrics(
+            request_id=request_id,
+            agent_name=invocation_context.agent.name,
+            start_time=time.time(),
+        )
+        print(f"📊 [METRICS] 請求開始於 {datetime.now().strftime('%H:%M:%S')}")
+        return None
+
+    async def after_model_callback(self, *, callback_context, llm_response):
+        """累計模型回應的 Token 使用量。"""
+        metrics = self.current_requests.get(callback_context.invocation_id)
+        usage = getattr(llm_response, "usage_metadata", None)
+        if metrics and usage:
+            metrics.token_count += getattr(usage, "total_token_count", None) or 0
+        return None
+
+    async def on_model_error_callback(
+        self, *, callback_context, llm_request, error: Exception
+    ):
+        """模型錯誤時將請求標記為失敗。"""
+        metrics = self.current_requests.get(callback_context.invocation_id)
+        if metrics:
+            metrics.success = False
+            metrics.error = str(error)
+        return None
+
+    async def before_tool_callback(self, *, tool, tool_args, tool_context):
+        """計算工具呼叫次數。"""
+        metrics = self.current_requests.get(tool_context.invocation_id)
+        if metrics:
+            metrics.tool_calls += 1
+        return None
+
+    async def on_tool_error_callback(self, *, tool, tool_args, tool_context, error):
+        """工具錯誤時將請求標記為失敗。"""
+        metrics = self.current_requests.get(tool_context.invocation_id)
+        if metrics:
+            metrics.success = False
+            metrics.error = str(error)
+        return None
+
+    async def after_run_callback(self, *, invocation_context) -> None:
+        """調用結束時完成該 invocation_id 的指標並更新聚合。"""
+        metrics = self.current_requests.pop(invocation_context.invocation_id, None)
+        if metrics is None:
+            return None
+
+        metrics.end_time = time.time()
+        metrics.latency = metrics.end_time - metrics.start_time
+
+        # 更新聚合物件
+        m = self.metrics
+        m.total_requests += 1
+        if metrics.success:
+            m.successful_requests += 1
+        else:
+            m.failed_requests += 1
+        m.total_latency += metrics.latency
+        m.total_tokens += metrics.token_count
+        m.total_tool_calls += metrics.tool_calls
+        m.requests.append(metrics)
+
+        self.store.record(
+            "agent",
+            metrics.agent_name,
+            latency=metrics.latency,
+            tokens=metrics.token_count,
+            success=metrics.success,
+        )
+
+        print(f"✅ [METRICS] 請求完成: {metrics.latency:.2f}s")
+        return None
+
+    def export_summary(self) -> Dict[str, Any]:
+        """匯出可序列化的指標摘要 (聚合計數 + 各 Agent 的分位數)。"""
+        m = self.metrics
+        return {
+            "total_requests": m.total_requests,
+            "successful_requests": m.successful_requests,
+            "failed_requests": m.failed_requests,
+            "success_rate": m.success_rate,
+            "avg_latency": m.avg_latency,
+            "avg_tokens": m.avg_tokens,
+            "total_tool_calls": m.total_tool_calls,
+            "in_flight": len(self.current_requests),
+            "agents": self.store.export().get("agent", {}),
+        }
 
     def get_summary(self) -> str:
         """獲取指標摘要。"""
@@ -139,6 +235,15 @@ class MetricsCollectorPlugin(BasePlugin):
         {'='*70}
         """.strip()
 
+        for agent_name in self.store.names("agent"):
+            latency = self.store.latency("agent", agent_name)
+            summary += (
+                f"\n{agent_name}: "
+                f"p50={latency.quantile(0.5):.2f}s "
+                f"p95={latency.quantile(0.95):.2f}s "
+                f"p99={latency.quantile(0.99):.2f}s"
+            )
+
         return summary
 
 
@@ -185,77 +290,88 @@ class AlertingPlugin(BasePlugin):
 
 
 class PerformanceProfilerPlugin(BasePlugin):
-    """用於詳細效能分析的外掛程式。"""
+    """用於詳細效能分析的外掛程式。
 
-    def __init__(self, name: str = "performance_profiler_plugin"):
-        """初始化分析器。"""
-        super().__init__(name)
-        self.profiles: List[Dict] = []
-        self.current_profile: Optional[Dict] = None
+    進行中的工具呼叫以 function_call_id 為鍵追蹤，重疊的工具呼叫不會互相覆蓋；
+    各工具的耗時分佈記錄在固定記憶體的 MetricsStore 直方圖中。
+    """
 
-    async def on_event_callback(
-        self, *, invocation_context, event: Event
-    ) -> Optional[Event]:
-        """處理 Agent 事件以進行分析。"""
-        if hasattr(event, "event_type"):
-            if event.event_type == "tool_call_start":
-                self.current_profile = {
-                    "tool": getattr(event, "tool_name", "unknown"),
-                    "start_time": time.time(),
-                }
-                print("⚙️ [PROFILER] 工具呼叫開始")
-
-            elif event.event_type == "tool_call_complete":
-                if self.current_profile:
-                    self.current_profile["end_time"] = time.time()
-                    self.current_profile["duration"] = (
-                        self.current_profile["end_time"]
-                        - self.current_profile["start_time"]
-                    )
-                    self.profiles.append(self.current_profile)
-                    print(
-                        f"✅ [PROFILER] 工具呼叫完成: {self.current_profile['duration']:.2f}s"
-                    )
-                    self.current_profile = None
-        return event
+    def __init__(
+        self,
+        name: str = "performance_profiler_plugin",
+        store: Optional[MetricsStore] = None,
+    ):
+        """
+        初始化分析器。
+
+        Args:
+            name: 外掛程式名稱
+            store: 共用的指標儲存 (預設建立新的 MetricsStore)
+        """
+        super().__init__(name)
+        self.store = store if store is not None else MetricsStore()
+        # 有界佇列：只保留最近完成的工具呼叫明細
+        self.profiles: Deque[Dict] = deque(maxlen=MAX_RECENT_PROFILES)
+        self.active_calls: Dict[str, Dict] = {}
+
+    async def before_tool_callback(self, *, tool, tool_args, tool_context):
+        """工具呼叫開始時記錄起始時間。"""
+        self.active_calls[_tool_call_key(tool, tool_args, tool_context)] = {
+            "tool": getattr(tool, "name", "unknown"),
+            "invocation_id": getattr(tool_context, "invocation_id", None),
+            "start_time": time.time(),
+        }
+        print("⚙️ [PROFILER] 工具呼叫開始")
+        return None
+
+    def _finish(self, key: str, success: bool) -> Optional[Dict]:
+        """完成一個工具呼叫的分析紀錄。"""
+        profile = self.active_calls.pop(key, None)
+        if profile is None:
+            return None
+
+        profile["end_time"] = time.time()
+        profile["duration"] = profile["end_time"] - profile["start_time"]
+        profile["success"] = success
+        self.profiles.append(profile)
+        self.store.record(
+            "tool", profile["tool"], latency=profile["duration"], success=success
+        )
+        return profile
+
+    async def after_tool_callback(self, *, tool, tool_args, tool_context, result):
+        """工具呼叫完成時計算耗時。"""
+        profile = self._finish(_tool_call_key(tool, tool_args, tool_context), True)
+        if profile:
+            print(f"✅ [PROFILER] 工具呼叫完成: {profile['duration']:.2f}s")
+        return None
+
+    async def on_tool_error_callback(self, *, tool, tool_args, tool_context, error):
+        """工具呼叫失敗時仍記錄耗時並標記錯誤。"""
+        self._finish(_tool_call_key(tool, tool_args, tool_context), False)
+        return None
+
+    def export_profile(self) -> Dict[str, Any]:
+        """匯出各工具的耗時分佈摘要。"""
+        return self.store.export().get("tool", {})
 
     def get_profile_summary(self) -> str:
         """獲取分析摘要。"""
-        if not self.profiles:
+        tools = self.store.names("tool")
+        if not tools:
             return "未收集到分析資料"
 
         summary = f"\nPERFORMANCE PROFILE (效能分析)\n{'='*70}\n\n"
 
-        tool_stats = {}
-
-        for profile in self.profiles:
-            if "duration" not in profile:
-                continue
-
-            tool = profile["tool"]
-
-            if tool not in tool_stats:
-                tool_stats[tool] = {
-                    "calls": 0,
-                    "total_duration": 0.0,
-                    "min_duration": float("inf"),
-                    "max_duration": 0.0,
-                }
-
-            stats = tool_stats[tool]
-            stats["calls"] += 1
-            stats["total_duration"] += profile["duration"]
-            stats["min_duration"] = min(stats["min_duration"], profile["duration"])
-            stats["max_duration"] = max(stats["max_duration"], profile["duration"])
-
-        for tool, stats in tool_stats.items():
-            avg_duration = stats["total_duration"] / stats["calls"]
+        for tool in tools:
+            latency = self.store.latency("tool", tool)
 
             summary += f"Tool (工具): {tool}\n"
-            summary += f"  Calls (呼叫次數):        {stats['calls']}\n"
-            summary += f"  Avg Duration (平均耗時): {avg_duration:.3f}s\n"
-            summary += f"  Min Duration (最小耗時): {stats['min_duration']:.3f}s\n"
-            summary += f"  Max Duration (最大耗時): {stats['max_duration']:.3f}s\n\n"
+            summary += f"  Calls (呼叫次數):        {latency.count}\n"
+            summary += f"  Avg Duration (平均耗時): {latency.mean:.3f}s\n"
+            summary += f"  Min Duration (最小耗時): {latency.min:.3f}s\n"
+            summary += f"  P95 Duration (P95 耗時): {latency.quantile(0.95):.3f}s\n"
+            summary += f"  Max Duration (最大耗時): {latency.max:.3f}s\n\n"
 
         summary += f"{'='*70}\n"
 
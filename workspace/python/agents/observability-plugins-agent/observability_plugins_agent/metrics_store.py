@@ -0,0 +1,267 @@
+"""
+固定記憶體的串流分位數指標儲存
+
+提供 MetricsCollectorPlugin 與 PerformanceProfilerPlugin 共用的指標後端：
+- StreamingHistogram: 對數分桶 (HDR 風格) 直方圖，以固定相對誤差估算分位數
+- MetricsStore: 依 (類別, 名稱) 分組保存延遲與 Token 直方圖，可匯出為 dict / JSON
+
+不論記錄多少筆資料，每個直方圖最多只保留 max_buckets 個桶，
+因此長時間運行的服務記憶體用量維持固定。
+"""
+
+import json
+import math
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+# 預設相對誤差 (1%) 與每個直方圖的最大桶數
+DEFAULT_RELATIVE_ACCURACY = 0.01
+DEFAULT_MAX_BUCKETS = 2048
+
+# 匯出摘要時預設計算的分位數
+DEFAULT_QUANTILES: Tuple[float, ...] = (0.5, 0.9, 0.95, 0.99)
+
+
+class StreamingHistogram:
+    """對數分桶的串流直方圖。
+
+    每個正值 x 會落在索引為 ceil(log_gamma(x)) 的桶中，
+    其中 gamma = (1 + a) / (1 - a)，a 為相對誤差。
+    桶數超過 max_buckets 時會合併最低的桶，以犧牲低分位數精度換取固定記憶體。
+    """
+
+    def __init__(
+        self,
+        relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+        max_buckets: int = DEFAULT_MAX_BUCKETS,
+    ):
+        """
+        初始化直方圖。
+
+        Args:
+            relative_accuracy: 分位數估算的相對誤差，必須介於 0 與 1 之間
+            max_buckets: 最多保留的桶數
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy 必須介於 0 與 1 之間")
+        if max_buckets < 1:
+            raise ValueError("max_buckets 必須大於 0")
+
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+
+        self._buckets: Dict[int, int] = {}
+        self._zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def _bucket_index(self, value: float) -> int:
+        """計算數值所屬的桶索引。"""
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _bucket_value(self, index: int) -> float:
+        """回傳桶的代表值 (與桶上下界的相對誤差皆不超過 a)。"""
+        return 2 * self._gamma**index / (self._gamma + 1)
+
+    def record(self, value: float, count: int = 1) -> None:
+        """記錄一個數值 (負值視為 0)。"""
+        value = max(float(value), 0.0)
+
+        self.count += count
+        self.total += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+        if value == 0.0:
+            self._zero_count += count
+            return
+
+        index = self._bucket_index(value)
+        self._buckets[index] = self._buckets.get(index, 0) + count
+
+        if len(self._buckets) > self.max_buckets:
+            self._collapse_lowest()
+
+    def _collapse_lowest(self) -> None:
+        """將最低的兩個桶合併，使桶數回到上限內。"""
+        lowest, second = sorted(self._buckets)[:2]
+        self._buckets[second] += self._buckets.pop(lowest)
+
+    def merge(self, other: "StreamingHistogram") -> None:
+        """合併另一個相同精度的直方圖。"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("只能合併相同 relative_accuracy 的直方圖")
+        if other.count == 0:
+            return
+
+        for index, bucket_count in other._buckets.items():
+            self._buckets[index] = self._buckets.get(index, 0) + bucket_count
+        self._zero_count += other._zero_count
+        self.count += other.count
+        self.total += other.total
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+        while len(self._buckets) > self.max_buckets:
+            self._collapse_lowest()
+
+    @property
+    def bucket_count(self) -> int:
+        """目前使用中的桶數。"""
+        return len(self._buckets)
+
+    @property
+    def mean(self) -> float:
+        """平均值。"""
+        if self.count == 0:
+            return 0.0
+        return self.total / self.count
+
+    def quantile(self, q: float) -> float:
+        """估算分位數 q (0 <= q <= 1)。"""
+        if not 0 <= q <= 1:
+            raise ValueError("q 必須介於 0 與 1 之間")
+        if self.count == 0:
+            return 0.0
+
+        rank = q * (self.count - 1)
+        if rank < self._zero_count:
+            return 0.0
+
+        cumulative = self._zero_count
+        for index in sorted(self._buckets):
+            cumulative += self._buckets[index]
+            if cumulative > rank:
+                # 代表值限制在實際觀察到的範圍內
+                return min(max(self._bucket_value(index), self.min), self.max)
+        return self.max
+
+    def summary(self, quantiles: Iterable[float] = DEFAULT_QUANTILES) -> Dict:
+        """回傳可序列化的摘要。"""
+        result = {
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.mean,
+            "min": self.min if self.min is not None else 0.0,
+            "max": self.max if self.max is not None else 0.0,
+        }
+        for q in quantiles:
+            result[f"p{q * 100:g}"] = self.quantile(q)
+        return result
+
+
+class MetricsStore:
+    """依分組保存延遲與 Token 直方圖的執行緒安全指標儲存。
+
+    分組鍵為 (kind, name)，例如 ("agent", "observability_plugins_agent")
+    或 ("tool", "get_weather")。每個分組的記憶體用量固定。
+    """
+
+    def __init__(
+        self,
+        relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+        max_buckets: int = DEFAULT_MAX_BUCKETS,
+    ):
+        """初始化指標儲存。"""
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self._lock = threading.Lock()
+        self._groups: Dict[Tuple[str, str], Dict] = {}
+
+    def _group(self, kind: str, name: str) -> Dict:
+        """取得 (或建立) 分組。呼叫者必須持有鎖。"""
+        key = (kind, name)
+        group = self._groups.get(key)
+        if group is None:
+            group = {
+                "calls": 0,
+                "errors": 0,
+                "latency": StreamingHistogram(
+                    self.relative_accuracy, self.max_buckets
+                ),
+                "tokens": StreamingHistogram(
+                    self.relative_accuracy, self.max_buckets
+                ),
+            }
+            self._groups[key] = group
+        return group
+
+    def record(
+        self,
+        kind: str,
+        name: str,
+        latency: float,
+        tokens: Optional[int] = None,
+        success: bool = True,
+    ) -> None:
+        """
+        記錄一次完成的呼叫。
+
+        Args:
+            kind: 分組類別，例如 "agent" 或 "tool"
+            name: Agent 或工具名稱
+            latency: 延遲秒數
+            tokens: Token 數 (None 表示不適用)
+            success: 是否成功
+        """
+        with self._lock:
+            group = self._group(kind, name)
+            group["calls"] += 1
+            if not success:
+                group["errors"] += 1
+            group["latency"].record(latency)
+            if tokens is not None:
+                group["tokens"].record(tokens)
+
+    def names(self, kind: str) -> list:
+        """回傳某類別下所有已記錄的名稱。"""
+        with self._lock:
+            return sorted(name for k, name in self._groups if k == kind)
+
+    def latency(self, kind: str, name: str) -> StreamingHistogram:
+        """取得某分組的延遲直方圖。"""
+        with self._lock:
+            return self._group(kind, name)["latency"]
+
+    def tokens(self, kind: str, name: str) -> StreamingHistogram:
+        """取得某分組的 Token 直方圖。"""
+        with self._lock:
+            return self._group(kind, name)["tokens"]
+
+    def export(self, quantiles: Iterable[float] = DEFAULT_QUANTILES) -> Dict:
+        """
+        匯出所有分組的摘要。
+
+        Returns:
+            {kind: {name: {"calls", "errors", "latency", "tokens"}}} 格式的字典
+        """
+        quantiles = tuple(quantiles)
+        exported: Dict[str, Dict] = {}
+        with self._lock:
+            for (kind, name), group in sorted(self._groups.items()):
+                exported.setdefault(kind, {})[name] = {
+                    "calls": group["calls"],
+                    "errors": group["errors"],
+                    "latency": group["latency"].summary(quantiles),
+                    "tokens": group["tokens"].summary(quantiles),
+                }
+        return exported
+
+    def to_json(self, **kwargs) -> str:
+        """以 JSON 字串匯出摘要。"""
+        return json.dumps(self.export(), ensure_ascii=False, **kwargs)
+
+    def reset(self) -> None:
+        """清除所有指標。"""
+        with self._lock:
+            self._groups.clear()
+
+
+# 重點摘要
+# - **核心概念**: 固定記憶體的串流分位數指標
+# - **關鍵技術**: 對數分桶直方圖 (HDR 風格), threading.Lock, JSON 匯出
+# - **行動項目**: 由外掛程式呼叫 MetricsStore.record()，以 export() / to_json() 匯出摘要
@@ -0,0 +1,112 @@
+"""
+測試固定記憶體的串流分位數指標儲存。
+"""
+
+import json
+import random
+
+import pytest
+from observability_plugins_agent.metrics_store import MetricsStore, StreamingHistogram
+
+
+class TestStreamingHistogram:
+    """測試 StreamingHistogram 功能。"""
+
+    def test_empty_histogram(self):
+        """測試空直方圖的預設值。"""
+        hist = StreamingHistogram()
+        assert hist.count == 0
+        assert hist.mean == 0.0
+        assert hist.quantile(0.5) == 0.0
+
+    def test_invalid_arguments(self):
+        """測試無效參數會引發 ValueError。"""
+        with pytest.raises(ValueError):
+            StreamingHistogram(relative_accuracy=0)
+        with pytest.raises(ValueError):
+            StreamingHistogram(max_buckets=0)
+        with pytest.raises(ValueError):
+            StreamingHistogram().quantile(1.5)
+
+    def test_quantiles_within_relative_accuracy(self):
+        """測試分位數估算落在相對誤差範圍內。"""
+        rng = random.Random(42)
+        values = [rng.lognormvariate(0, 1) for _ in range(10_000)]
+        hist = StreamingHistogram(relative_accuracy=0.01)
+        for value in values:
+            hist.record(value)
+
+        values.sort()
+        for q in (0.5, 0.9, 0.99):
+            exact = values[int(q * (len(values) - 1))]
+            assert abs(hist.quantile(q) - exact) / exact <= 0.011
+
+        assert hist.count == len(values)
+        assert hist.min == values[0]
+        assert hist.max == values[-1]
+
+    def test_zero_values(self):
+        """測試 0 值 (例如沒有 Token) 可以被記錄。"""
+        hist = StreamingHistogram()
+        for _ in range(9):
+            hist.record(0)
+        hist.record(100)
+        assert hist.quantile(0.5) == 0.0
+        assert hist.quantile(1.0) == 100
+
+    def test_memory_is_bounded(self):
+        """測試桶數不會超過 max_buckets。"""
+        hist = StreamingHistogram(relative_accuracy=0.01, max_buckets=64)
+        for exponent in range(-20, 20):
+            for _ in range(10):
+                hist.record(10.0**exponent)
+        assert hist.bucket_count <= 64
+        assert hist.count == 400
+        # 高分位數不受合併最低桶影響
+        assert hist.quantile(1.0) == pytest.approx(1e19)
+
+    def test_merge(self):
+        """測試合併兩個直方圖。"""
+        a, b = StreamingHistogram(), StreamingHistogram()
+        for value in range(1, 101):
+            a.record(value)
+            b.record(value + 100)
+        a.merge(b)
+        assert a.count == 200
+        assert a.min == 1
+        assert a.max == 200
+        assert a.quantile(0.5) == pytest.approx(100, rel=0.02)
+
+
+class TestMetricsStore:
+    """測試 MetricsStore 功能。"""
+
+    def test_record_and_export(self):
+        """測試記錄並匯出分組摘要。"""
+        store = MetricsStore()
+        store.record("agent", "a", latency=1.0, tokens=100)
+        store.record("agent", "a", latency=3.0, tokens=300, success=False)
+        store.record("tool", "t", latency=0.5)
+
+        exported = store.export()
+        assert exported["agent"]["a"]["calls"] == 2
+        assert exported["agent"]["a"]["errors"] == 1
+        assert exported["agent"]["a"]["latency"]["mean"] == pytest.approx(2.0)
+        assert exported["agent"]["a"]["tokens"]["sum"] == 400
+        assert exported["tool"]["t"]["tokens"]["count"] == 0
+        assert "p99" in exported["tool"]["t"]["latency"]
+
+    def test_to_json(self):
+        """測試 JSON 匯出可被解析。"""
+        store = MetricsStore()
+        store.record("tool", "t", latency=0.1)
+        assert json.loads(store.to_json())["tool"]["t"]["calls"] == 1
+
+    def test_names_and_reset(self):
+        """測試名稱列舉與重置。"""
+        store = MetricsStore()
+        store.record("tool", "b", latency=0.1)
+        store.record("tool", "a", latency=0.1)
+        assert store.names("tool") == ["a", "b"]
+        store.reset()
+        assert store.export() == {}
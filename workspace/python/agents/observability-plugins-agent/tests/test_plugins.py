@@ -4,13 +4,16 @@
 
 import pytest
 import asyncio
+import random
 import time
+from types import SimpleNamespace
 from observability_plugins_agent.agent import (
     MetricsCollectorPlugin,
     AlertingPlugin,
     PerformanceProfilerPlugin,
     RequestMetrics,
     AggregateMetrics,
+    MAX_RECENT_REQUESTS,
 )
 
 
@@ -108,8 +111,8 @@ class TestPerformanceProfilerPlugin:
         """測試 Plugin 初始化。"""
         plugin = PerformanceProfilerPlugin()
         assert plugin is not None
-        assert plugin.profiles == []
-        assert plugin.current_profile is None
+        assert len(plugin.profiles) == 0
+        assert plugin.active_calls == {}
 
     def test_get_profile_summary_empty(self):
         """測試沒有 Profile 時的 get_profile_summary。"""
@@ -161,3 +164,108 @@ class TestPluginIntegration:
 
         for plugin in plugins:
             assert isinstance(plugin, BasePlugin)
+
+
+def _fake_invocation(invocation_id: str, agent_name: str = "test_agent"):
+    """建立模擬的 InvocationContext。"""
+    return SimpleNamespace(
+        invocation_id=invocation_id, agent=SimpleNamespace(name=agent_name)
+    )
+
+
+async def _simulate_invocation(metrics_plugin, profiler_plugin, index: int):
+    """模擬一次包含模型回應與工具呼叫的完整調用。"""
+    invocation_id = f"inv-{index}"
+    ctx = _fake_invocation(invocation_id)
+    callback_ctx = SimpleNamespace(invocation_id=invocation_id)
+    tool = SimpleNamespace(name=f"tool_{index % 3}")
+    tool_args = {"index": index}
+    tool_ctx = SimpleNamespace(
+        invocation_id=invocation_id, function_call_id=f"call-{index}"
+    )
+
+    await metrics_plugin.before_run_callback(invocation_context=ctx)
+    await asyncio.sleep(random.random() * 0.01)
+
+    # 每次調用的 Token 數等於 index，方便驗證沒有串號
+    response = SimpleNamespace(usage_metadata=SimpleNamespace(total_token_count=index))
+    await metrics_plugin.after_model_callback(
+        callback_context=callback_ctx, llm_response=response
+    )
+
+    for plugin in (metrics_plugin, profiler_plugin):
+        await plugin.before_tool_callback(
+            tool=tool, tool_args=tool_args, tool_context=tool_ctx
+        )
+    await asyncio.sleep(random.random() * 0.01)
+    if index % 10 == 0:
+        error = RuntimeError("boom")
+        for plugin in (metrics_plugin, profiler_plugin):
+            await plugin.on_tool_error_callback(
+                tool=tool, tool_args=tool_args, tool_context=tool_ctx, error=error
+            )
+    else:
+        await profiler_plugin.after_tool_callback(
+            tool=tool, tool_args=tool_args, tool_context=tool_ctx, result={}
+        )
+
+    await metrics_plugin.after_run_callback(invocation_context=ctx)
+
+
+class TestConcurrentInvocations:
+    """測試並行調用時的指標正確性。"""
+
+    @pytest.mark.asyncio
+    async def test_1000_concurrent_invocations(self):
+        """測試 1,000 個並行調用不會互相混淆。"""
+        metrics_plugin = MetricsCollectorPlugin()
+        profiler_plugin = PerformanceProfilerPlugin(store=metrics_plugin.store)
+        n = 1000
+
+        await asyncio.gather(
+            *(_simulate_invocation(metrics_plugin, profiler_plugin, i) for i in range(n))
+        )
+
+        m = metrics_plugin.metrics
+        assert metrics_plugin.current_requests == {}
+        assert profiler_plugin.active_calls == {}
+        assert m.total_requests == n
+        assert m.failed_requests == n // 10
+        assert m.successful_requests == n - n // 10
+        assert m.total_tokens == sum(range(n))
+        assert m.total_tool_calls == n
+
+        # 明細只保留最近的請求，且每筆的 Token 數與其 request_id 相符
+        assert len(m.requests) == MAX_RECENT_REQUESTS
+        for request in m.requests:
+            assert request.token_count == int(request.request_id.split("-")[1])
+
+        exported = metrics_plugin.export_summary()
+        assert exported["agents"]["test_agent"]["calls"] == n
+        assert exported["agents"]["test_agent"]["tokens"]["max"] == n - 1
+
+        tools = profiler_plugin.export_profile()
+        assert sum(t["calls"] for t in tools.values()) == n
+        assert sum(t["errors"] for t in tools.values()) == n // 10
+        assert "tool_0" in profiler_plugin.get_profile_summary()
+
+    @pytest.mark.asyncio
+    async def test_overlapping_tool_calls(self):
+        """測試重疊的工具呼叫各自計時。"""
+        plugin = PerformanceProfilerPlugin()
+        tool = SimpleNamespace(name="slow_tool")
+        ctx_a = SimpleNamespace(invocation_id="inv", function_call_id="a")
+        ctx_b = SimpleNamespace(invocation_id="inv", function_call_id="b")
+
+        await plugin.before_tool_callback(tool=tool, tool_args={}, tool_context=ctx_a)
+        await plugin.before_tool_callback(tool=tool, tool_args={}, tool_context=ctx_b)
+        assert len(plugin.active_calls) == 2
+
+        await plugin.after_tool_callback(
+            tool=tool, tool_args={}, tool_context=ctx_b, result={}
+        )
+        await plugin.after_tool_callback(
+            tool=tool, tool_args={}, tool_context=ctx_a, result={}
+        )
+        assert plugin.active_calls == {}
+        assert plugin.store.latency("tool", "slow_tool").count == 2
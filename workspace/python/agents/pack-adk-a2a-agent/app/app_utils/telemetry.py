@@ -18,7 +18,37 @@ import os
 import google.auth
 from google.adk.cli.adk_web_server import _setup_instrumentation_lib_if_installed
 from google.adk.telemetry.google_cloud import get_gcp_exporters, get_gcp_resource
-from google.adk.telemetry.setup import maybe_set_otel_providers
+from google.adk.telemetry.setup import OTelHooks, maybe_set_otel_providers
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+
+from app.app_utils.lazy_tracing import LazyTracerProvider, build_tracer_provider
+
+
+def _build_gcp_tracer_provider() -> TracerProvider:
+    """第一個追蹤點開始時才取得憑證，並建立 Cloud Trace 與 Cloud Logging 匯出器。"""
+    credentials, project_id = google.auth.default()
+    otel_hooks = get_gcp_exporters(
+        enable_cloud_tracing=True,
+        enable_cloud_metrics=False,
+        enable_cloud_logging=True,
+        google_auth=(credentials, project_id),
+    )
+    if not otel_hooks.span_processors:
+        raise RuntimeError("無法取得 Google Cloud 專案，未建立 Cloud Trace 匯出器")
+    otel_resource = get_gcp_resource(project_id)
+    # Cloud Logging 的 LoggerProvider 沿用 ADK 的設定方式；TracerProvider 由延遲提供者負責
+    maybe_set_otel_providers(
+        otel_hooks_to_setup=[
+            OTelHooks(log_record_processors=otel_hooks.log_record_processors)
+        ],
+        otel_resource=otel_resource,
+    )
+    first, *others = otel_hooks.span_processors
+    provider = build_tracer_provider(first, resource=otel_resource)
+    for processor in others:
+        provider.add_span_processor(processor)
+    return provider
 
 
 def setup_telemetry() -> str | None:
@@ -53,19 +83,9 @@ def setup_telemetry() -> str | None:
             "提示-回應記錄已停用 (設定 LOGS_BUCKET_NAME=gs://your-bucket 和 OTEL_INSTRUMENTATION_GENAI_CAPTURE_MESSAGE_CONTENT=NO_CONTENT 以啟用)"
         )
 
-    # 設定 OpenTelemetry 導出器以用於 Cloud Trace 和 Cloud Logging
-    credentials, project_id = google.auth.default()
-    otel_hooks = get_gcp_exporters(
-        enable_cloud_tracing=True,
-        enable_cloud_metrics=False,
-        enable_cloud_logging=True,
-        google_auth=(credentials, project_id),
-    )
-    otel_resource = get_gcp_resource(project_id)
-    maybe_set_otel_providers(
-        otel_hooks_to_setup=[otel_hooks],
-        otel_resource=otel_resource,
-    )
+    # 註冊延遲建立的 TracerProvider：憑證、Cloud Trace / Cloud Logging 匯出器與背景執行緒
+    # 在第一個追蹤點開始時才建立；取樣與上限由 TELEMETRY_* 環境變數控制 (見 lazy_tracing.py)
+    trace.set_tracer_provider(LazyTracerProvider(_build_gcp_tracer_provider))
 
     # 設定 GenAI SDK 儀器
     _setup_instrumentation_lib_if_installed()
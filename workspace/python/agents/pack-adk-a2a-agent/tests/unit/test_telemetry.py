@@ -0,0 +1,99 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+遙測設定的單元測試：匯入與 setup_telemetry() 不建立匯出器，第一個追蹤點才建立。
+"""
+
+from collections.abc import Iterator
+from unittest.mock import MagicMock, patch
+
+import pytest
+from google.adk.telemetry.setup import OTelHooks
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+    InMemorySpanExporter,
+)
+
+from app.app_utils import telemetry
+from app.app_utils.lazy_tracing import LazyTracerProvider
+
+
+@pytest.fixture
+def gcp() -> Iterator[dict[str, MagicMock]]:
+    """以假的憑證與匯出器取代 Google Cloud，並攔截全域 TracerProvider 的設定。"""
+    exporter = InMemorySpanExporter()
+    hooks = OTelHooks(span_processors=[SimpleSpanProcessor(exporter)])
+    with (
+        patch.object(
+            telemetry.google.auth, "default", return_value=(MagicMock(), "proj")
+        ) as auth_default,
+        patch.object(telemetry, "get_gcp_exporters", return_value=hooks) as exporters,
+        patch.object(telemetry, "get_gcp_resource", return_value=Resource.create()),
+        patch.object(telemetry, "maybe_set_otel_providers") as set_providers,
+        patch.object(telemetry, "_setup_instrumentation_lib_if_installed"),
+        patch.object(telemetry.trace, "set_tracer_provider") as set_tracer_provider,
+    ):
+        yield {
+            "auth_default": auth_default,
+            "exporters": exporters,
+            "set_providers": set_providers,
+            "set_tracer_provider": set_tracer_provider,
+            "exporter": exporter,
+        }
+
+
+def installed_provider(gcp: dict[str, MagicMock]) -> LazyTracerProvider:
+    provider = gcp["set_tracer_provider"].call_args.args[0]
+    assert isinstance(provider, LazyTracerProvider)
+    return provider
+
+
+def test_setup_does_not_build_exporters(gcp: dict[str, MagicMock]) -> None:
+    """setup_telemetry() 只註冊延遲提供者，不取得憑證也不建立匯出器。"""
+    telemetry.setup_telemetry()
+
+    provider = installed_provider(gcp)
+    assert provider.initialized is False
+    gcp["auth_default"].assert_not_called()
+    gcp["exporters"].assert_not_called()
+
+
+def test_first_span_builds_exporters_once(gcp: dict[str, MagicMock]) -> None:
+    """第一個追蹤點建立 Cloud Trace 匯出器與 Cloud Logging 提供者，只建立一次。"""
+    telemetry.setup_telemetry()
+    tracer = installed_provider(gcp).get_tracer("test")
+
+    with tracer.start_as_current_span("request"):
+        tracer.start_span("llm").end()
+
+    gcp["auth_default"].assert_called_once()
+    gcp["exporters"].assert_called_once()
+    gcp["set_providers"].assert_called_once()
+    assert [span.name for span in gcp["exporter"].get_finished_spans()] == [
+        "llm",
+        "request",
+    ]
+
+
+def test_missing_project_disables_tracing(gcp: dict[str, MagicMock]) -> None:
+    """無法取得專案時停用追蹤，追蹤點不會讓請求失敗。"""
+    gcp["exporters"].return_value = OTelHooks()
+    telemetry.setup_telemetry()
+    provider = installed_provider(gcp)
+
+    with provider.get_tracer("test").start_as_current_span("request") as span:
+        assert span.is_recording() is False
+
+    assert provider.failed is True
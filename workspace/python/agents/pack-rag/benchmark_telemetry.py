@@ -0,0 +1,199 @@
+"""
+### 摘要
+量測延遲追蹤啟動（`rag/app_utils/lazy_tracing.py`）帶來的匯入時間與每個請求的額外負擔。
+
+### 核心重點
+- **啟動成本**：比較匯入時直接呼叫 Arize `register()`（建立 TracerProvider、gRPC 匯出器與背景執行緒）
+  與 `install_lazy_tracing()`（只建立代理物件），以及延遲模式在第一個追蹤點時支付的建立成本。
+- **每個請求的負擔**：模擬一個代理請求（根追蹤點加上代理、LLM 與工具的子追蹤點），
+  比較未啟用追蹤、全部保留、頭部取樣與尾部取樣的耗時；匯出器只計數，不做網路傳輸。
+
+使用方法：
+    python benchmark_telemetry.py --requests 2000
+"""
+
+import argparse
+import io
+import statistics
+import subprocess
+import sys
+import time
+from collections.abc import Callable, Sequence
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from opentelemetry import trace
+from opentelemetry.sdk.trace import ReadableSpan
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+from rag.app_utils.lazy_tracing import (
+    LazyTracerProvider,
+    TracingSettings,
+    install_lazy_tracing,
+)
+
+SPACE_ID = "benchmark-space"
+API_KEY = "benchmark-key"
+PROJECT_NAME = "adk-rag-agent"
+
+
+class CountingExporter(SpanExporter):
+    """只計數的匯出器，用於排除網路傳輸的影響。"""
+
+    def __init__(self) -> None:
+        self.exported = 0
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        self.exported += len(spans)
+        return SpanExportResult.SUCCESS
+
+
+def arize_exporter() -> SpanExporter:
+    from arize.otel import GRPCSpanExporter
+
+    return GRPCSpanExporter(space_id=SPACE_ID, api_key=API_KEY)
+
+
+def median_ms(fn: Callable[[], object], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+# 在新的直譯器中，已載入 OpenTelemetry SDK 後單獨載入 lazy_tracing.py 的耗時（毫秒）
+IMPORT_PROBE = """
+import importlib.util, time
+import opentelemetry.sdk.trace, opentelemetry.sdk.trace.export
+started = time.perf_counter()
+spec = importlib.util.spec_from_file_location("lazy_tracing", {path!r})
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+print((time.perf_counter() - started) * 1000)
+"""
+
+
+def measure_import(repeat: int) -> None:
+    """量測模組本身的匯入時間（不含 OpenTelemetry SDK 與 rag 套件初始化）。"""
+    path = Path(__file__).parent / "rag" / "app_utils" / "lazy_tracing.py"
+    samples = [
+        float(
+            subprocess.run(
+                [sys.executable, "-c", IMPORT_PROBE.format(path=str(path))],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+        )
+        for _ in range(repeat)
+    ]
+    print(f"匯入 lazy_tracing.py（中位數）：  {statistics.median(samples):8.3f} ms")
+
+
+def measure_bootstrap(repeat: int) -> None:
+    """比較匯入時的啟動成本。"""
+    from arize.otel import register
+
+    eager_providers = []
+
+    def eager() -> None:
+        with redirect_stdout(io.StringIO()):
+            eager_providers.append(
+                register(
+                    space_id=SPACE_ID,
+                    api_key=API_KEY,
+                    project_name=PROJECT_NAME,
+                    set_global_tracer_provider=False,
+                    verbose=False,
+                )
+            )
+
+    lazy_providers: list[LazyTracerProvider] = []
+
+    def lazy() -> None:
+        lazy_providers.append(install_lazy_tracing(arize_exporter, set_global=False))
+
+    eager_ms = median_ms(eager, repeat)
+    lazy_ms = median_ms(lazy, repeat)
+    first_span_samples = []
+    for provider in lazy_providers:
+        started = time.perf_counter()
+        # 不結束追蹤點，避免實際匯出
+        provider.get_tracer("bench").start_span("first")
+        first_span_samples.append((time.perf_counter() - started) * 1000)
+    first_span_ms = statistics.median(first_span_samples)
+    for provider in [*eager_providers, *lazy_providers]:
+        provider.shutdown()
+
+    print("啟動成本（中位數）")
+    print(f"  匯入時 register()：             {eager_ms:8.3f} ms")
+    print(f"  匯入時 install_lazy_tracing()： {lazy_ms:8.3f} ms")
+    print(f"  延遲模式第一個追蹤點：          {first_span_ms:8.3f} ms")
+
+
+def simulate_request(tracer: trace.Tracer, index: int) -> None:
+    """一個代理請求：invocation → agent_run → call_llm ×2、execute_tool ×2。"""
+    with tracer.start_as_current_span("invocation", attributes={"request": index}):
+        with tracer.start_as_current_span("agent_run [ask_rag_agent]"):
+            for step in range(2):
+                with tracer.start_as_current_span(
+                    "call_llm",
+                    attributes={"gen_ai.request.model": "gemini-2.0-flash-001", "step": step},
+                ):
+                    pass
+                with tracer.start_as_current_span(
+                    "execute_tool retrieve_rag_documentation",
+                    attributes={"gen_ai.tool.name": "retrieve_rag_documentation"},
+                ):
+                    pass
+
+
+def measure_request_overhead(requests: int) -> None:
+    """比較每個請求的追蹤負擔。"""
+    configurations: list[tuple[str, TracingSettings | None]] = [
+        ("未啟用追蹤", None),
+        ("全部保留", TracingSettings()),
+        ("頭部取樣 10%", TracingSettings(sample_ratio=0.1, keep_error_traces=False)),
+        ("尾部取樣 10% + 慢/錯誤", TracingSettings(sample_ratio=0.1, slow_trace_ms=500)),
+    ]
+
+    print(f"\n每個請求的負擔（{requests} 個請求，每個 6 個追蹤點）")
+    print(f"  {'設定':<24} {'µs/請求':>10} {'匯出追蹤點':>10}")
+    baseline_us = None
+    for name, settings in configurations:
+        exporter = CountingExporter()
+        if settings is None:
+            tracer: trace.Tracer = trace.NoOpTracer()
+            provider = None
+        else:
+            provider = install_lazy_tracing(lambda: exporter, settings=settings, set_global=False)
+            tracer = provider.get_tracer("bench")
+            simulate_request(tracer, -1)  # 建立成本不計入
+
+        started = time.perf_counter()
+        for index in range(requests):
+            simulate_request(tracer, index)
+        elapsed_us = (time.perf_counter() - started) * 1e6 / requests
+
+        if provider is not None:
+            provider.force_flush()
+            provider.shutdown()
+        baseline_us = baseline_us if baseline_us is not None else elapsed_us
+        extra = f"（+{elapsed_us - baseline_us:.1f}）" if settings is not None else ""
+        print(f"  {name:<24} {elapsed_us:>10.1f} {exporter.exported:>10} {extra}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000, help="模擬的請求數")
+    parser.add_argument("--repeat", type=int, default=20, help="啟動成本的量測次數")
+    args = parser.parse_args()
+
+    measure_import(min(args.repeat, 5))
+    measure_bootstrap(args.repeat)
+    measure_request_overhead(args.requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -31,14 +31,14 @@ from google.adk.tools.retrieval.vertex_ai_rag_retrieval import (
 from openinference.instrumentation import using_session
 from vertexai.preview import rag
 
-from rag.tracing import instrument_adk_with_arize
+from rag.tracing import instrument_adk_with_arize_lazily
 
 from .prompts import return_instructions_root
 
 # 載入 .env 檔案中的環境變數
 load_dotenv()
-# 初始化 Arize 追蹤器，用於監控 ADK 效能
-_ = instrument_adk_with_arize()
+# 檢測 ADK 並註冊延遲建立的 Arize 追蹤器；匯出器在第一個追蹤點才建立
+instrument_adk_with_arize_lazily()
 
 
 # 設定 Vertex AI RAG 檢索工具
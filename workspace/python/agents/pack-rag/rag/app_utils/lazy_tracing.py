@@ -0,0 +1,449 @@
+# 版權所有 2025 Google LLC
+#
+# 根據 Apache 許可證 2.0 版（「許可證」）授權；
+# 除非遵守許可證，否則您不得使用此檔案。
+# 您可以在以下網址獲得許可證副本：
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# 除非適用法律要求或書面同意，否則根據許可證分發的軟體
+# 是按「原樣」分發的，無任何明示或暗示的保證或條件。
+# 請參閱許可證以了解管理權限和許可證下的限制。
+
+"""
+### 摘要
+本檔案提供可重複使用的追蹤啟動工具：匯入時只註冊一個輕量的 `LazyTracerProvider`，
+真正的 TracerProvider、匯出器（例如 gRPC 連線）與批次處理器延後到第一個追蹤點開始時才建立。
+
+### 核心重點
+- **核心概念**：延遲初始化、取樣與有上限的記憶體用量。
+- **關鍵技術**：OpenTelemetry SDK（TracerProvider、BatchSpanProcessor、TraceIdRatioBased）。
+- **取樣**：`sample_ratio` 為頭部取樣比例；比例小於 1 且設定了 `slow_trace_ms` 或保留錯誤追蹤
+  （`keep_error_traces`，預設開啟）時，改用尾部取樣：緩衝整條追蹤，根追蹤點結束後保留錯誤、
+  過慢或依比例抽中的追蹤。
+- **記憶體上限**：尾部緩衝的追蹤數與每條追蹤的追蹤點數、匯出佇列長度皆有上限，超過時丟棄並計數。
+- **失敗處理**：建立 TracerProvider 或匯出器失敗時只記錄一次錯誤並改用 NoOpTracerProvider，
+  不會讓請求失敗。
+- **重要結論**：本模組只依賴 OpenTelemetry SDK；每個代理獨立建置與部署，
+  因此以相同內容複製到各代理的 `app_utils/`（`pack-rag` 與 `pack-adk-a2a-agent`），修改時需同步。
+"""
+
+import logging
+import math
+import os
+import threading
+from collections import Counter, OrderedDict
+from collections.abc import Callable, Sequence
+from contextlib import AbstractContextManager
+from dataclasses import dataclass, field
+from typing import Any
+
+from opentelemetry import context as context_api
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import (
+    ReadableSpan,
+    Span,
+    SpanLimits,
+    SpanProcessor,
+    TracerProvider,
+)
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter
+from opentelemetry.sdk.trace.sampling import (
+    ALWAYS_ON,
+    ParentBased,
+    Sampler,
+    TraceIdRatioBased,
+)
+from opentelemetry.trace import StatusCode
+from opentelemetry.util.types import Attributes
+
+logger = logging.getLogger(__name__)
+
+
+def _env_float(name: str, default: float | None) -> float | None:
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def _env_ratio(name: str, default: float) -> float:
+    """讀取 0~1 的比例；超出範圍時截斷並記錄警告。"""
+    value = _env_float(name, default) or 0.0
+    if math.isnan(value):
+        logger.warning("%s 不是有效的比例，改用 %s", name, default)
+        return default
+    if not 0.0 <= value <= 1.0:
+        clamped = min(max(value, 0.0), 1.0)
+        logger.warning("%s=%s 超出 0~1 的範圍，改用 %s", name, value, clamped)
+        return clamped
+    return value
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+@dataclass(frozen=True)
+class TracingSettings:
+    """追蹤的取樣與記憶體上限設定。"""
+
+    # 頭部取樣比例（0~1）；啟用尾部取樣時作為一般追蹤的保留比例
+    sample_ratio: float = 1.0
+    # 根追蹤點耗時超過此毫秒數的追蹤一律保留（None 表示不依耗時保留）
+    slow_trace_ms: float | None = None
+    # 含有錯誤狀態追蹤點的追蹤一律保留
+    keep_error_traces: bool = True
+    # 尾部取樣同時緩衝的追蹤數與每條追蹤的追蹤點數上限
+    max_buffered_traces: int = 512
+    max_spans_per_trace: int = 256
+    # 匯出佇列與批次大小（BatchSpanProcessor）
+    max_queue_size: int = 2048
+    max_export_batch_size: int = 512
+    schedule_delay_millis: float = 5000
+    # 單一屬性值的長度上限（None 表示不截斷；ADK 會將完整的 LLM 請求寫入屬性）
+    max_attribute_length: int | None = None
+
+    @property
+    def tail_sampling(self) -> bool:
+        """比例為 1 時所有追蹤都會保留，不需要緩衝。"""
+        return self.sample_ratio < 1.0 and (
+            self.slow_trace_ms is not None or self.keep_error_traces
+        )
+
+    @classmethod
+    def from_env(cls) -> "TracingSettings":
+        """
+        從環境變數讀取設定。
+
+        傳回:
+            TELEMETRY_SAMPLE_RATIO、TELEMETRY_SLOW_TRACE_MS、TELEMETRY_KEEP_ERROR_TRACES、
+            TELEMETRY_MAX_BUFFERED_TRACES、TELEMETRY_MAX_QUEUE_SIZE、
+            TELEMETRY_MAX_ATTRIBUTE_LENGTH 對應的設定
+        """
+        return cls(
+            sample_ratio=_env_ratio("TELEMETRY_SAMPLE_RATIO", 1.0),
+            slow_trace_ms=_env_float("TELEMETRY_SLOW_TRACE_MS", None),
+            keep_error_traces=os.environ.get("TELEMETRY_KEEP_ERROR_TRACES", "true").lower()
+            != "false",
+            max_buffered_traces=_env_int("TELEMETRY_MAX_BUFFERED_TRACES", 512),
+            max_queue_size=_env_int("TELEMETRY_MAX_QUEUE_SIZE", 2048),
+            max_attribute_length=_env_int("TELEMETRY_MAX_ATTRIBUTE_LENGTH", 0) or None,
+        )
+
+
+def _is_local_root(span: ReadableSpan) -> bool:
+    parent = span.parent
+    return parent is None or parent.is_remote
+
+
+@dataclass
+class _TraceBuffer:
+    spans: list[ReadableSpan] = field(default_factory=list)
+    error: bool = False
+
+
+class TailSamplingSpanProcessor(SpanProcessor):
+    """
+    尾部取樣處理器：緩衝每條追蹤的追蹤點，於本地根追蹤點結束時決定是否交給下游處理器。
+
+    保留條件（任一成立）：含錯誤的追蹤點、根追蹤點耗時超過門檻、依 trace_id 的比例抽中。
+    緩衝的追蹤數超過上限時，最舊的追蹤以目前已知的資訊立即決定。
+    """
+
+    def __init__(
+        self,
+        downstream: SpanProcessor,
+        sample_ratio: float = 1.0,
+        slow_trace_ms: float | None = None,
+        keep_error_traces: bool = True,
+        max_buffered_traces: int = 512,
+        max_spans_per_trace: int = 256,
+    ) -> None:
+        self._downstream = downstream
+        self._bound = TraceIdRatioBased.get_bound_for_rate(max(0.0, min(1.0, sample_ratio)))
+        self._slow_ns = int(slow_trace_ms * 1e6) if slow_trace_ms is not None else None
+        self._keep_errors = keep_error_traces
+        self._max_traces = max(1, max_buffered_traces)
+        self._max_spans = max(1, max_spans_per_trace)
+        self._traces: OrderedDict[int, _TraceBuffer] = OrderedDict()
+        self._counts: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def on_start(self, span: Span, parent_context: context_api.Context | None = None) -> None:
+        self._downstream.on_start(span, parent_context=parent_context)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        trace_id = span.context.trace_id if span.context else 0
+        decided: list[tuple[int, _TraceBuffer, bool]] = []
+        with self._lock:
+            buffer = self._traces.get(trace_id)
+            if buffer is None:
+                buffer = self._traces[trace_id] = _TraceBuffer()
+            if len(buffer.spans) < self._max_spans:
+                buffer.spans.append(span)
+            else:
+                self._counts["dropped_spans"] += 1
+            if span.status.status_code is StatusCode.ERROR:
+                buffer.error = True
+
+            if _is_local_root(span):
+                del self._traces[trace_id]
+                decided.append((trace_id, buffer, self._is_slow(span)))
+            while len(self._traces) > self._max_traces:
+                evicted_id, evicted = self._traces.popitem(last=False)
+                self._counts["evicted_traces"] += 1
+                decided.append((evicted_id, evicted, False))
+
+        for decided_id, decided_buffer, slow in decided:
+            self._finish(decided_id, decided_buffer, slow)
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self._downstream.force_flush(timeout_millis)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pending = list(self._traces.items())
+            self._traces.clear()
+        for trace_id, buffer in pending:
+            self._finish(trace_id, buffer, False)
+        self._downstream.shutdown()
+
+    def stats(self) -> dict[str, int]:
+        """傳回保留、捨棄、逐出的追蹤數與目前緩衝的追蹤數。"""
+        with self._lock:
+            return {
+                "kept_traces": self._counts["kept_traces"],
+                "sampled_out_traces": self._counts["sampled_out_traces"],
+                "evicted_traces": self._counts["evicted_traces"],
+                "dropped_spans": self._counts["dropped_spans"],
+                "buffered_traces": len(self._traces),
+            }
+
+    def _is_slow(self, root: ReadableSpan) -> bool:
+        if self._slow_ns is None or root.start_time is None or root.end_time is None:
+            return False
+        return root.end_time - root.start_time >= self._slow_ns
+
+    def _finish(self, trace_id: int, buffer: _TraceBuffer, slow: bool) -> None:
+        keep = (
+            slow
+            or (self._keep_errors and buffer.error)
+            or trace_id & TraceIdRatioBased.TRACE_ID_LIMIT < self._bound
+        )
+        with self._lock:
+            self._counts["kept_traces" if keep else "sampled_out_traces"] += 1
+        if keep:
+            for span in buffer.spans:
+                self._downstream.on_end(span)
+
+
+def build_tracer_provider(
+    exporter: SpanExporter | SpanProcessor,
+    settings: TracingSettings | None = None,
+    resource: Resource | None = None,
+) -> TracerProvider:
+    """
+    依設定建立含取樣與批次匯出的 TracerProvider。
+
+    參數:
+        exporter: 追蹤點匯出器；傳入已含批次處理的 SpanProcessor（例如 ADK
+            `get_gcp_exporters()` 傳回的處理器）時直接使用，佇列上限由該處理器決定
+        settings: 取樣與上限設定（預設從環境變數讀取）
+        resource: 資源屬性（預設為 Resource.create()）
+
+    傳回:
+        已加入處理器的 TracerProvider
+    """
+    settings = settings or TracingSettings.from_env()
+    processor: SpanProcessor
+    if isinstance(exporter, SpanProcessor):
+        processor = exporter
+    else:
+        processor = BatchSpanProcessor(
+            exporter,
+            max_queue_size=settings.max_queue_size,
+            max_export_batch_size=min(settings.max_export_batch_size, settings.max_queue_size),
+            schedule_delay_millis=settings.schedule_delay_millis,
+        )
+    sampler: Sampler
+    if settings.tail_sampling:
+        # 尾部取樣需要記錄所有追蹤點，結束時才決定是否匯出
+        sampler = ALWAYS_ON
+        processor = TailSamplingSpanProcessor(
+            processor,
+            sample_ratio=settings.sample_ratio,
+            slow_trace_ms=settings.slow_trace_ms,
+            keep_error_traces=settings.keep_error_traces,
+            max_buffered_traces=settings.max_buffered_traces,
+            max_spans_per_trace=settings.max_spans_per_trace,
+        )
+    else:
+        sampler = ParentBased(TraceIdRatioBased(settings.sample_ratio))
+
+    provider = TracerProvider(
+        sampler=sampler,
+        resource=resource or Resource.create(),
+        span_limits=SpanLimits(max_attribute_length=settings.max_attribute_length),
+    )
+    provider.add_span_processor(processor)
+    return provider
+
+
+class _LazyTracer(trace.Tracer):
+    """在第一次開始追蹤點時才向 LazyTracerProvider 取得真正的 Tracer。"""
+
+    def __init__(self, provider: "LazyTracerProvider", args: tuple[Any, ...]) -> None:
+        self._provider = provider
+        self._args = args
+        self._tracer: trace.Tracer | None = None
+
+    def _resolve(self) -> trace.Tracer:
+        if self._tracer is None:
+            self._tracer = self._provider.resolve().get_tracer(*self._args)
+        return self._tracer
+
+    def start_span(
+        self,
+        name: str,
+        context: context_api.Context | None = None,
+        kind: trace.SpanKind = trace.SpanKind.INTERNAL,
+        attributes: Attributes = None,
+        links: Sequence[trace.Link] | None = None,
+        start_time: int | None = None,
+        record_exception: bool = True,
+        set_status_on_exception: bool = True,
+    ) -> trace.Span:
+        return self._resolve().start_span(
+            name,
+            context=context,
+            kind=kind,
+            attributes=attributes,
+            links=links,
+            start_time=start_time,
+            record_exception=record_exception,
+            set_status_on_exception=set_status_on_exception,
+        )
+
+    def start_as_current_span(  # type: ignore[override]
+        self,
+        name: str,
+        context: context_api.Context | None = None,
+        kind: trace.SpanKind = trace.SpanKind.INTERNAL,
+        attributes: Attributes = None,
+        links: Sequence[trace.Link] | None = None,
+        start_time: int | None = None,
+        record_exception: bool = True,
+        set_status_on_exception: bool = True,
+        end_on_exit: bool = True,
+    ) -> AbstractContextManager[trace.Span]:
+        return self._resolve().start_as_current_span(
+            name,
+            context=context,
+            kind=kind,
+            attributes=attributes,
+            links=links,
+            start_time=start_time,
+            record_exception=record_exception,
+            set_status_on_exception=set_status_on_exception,
+            end_on_exit=end_on_exit,
+        )
+
+
+class LazyTracerProvider(trace.TracerProvider):
+    """
+    延遲建立的 TracerProvider。
+
+    get_tracer() 只傳回代理物件；第一個追蹤點開始時才呼叫 factory 建立真正的
+    TracerProvider（以及其匯出器與背景執行緒）。建立過程只會執行一次；
+    factory 失敗時記錄一次錯誤並改用 NoOpTracerProvider，追蹤失敗不會影響請求。
+    """
+
+    def __init__(self, factory: Callable[[], TracerProvider]) -> None:
+        self._factory = factory
+        self._provider: trace.TracerProvider | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def initialized(self) -> bool:
+        """是否已建立 TracerProvider（或因建立失敗而改用 NoOpTracerProvider）。"""
+        return self._provider is not None
+
+    @property
+    def failed(self) -> bool:
+        """建立 TracerProvider 是否失敗（改用 NoOpTracerProvider）。"""
+        return isinstance(self._provider, trace.NoOpTracerProvider)
+
+    def resolve(self) -> trace.TracerProvider:
+        """建立（或取得已建立的）TracerProvider；建立失敗時傳回 NoOpTracerProvider。"""
+        provider = self._provider
+        if provider is None:
+            with self._lock:
+                if self._provider is None:
+                    try:
+                        self._provider = self._factory()
+                    except Exception:
+                        logger.exception("建立 TracerProvider 失敗，停用追蹤")
+                        self._provider = trace.NoOpTracerProvider()
+                    else:
+                        logger.info("已建立 TracerProvider 與匯出器（第一個追蹤點）")
+                provider = self._provider
+        return provider
+
+    def get_tracer(
+        self,
+        instrumenting_module_name: str,
+        instrumenting_library_version: str | None = None,
+        schema_url: str | None = None,
+        attributes: Attributes = None,
+    ) -> trace.Tracer:
+        args = (instrumenting_module_name, instrumenting_library_version, schema_url, attributes)
+        if self._provider is not None:
+            return self._provider.get_tracer(*args)
+        return _LazyTracer(self, args)
+
+    def add_span_processor(self, span_processor: SpanProcessor) -> None:
+        """供需要額外處理器的整合使用；會觸發建立。"""
+        provider = self.resolve()
+        if isinstance(provider, TracerProvider):
+            provider.add_span_processor(span_processor)
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        if not isinstance(self._provider, TracerProvider):
+            return True
+        return self._provider.force_flush(timeout_millis)
+
+    def shutdown(self) -> None:
+        if isinstance(self._provider, TracerProvider):
+            self._provider.shutdown()
+
+
+def install_lazy_tracing(
+    exporter_factory: Callable[[], SpanExporter | SpanProcessor],
+    settings: TracingSettings | None = None,
+    resource_factory: Callable[[], Resource] | None = None,
+    set_global: bool = True,
+) -> LazyTracerProvider:
+    """
+    註冊延遲建立的 TracerProvider。
+
+    參數:
+        exporter_factory: 建立匯出器（或已含批次處理的 SpanProcessor）的函式，
+            第一個追蹤點開始時才呼叫
+        settings: 取樣與上限設定（預設於建立時從環境變數讀取）
+        resource_factory: 建立資源屬性的函式
+        set_global: 是否設為全域 TracerProvider
+
+    傳回:
+        LazyTracerProvider
+    """
+
+    def factory() -> TracerProvider:
+        resource = resource_factory() if resource_factory else None
+        return build_tracer_provider(exporter_factory(), settings, resource)
+
+    provider = LazyTracerProvider(factory)
+    if set_global:
+        trace.set_tracer_provider(provider)
+    return provider
+
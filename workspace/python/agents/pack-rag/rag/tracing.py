@@ -4,7 +4,16 @@ import warnings
 from arize.otel import register
 from dotenv import load_dotenv
 from openinference.instrumentation.google_adk import GoogleADKInstrumentor
+from openinference.semconv.resource import ResourceAttributes
 from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace.export import SpanExporter
+
+from rag.app_utils.lazy_tracing import (
+    LazyTracerProvider,
+    TracingSettings,
+    install_lazy_tracing,
+)
 
 """
 ## 摘要
@@ -14,21 +23,33 @@ from opentelemetry import trace
 - **核心概念**：實現代理人的可觀察性（Observability）。
 - **關鍵技術**：Arize AI, OpenTelemetry (OTEL), Google ADK Instrumentation。
 - **重要結論**：必須提供 `ARIZE_SPACE_ID` 與 `ARIZE_API_KEY` 才能啟動追蹤功能。
+- **延遲初始化**：`instrument_adk_with_arize_lazily` 在匯入時只註冊 `LazyTracerProvider`，
+  Arize 的 gRPC 匯出器在第一個追蹤點開始時才建立，並套用 `TracingSettings` 的取樣設定。
 """
 
+# 已註冊的延遲 TracerProvider（重新載入代理時不重複檢測）
+_lazy_provider: LazyTracerProvider | None = None
+
 # 載入 .env 環境變數
 load_dotenv()
 
 
+def _has_arize_credentials() -> bool:
+    """檢查必要的 Arize 環境變數，缺少時發出警告。"""
+    if os.getenv("ARIZE_SPACE_ID") is None:
+        warnings.warn("未設定 ARIZE_SPACE_ID", stacklevel=3)
+        return False
+    if os.getenv("ARIZE_API_KEY") is None:
+        warnings.warn("未設定 ARIZE_API_KEY", stacklevel=3)
+        return False
+    return True
+
+
 def instrument_adk_with_arize() -> trace.Tracer | None:
     """使用 Arize 對 ADK 進行檢測（Instrumentation）。"""
 
     # 檢查必要的 Arize 環境變數
-    if os.getenv("ARIZE_SPACE_ID") is None:
-        warnings.warn("未設定 ARIZE_SPACE_ID", stacklevel=2)
-        return None
-    if os.getenv("ARIZE_API_KEY") is None:
-        warnings.warn("未設定 ARIZE_API_KEY", stacklevel=2)
+    if not _has_arize_credentials():
         return None
 
     # 註冊 Arize OTEL 追蹤提供者
@@ -43,3 +64,37 @@ def instrument_adk_with_arize() -> trace.Tracer | None:
 
     # 取得並回傳追蹤器實例
     return tracer_provider.get_tracer(__name__)
+
+
+def instrument_adk_with_arize_lazily(
+    settings: TracingSettings | None = None,
+) -> LazyTracerProvider | None:
+    """使用 Arize 對 ADK 進行檢測，匯出器延後到第一個追蹤點才建立。"""
+    global _lazy_provider
+
+    if _lazy_provider is not None:
+        return _lazy_provider
+    if not _has_arize_credentials():
+        return None
+
+    space_id = os.environ["ARIZE_SPACE_ID"]
+    api_key = os.environ["ARIZE_API_KEY"]
+    project_name = os.getenv("ARIZE_PROJECT_NAME", "adk-rag-agent")
+
+    def exporter_factory() -> SpanExporter:
+        # 建立 gRPC 連線的成本在此才發生
+        from arize.otel import GRPCSpanExporter
+
+        return GRPCSpanExporter(space_id=space_id, api_key=api_key)
+
+    def resource_factory() -> Resource:
+        return Resource.create({ResourceAttributes.PROJECT_NAME: project_name})
+
+    provider = install_lazy_tracing(
+        exporter_factory,
+        settings=settings,
+        resource_factory=resource_factory,
+    )
+    GoogleADKInstrumentor().instrument(tracer_provider=provider)
+    _lazy_provider = provider
+    return provider
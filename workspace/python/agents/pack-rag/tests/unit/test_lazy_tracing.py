@@ -0,0 +1,292 @@
+"""
+延遲追蹤啟動與取樣測試
+"""
+
+import os
+import time
+from unittest.mock import MagicMock, patch
+
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+    InMemorySpanExporter,
+)
+from opentelemetry.trace import Status, StatusCode
+
+
+def make_tail_provider(**kwargs):
+    """建立以尾部取樣處理器接到記憶體匯出器的 TracerProvider。"""
+    from rag.app_utils.lazy_tracing import TailSamplingSpanProcessor
+
+    exporter = InMemorySpanExporter()
+    processor = TailSamplingSpanProcessor(SimpleSpanProcessor(exporter), **kwargs)
+    provider = TracerProvider()
+    provider.add_span_processor(processor)
+    return provider.get_tracer("test"), exporter, processor
+
+
+class TestLazyTracerProvider:
+    """
+    測試 LazyTracerProvider。
+
+    重點說明:
+    1. 驗證匯入時不建立匯出器
+    2. 驗證第一個追蹤點才建立 TracerProvider，且只建立一次
+    """
+
+    def test_factory_not_called_until_first_span(self):
+        """測試取得 Tracer 不會建立 TracerProvider。"""
+        from rag.app_utils.lazy_tracing import LazyTracerProvider
+
+        factory = MagicMock(return_value=TracerProvider())
+        provider = LazyTracerProvider(factory)
+
+        tracer = provider.get_tracer("test")
+
+        assert tracer is not None
+        assert provider.initialized is False
+        factory.assert_not_called()
+
+    def test_first_span_builds_provider_once(self):
+        """測試第一個追蹤點建立 TracerProvider，之後重複使用。"""
+        from rag.app_utils.lazy_tracing import LazyTracerProvider
+
+        exporter = InMemorySpanExporter()
+        real_provider = TracerProvider()
+        real_provider.add_span_processor(SimpleSpanProcessor(exporter))
+        factory = MagicMock(return_value=real_provider)
+        provider = LazyTracerProvider(factory)
+        tracer = provider.get_tracer("test")
+
+        with tracer.start_as_current_span("parent"):
+            tracer.start_span("child").end()
+        provider.get_tracer("other").start_span("later").end()
+
+        factory.assert_called_once()
+        assert provider.initialized is True
+        assert [span.name for span in exporter.get_finished_spans()] == [
+            "child",
+            "parent",
+            "later",
+        ]
+
+    def test_install_lazy_tracing_defers_exporter(self):
+        """測試 install_lazy_tracing 延後建立匯出器。"""
+        from rag.app_utils.lazy_tracing import TracingSettings, install_lazy_tracing
+
+        exporter = InMemorySpanExporter()
+        exporter_factory = MagicMock(return_value=exporter)
+
+        provider = install_lazy_tracing(
+            exporter_factory,
+            settings=TracingSettings(schedule_delay_millis=10),
+            set_global=False,
+        )
+        exporter_factory.assert_not_called()
+
+        provider.get_tracer("test").start_span("first").end()
+        provider.force_flush()
+
+        exporter_factory.assert_called_once()
+        assert len(exporter.get_finished_spans()) == 1
+        provider.shutdown()
+
+    def test_shutdown_before_first_span(self):
+        """測試未建立時 force_flush 與 shutdown 不會建立 TracerProvider。"""
+        from rag.app_utils.lazy_tracing import LazyTracerProvider
+
+        factory = MagicMock()
+        provider = LazyTracerProvider(factory)
+
+        assert provider.force_flush() is True
+        provider.shutdown()
+        factory.assert_not_called()
+
+    def test_factory_failure_falls_back_to_noop(self, caplog):
+        """測試建立失敗時只嘗試一次、記錄一次錯誤並改用 NoOpTracerProvider。"""
+        from rag.app_utils.lazy_tracing import LazyTracerProvider
+
+        factory = MagicMock(side_effect=RuntimeError("exporter unavailable"))
+        provider = LazyTracerProvider(factory)
+        tracer = provider.get_tracer("test")
+
+        with caplog.at_level("ERROR", logger="rag.app_utils.lazy_tracing"):
+            with tracer.start_as_current_span("first") as span:
+                assert span.is_recording() is False
+            tracer.start_span("second").end()
+            provider.get_tracer("other").start_span("third").end()
+
+        factory.assert_called_once()
+        assert provider.failed is True
+        assert len(caplog.records) == 1
+        assert provider.force_flush() is True
+        provider.shutdown()
+
+    @patch.dict(os.environ, {"TELEMETRY_SAMPLE_RATIO": "1.5"}, clear=True)
+    def test_invalid_ratio_does_not_fail_first_span(self):
+        """測試超出範圍的取樣比例不會讓第一個追蹤點失敗。"""
+        from rag.app_utils.lazy_tracing import install_lazy_tracing
+
+        exporter = InMemorySpanExporter()
+        provider = install_lazy_tracing(lambda: exporter, set_global=False)
+
+        provider.get_tracer("test").start_span("first").end()
+        provider.force_flush()
+
+        assert provider.failed is False
+        assert len(exporter.get_finished_spans()) == 1
+        provider.shutdown()
+
+
+class TestTracingSettings:
+    """測試 TracingSettings。"""
+
+    @patch.dict(
+        os.environ,
+        {
+            "TELEMETRY_SAMPLE_RATIO": "0.25",
+            "TELEMETRY_SLOW_TRACE_MS": "1500",
+            "TELEMETRY_MAX_BUFFERED_TRACES": "64",
+            "TELEMETRY_MAX_ATTRIBUTE_LENGTH": "4096",
+        },
+        clear=True,
+    )
+    def test_from_env(self):
+        """測試從環境變數讀取設定。"""
+        from rag.app_utils.lazy_tracing import TracingSettings
+
+        settings = TracingSettings.from_env()
+
+        assert settings.sample_ratio == 0.25
+        assert settings.slow_trace_ms == 1500
+        assert settings.max_buffered_traces == 64
+        assert settings.max_attribute_length == 4096
+        assert settings.tail_sampling is True
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_defaults_keep_everything_without_buffering(self):
+        """測試預設保留所有追蹤，不啟用尾部取樣。"""
+        from rag.app_utils.lazy_tracing import TracingSettings
+
+        settings = TracingSettings.from_env()
+
+        assert settings.sample_ratio == 1.0
+        assert settings.max_attribute_length is None
+        assert settings.tail_sampling is False
+
+    def test_ratio_is_clamped(self):
+        """測試超出 0~1 的取樣比例被截斷，NaN 改用預設值。"""
+        from rag.app_utils.lazy_tracing import TracingSettings
+
+        for value, expected in (("1.5", 1.0), ("-0.2", 0.0), ("nan", 1.0), ("0", 0.0)):
+            with patch.dict(os.environ, {"TELEMETRY_SAMPLE_RATIO": value}, clear=True):
+                assert TracingSettings.from_env().sample_ratio == expected
+
+    def test_tail_sampling_requires_ratio_below_one(self):
+        """測試尾部取樣只在比例小於 1 且有保留規則時啟用。"""
+        from rag.app_utils.lazy_tracing import TracingSettings
+
+        assert TracingSettings(slow_trace_ms=100).tail_sampling is False
+        assert TracingSettings(sample_ratio=0.5, slow_trace_ms=100).tail_sampling is True
+        assert TracingSettings(sample_ratio=0.5, keep_error_traces=False).tail_sampling is False
+
+    def test_head_sampling(self):
+        """測試未啟用尾部取樣時以 trace_id 比例在開始時取樣。"""
+        from rag.app_utils.lazy_tracing import TracingSettings, build_tracer_provider
+
+        exporter = InMemorySpanExporter()
+        provider = build_tracer_provider(
+            exporter,
+            TracingSettings(sample_ratio=0.0, keep_error_traces=False, schedule_delay_millis=10),
+        )
+
+        span = provider.get_tracer("test").start_span("dropped")
+        span.end()
+        provider.force_flush()
+
+        assert span.is_recording() is False
+        assert exporter.get_finished_spans() == ()
+        provider.shutdown()
+
+
+class TestTailSampling:
+    """
+    測試 TailSamplingSpanProcessor。
+
+    重點說明:
+    1. 驗證錯誤與過慢的追蹤一律保留，其餘依比例取樣
+    2. 驗證保留時整條追蹤一起匯出
+    3. 驗證緩衝追蹤數與每條追蹤的追蹤點數上限
+    """
+
+    def test_sampled_out_trace_is_dropped(self):
+        """測試比例為 0 時一般追蹤被捨棄。"""
+        tracer, exporter, processor = make_tail_provider(sample_ratio=0.0)
+
+        with tracer.start_as_current_span("root"):
+            tracer.start_span("child").end()
+
+        assert exporter.get_finished_spans() == ()
+        assert processor.stats()["sampled_out_traces"] == 1
+        assert processor.stats()["buffered_traces"] == 0
+
+    def test_error_trace_is_kept_with_all_spans(self):
+        """測試含錯誤的追蹤整條保留。"""
+        tracer, exporter, processor = make_tail_provider(sample_ratio=0.0)
+
+        with tracer.start_as_current_span("root"):
+            child = tracer.start_span("failing_tool")
+            child.set_status(Status(StatusCode.ERROR))
+            child.end()
+            tracer.start_span("other").end()
+
+        assert {span.name for span in exporter.get_finished_spans()} == {
+            "failing_tool",
+            "other",
+            "root",
+        }
+        assert processor.stats()["kept_traces"] == 1
+
+    def test_slow_trace_is_kept(self):
+        """測試根追蹤點超過門檻的追蹤保留。"""
+        tracer, exporter, _ = make_tail_provider(sample_ratio=0.0, slow_trace_ms=20)
+
+        with tracer.start_as_current_span("fast"):
+            pass
+        with tracer.start_as_current_span("slow"):
+            time.sleep(0.03)
+
+        assert [span.name for span in exporter.get_finished_spans()] == ["slow"]
+
+    def test_ratio_is_deterministic_per_trace(self):
+        """測試比例取樣依 trace_id 決定，約保留對應比例的追蹤。"""
+        tracer, exporter, processor = make_tail_provider(
+            sample_ratio=0.5, keep_error_traces=False
+        )
+
+        for _ in range(400):
+            with tracer.start_as_current_span("root"):
+                tracer.start_span("child").end()
+
+        kept = processor.stats()["kept_traces"]
+        assert 120 < kept < 280
+        assert len(exporter.get_finished_spans()) == kept * 2
+
+    def test_buffer_is_bounded(self):
+        """測試未結束的追蹤超過上限時被逐出，單一追蹤的追蹤點數有上限。"""
+        tracer, _, processor = make_tail_provider(
+            sample_ratio=0.0, max_buffered_traces=3, max_spans_per_trace=2
+        )
+
+        roots = [tracer.start_span(f"root-{i}") for i in range(5)]
+        for root in roots:
+            # 在各自的追蹤中結束子追蹤點，根追蹤點保持開啟
+            ctx = trace.set_span_in_context(root)
+            for _ in range(3):
+                tracer.start_span("child", context=ctx).end()
+
+        stats = processor.stats()
+        assert stats["buffered_traces"] == 3
+        assert stats["evicted_traces"] == 2
+        assert stats["dropped_spans"] == 5
@@ -120,6 +120,53 @@ class TestArizeInstrumentation:
         )
 
 
+class TestLazyArizeInstrumentation:
+    """
+    測試延遲建立的 Arize 追蹤。
+
+    重點說明:
+    1. 驗證檢測 ADK 時不建立 Arize 匯出器
+    2. 驗證缺少憑證時的行為與重複呼叫
+    """
+
+    @patch.dict(os.environ, {}, clear=True)
+    def test_lazy_without_credentials(self):
+        """測試沒有憑證時回傳 None 並警告。"""
+        from rag.tracing import instrument_adk_with_arize_lazily
+
+        with patch("rag.tracing._lazy_provider", None):
+            with pytest.warns(UserWarning, match="未設定 ARIZE_SPACE_ID"):
+                assert instrument_adk_with_arize_lazily() is None
+
+    @patch.dict(
+        os.environ,
+        {"ARIZE_SPACE_ID": "test-space-id", "ARIZE_API_KEY": "test-api-key"},
+        clear=True,
+    )
+    @patch("rag.app_utils.lazy_tracing.trace.set_tracer_provider")
+    @patch("rag.tracing.GoogleADKInstrumentor")
+    @patch("arize.otel.GRPCSpanExporter")
+    def test_lazy_defers_exporter(
+        self, mock_exporter, mock_instrumentor, mock_set_provider
+    ):
+        """測試註冊時只建立延遲 TracerProvider，重複呼叫不重複檢測。"""
+        from rag.app_utils.lazy_tracing import LazyTracerProvider
+        from rag.tracing import instrument_adk_with_arize_lazily
+
+        with patch("rag.tracing._lazy_provider", None):
+            provider = instrument_adk_with_arize_lazily()
+            again = instrument_adk_with_arize_lazily()
+
+        assert isinstance(provider, LazyTracerProvider)
+        assert again is provider
+        assert provider.initialized is False
+        mock_exporter.assert_not_called()
+        mock_set_provider.assert_called_once_with(provider)
+        mock_instrumentor.return_value.instrument.assert_called_once_with(
+            tracer_provider=provider
+        )
+
+
 class TestTracingIntegration:
     """測試追蹤整合。"""
 
@@ -278,6 +278,13 @@ technical_tool = AgentTool(technical_agent)
 sales_tool = AgentTool(sales_agent)
 marketing_tool = AgentTool(marketing_agent)
 
+# 分析器名稱 → 輸出結構描述 (訂閱者用來驗證分析結果，不符合時送到死信主題)
+# Analyzer name → output schema (used by the subscriber to validate results)
+ANALYZER_SCHEMAS = {
+    agent.name: agent.output_schema
+    for agent in (financial_agent, technical_agent, sales_agent, marketing_agent)
+}
+
 
 # ============================================================================
 # 根協調者代理
@@ -0,0 +1,253 @@
+# 本地記憶體內 Pub/Sub 替身
+# In-memory Pub/Sub stand-in for offline testing and benchmarking
+#
+# 提供與 google-cloud-pubsub 的 PublisherClient / SubscriberClient
+# 相同形狀的同步 API (publish、pull、acknowledge、modify_ack_deadline)，
+# 讓訂閱者執行環境可以在沒有 GCP 專案的情況下測試與量測吞吐量。
+
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Deque, Dict, List, Optional
+
+
+@dataclass
+class LocalMessage:
+    """
+    已發布的訊息 (對應 pubsub_v1.types.PubsubMessage)。
+    Published message (mirrors pubsub_v1.types.PubsubMessage).
+    """
+
+    data: bytes
+    message_id: str
+    attributes: Dict[str, str] = field(default_factory=dict)
+    publish_time: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+@dataclass
+class LocalReceivedMessage:
+    """
+    拉取到的訊息 (對應 pubsub_v1.types.ReceivedMessage)。
+    Pulled message (mirrors pubsub_v1.types.ReceivedMessage).
+    """
+
+    ack_id: str
+    message: LocalMessage
+    delivery_attempt: int
+
+
+@dataclass
+class LocalPullResponse:
+    """拉取回應 (對應 pubsub_v1.types.PullResponse)。"""
+
+    received_messages: List[LocalReceivedMessage]
+
+
+@dataclass
+class _Lease:
+    message: LocalMessage
+    deadline: float
+    attempt: int
+
+
+class _Subscription:
+    """單一訂閱的待處理佇列與租約 (lease)。"""
+
+    def __init__(self, ack_deadline: float):
+        self.ack_deadline = ack_deadline
+        self.pending: Deque[tuple] = deque()
+        self.leases: Dict[str, _Lease] = {}
+        self.attempts: Dict[str, int] = {}
+        self.acked = 0
+        self.redelivered = 0
+
+
+class InMemoryPubSub:
+    """
+    執行緒安全的記憶體內 Pub/Sub。
+    Thread-safe in-memory Pub/Sub.
+
+    同時扮演 PublisherClient 與 SubscriberClient：
+    - `publish(topic, data, **attributes)` 回傳已完成的 Future (與真實客戶端相同)
+    - `pull` / `acknowledge` / `modify_ack_deadline` 接受與真實客戶端相同的 `request` 字典
+    - 租約到期或 `modify_ack_deadline(..., 0)` (nack) 的訊息會被重新傳遞，
+      並遞增 `delivery_attempt`
+    """
+
+    def __init__(self, ack_deadline: float = 10.0, clock: Callable[[], float] = time.monotonic):
+        """
+        初始化記憶體內 Pub/Sub。
+
+        Args:
+            ack_deadline: 訂閱的預設確認期限 (秒)
+            clock: (可選) 取得目前時間的函式，主要用於測試
+        """
+        self.ack_deadline = ack_deadline
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._topics: Dict[str, List[str]] = {}
+        self._subscriptions: Dict[str, _Subscription] = {}
+        self._message_ids = itertools.count(1)
+        self._ack_ids = itertools.count(1)
+        self.requests = {"pull": 0, "acknowledge": 0, "modify_ack_deadline": 0}
+
+    # ------------------------------------------------------------------
+    # 路徑輔助函式 (與真實客戶端相同格式)
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def topic_path(project: Optional[str], topic: str) -> str:
+        return f"projects/{project}/topics/{topic}"
+
+    @staticmethod
+    def subscription_path(project: Optional[str], subscription: str) -> str:
+        return f"projects/{project}/subscriptions/{subscription}"
+
+    # ------------------------------------------------------------------
+    # 管理
+    # ------------------------------------------------------------------
+
+    def create_topic(self, topic: str) -> str:
+        """建立主題 (已存在時不做任何事)。"""
+        with self._lock:
+            self._topics.setdefault(topic, [])
+        return topic
+
+    def create_subscription(
+        self, subscription: str, topic: str, ack_deadline: Optional[float] = None
+    ) -> str:
+        """建立附加到主題的訂閱；之後發布到主題的訊息都會傳遞到此訂閱。"""
+        with self._lock:
+            self._topics.setdefault(topic, [])
+            if subscription not in self._subscriptions:
+                self._subscriptions[subscription] = _Subscription(
+                    self.ack_deadline if ack_deadline is None else ack_deadline
+                )
+                self._topics[topic].append(subscription)
+        return subscription
+
+    # ------------------------------------------------------------------
+    # 發布者 API
+    # ------------------------------------------------------------------
+
+    def publish(self, topic: str, data: bytes, **attributes: str) -> Future:
+        """發布訊息到主題的所有訂閱；回傳已完成的 Future，結果為訊息 ID。"""
+        if topic not in self._topics:
+            raise KeyError(f"找不到主題 (Topic not found): {topic}")
+        message = LocalMessage(
+            data=data,
+            message_id=str(next(self._message_ids)),
+            attributes={k: str(v) for k, v in attributes.items()},
+        )
+        with self._lock:
+            for name in self._topics[topic]:
+                self._subscriptions[name].pending.append((message, 0))
+        future: Future = Future()
+        future.set_result(message.message_id)
+        return future
+
+    # ------------------------------------------------------------------
+    # 訂閱者 API
+    # ------------------------------------------------------------------
+
+    def _subscription(self, path: str) -> _Subscription:
+        try:
+            return self._subscriptions[path]
+        except KeyError:
+            raise KeyError(f"找不到訂閱 (Subscription not found): {path}") from None
+
+    def _expire_leases(self, sub: _Subscription) -> None:
+        now = self._clock()
+        expired = [ack_id for ack_id, lease in sub.leases.items() if lease.deadline <= now]
+        for ack_id in expired:
+            lease = sub.leases.pop(ack_id)
+            sub.pending.appendleft((lease.message, lease.attempt))
+            sub.redelivered += 1
+
+    def pull(self, request: Optional[dict] = None, **kwargs) -> LocalPullResponse:
+        """拉取最多 `max_messages` 則訊息並建立租約；沒有訊息時立即回傳空清單。"""
+        request = {**(request or {}), **kwargs}
+        max_messages = int(request.get("max_messages", 1))
+        with self._lock:
+            self.requests["pull"] += 1
+            sub = self._subscription(request["subscription"])
+            self._expire_leases(sub)
+            received = []
+            deadline = self._clock() + sub.ack_deadline
+            while sub.pending and len(received) < max_messages:
+                message, attempt = sub.pending.popleft()
+                ack_id = f"ack-{next(self._ack_ids)}"
+                sub.leases[ack_id] = _Lease(message, deadline, attempt + 1)
+                received.append(LocalReceivedMessage(ack_id, message, attempt + 1))
+        return LocalPullResponse(received)
+
+    def acknowledge(self, request: Optional[dict] = None, **kwargs) -> None:
+        """確認訊息；未知或已過期的 ack_id 會被忽略 (與真實服務相同)。"""
+        request = {**(request or {}), **kwargs}
+        with self._lock:
+            self.requests["acknowledge"] += 1
+            sub = self._subscription(request["subscription"])
+            for ack_id in request.get("ack_ids", []):
+                if sub.leases.pop(ack_id, None) is not None:
+                    sub.acked += 1
+
+    def modify_ack_deadline(self, request: Optional[dict] = None, **kwargs) -> None:
+        """延長租約；`ack_deadline_seconds=0` 表示 nack，訊息會立即重新傳遞。"""
+        request = {**(request or {}), **kwargs}
+        seconds = float(request["ack_deadline_seconds"])
+        with self._lock:
+            self.requests["modify_ack_deadline"] += 1
+            sub = self._subscription(request["subscription"])
+            for ack_id in request.get("ack_ids", []):
+                lease = sub.leases.get(ack_id)
+                if lease is None:
+                    continue
+                if seconds <= 0:
+                    del sub.leases[ack_id]
+                    sub.pending.appendleft((lease.message, lease.attempt))
+                    sub.redelivered += 1
+                else:
+                    lease.deadline = self._clock() + seconds
+
+    # ------------------------------------------------------------------
+    # 觀察
+    # ------------------------------------------------------------------
+
+    def backlog(self, subscription: str) -> int:
+        """尚未確認的訊息數 (待處理 + 租約中)。"""
+        with self._lock:
+            sub = self._subscription(subscription)
+            return len(sub.pending) + len(sub.leases)
+
+    def stats(self, subscription: str) -> Dict[str, int]:
+        """訂閱的統計：待處理、租約中、已確認與重新傳遞次數。"""
+        with self._lock:
+            sub = self._subscription(subscription)
+            return {
+                "pending": len(sub.pending),
+                "leased": len(sub.leases),
+                "acked": sub.acked,
+                "redelivered": sub.redelivered,
+            }
+
+    def messages(self, subscription: str) -> List[LocalMessage]:
+        """取出訂閱中所有待處理的訊息並確認 (例如檢查死信主題)。"""
+        with self._lock:
+            sub = self._subscription(subscription)
+            messages = [message for message, _ in sub.pending]
+            sub.acked += len(messages)
+            sub.pending.clear()
+            return messages
+
+
+### 重點摘要
+# - **核心概念**：記憶體內的 Pub/Sub 替身，模擬主題、訂閱、租約與重新傳遞。
+# - **關鍵技術**：執行緒鎖、租約期限、與 google-cloud-pubsub 相同形狀的 request 字典 API。
+# - **重要結論**：訂閱者執行環境只依賴 pull / acknowledge / modify_ack_deadline，因此可以離線測試與量測吞吐量。
+# - **行動項目**：正式環境改用 `pubsub_v1.SubscriberClient` 與 `pubsub_v1.PublisherClient`。
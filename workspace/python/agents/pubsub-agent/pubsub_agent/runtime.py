@@ -0,0 +1,750 @@
+# 訂閱者執行環境：流量控制、有限並行、批次確認與死信處理
+# Subscriber runtime: flow control, bounded concurrency, batched acks and dead-lettering
+#
+# 執行流程：
+# 1. 拉取器 (puller) 在未超過流量控制上限 (未完成的訊息數 / 位元組) 時拉取訊息，
+#    並立即以一次 modify_ack_deadline 請求延長整批訊息的租約
+# 2. 每則訊息由一個 asyncio 工作處理；同時進行的代理 (LLM) 呼叫數以 Semaphore 限制
+# 3. 確認 (ack) 與否定確認 (nack) 先放入佇列，由確認器 (acker) 批次送出
+# 4. 租約延長器 (leaser) 定期以一次請求延長所有處理中訊息的租約，避免慢速分析被重新傳遞
+# 5. 訊息內容或分析結果不符合結構描述 (SchemaError) 時不重試，直接送到死信主題
+#    傳遞次數取 Pub/Sub 回報的 delivery_attempt (僅在訂閱設定死信政策時提供) 與本行程
+#    觀察到的次數中較大者，因此未設定死信政策時仍會套用 max_delivery_attempts
+# 6. pull / acknowledge / modify_ack_deadline 的暫時性錯誤 (例如 gRPC 錯誤、閒置訂閱的
+#    DeadlineExceeded) 只記錄並以指數退避重試，不會中止執行環境或背景工作
+# 7. 代理由常駐的 AgentWorker 執行：整個行程共用一個 Runner 與會話服務，
+#    每份文件建立自己的工作階段，處理完成 (或失敗) 後刪除，記憶體用量不隨訊息數成長
+#
+# 用戶端只需提供 pull / acknowledge / modify_ack_deadline (request 字典)，
+# 因此可以使用 `pubsub_v1.SubscriberClient` 或 `local_pubsub.InMemoryPubSub`。
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import statistics
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Type
+
+from pydantic import BaseModel, ValidationError
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# 訊息與結構描述
+# Messages and Schemas
+# ============================================================================
+
+class SchemaError(ValueError):
+    """
+    訊息內容或分析結果不符合結構描述。
+    重試也不會成功，因此直接送到死信主題。
+    """
+
+
+@dataclass
+class Document:
+    """
+    從 Pub/Sub 訊息解碼的文件。
+    Document decoded from a Pub/Sub message.
+    """
+
+    document_id: str
+    content: str
+    message_id: str = ""
+    attributes: Dict[str, str] = field(default_factory=dict)
+    delivery_attempt: int = 1
+    publish_time: Optional[datetime] = None
+
+
+def decode_document(received: Any) -> Document:
+    """
+    將拉取到的訊息解碼為 Document。
+
+    Args:
+        received: ReceivedMessage (具有 ack_id、message、delivery_attempt)
+
+    Raises:
+        SchemaError: 訊息不是 JSON，或缺少字串欄位 document_id / content
+    """
+    message = received.message
+    try:
+        data = json.loads(message.data.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise SchemaError(f"訊息不是有效的 JSON: {e}") from e
+    if not isinstance(data, dict):
+        raise SchemaError("訊息必須是 JSON 物件")
+    for key in ("document_id", "content"):
+        if not isinstance(data.get(key), str) or not data[key]:
+            raise SchemaError(f"訊息缺少字串欄位 {key}")
+    return Document(
+        document_id=data["document_id"],
+        content=data["content"],
+        message_id=message.message_id,
+        attributes=dict(message.attributes or {}),
+        delivery_attempt=received.delivery_attempt or 1,
+        publish_time=message.publish_time,
+    )
+
+
+def extract_analysis(events: Iterable[Any], schemas: Dict[str, Type[BaseModel]]) -> BaseModel:
+    """
+    從代理事件中取出最後一個分析器的結構化輸出並驗證。
+
+    Args:
+        events: `Runner.run_async` 產生的事件
+        schemas: 分析器名稱 → 輸出結構描述
+
+    Raises:
+        SchemaError: 協調者沒有呼叫任何分析器，或分析器輸出不符合結構描述
+    """
+    for event in reversed(list(events)):
+        for response in event.get_function_responses() or []:
+            schema = schemas.get(response.name)
+            if schema is None:
+                continue
+            try:
+                return schema.model_validate(response.response)
+            except ValidationError as e:
+                raise SchemaError(f"{response.name} 輸出不符合結構描述: {e}") from e
+    raise SchemaError("協調者沒有呼叫任何分析器")
+
+
+# ============================================================================
+# 設定與指標
+# Settings and Metrics
+# ============================================================================
+
+def _env(name: str, default: float) -> float:
+    return float(os.environ.get(name, default))
+
+
+@dataclass
+class FlowControlSettings:
+    """
+    訂閱者執行環境的流量控制設定。
+
+    Attributes:
+        max_messages: 最多同時未完成 (已拉取但尚未確認) 的訊息數
+        max_bytes: 未完成訊息的總位元組上限
+        max_in_flight: 最多同時進行的代理 (LLM) 呼叫數
+        pull_batch: 單次 pull 請求最多拉取的訊息數
+        ack_batch_size: 確認佇列達到此數量時立即送出
+        ack_flush_interval: 確認佇列最長的等待秒數
+        lease_extension: 每次延長租約的秒數 (租約延長器每半個週期執行一次)
+        max_lease_duration: 單則訊息最長的租約總時間；超過後不再延長
+        max_delivery_attempts: 傳遞次數超過此值的訊息直接送到死信主題
+            (Pub/Sub 只在訂閱設定死信政策時回報傳遞次數；否則使用本行程觀察到的次數)
+        poll_interval: 沒有訊息時再次拉取前的等待秒數
+        pull_timeout: 單次 pull 請求的逾時秒數
+        error_backoff: Pub/Sub 請求失敗後第一次重試前的等待秒數 (之後加倍)
+        max_error_backoff: 重試等待秒數的上限
+        max_tracked_messages: 在本行程中記錄傳遞次數的訊息數上限 (超過時移除最舊的記錄)
+    """
+
+    max_messages: int = 100
+    max_bytes: int = 10 * 1024 * 1024
+    max_in_flight: int = 8
+    pull_batch: int = 50
+    ack_batch_size: int = 100
+    ack_flush_interval: float = 0.1
+    lease_extension: float = 60.0
+    max_lease_duration: float = 600.0
+    max_delivery_attempts: int = 5
+    poll_interval: float = 0.5
+    pull_timeout: float = 30.0
+    error_backoff: float = 1.0
+    max_error_backoff: float = 30.0
+    max_tracked_messages: int = 10_000
+
+    def __post_init__(self):
+        if self.max_messages < 1 or self.max_in_flight < 1 or self.pull_batch < 1:
+            raise ValueError("max_messages、max_in_flight 與 pull_batch 必須大於 0")
+
+    @classmethod
+    def from_env(cls) -> "FlowControlSettings":
+        """
+        從環境變數讀取設定 (PUBSUB_MAX_MESSAGES、PUBSUB_MAX_BYTES、PUBSUB_MAX_IN_FLIGHT、
+        PUBSUB_PULL_BATCH、PUBSUB_ACK_BATCH_SIZE、PUBSUB_ACK_FLUSH_INTERVAL、
+        PUBSUB_LEASE_EXTENSION、PUBSUB_MAX_LEASE_DURATION、PUBSUB_MAX_DELIVERY_ATTEMPTS)。
+        """
+        defaults = cls()
+        return cls(
+            max_messages=int(_env("PUBSUB_MAX_MESSAGES", defaults.max_messages)),
+            max_bytes=int(_env("PUBSUB_MAX_BYTES", defaults.max_bytes)),
+            max_in_flight=int(_env("PUBSUB_MAX_IN_FLIGHT", defaults.max_in_flight)),
+            pull_batch=int(_env("PUBSUB_PULL_BATCH", defaults.pull_batch)),
+            ack_batch_size=int(_env("PUBSUB_ACK_BATCH_SIZE", defaults.ack_batch_size)),
+            ack_flush_interval=_env("PUBSUB_ACK_FLUSH_INTERVAL", defaults.ack_flush_interval),
+            lease_extension=_env("PUBSUB_LEASE_EXTENSION", defaults.lease_extension),
+            max_lease_duration=_env("PUBSUB_MAX_LEASE_DURATION", defaults.max_lease_duration),
+            max_delivery_attempts=int(
+                _env("PUBSUB_MAX_DELIVERY_ATTEMPTS", defaults.max_delivery_attempts)
+            ),
+        )
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+@dataclass
+class RuntimeMetrics:
+    """
+    吞吐量與延遲指標。
+
+    Attributes:
+        received: 拉取到的訊息數 (含重新傳遞)
+        acked: 處理成功並確認的訊息數
+        nacked: 處理失敗並否定確認 (等待重試) 的訊息數
+        dead_lettered: 送到死信主題的訊息數
+        lease_extensions: 延長租約的訊息次數
+        pull_requests / ack_requests / modack_requests: 對 Pub/Sub 發出的請求數
+        request_errors: 失敗並稍後重試的 Pub/Sub 請求數
+        peak_in_flight: 同時進行的代理呼叫數峰值
+        peak_outstanding: 同時未完成的訊息數峰值
+    """
+
+    received: int = 0
+    acked: int = 0
+    nacked: int = 0
+    dead_lettered: int = 0
+    lease_extensions: int = 0
+    pull_requests: int = 0
+    ack_requests: int = 0
+    modack_requests: int = 0
+    request_errors: int = 0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    outstanding: int = 0
+    peak_outstanding: int = 0
+    started_at: Optional[float] = None
+    stopped_at: Optional[float] = None
+    processing_seconds: Deque[float] = field(default_factory=lambda: deque(maxlen=10_000))
+    end_to_end_seconds: Deque[float] = field(default_factory=lambda: deque(maxlen=10_000))
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """目前指標的字典 (含吞吐量與 p50 / p95 延遲)。"""
+        end = self.stopped_at or now or time.monotonic()
+        elapsed = end - self.started_at if self.started_at is not None else 0.0
+        processing = list(self.processing_seconds)
+        end_to_end = list(self.end_to_end_seconds)
+        return {
+            "received": self.received,
+            "acked": self.acked,
+            "nacked": self.nacked,
+            "dead_lettered": self.dead_lettered,
+            "lease_extensions": self.lease_extensions,
+            "pull_requests": self.pull_requests,
+            "ack_requests": self.ack_requests,
+            "modack_requests": self.modack_requests,
+            "request_errors": self.request_errors,
+            "peak_in_flight": self.peak_in_flight,
+            "peak_outstanding": self.peak_outstanding,
+            "elapsed_seconds": round(elapsed, 3),
+            "throughput_per_second": round(self.acked / elapsed, 2) if elapsed > 0 else 0.0,
+            "processing_p50_seconds": _percentile(processing, 50),
+            "processing_p95_seconds": _percentile(processing, 95),
+            "end_to_end_p50_seconds": _percentile(end_to_end, 50),
+            "end_to_end_p95_seconds": _percentile(end_to_end, 95),
+        }
+
+
+# ============================================================================
+# 執行環境
+# Runtime
+# ============================================================================
+
+DeadLetterSink = Callable[[bytes, Dict[str, str]], Any]
+
+# 停止時送出剩餘 ack / nack 的最多嘗試次數
+_SHUTDOWN_FLUSH_ATTEMPTS = 3
+
+
+def pubsub_dead_letter(publisher: Any, topic_path: str) -> DeadLetterSink:
+    """
+    建立將訊息發布到死信主題的函式。
+
+    Args:
+        publisher: `pubsub_v1.PublisherClient` 或 `InMemoryPubSub`
+        topic_path: 死信主題路徑
+    """
+
+    def publish(data: bytes, attributes: Dict[str, str]) -> None:
+        publisher.publish(topic_path, data, **attributes).result()
+
+    return publish
+
+
+@dataclass
+class _Lease:
+    received_at: float
+    size: int
+
+
+class SubscriberRuntime:
+    """
+    以 asyncio 處理 Pub/Sub 訊息的訂閱者執行環境。
+
+    Example:
+        runtime = SubscriberRuntime(subscriber, subscription_path, analyze_document,
+                                    settings=FlowControlSettings.from_env(),
+                                    dead_letter=pubsub_dead_letter(publisher, dlq_path))
+        asyncio.run(runtime.run())
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        subscription_path: str,
+        process: Callable[[Document], Awaitable[Any]],
+        settings: Optional[FlowControlSettings] = None,
+        dead_letter: Optional[DeadLetterSink] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        初始化執行環境。
+
+        Args:
+            client: 提供 pull / acknowledge / modify_ack_deadline 的訂閱者用戶端
+            subscription_path: 訂閱路徑
+            process: 處理單一文件的協程函式；引發 SchemaError 表示送到死信主題，
+                其他例外表示 nack 等待重試
+            settings: 流量控制設定
+            dead_letter: (可選) 死信處理函式 (data, attributes)；未設定時只記錄錯誤並確認
+            clock: (可選) 取得目前時間的函式，主要用於測試
+        """
+        self.client = client
+        self.subscription_path = subscription_path
+        self.process = process
+        self.settings = settings or FlowControlSettings()
+        self.dead_letter = dead_letter
+        self.metrics = RuntimeMetrics()
+        self._clock = clock
+        self._leases: Dict[str, _Lease] = {}
+        self._outstanding_bytes = 0
+        self._ack_ids: List[str] = []
+        self._nack_ids: List[str] = []
+        # message_id → 本行程觀察到的傳遞次數 (依最近收到的順序)
+        self._attempts: "OrderedDict[str, int]" = OrderedDict()
+        self._workers: set = set()
+        self._consecutive_errors: Dict[str, int] = {}
+        self._stopping = False
+        self._capacity: Optional[asyncio.Condition] = None
+        self._flush_now: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    # ------------------------------------------------------------------
+    # 主迴圈
+    # ------------------------------------------------------------------
+
+    async def run(self, until_idle: bool = False) -> RuntimeMetrics:
+        """
+        開始拉取並處理訊息，直到呼叫 `stop()`。
+
+        Args:
+            until_idle: 為 True 時，訂閱沒有訊息且所有訊息處理完成後自動停止 (測試與量測用)
+
+        Returns:
+            執行期間的指標
+        """
+        self._stopping = False
+        self._capacity = asyncio.Condition()
+        self._flush_now = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.settings.max_in_flight)
+        self.metrics.started_at = self._clock()
+        self.metrics.stopped_at = None
+
+        acker = asyncio.create_task(self._ack_loop(), name="pubsub-acker")
+        leaser = asyncio.create_task(self._lease_loop(), name="pubsub-leaser")
+        try:
+            await self._pull_loop(until_idle)
+            if self._workers:
+                await asyncio.gather(*list(self._workers), return_exceptions=True)
+        finally:
+            self._stopping = True
+            leaser.cancel()
+            acker.cancel()
+            await asyncio.gather(acker, leaser, return_exceptions=True)
+            for _ in range(_SHUTDOWN_FLUSH_ATTEMPTS):
+                if await self._flush():
+                    break
+                await self._backoff("acknowledge")
+            else:
+                logger.error(
+                    "停止時仍有 %d 個 ack / %d 個 nack 無法送出，訊息將在租約到期後重新傳遞",
+                    len(self._ack_ids), len(self._nack_ids),
+                )
+            self.metrics.stopped_at = self._clock()
+        return self.metrics
+
+    def stop(self) -> None:
+        """停止拉取新訊息；處理中的訊息完成並確認後 `run()` 才會返回。"""
+        self._stopping = True
+        if self._capacity is not None:
+            asyncio.ensure_future(self._notify_capacity())
+
+    async def _notify_capacity(self) -> None:
+        async with self._capacity:
+            self._capacity.notify_all()
+
+    def _has_capacity(self) -> bool:
+        return (
+            len(self._leases) < self.settings.max_messages
+            and self._outstanding_bytes < self.settings.max_bytes
+        )
+
+    async def _pull_loop(self, until_idle: bool) -> None:
+        while not self._stopping:
+            async with self._capacity:
+                await self._capacity.wait_for(lambda: self._has_capacity() or self._stopping)
+            if self._stopping:
+                break
+
+            count = min(self.settings.pull_batch, self.settings.max_messages - len(self._leases))
+            try:
+                response = await asyncio.to_thread(
+                    self.client.pull,
+                    request={"subscription": self.subscription_path, "max_messages": count},
+                    timeout=self.settings.pull_timeout,
+                )
+            except Exception as e:
+                # 暫時性錯誤 (含閒置訂閱的 DeadlineExceeded) 退避後重試，不中止執行環境
+                await self._backoff("pull", e)
+                continue
+            self._consecutive_errors.pop("pull", None)
+            self.metrics.pull_requests += 1
+            received = list(response.received_messages)
+            if not received:
+                if until_idle and not self._leases:
+                    if not self._nack_ids:
+                        break
+                    # 送出 nack 讓訊息重新傳遞後再判斷是否閒置
+                    await self._flush()
+                    continue
+                await asyncio.sleep(self.settings.poll_interval)
+                continue
+
+            now = self._clock()
+            for message in received:
+                size = len(message.message.data)
+                self._leases[message.ack_id] = _Lease(now, size)
+                self._outstanding_bytes += size
+            self.metrics.received += len(received)
+            self.metrics.outstanding = len(self._leases)
+            self.metrics.peak_outstanding = max(self.metrics.peak_outstanding, len(self._leases))
+
+            # 收到訊息後立即延長整批的租約 (訂閱的預設期限可能比分析時間短)；
+            # 失敗時仍繼續處理，租約延長器會在下一個週期重試
+            try:
+                await self._modify_deadline(
+                    [m.ack_id for m in received], self.settings.lease_extension
+                )
+            except Exception as e:
+                self._record_error("modify_ack_deadline", e)
+
+            for message in received:
+                task = asyncio.create_task(self._handle(message))
+                self._workers.add(task)
+                task.add_done_callback(self._workers.discard)
+
+    # ------------------------------------------------------------------
+    # 單則訊息處理
+    # ------------------------------------------------------------------
+
+    async def _handle(self, received: Any) -> None:
+        attempt = self._track_attempt(received)
+        try:
+            document = decode_document(received)
+        except SchemaError as e:
+            await self._send_to_dead_letter(received, str(e), attempt)
+            return
+        document.delivery_attempt = attempt
+
+        if attempt > self.settings.max_delivery_attempts:
+            await self._send_to_dead_letter(
+                received, f"超過最大傳遞次數 {self.settings.max_delivery_attempts}", attempt
+            )
+            return
+
+        async with self._slots:
+            self.metrics.in_flight += 1
+            self.metrics.peak_in_flight = max(self.metrics.peak_in_flight, self.metrics.in_flight)
+            started = self._clock()
+            try:
+                await self.process(document)
+            except SchemaError as e:
+                await self._send_to_dead_letter(received, str(e), attempt)
+            except Exception as e:
+                logger.warning("處理 %s 失敗，稍後重試: %s", document.document_id, e)
+                self._settle(received, ack=False)
+            else:
+                self.metrics.processing_seconds.append(self._clock() - started)
+                self._settle(received, ack=True)
+            finally:
+                self.metrics.in_flight -= 1
+
+    def _track_attempt(self, received: Any) -> int:
+        """
+        回傳此訊息的傳遞次數。
+
+        Pub/Sub 只在訂閱設定死信政策時回報 delivery_attempt (否則為 0)，
+        因此同時記錄本行程收到同一 message_id 的次數，取兩者中較大者。
+        """
+        message_id = str(received.message.message_id)
+        seen = self._attempts.pop(message_id, 0) + 1
+        self._attempts[message_id] = seen
+        while len(self._attempts) > self.settings.max_tracked_messages:
+            self._attempts.popitem(last=False)
+        return max(received.delivery_attempt or 0, seen)
+
+    async def _send_to_dead_letter(self, received: Any, reason: str, attempt: int) -> None:
+        message = received.message
+        attributes = {
+            **dict(message.attributes or {}),
+            "dead_letter_reason": reason[:1024],
+            "source_message_id": str(message.message_id),
+            "delivery_attempt": str(attempt),
+        }
+        if self.dead_letter is None:
+            logger.error("訊息 %s 無法處理且未設定死信主題，直接確認: %s", message.message_id, reason)
+        else:
+            try:
+                await asyncio.to_thread(self.dead_letter, message.data, attributes)
+            except Exception as e:
+                logger.error("無法送出死信訊息 %s，稍後重試: %s", message.message_id, e)
+                self._settle(received, ack=False)
+                return
+        self.metrics.dead_lettered += 1
+        self._settle(received, ack=True, record=False)
+
+    def _settle(self, received: Any, ack: bool, record: bool = True) -> None:
+        """釋放流量控制容量，並將 ack / nack 放入批次佇列。"""
+        lease = self._leases.pop(received.ack_id, None)
+        if lease is not None:
+            self._outstanding_bytes -= lease.size
+        self.metrics.outstanding = len(self._leases)
+        if ack:
+            self._ack_ids.append(received.ack_id)
+            self._attempts.pop(str(received.message.message_id), None)
+            if record:
+                self.metrics.acked += 1
+                publish_time = received.message.publish_time
+                if publish_time is not None:
+                    delay = datetime.now(timezone.utc) - publish_time
+                    self.metrics.end_to_end_seconds.append(delay.total_seconds())
+        else:
+            self._nack_ids.append(received.ack_id)
+            self.metrics.nacked += 1
+        if len(self._ack_ids) + len(self._nack_ids) >= self.settings.ack_batch_size:
+            self._flush_now.set()
+        asyncio.ensure_future(self._notify_capacity())
+
+    # ------------------------------------------------------------------
+    # 批次確認與租約延長
+    # ------------------------------------------------------------------
+
+    def _batches(self, ack_ids: List[str]):
+        size = max(self.settings.ack_batch_size, 1)
+        for i in range(0, len(ack_ids), size):
+            yield ack_ids[i:i + size]
+
+    async def _ack_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), self.settings.ack_flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            if await self._flush():
+                self._consecutive_errors.pop("acknowledge", None)
+            else:
+                await self._backoff("acknowledge")
+
+    async def _flush(self) -> bool:
+        """
+        送出佇列中的 ack / nack。
+
+        ack_id 在請求成功後才從佇列移除，因此失敗或被取消時會留在佇列中稍後重試。
+
+        Returns:
+            所有請求都成功時為 True
+        """
+        size = max(self.settings.ack_batch_size, 1)
+        operation = "acknowledge"
+        try:
+            while self._ack_ids:
+                batch = self._ack_ids[:size]
+                await asyncio.to_thread(
+                    self.client.acknowledge,
+                    request={"subscription": self.subscription_path, "ack_ids": batch},
+                )
+                del self._ack_ids[:len(batch)]
+                self.metrics.ack_requests += 1
+            operation = "modify_ack_deadline"
+            while self._nack_ids:
+                batch = self._nack_ids[:size]
+                await self._modify_deadline(batch, 0)
+                del self._nack_ids[:len(batch)]
+        except Exception as e:
+            self._record_error(operation, e)
+            return False
+        return True
+
+    async def _modify_deadline(self, ack_ids: List[str], seconds: float) -> None:
+        # Pub/Sub 只接受整數秒；小於 1 秒的期限只用於記憶體內替身的測試
+        if seconds >= 1:
+            seconds = int(seconds)
+        for batch in self._batches(ack_ids):
+            await asyncio.to_thread(
+                self.client.modify_ack_deadline,
+                request={
+                    "subscription": self.subscription_path,
+                    "ack_ids": batch,
+                    "ack_deadline_seconds": seconds,
+                },
+            )
+            self.metrics.modack_requests += 1
+
+    async def _lease_loop(self) -> None:
+        interval = max(self.settings.lease_extension / 2, 0.01)
+        while True:
+            await asyncio.sleep(interval)
+            now = self._clock()
+            ack_ids = [
+                ack_id
+                for ack_id, lease in self._leases.items()
+                if now - lease.received_at < self.settings.max_lease_duration
+            ]
+            if not ack_ids:
+                continue
+            try:
+                await self._modify_deadline(ack_ids, self.settings.lease_extension)
+            except Exception as e:
+                # 下一個週期重試；租約延長的間隔是期限的一半，仍有時間補上
+                self._record_error("modify_ack_deadline", e)
+                continue
+            self.metrics.lease_extensions += len(ack_ids)
+
+    # ------------------------------------------------------------------
+    # 錯誤處理
+    # ------------------------------------------------------------------
+
+    def _record_error(self, operation: str, error: Exception) -> None:
+        self.metrics.request_errors += 1
+        logger.warning("Pub/Sub %s 請求失敗，稍後重試: %s", operation, error)
+
+    async def _backoff(self, operation: str, error: Optional[Exception] = None) -> None:
+        """記錄錯誤 (若有) 並以指數退避等待；成功的請求會重設等待時間。"""
+        if error is not None:
+            self._record_error(operation, error)
+        failures = self._consecutive_errors.get(operation, 0)
+        self._consecutive_errors[operation] = failures + 1
+        delay = min(self.settings.error_backoff * (2 ** failures), self.settings.max_error_backoff)
+        await asyncio.sleep(delay)
+
+
+# ============================================================================
+# 常駐代理執行器
+# Warm Agent Worker
+# ============================================================================
+
+class AgentWorker:
+    """
+    在訂閱者事件迴圈中常駐的代理執行器。
+
+    整個行程共用一個 Runner 與其會話服務，避免每份文件重新建立；每份文件使用
+    獨立的工作階段，執行結束後 (不論成功或失敗) 立即刪除，因此處理大量訊息時
+    會話服務的記憶體用量維持固定。
+
+    Example:
+        runner = Runner(app_name="pubsub_processor", agent=root_agent,
+                        session_service=InMemorySessionService())
+        worker = AgentWorker(runner)
+        events = await worker.run(prompt)
+    """
+
+    def __init__(self, runner: Any, user_id: str = "pubsub_subscriber"):
+        """
+        初始化執行器。
+
+        Args:
+            runner: ADK `Runner` (提供 app_name、session_service 與 run_async)
+            user_id: (可選) 建立工作階段時使用的使用者 ID
+        """
+        self.runner = runner
+        self.user_id = user_id
+        self.sessions_created = 0
+        self.sessions_deleted = 0
+        self.peak_active_sessions = 0
+        self._active: set = set()
+
+    @property
+    def active_sessions(self) -> int:
+        """目前尚未刪除的工作階段數。"""
+        return len(self._active)
+
+    async def run(self, new_message: Any) -> List[Any]:
+        """
+        在新的工作階段中執行代理，並在結束後刪除該工作階段。
+
+        Args:
+            new_message: 給代理的訊息 (`types.Content`)
+
+        Returns:
+            代理執行產生的所有事件 (最後一個為最終結果)
+        """
+        session_service = self.runner.session_service
+        session = await session_service.create_session(
+            app_name=self.runner.app_name, user_id=self.user_id
+        )
+        self.sessions_created += 1
+        self._active.add(session.id)
+        self.peak_active_sessions = max(self.peak_active_sessions, len(self._active))
+        try:
+            return [
+                event
+                async for event in self.runner.run_async(
+                    user_id=self.user_id, session_id=session.id, new_message=new_message
+                )
+            ]
+        finally:
+            try:
+                await session_service.delete_session(
+                    app_name=self.runner.app_name, user_id=self.user_id, session_id=session.id
+                )
+                self.sessions_deleted += 1
+            except Exception as e:
+                logger.warning("無法刪除工作階段 %s: %s", session.id, e)
+            self._active.discard(session.id)
+
+    def stats(self) -> Dict[str, int]:
+        """工作階段計數 (建立、刪除、目前與峰值)。"""
+        return {
+            "sessions_created": self.sessions_created,
+            "sessions_deleted": self.sessions_deleted,
+            "active_sessions": self.active_sessions,
+            "peak_active_sessions": self.peak_active_sessions,
+        }
+
+    async def close(self) -> None:
+        """關閉 Runner (釋放工具集與外掛的資源)；行程結束前呼叫一次。"""
+        await self.runner.close()
+
+
+### 重點摘要
+# - **核心概念**：以 asyncio 處理 Pub/Sub 訊息的訂閱者執行環境，突發流量時仍維持有限的 LLM 並行數。
+# - **關鍵技術**：流量控制 (未完成訊息數與位元組)、Semaphore、批次 acknowledge / modify_ack_deadline、租約延長、死信主題、
+#   常駐 Runner 與逐文件建立 / 刪除的工作階段 (AgentWorker)。
+# - **重要結論**：SchemaError 代表重試也不會成功的訊息，直接送到死信主題；其他錯誤 nack 後由 Pub/Sub 重新傳遞。
+# - **行動項目**：依 LLM 配額調整 `PUBSUB_MAX_IN_FLIGHT`，並在 GCP 建立死信主題 (`PUBSUB_TOPIC_DLQ`)。
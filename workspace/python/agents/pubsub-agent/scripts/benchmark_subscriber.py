@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+比較原本的回呼式訂閱者與 SubscriberRuntime 處理突發流量的吞吐量與延遲。
+
+使用記憶體內 Pub/Sub 替身與模擬的代理延遲 (不需要 GCP 專案或 API 金鑰)：
+
+- callback: 原本的 subscriber.py；串流拉取回呼在 10 個執行緒中執行，
+  每則訊息以 asyncio.run() 建立新的事件迴圈，並逐一 ack
+- runtime: SubscriberRuntime；單一事件迴圈、有限並行 (max_in_flight) 與批次確認
+
+使用方法：
+    python scripts/benchmark_subscriber.py --messages 500 --latency 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from pubsub_agent.local_pubsub import InMemoryPubSub  # noqa: E402
+from pubsub_agent.runtime import FlowControlSettings, SubscriberRuntime  # noqa: E402
+
+TOPIC = "document-uploads"
+SUBSCRIPTION = "document-processor"
+CALLBACK_THREADS = 10  # pubsub_v1 串流拉取預設的回呼執行緒數
+
+
+def make_pubsub(messages: int) -> InMemoryPubSub:
+    pubsub = InMemoryPubSub(ack_deadline=600)
+    pubsub.create_subscription(SUBSCRIPTION, TOPIC)
+    for i in range(messages):
+        data = json.dumps({"document_id": f"DOC-{i:05d}", "content": "季度營收成長 15%"})
+        pubsub.publish(TOPIC, data.encode("utf-8"))
+    return pubsub
+
+
+def fake_agent(latency: float, rng: random.Random):
+    """模擬代理呼叫：平均 latency 秒、帶有長尾的延遲。"""
+    delay = latency * rng.lognormvariate(0, 0.4)
+
+    async def call(*_):
+        await asyncio.sleep(delay)
+
+    return call
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def run_callback(pubsub: InMemoryPubSub, latency: float) -> dict:
+    """原本的行為：執行緒池回呼 + 每則訊息 asyncio.run() + 逐一 ack。"""
+    rng = random.Random(0)
+    latencies = []
+    start = time.perf_counter()
+
+    def callback(received):
+        asyncio.run(fake_agent(latency, rng)())
+        pubsub.acknowledge(request={"subscription": SUBSCRIPTION, "ack_ids": [received.ack_id]})
+        delay = datetime.now(timezone.utc) - received.message.publish_time
+        latencies.append(delay.total_seconds())
+
+    with ThreadPoolExecutor(max_workers=CALLBACK_THREADS) as pool:
+        while True:
+            response = pubsub.pull(request={"subscription": SUBSCRIPTION, "max_messages": 100})
+            if not response.received_messages:
+                break
+            # 串流拉取不等待回呼完成就繼續租用訊息 (預設最多 1000 則)
+            for received in response.received_messages:
+                pool.submit(callback, received)
+    elapsed = time.perf_counter() - start
+    return {
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "ack_requests": pubsub.requests["acknowledge"],
+    }
+
+
+def run_runtime(pubsub: InMemoryPubSub, latency: float, max_in_flight: int) -> dict:
+    rng = random.Random(0)
+
+    async def process(document):
+        await fake_agent(latency, rng)(document)
+
+    settings = FlowControlSettings(max_in_flight=max_in_flight, ack_flush_interval=0.05, poll_interval=0.01)
+    runtime = SubscriberRuntime(pubsub, SUBSCRIPTION, process, settings=settings, clock=time.perf_counter)
+    snapshot = asyncio.run(runtime.run(until_idle=True)).snapshot()
+    return {
+        "elapsed": snapshot["elapsed_seconds"],
+        "throughput": snapshot["throughput_per_second"],
+        "p50": snapshot["end_to_end_p50_seconds"],
+        "p95": snapshot["end_to_end_p95_seconds"],
+        "ack_requests": pubsub.requests["acknowledge"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=500, help="突發的訊息數")
+    parser.add_argument("--latency", type=float, default=0.2, help="模擬代理呼叫的平均延遲 (秒)")
+    parser.add_argument("--max-in-flight", type=int, nargs="+", default=[10, 32])
+    args = parser.parse_args()
+
+    print(f"{args.messages} 則訊息，代理延遲約 {args.latency * 1000:.0f} 毫秒")
+    print(f"{'模式':<14} {'耗時 (秒)':>10} {'訊息/秒':>9} {'p50 (秒)':>9} {'p95 (秒)':>9} {'ack 請求':>9}")
+    rows = [("callback", run_callback(make_pubsub(args.messages), args.latency))]
+    for limit in args.max_in_flight:
+        rows.append((f"runtime ({limit})", run_runtime(make_pubsub(args.messages), args.latency, limit)))
+    for name, r in rows:
+        print(
+            f"{name:<14} {r['elapsed']:>10.2f} {r['throughput']:>9.1f} "
+            f"{r['p50']:>9.2f} {r['p95']:>9.2f} {r['ack_requests']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+比較每份文件建立新 Runner 與常駐 AgentWorker 的每份文件耗時與會話服務保留的記憶體。
+
+使用不呼叫 LLM 的回聲代理 (不需要 GCP 專案或 API 金鑰)，只量測執行環境本身的成本：
+
+- per-document: 原本的 process_document_with_agent；每份文件建立新的
+  InMemorySessionService 與 Runner，且從不關閉 Runner
+- shared (no delete): 共用一個 Runner，但不刪除工作階段 (記憶體隨文件數成長)
+- AgentWorker: 共用一個 Runner，每份文件處理後刪除工作階段
+
+使用方法：
+    python scripts/benchmark_worker.py --documents 2000
+"""
+
+import argparse
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import AsyncGenerator
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from google.adk import Runner  # noqa: E402
+from google.adk.agents import BaseAgent  # noqa: E402
+from google.adk.events import Event  # noqa: E402
+from google.adk.sessions import InMemorySessionService  # noqa: E402
+from google.genai import types  # noqa: E402
+
+from pubsub_agent.runtime import AgentWorker  # noqa: E402
+
+APP_NAME = "pubsub_processor"
+USER_ID = "pubsub_subscriber"
+
+
+class EchoAgent(BaseAgent):
+    """回傳固定回應的代理，用於排除 LLM 延遲。"""
+
+    async def _run_async_impl(self, ctx) -> AsyncGenerator[Event, None]:
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            content=types.Content(role="model", parts=[types.Part(text="分析完成")]),
+        )
+
+
+def make_runner(agent: BaseAgent) -> Runner:
+    return Runner(app_name=APP_NAME, agent=agent, session_service=InMemorySessionService())
+
+
+def prompt(index: int) -> types.Content:
+    text = f"文件 ID: DOC-{index:05d}\n內容: " + "季度營收成長 15%。" * 100
+    return types.Content(role="user", parts=[types.Part(text=text)])
+
+
+def retained_kb() -> int:
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0] // 1024
+
+
+async def run_per_document(agent: BaseAgent, documents: int) -> int:
+    for i in range(documents):
+        runner = make_runner(agent)
+        session = await runner.session_service.create_session(app_name=APP_NAME, user_id=USER_ID)
+        async for _ in runner.run_async(user_id=USER_ID, session_id=session.id, new_message=prompt(i)):
+            pass
+    return retained_kb()
+
+
+async def run_shared(agent: BaseAgent, documents: int, delete: bool) -> int:
+    runner = make_runner(agent)
+    worker = AgentWorker(runner, user_id=USER_ID)
+    for i in range(documents):
+        if delete:
+            await worker.run(prompt(i))
+            continue
+        session = await runner.session_service.create_session(app_name=APP_NAME, user_id=USER_ID)
+        async for _ in runner.run_async(user_id=USER_ID, session_id=session.id, new_message=prompt(i)):
+            pass
+    # 在 Runner 仍存活時量測保留的記憶體
+    memory = retained_kb()
+    await runner.close()
+    return memory
+
+
+def measure(name: str, coroutine_factory, documents: int) -> None:
+    asyncio.run(coroutine_factory(10))  # 暖身：載入模組與快取
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    memory = asyncio.run(coroutine_factory(documents))
+    elapsed = time.perf_counter() - started
+    tracemalloc.stop()
+    print(f"{name:<20} {elapsed / documents * 1000:>10.3f} {memory:>14,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=2000, help="處理的文件數")
+    args = parser.parse_args()
+
+    agent = EchoAgent(name="echo_analyzer")
+    print(f"{args.documents} 份文件 (回聲代理，不呼叫 LLM)")
+    print(f"{'模式':<20} {'毫秒/文件':>10} {'保留記憶體 (KB)':>14}")
+    measure("per-document", lambda n: run_per_document(agent, n), args.documents)
+    measure("shared (no delete)", lambda n: run_shared(agent, n, delete=False), args.documents)
+    measure("AgentWorker", lambda n: run_shared(agent, n, delete=True), args.documents)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,22 @@ import sys
 import json
 import asyncio
 import logging
+from typing import Optional
 from google.cloud import pubsub_v1
 from google.adk import Runner
 from google.adk.sessions import InMemorySessionService
 from google.genai import types
-from pubsub_agent.agent import root_agent
+from pydantic import ValidationError
+from pubsub_agent.agent import ANALYZER_SCHEMAS, root_agent
+from pubsub_agent.runtime import (
+    AgentWorker,
+    Document,
+    FlowControlSettings,
+    SchemaError,
+    SubscriberRuntime,
+    extract_analysis,
+    pubsub_dead_letter,
+)
 
 # 抑制來自函式庫的吵雜除錯訊息
 logging.getLogger('google.auth').setLevel(logging.WARNING)
@@ -17,13 +28,33 @@ logging.getLogger('absl').setLevel(logging.ERROR)
 
 # 從環境變數中取得 GCP 專案 ID
 project_id = os.environ.get("GCP_PROJECT")
-# 定義 Pub/Sub 訂閱 ID
-subscription_id = "document-processor"
+# 定義 Pub/Sub 訂閱 ID 與死信主題
+subscription_id = os.environ.get("PUBSUB_SUBSCRIPTION_PROCESSOR", "document-processor")
+dead_letter_topic_id = os.environ.get("PUBSUB_TOPIC_DLQ", "document-dlq")
+
+APP_NAME = "pubsub_processor"
+USER_ID = "pubsub_subscriber"
+
+# 行程內共用的代理執行器 (第一次處理文件時建立)
+_agent_worker: Optional[AgentWorker] = None
+
+
+def get_agent_worker() -> AgentWorker:
+    """
+    取得行程內共用的代理執行器。
+
+    Runner 與會話服務只建立一次；每份文件的工作階段由 AgentWorker 建立並在處理後刪除。
+    """
+    global _agent_worker
+    if _agent_worker is None:
+        runner = Runner(
+            app_name=APP_NAME,
+            agent=root_agent,
+            session_service=InMemorySessionService()
+        )
+        _agent_worker = AgentWorker(runner, user_id=USER_ID)
+    return _agent_worker
 
-# 初始化 Pub/Sub 訂閱者客戶端
-subscriber = pubsub_v1.SubscriberClient()
-# 建立完整的訂閱路徑: projects/{project_id}/subscriptions/{subscription_id}
-subscription_path = subscriber.subscription_path(project_id, subscription_id)
 
 async def process_document_with_agent(document_id: str, content: str):
     """
@@ -34,23 +65,9 @@ async def process_document_with_agent(document_id: str, content: str):
         content (str): 文件的文字內容
 
     Returns:
-        代理執行的最終結果
+        代理執行產生的所有事件 (最後一個為最終結果)
     """
     try:
-        # 使用所需的會話服務建立代理執行器 (Runner)
-        session_service = InMemorySessionService()
-        runner = Runner(
-            app_name="pubsub_processor",
-            agent=root_agent,
-            session_service=session_service
-        )
-
-        # 為此文件處理建立一個工作階段 (Session)
-        session = await session_service.create_session(
-            app_name="pubsub_processor",
-            user_id="pubsub_subscriber"
-        )
-
         # 準備給代理的提示訊息
         prompt_text = f"""分析此文件並將其路由到適當的分析器：
 
@@ -67,100 +84,111 @@ async def process_document_with_agent(document_id: str, content: str):
             parts=[types.Part(text=prompt_text)]
         )
 
-        # 執行代理並收集結果
-        final_result = None
-        # run_async 回傳一個非同步產生器，我們會迭代它直到最後一個事件
-        async for event in runner.run_async(
-            user_id="pubsub_subscriber",
-            session_id=session.id,
-            new_message=prompt
-        ):
-            # 事件是串流的，捕捉最後一個
-            final_result = event
-
-        return final_result
+        # 在共用的 Runner 上以獨立的工作階段執行代理，並收集所有事件
+        # (分析器的結構化輸出位於函式回應事件中)
+        return await get_agent_worker().run(prompt)
 
     except Exception as e:
         print(f"❌ 代理處理錯誤: {e}")
         raise
 
-def process_message(message):
+def response_text(event) -> str:
+    """從事件內容中提取文字。"""
+    text = ""
+    if event is not None and event.content and event.content.parts:
+        for part in event.content.parts:
+            if part.text:
+                text += part.text
+    return text.strip()
+
+
+async def analyze_document(document: Document):
     """
-    處理 Pub/Sub 訊息，並進行非同步代理處理。
+    處理單一文件並驗證分析器的結構化輸出。
 
     Args:
-        message: Pub/Sub 訊息物件
+        document: 從 Pub/Sub 訊息解碼的文件
+
+    Raises:
+        SchemaError: 分析結果不符合結構描述 (訊息會送到死信主題)
     """
+    print(f"\n📨 正在處理: {document.document_id} (第 {document.delivery_attempt} 次傳遞)")
     try:
-        # 解碼訊息資料
-        data = json.loads(message.data.decode("utf-8"))
-        document_id = data.get("document_id")
-        content = data.get("content")
-
-        print(f"\n📨 正在處理: {document_id}")
-
-        # 執行非同步代理處理
-        result = asyncio.run(process_document_with_agent(document_id, content))
-
-        if result:
-            # 從事件內容中提取文字
-            response_text = ""
-            if hasattr(result, 'content') and result.content and result.content.parts:
-                for part in result.content.parts:
-                    if part.text:
-                        response_text += part.text
-
-            if response_text:
-                # 清理回應文字以進行顯示 (取前 200 個字元)
-                display_text = response_text.strip()[:200]
-                print(f"✅ 成功: {document_id}")
-                print(f"   └─ {display_text}...")
-            else:
-                print(f"✅ 完成 {document_id} (無文字回應)")
-        else:
-            print(f"✅ 完成 {document_id}")
-
-        # 確認訊息 (從佇列中移除)
-        message.ack()
+        events = await process_document_with_agent(document.document_id, document.content)
+    except ValidationError as e:
+        # AgentTool 以 output_schema 驗證子代理輸出失敗
+        raise SchemaError(str(e)) from e
+    analysis = extract_analysis(events, ANALYZER_SCHEMAS)
+
+    display_text = response_text(events[-1] if events else None)[:200]
+    print(f"✅ 成功: {document.document_id} ({type(analysis).__name__})")
+    if display_text:
+        print(f"   └─ {display_text}...")
+    return analysis
+
+
+def main():
+    # 初始化 Pub/Sub 訂閱者與發布者 (死信主題) 客戶端
+    subscriber = pubsub_v1.SubscriberClient()
+    publisher = pubsub_v1.PublisherClient()
+    # 建立完整的訂閱路徑: projects/{project_id}/subscriptions/{subscription_id}
+    subscription_path = subscriber.subscription_path(project_id, subscription_id)
+    dead_letter_path = publisher.topic_path(project_id, dead_letter_topic_id)
+
+    settings = FlowControlSettings.from_env()
+    worker = get_agent_worker()
+    runtime = SubscriberRuntime(
+        subscriber,
+        subscription_path,
+        analyze_document,
+        settings=settings,
+        dead_letter=pubsub_dead_letter(publisher, dead_letter_path),
+    )
 
-    except Exception as e:
-        print(f"❌ 錯誤: {document_id} - {str(e)[:100]}")
-        # 否定確認訊息 (讓 Pub/Sub 稍後重試)
-        message.nack()
-
-# 訂閱並開始處理
-print("\n" + "="*70)
-print("🚀 文件處理協調者")
-print("="*70)
-print(f"訂閱: {subscription_id}")
-print(f"專案: {project_id or '(未設定 - 本地模式)'}")
-print(f"代理: root_agent (多重分析協調者)")
-print("="*70)
-print("等待訊息中...\n")
-
-# 開啟串流拉取 (Streaming Pull)
-streaming_pull_future = subscriber.subscribe(
-    subscription_path,
-    callback=process_message
-)
+    print("\n" + "="*70)
+    print("🚀 文件處理協調者")
+    print("="*70)
+    print(f"訂閱: {subscription_id}")
+    print(f"專案: {project_id or '(未設定 - 本地模式)'}")
+    print(f"代理: root_agent (多重分析協調者)")
+    print(f"並行: 最多 {settings.max_in_flight} 個代理呼叫，{settings.max_messages} 則未完成訊息")
+    print(f"死信主題: {dead_letter_topic_id}")
+    print("="*70)
+    print("等待訊息中...\n")
+
+    async def serve():
+        try:
+            await runtime.run()
+        finally:
+            await worker.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        # 處理 Ctrl+C 中斷
+        pass
+    finally:
+        subscriber.close()
 
-try:
-    # 保持主執行緒運行，直到收到取消訊號或發生錯誤
-    streaming_pull_future.result()
-except KeyboardInterrupt:
-    # 處理 Ctrl+C 中斷
-    streaming_pull_future.cancel()
     print("\n" + "="*70)
     print("✋ 處理器已停止")
+    print(json.dumps(
+        {**runtime.metrics.snapshot(), **worker.stats()}, ensure_ascii=False, indent=2
+    ))
     print("="*70)
 
+
+if __name__ == "__main__":
+    main()
+
 ### 重點摘要
 # - **核心概念**：Pub/Sub 訂閱者 (Subscriber) 實作，整合 ADK 代理進行文件處理。
-# - **關鍵技術**：Pub/Sub Streaming Pull, Python Asyncio, Google ADK Runner, InMemorySessionService。
+# - **關鍵技術**：Pub/Sub Pull, Python Asyncio, Google ADK Runner, `pubsub_agent.runtime.SubscriberRuntime`。
 # - **重要結論**：
-#   - 使用 `subscriber.subscribe(callback=process_message)` 建立持續的訊息監聽。
-#   - `process_message` 回呼函式在獨立的執行緒中執行，因此需要使用 `asyncio.run()` 來呼叫非同步的代理邏輯。
-#   - 訊息必須被明確地 `ack()` (確認成功) 或 `nack()` (處理失敗，要求重試)。
+#   - 所有訊息在同一個事件迴圈中處理，共用一個 Runner 與會話服務 (`AgentWorker`)；每份文件的工作階段處理後即刪除。
+#   - `PUBSUB_MAX_IN_FLIGHT` 限制同時進行的代理呼叫數，`PUBSUB_MAX_MESSAGES` / `PUBSUB_MAX_BYTES` 限制未完成的訊息。
+#   - 確認 (ack) 與否定確認 (nack) 會批次送出；處理中的訊息租約會自動延長。
+#   - 訊息內容或分析結果不符合結構描述時送到死信主題 `document-dlq`，其他錯誤 nack 後由 Pub/Sub 重試。
 # - **行動項目**：
-#   - 確保訂閱 `document-processor` 已在 GCP 中建立。
-#   - 監控處理錯誤並根據需要調整重試策略。
+#   - 確保訂閱 `document-processor` 與主題 `document-dlq` 已在 GCP 中建立。
+#   - 依 LLM 配額調整流量控制環境變數，並監控結束時輸出的指標。
@@ -0,0 +1,493 @@
+# 教學範例 34：文件處理代理 - 訂閱者執行環境測試
+# 使用記憶體內 Pub/Sub 替身驗證流量控制與確認流程
+#
+# 重點說明：
+# 此測試模組不需要 GCP 專案或 LLM 呼叫。
+# 主要測試範圍包括：
+# 1. InMemoryPubSub 的租約、確認與重新傳遞行為。
+# 2. SubscriberRuntime 的有限並行、批次確認與租約延長。
+# 3. 結構描述錯誤與超過傳遞次數的訊息送到死信主題。
+# 4. 分析器結構化輸出的驗證。
+# 5. Pub/Sub 請求的暫時性錯誤會退避重試，以及未設定死信政策時的傳遞次數記錄。
+# 6. AgentWorker 共用 Runner，並在每份文件處理後刪除工作階段。
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from pubsub_agent.local_pubsub import InMemoryPubSub
+from pubsub_agent.runtime import (
+    AgentWorker,
+    FlowControlSettings,
+    SchemaError,
+    SubscriberRuntime,
+    extract_analysis,
+    pubsub_dead_letter,
+)
+
+TOPIC = "document-uploads"
+SUBSCRIPTION = "document-processor"
+DLQ_TOPIC = "document-dlq"
+DLQ_SUBSCRIPTION = "document-dlq-sub"
+
+
+def make_pubsub(ack_deadline: float = 10.0) -> InMemoryPubSub:
+    pubsub = InMemoryPubSub(ack_deadline=ack_deadline)
+    pubsub.create_subscription(SUBSCRIPTION, TOPIC)
+    pubsub.create_subscription(DLQ_SUBSCRIPTION, DLQ_TOPIC)
+    return pubsub
+
+
+def publish_documents(pubsub: InMemoryPubSub, count: int) -> None:
+    for i in range(count):
+        data = json.dumps({"document_id": f"DOC-{i:03d}", "content": f"文件 {i}"})
+        pubsub.publish(TOPIC, data.encode("utf-8"))
+
+
+def fast_settings(**overrides) -> FlowControlSettings:
+    values = dict(ack_flush_interval=0.01, poll_interval=0.01, lease_extension=10.0)
+    values.update(overrides)
+    return FlowControlSettings(**values)
+
+
+class FlakyClient:
+    """包裝 InMemoryPubSub：指定方法的前幾次呼叫失敗，並可模擬未設定死信政策 (delivery_attempt=0)。"""
+
+    def __init__(self, pubsub: InMemoryPubSub, failures=None, zero_attempts=False):
+        self.pubsub = pubsub
+        self.failures = dict(failures or {})
+        self.zero_attempts = zero_attempts
+
+    def _maybe_fail(self, name):
+        if self.failures.get(name, 0) > 0:
+            self.failures[name] -= 1
+            raise ConnectionError(f"{name} 暫時失敗")
+
+    def pull(self, *args, **kwargs):
+        self._maybe_fail("pull")
+        response = self.pubsub.pull(*args, **kwargs)
+        if self.zero_attempts:
+            for received in response.received_messages:
+                received.delivery_attempt = 0
+        return response
+
+    def acknowledge(self, *args, **kwargs):
+        self._maybe_fail("acknowledge")
+        return self.pubsub.acknowledge(*args, **kwargs)
+
+    def modify_ack_deadline(self, *args, **kwargs):
+        self._maybe_fail("modify_ack_deadline")
+        return self.pubsub.modify_ack_deadline(*args, **kwargs)
+
+
+class TestInMemoryPubSub:
+    """測試記憶體內 Pub/Sub 替身。"""
+
+    def test_publish_pull_ack(self):
+        """測試發布、拉取與確認後訊息從訂閱移除。"""
+        pubsub = make_pubsub()
+        publish_documents(pubsub, 3)
+
+        response = pubsub.pull(request={"subscription": SUBSCRIPTION, "max_messages": 2})
+        assert len(response.received_messages) == 2
+        assert response.received_messages[0].delivery_attempt == 1
+
+        pubsub.acknowledge(request={
+            "subscription": SUBSCRIPTION,
+            "ack_ids": [m.ack_id for m in response.received_messages],
+        })
+        assert pubsub.backlog(SUBSCRIPTION) == 1
+
+    def test_nack_redelivers(self):
+        """測試 ack_deadline_seconds=0 (nack) 後訊息重新傳遞並遞增傳遞次數。"""
+        pubsub = make_pubsub()
+        publish_documents(pubsub, 1)
+        first = pubsub.pull(subscription=SUBSCRIPTION, max_messages=1).received_messages[0]
+
+        pubsub.modify_ack_deadline(subscription=SUBSCRIPTION, ack_ids=[first.ack_id], ack_deadline_seconds=0)
+        second = pubsub.pull(subscription=SUBSCRIPTION, max_messages=1).received_messages[0]
+
+        assert second.message.message_id == first.message.message_id
+        assert second.delivery_attempt == 2
+
+    def test_expired_lease_redelivers(self):
+        """測試租約到期的訊息會被重新傳遞。"""
+        now = [0.0]
+        pubsub = InMemoryPubSub(ack_deadline=5, clock=lambda: now[0])
+        pubsub.create_subscription(SUBSCRIPTION, TOPIC)
+        publish_documents(pubsub, 1)
+        pubsub.pull(subscription=SUBSCRIPTION, max_messages=1)
+
+        now[0] = 6.0
+        redelivered = pubsub.pull(subscription=SUBSCRIPTION, max_messages=1).received_messages
+
+        assert len(redelivered) == 1
+        assert pubsub.stats(SUBSCRIPTION)["redelivered"] == 1
+
+
+class TestSubscriberRuntime:
+    """測試訂閱者執行環境。"""
+
+    def test_processes_all_messages_with_bounded_concurrency(self):
+        """測試所有訊息都被處理並確認，且同時進行的處理數不超過上限。
+
+        重點說明：
+        1. 發布 40 則訊息
+        2. 以 max_in_flight=4 執行，每則處理 20 毫秒
+        3. 驗證全部確認、並行峰值與批次確認請求數
+        """
+        pubsub = make_pubsub()
+        publish_documents(pubsub, 40)
+        active = {"now": 0, "peak": 0}
+
+        async def process(document):
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+            await asyncio.sleep(0.02)
+            active["now"] -= 1
+
+        runtime = SubscriberRuntime(
+            pubsub, SUBSCRIPTION, process,
+            settings=fast_settings(max_in_flight=4, ack_batch_size=10),
+        )
+        metrics = asyncio.run(runtime.run(until_idle=True))
+
+        assert metrics.acked == 40
+        assert pubsub.backlog(SUBSCRIPTION) == 0
+        assert active["peak"] == 4
+        assert metrics.peak_in_flight == 4
+        assert metrics.ack_requests < 40
+
+    def test_flow_control_limits_outstanding(self):
+        """測試未完成的訊息數不超過 max_messages。"""
+        pubsub = make_pubsub()
+        publish_documents(pubsub, 30)
+
+        async def process(document):
+            await asyncio.sleep(0.005)
+
+        runtime = SubscriberRuntime(
+            pubsub, SUBSCRIPTION, process,
+            settings=fast_settings(max_messages=5, max_in_flight=5, pull_batch=50),
+        )
+        metrics = asyncio.run(runtime.run(until_idle=True))
+
+        assert metrics.acked == 30
+        assert metrics.peak_outstanding <= 5
+
+    def test_failure_is_nacked_and_retried(self):
+        """測試處理失敗的訊息被 nack 並在重新傳遞後成功。"""
+        pubsub = make_pubsub()
+        publish_documents(pubsub, 1)
+        attempts = []
+
+        async def process(document):
+            attempts.append(document.delivery_attempt)
+            if len(attempts) == 1:
+                raise RuntimeError("暫時性錯誤")
+
+        runtime = SubscriberRuntime(pubsub, SUBSCRIPTION, process, settings=fast_settings())
+        metrics = asyncio.run(runtime.run(until_idle=True))
+
+        assert attempts == [1, 2]
+        assert metrics.nacked == 1
+        assert metrics.acked == 1
+        assert pubsub.backlog(SUBSCRIPTION) == 0
+
+    def test_schema_errors_go_to_dead_letter(self):
+        """測試無效訊息與分析結果不符合結構描述時送到死信主題而不重試。"""
+        pubsub = make_pubsub()
+        pubsub.publish(TOPIC, b"not json")
+        pubsub.publish(TOPIC, json.dumps({"document_id": "DOC-BAD", "content": "x"}).encode())
+        calls = []
+
+        async def process(document):
+            calls.append(document.document_id)
+            raise SchemaError("缺少 summary")
+
+        runtime = SubscriberRuntime(
+            pubsub, SUBSCRIPTION, process,
+            settings=fast_settings(),
+            dead_letter=pubsub_dead_letter(pubsub, DLQ_TOPIC),
+        )
+        metrics = asyncio.run(runtime.run(until_idle=True))
+        dead = pubsub.messages(DLQ_SUBSCRIPTION)
+
+        assert calls == ["DOC-BAD"]
+        assert metrics.dead_lettered == 2
+        assert metrics.nacked == 0
+        assert pubsub.backlog(SUBSCRIPTION) == 0
+        assert {m.data for m in dead} == {b"not json", b'{"document_id": "DOC-BAD", "content": "x"}'}
+        assert all("dead_letter_reason" in m.attributes for m in dead)
+
+    def test_max_delivery_attempts_dead_letters(self):
+        """測試持續失敗的訊息在超過最大傳遞次數後送到死信主題。"""
+        pubsub = make_pubsub()
+        publish_documents(pubsub, 1)
+
+        async def process(document):
+            raise RuntimeError("持續失敗")
+
+        runtime = SubscriberRuntime(
+            pubsub, SUBSCRIPTION, process,
+            settings=fast_settings(max_delivery_attempts=3),
+            dead_letter=pubsub_dead_letter(pubsub, DLQ_TOPIC),
+        )
+        metrics = asyncio.run(runtime.run(until_idle=True))
+
+        assert metrics.nacked == 3
+        assert metrics.dead_lettered == 1
+        assert pubsub.messages(DLQ_SUBSCRIPTION)[0].attributes["delivery_attempt"] == "4"
+
+    def test_lease_extension_prevents_redelivery(self):
+        """測試處理時間超過訂閱確認期限時，租約延長避免訊息被重新傳遞。"""
+        pubsub = make_pubsub(ack_deadline=0.1)
+        publish_documents(pubsub, 2)
+
+        async def process(document):
+            await asyncio.sleep(0.35)
+
+        runtime = SubscriberRuntime(
+            pubsub, SUBSCRIPTION, process,
+            settings=fast_settings(lease_extension=0.1),
+        )
+        metrics = asyncio.run(runtime.run(until_idle=True))
+
+        assert metrics.acked == 2
+        assert metrics.lease_extensions >= 2
+        assert pubsub.stats(SUBSCRIPTION)["redelivered"] == 0
+
+    def test_metrics_snapshot(self):
+        """測試指標快照包含吞吐量與延遲百分位數。"""
+        pubsub = make_pubsub()
+        publish_documents(pubsub, 5)
+
+        async def process(document):
+            await asyncio.sleep(0.01)
+
+        runtime = SubscriberRuntime(pubsub, SUBSCRIPTION, process, settings=fast_settings())
+        snapshot = asyncio.run(runtime.run(until_idle=True)).snapshot()
+
+        assert snapshot["acked"] == 5
+        assert snapshot["throughput_per_second"] > 0
+        assert snapshot["processing_p50_seconds"] >= 0.01
+        assert snapshot["end_to_end_p95_seconds"] is not None
+
+    def test_settings_from_env(self, monkeypatch):
+        """測試從環境變數讀取流量控制設定。"""
+        monkeypatch.setenv("PUBSUB_MAX_IN_FLIGHT", "3")
+        monkeypatch.setenv("PUBSUB_ACK_FLUSH_INTERVAL", "0.5")
+
+        settings = FlowControlSettings.from_env()
+
+        assert settings.max_in_flight == 3
+        assert settings.ack_flush_interval == 0.5
+        assert settings.max_messages == FlowControlSettings().max_messages
+
+
+class TestRuntimeResilience:
+    """測試 Pub/Sub 請求失敗與傳遞次數記錄。"""
+
+    def test_request_errors_are_retried(self):
+        """測試 pull、acknowledge 與 modify_ack_deadline 的暫時性錯誤不會中止執行環境。
+
+        重點說明：
+        1. pull 前兩次、acknowledge 與 modify_ack_deadline 第一次失敗
+        2. 驗證所有訊息仍被處理並確認，沒有遺失的 ack
+        3. 驗證失敗的請求計入 request_errors
+        """
+        pubsub = make_pubsub()
+        publish_documents(pubsub, 10)
+        client = FlakyClient(
+            pubsub, {"pull": 2, "acknowledge": 1, "modify_ack_deadline": 1}
+        )
+        processed = []
+
+        async def process(document):
+            processed.append(document.document_id)
+
+        runtime = SubscriberRuntime(
+            client, SUBSCRIPTION, process,
+            settings=fast_settings(error_backoff=0.01, max_error_backoff=0.05),
+        )
+        metrics = asyncio.run(runtime.run(until_idle=True))
+
+        assert len(processed) == 10
+        assert metrics.acked == 10
+        assert metrics.request_errors == 4
+        assert pubsub.backlog(SUBSCRIPTION) == 0
+        assert metrics.snapshot()["request_errors"] == 4
+
+    def test_lease_errors_do_not_stop_the_leaser(self):
+        """測試租約延長失敗後，租約延長器在下一個週期繼續延長租約。"""
+        pubsub = make_pubsub(ack_deadline=0.1)
+        publish_documents(pubsub, 1)
+        client = FlakyClient(pubsub, {"modify_ack_deadline": 2})
+
+        async def process(document):
+            await asyncio.sleep(0.35)
+
+        runtime = SubscriberRuntime(
+            client, SUBSCRIPTION, process,
+            settings=fast_settings(lease_extension=0.1),
+        )
+        metrics = asyncio.run(runtime.run(until_idle=True))
+
+        assert metrics.acked == 1
+        assert metrics.request_errors == 2
+        assert metrics.lease_extensions > 0
+
+    def test_delivery_attempts_tracked_without_dead_letter_policy(self):
+        """測試訂閱未設定死信政策 (delivery_attempt 為 0) 時，以本行程的記錄套用最大傳遞次數。"""
+        pubsub = make_pubsub()
+        publish_documents(pubsub, 1)
+        attempts = []
+
+        async def process(document):
+            attempts.append(document.delivery_attempt)
+            raise RuntimeError("持續失敗")
+
+        runtime = SubscriberRuntime(
+            FlakyClient(pubsub, zero_attempts=True), SUBSCRIPTION, process,
+            settings=fast_settings(max_delivery_attempts=3),
+            dead_letter=pubsub_dead_letter(pubsub, DLQ_TOPIC),
+        )
+        metrics = asyncio.run(runtime.run(until_idle=True))
+
+        assert attempts == [1, 2, 3]
+        assert metrics.dead_lettered == 1
+        assert pubsub.messages(DLQ_SUBSCRIPTION)[0].attributes["delivery_attempt"] == "4"
+
+
+class TestExtractAnalysis:
+    """測試分析器結構化輸出的驗證。"""
+
+    @staticmethod
+    def event(name, response):
+        function_response = SimpleNamespace(name=name, response=response)
+        return SimpleNamespace(get_function_responses=lambda: [function_response])
+
+    def test_valid_output(self):
+        """測試有效的分析器輸出被解析為對應的結構描述。"""
+        from pubsub_agent.agent import ANALYZER_SCHEMAS, TechnicalAnalysisOutput
+
+        output = {
+            "summary": {"main_points": ["API"], "key_insight": "部署", "summary": "技術文件"},
+            "entities": {"dates": [], "currency_amounts": [], "percentages": [], "numbers": []},
+            "technologies": ["Python"],
+            "components": ["API"],
+            "recommendations": [],
+        }
+        analysis = extract_analysis([self.event("technical_analyzer", output)], ANALYZER_SCHEMAS)
+
+        assert isinstance(analysis, TechnicalAnalysisOutput)
+
+    def test_invalid_or_missing_output(self):
+        """測試輸出不符合結構描述或沒有呼叫分析器時引發 SchemaError。"""
+        from pubsub_agent.agent import ANALYZER_SCHEMAS
+
+        with pytest.raises(SchemaError):
+            extract_analysis([self.event("sales_analyzer", {"summary": "x"})], ANALYZER_SCHEMAS)
+        with pytest.raises(SchemaError):
+            extract_analysis([SimpleNamespace(get_function_responses=lambda: [])], ANALYZER_SCHEMAS)
+
+
+class FakeRunner:
+    """以記憶體內會話服務記錄工作階段的 Runner 替身 (不呼叫 LLM)。"""
+
+    def __init__(self, fail_on=None, delay=0.0):
+        from google.adk.sessions import InMemorySessionService
+
+        self.app_name = "pubsub_processor"
+        self.session_service = InMemorySessionService()
+        self.session_ids = []
+        self.fail_on = fail_on
+        self.delay = delay
+        self.closed = False
+
+    async def run_async(self, user_id, session_id, new_message):
+        session = await self.session_service.get_session(
+            app_name=self.app_name, user_id=user_id, session_id=session_id
+        )
+        assert session is not None
+        self.session_ids.append(session_id)
+        await asyncio.sleep(self.delay)
+        if new_message == self.fail_on:
+            raise RuntimeError("代理失敗")
+        yield SimpleNamespace(session_id=session_id, message=new_message)
+
+    async def close(self):
+        self.closed = True
+
+    def stored_sessions(self):
+        return self.session_service.sessions.get(self.app_name, {}).get("pubsub_subscriber", {})
+
+
+class TestAgentWorker:
+    """測試常駐代理執行器。"""
+
+    def test_sessions_are_deleted_after_each_document(self):
+        """測試每份文件使用新的工作階段，處理後刪除。"""
+        runner = FakeRunner()
+        worker = AgentWorker(runner)
+
+        async def run_all():
+            return [await worker.run(f"文件 {i}") for i in range(20)]
+
+        results = asyncio.run(run_all())
+
+        assert [events[0].message for events in results] == [f"文件 {i}" for i in range(20)]
+        assert len(set(runner.session_ids)) == 20
+        assert runner.stored_sessions() == {}
+        assert worker.stats() == {
+            "sessions_created": 20,
+            "sessions_deleted": 20,
+            "active_sessions": 0,
+            "peak_active_sessions": 1,
+        }
+
+    def test_session_is_deleted_when_agent_fails(self):
+        """測試代理失敗時例外照常傳遞，工作階段仍被刪除。"""
+        runner = FakeRunner(fail_on="壞文件")
+        worker = AgentWorker(runner)
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(worker.run("壞文件"))
+
+        assert runner.stored_sessions() == {}
+        assert worker.active_sessions == 0
+
+    def test_runtime_shares_one_runner(self):
+        """測試訂閱者執行環境並行處理時共用同一個 Runner，結束後沒有殘留的工作階段。
+
+        重點說明：
+        1. 以 max_in_flight=5 處理 30 則訊息
+        2. 驗證同時存在的工作階段數不超過並行上限
+        3. 驗證關閉時只關閉一次 Runner
+        """
+        pubsub = make_pubsub()
+        publish_documents(pubsub, 30)
+        runner = FakeRunner(delay=0.01)
+        worker = AgentWorker(runner)
+
+        async def process(document):
+            await worker.run(document.content)
+
+        async def serve():
+            runtime = SubscriberRuntime(
+                pubsub, SUBSCRIPTION, process, settings=fast_settings(max_in_flight=5)
+            )
+            try:
+                return await runtime.run(until_idle=True)
+            finally:
+                await worker.close()
+
+        metrics = asyncio.run(serve())
+
+        assert metrics.acked == 30
+        assert worker.sessions_created == 30
+        assert worker.peak_active_sessions == 5
+        assert runner.stored_sessions() == {}
+        assert runner.closed is True
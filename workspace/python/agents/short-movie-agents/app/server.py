@@ -22,6 +22,7 @@ from opentelemetry.sdk.trace import TracerProvider, export
 from app.utils.gcs import create_bucket_if_not_exists
 from app.utils.tracing import CloudTraceLoggingSpanExporter
 from app.utils.typing import Feedback
+from app.utils.video_orchestrator import get_scene_progress
 
 # 獲取預設的 Google Cloud 憑證與專案 ID
 _, project_id = google.auth.default()
@@ -79,6 +80,21 @@ def collect_feedback(feedback: Feedback) -> dict[str, str]:
     return {"status": "success"}
 
 
+@app.get("/video-progress/{session_id}")
+def video_progress(session_id: str) -> dict[str, dict]:
+    """回傳工作階段中每個場景的影片生成狀態。
+
+    影片工具結束前，工作階段狀態的變更不會送出；前端可輪詢此端點顯示即時進度。
+
+    Args:
+        session_id: 工作階段 ID
+
+    Returns:
+        以場景編號為鍵的狀態表
+    """
+    return get_scene_progress(session_id)
+
+
 # 主執行入口
 if __name__ == "__main__":
     import uvicorn
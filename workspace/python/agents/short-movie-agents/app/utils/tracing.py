@@ -12,14 +12,63 @@
 
 import json
 import logging
-from collections.abc import Sequence
+import queue
+import threading
+import time
+from collections import Counter
+from collections.abc import Mapping, Sequence
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Any
 
 from google.cloud import logging as google_cloud_logging
 from google.cloud import storage
+from opentelemetry import trace as trace_api
 from opentelemetry.exporter.cloud_trace import CloudTraceSpanExporter
+from opentelemetry.sdk.resources import Resource
 from opentelemetry.sdk.trace import ReadableSpan
 from opentelemetry.sdk.trace.export import SpanExportResult
+from opentelemetry.sdk.util import ns_to_iso_str
+
+# Cloud Logging 單一條目上限為 256 KB；屬性估計超過此大小時改存至 GCS
+MAX_LOG_ATTRIBUTES_BYTES = 255 * 1024
+# 屬性移至 GCS 後，日誌條目中仍保留的單一屬性與保留屬性總計的上限
+MAX_INLINE_ATTRIBUTE_BYTES = 1024
+MAX_INLINE_ATTRIBUTES_TOTAL_BYTES = 16 * 1024
+
+LOG_LABELS = {
+    "type": "agent_telemetry",
+    "service_name": "test-agent",
+}
+
+BUCKET_NOT_FOUND = "找不到 GCS 儲存桶"
+UPLOAD_QUEUE_FULL = "負載上傳佇列已滿，未存儲於 GCS"
+
+
+def estimate_json_size(value: Any) -> int:
+    """
+    估計值序列化為 JSON（UTF-8）後的位元組數，不實際序列化。
+
+    字串以其 UTF-8 長度加上引號與需跳脫的字元計算；估計值用於判斷
+    是否接近日誌條目上限，不需要與 json.dumps 的結果完全一致。
+
+    :param value: 追蹤點屬性值（字串、數字、布林值或其序列）
+    :return: 估計的位元組數
+    """
+    if isinstance(value, str):
+        size = len(value) if value.isascii() else len(value.encode("utf-8"))
+        return size + 2 + value.count('"') + value.count("\\")
+    if value is None or isinstance(value, bool):
+        return 5
+    if isinstance(value, int | float):
+        return len(repr(value))
+    if isinstance(value, Mapping):
+        return 2 + sum(
+            estimate_json_size(str(k)) + 1 + estimate_json_size(v) + 1
+            for k, v in value.items()
+        )
+    if isinstance(value, Sequence):
+        return 2 + sum(estimate_json_size(item) + 1 for item in value)
+    return estimate_json_size(str(value))
 
 
 class CloudTraceLoggingSpanExporter(CloudTraceSpanExporter):
@@ -29,6 +78,12 @@ class CloudTraceLoggingSpanExporter(CloudTraceSpanExporter):
 
     此類別有助於繞過 Cloud Trace 對屬性值 256 字元的限制，
     利用 Cloud Logging（限制為 256KB）和 Cloud Storage 來處理更大的數據負載。
+
+    export() 只建立日誌條目並放入有上限的佇列：
+    - 日誌條目由背景執行緒以 logger.batch() 批次寫入
+    - 大型屬性由背景工作執行緒池上傳至 GCS（URI 可預先決定）
+    - 儲存桶是否存在的檢查結果會快取 bucket_check_ttl 秒
+    - 佇列已滿時丟棄條目並計入 stats()，不阻塞追蹤點處理器
     """
 
     def __init__(
@@ -37,6 +92,12 @@ class CloudTraceLoggingSpanExporter(CloudTraceSpanExporter):
         storage_client: storage.Client | None = None,
         bucket_name: str | None = None,
         debug: bool = False,
+        max_queue_size: int = 2048,
+        max_batch_size: int = 200,
+        flush_interval: float = 1.0,
+        upload_workers: int = 4,
+        max_pending_uploads: int = 64,
+        bucket_check_ttl: float = 300.0,
         **kwargs: Any,
     ) -> None:
         """
@@ -46,6 +107,12 @@ class CloudTraceLoggingSpanExporter(CloudTraceSpanExporter):
         :param storage_client: Google Cloud Storage 客戶端
         :param bucket_name: 用於存儲大型負載的 GCS 儲存桶名稱
         :param debug: 啟用偵錯模式以獲取額外日誌
+        :param max_queue_size: 等待寫入的日誌條目上限，超過時丟棄
+        :param max_batch_size: 每次批次寫入的日誌條目上限
+        :param flush_interval: 背景寫入執行緒等待新條目的間隔（秒）
+        :param upload_workers: 上傳大型負載的工作執行緒數
+        :param max_pending_uploads: 等待中或進行中的上傳上限，超過時不存儲負載
+        :param bucket_check_ttl: 快取儲存桶檢查結果的秒數
         :param kwargs: 傳遞給父類別的其他參數
         """
         super().__init__(**kwargs)
@@ -62,39 +129,42 @@ class CloudTraceLoggingSpanExporter(CloudTraceSpanExporter):
         )
         self.bucket = self.storage_client.bucket(self.bucket_name)
 
+        self._queue: queue.Queue[dict[str, Any]] = queue.Queue(max_queue_size)
+        self._max_batch_size = max(1, max_batch_size)
+        self._flush_interval = flush_interval
+        self._writer: threading.Thread | None = None
+        self._uploads = ThreadPoolExecutor(
+            max_workers=max(1, upload_workers),
+            thread_name_prefix="span-payload-upload",
+        )
+        self._max_pending_uploads = max_pending_uploads
+        self._pending_uploads = 0
+        self._bucket_check_ttl = bucket_check_ttl
+        self._bucket_checked_at: float | None = None
+        self._bucket_exists = False
+        self._resource: tuple[Resource, dict[str, Any]] | None = None
+        self._counts: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
     def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
         """
         將追蹤點匯出至 Google Cloud Logging 和 Cloud Trace。
 
+        日誌條目放入佇列後由背景執行緒寫入；Cloud Trace 仍由父類別同步批次寫入。
+
         :param spans: 要匯出的追蹤點序列
         :return: 匯出操作的結果
         """
-        for span in spans:
-            span_context = span.get_span_context()
-            trace_id = format(span_context.trace_id, "x")
-            span_id = format(span_context.span_id, "x")
-            span_dict = json.loads(span.to_json())
-
-            span_dict["trace"] = f"projects/{self.project_id}/traces/{trace_id}"
-            span_dict["span_id"] = span_id
-
-            # 處理可能過大的屬性
-            span_dict = self._process_large_attributes(
-                span_dict=span_dict, span_id=span_id
-            )
+        if self._stopped.is_set():
+            return SpanExportResult.FAILURE
 
+        self._ensure_writer()
+        for span in spans:
+            entry = self._span_to_entry(span)
             if self.debug:
-                print(span_dict)
-
-            # 將追蹤點數據記錄到 Google Cloud Logging
-            self.logger.log_struct(
-                span_dict,
-                labels={
-                    "type": "agent_telemetry",
-                    "service_name": "test-agent",
-                },
-                severity="INFO",
-            )
+                print(entry)
+            self._enqueue(entry)
         # 使用父類別方法將追蹤點匯出至 Google Cloud Trace
         return super().export(spans)
 
@@ -106,11 +176,8 @@ class CloudTraceLoggingSpanExporter(CloudTraceSpanExporter):
         :param span_id: 追蹤點的 ID
         :return: 存儲內容的 GCS URI
         """
-        if not self.storage_client.bucket(self.bucket_name).exists():
-            logging.warning(
-                f"找不到儲存桶 {self.bucket_name}。無法在 GCS 中存儲追蹤屬性。"
-            )
-            return "找不到 GCS 儲存桶"
+        if not self._bucket_available():
+            return BUCKET_NOT_FOUND
 
         blob_name = f"spans/{span_id}.json"
         blob = self.bucket.blob(blob_name)
@@ -119,32 +186,258 @@ class CloudTraceLoggingSpanExporter(CloudTraceSpanExporter):
         blob.upload_from_string(content, "application/json")
         return f"gs://{self.bucket_name}/{blob_name}"
 
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        """
+        等待佇列中的日誌條目與進行中的上傳完成。
+
+        :param timeout_millis: 等待上限（毫秒）
+        :return: 是否在時限內完成
+        """
+        deadline = time.monotonic() + timeout_millis / 1000
+        while time.monotonic() < deadline:
+            with self._lock:
+                pending_uploads = self._pending_uploads
+            if self._queue.unfinished_tasks == 0 and pending_uploads == 0:
+                return True
+            time.sleep(0.01)
+        return False
+
+    def shutdown(self) -> None:
+        """寫出剩餘的日誌條目、等待上傳完成並停止背景執行緒。"""
+        if self._stopped.is_set():
+            return
+        self.force_flush()
+        self._stopped.set()
+        if self._writer is not None:
+            self._writer.join(timeout=self._flush_interval + 5)
+        self._uploads.shutdown(wait=True)
+        super().shutdown()
+
+    def stats(self) -> dict[str, int]:
+        """
+        回傳匯出統計。
+
+        :return: 包含已匯出、已寫入、已丟棄、上傳等計數與目前佇列長度的字典
+        """
+        with self._lock:
+            counts = dict(self._counts)
+            pending_uploads = self._pending_uploads
+        return {
+            "spans": counts.get("spans", 0),
+            "logged": counts.get("logged", 0),
+            "log_failures": counts.get("log_failures", 0),
+            "dropped_entries": counts.get("dropped_entries", 0),
+            "offloaded": counts.get("offloaded", 0),
+            "uploaded": counts.get("uploaded", 0),
+            "upload_failures": counts.get("upload_failures", 0),
+            "dropped_uploads": counts.get("dropped_uploads", 0),
+            "queue_size": self._queue.qsize(),
+            "pending_uploads": pending_uploads,
+        }
+
+    def _span_to_entry(self, span: ReadableSpan) -> dict[str, Any]:
+        """
+        直接由追蹤點欄位建立日誌條目（格式與 span.to_json() 相同），
+        避免先序列化為 JSON 再解析。
+
+        :param span: 追蹤點
+        :return: 日誌條目
+        """
+        span_context = span.get_span_context()
+        trace_id = format(span_context.trace_id, "x")
+        span_id = format(span_context.span_id, "x")
+
+        status = {"status_code": str(span.status.status_code.name)}
+        if span.status.description:
+            status["description"] = span.status.description
+
+        entry = {
+            "name": span.name,
+            "context": (
+                ReadableSpan._format_context(span.context) if span.context else None
+            ),
+            "kind": str(span.kind),
+            "parent_id": (
+                f"0x{trace_api.format_span_id(span.parent.span_id)}"
+                if span.parent is not None
+                else None
+            ),
+            "start_time": ns_to_iso_str(span.start_time) if span.start_time else None,
+            "end_time": ns_to_iso_str(span.end_time) if span.end_time else None,
+            "status": status,
+            "attributes": dict(span.attributes or {}),
+            "events": ReadableSpan._format_events(span.events),
+            "links": ReadableSpan._format_links(span.links),
+            "resource": self._format_resource(span.resource),
+            "trace": f"projects/{self.project_id}/traces/{trace_id}",
+            "span_id": span_id,
+        }
+
+        # 處理可能過大的屬性
+        return self._process_large_attributes(span_dict=entry, span_id=span_id)
+
+    def _format_resource(self, resource: Resource) -> dict[str, Any]:
+        """同一個 TracerProvider 的追蹤點共用 Resource，只轉換一次。"""
+        cached = self._resource
+        if cached is None or cached[0] is not resource:
+            cached = (
+                resource,
+                {
+                    "attributes": dict(resource.attributes),
+                    "schema_url": resource.schema_url,
+                },
+            )
+            self._resource = cached
+        return cached[1]
+
     def _process_large_attributes(self, span_dict: dict, span_id: str) -> dict:
         """
         處理大型屬性值，如果超過 Google Cloud Logging 的大小限制，則將其存儲在 GCS 中。
 
+        以逐一估計每個屬性值的大小取代整體序列化；超過上限時，完整屬性交由
+        背景執行緒池上傳，日誌條目只保留小型屬性與負載的 URI。
+
         :param span_dict: 追蹤點數據字典
         :param span_id: 追蹤點 ID
         :return: 更新後的追蹤點字典
         """
         attributes = span_dict["attributes"]
-        # 如果屬性編碼後超過 250 KB
-        if len(json.dumps(attributes).encode()) > 255 * 1024:  # 250 KB
-            # 將大型負載與其他屬性分離
-            attributes_payload = dict(attributes.items())
-            attributes_retain = dict(attributes.items())
-
-            # 在 GCS 中存儲大型負載
-            gcs_uri = self.store_in_gcs(json.dumps(attributes_payload), span_id)
-            attributes_retain["uri_payload"] = gcs_uri
-            attributes_retain["url_payload"] = (
-                f"https://storage.mtls.cloud.google.com/"
-                f"{self.bucket_name}/spans/{span_id}.json"
-            )
+        sizes = {
+            key: estimate_json_size(key) + estimate_json_size(value) + 2
+            for key, value in attributes.items()
+        }
+        if sum(sizes.values()) + 2 <= MAX_LOG_ATTRIBUTES_BYTES:
+            return span_dict
 
-            span_dict["attributes"] = attributes_retain
-            logging.info(
-                "追蹤負載長度超過 250 KB，正在將屬性存儲於 GCS 以避免大型日誌條目錯誤"
-            )
+        # 保留小型屬性，將完整屬性存儲在 GCS
+        attributes_retain = {}
+        retained_bytes = 0
+        for key, size in sizes.items():
+            if (
+                size <= MAX_INLINE_ATTRIBUTE_BYTES
+                and retained_bytes + size <= MAX_INLINE_ATTRIBUTES_TOTAL_BYTES
+            ):
+                attributes_retain[key] = attributes[key]
+                retained_bytes += size
 
+        attributes_retain["uri_payload"] = self._submit_upload(attributes, span_id)
+        attributes_retain["url_payload"] = (
+            f"https://storage.mtls.cloud.google.com/"
+            f"{self.bucket_name}/spans/{span_id}.json"
+        )
+        span_dict["attributes"] = attributes_retain
+        logging.info(
+            "追蹤負載長度超過 250 KB，正在將屬性存儲於 GCS 以避免大型日誌條目錯誤"
+        )
         return span_dict
+
+    def _submit_upload(self, attributes: dict[str, Any], span_id: str) -> str:
+        """
+        將屬性交由背景執行緒池上傳；物件名稱固定，因此可先回傳 URI。
+
+        :return: 負載的 GCS URI，或無法存儲的原因
+        """
+        if not self._bucket_available():
+            return BUCKET_NOT_FOUND
+        with self._lock:
+            if self._pending_uploads >= self._max_pending_uploads:
+                self._counts["dropped_uploads"] += 1
+                return UPLOAD_QUEUE_FULL
+            self._pending_uploads += 1
+            self._counts["offloaded"] += 1
+
+        future = self._uploads.submit(self._upload, attributes, span_id)
+        future.add_done_callback(self._upload_done)
+        return f"gs://{self.bucket_name}/spans/{span_id}.json"
+
+    def _upload(self, attributes: dict[str, Any], span_id: str) -> str:
+        # 序列化在工作執行緒進行，不佔用匯出執行緒
+        return self.store_in_gcs(json.dumps(attributes), span_id)
+
+    def _upload_done(self, future: Future[str]) -> None:
+        error = future.exception()
+        with self._lock:
+            self._pending_uploads -= 1
+            self._counts["upload_failures" if error else "uploaded"] += 1
+        if error:
+            logging.warning(f"無法將追蹤屬性存儲於 GCS：{error}")
+
+    def _bucket_available(self) -> bool:
+        """檢查儲存桶是否存在；結果快取 bucket_check_ttl 秒。"""
+        now = time.monotonic()
+        checked_at = self._bucket_checked_at
+        if checked_at is not None and now - checked_at < self._bucket_check_ttl:
+            return self._bucket_exists
+
+        try:
+            exists = bool(self.bucket.exists())
+        except Exception as e:
+            logging.warning(f"無法檢查儲存桶 {self.bucket_name}：{e}")
+            exists = False
+        if not exists:
+            logging.warning(
+                f"找不到儲存桶 {self.bucket_name}。無法在 GCS 中存儲追蹤屬性。"
+            )
+        self._bucket_exists = exists
+        self._bucket_checked_at = now
+        return exists
+
+    def _enqueue(self, entry: dict[str, Any]) -> None:
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            with self._lock:
+                self._counts["dropped_entries"] += 1
+                dropped = self._counts["dropped_entries"]
+            # 避免在持續過載時每個追蹤點都記錄一次
+            if dropped == 1 or dropped % 1000 == 0:
+                logging.warning(f"追蹤日誌佇列已滿，已丟棄 {dropped} 個條目")
+            return
+        with self._lock:
+            self._counts["spans"] += 1
+
+    def _ensure_writer(self) -> None:
+        if self._writer is not None:
+            return
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write_loop,
+                    name="span-log-writer",
+                    daemon=True,
+                )
+                self._writer.start()
+
+    def _write_loop(self) -> None:
+        """取出目前佇列中的條目（最多 max_batch_size 個）並批次寫入。"""
+        while True:
+            try:
+                entries = [self._queue.get(timeout=self._flush_interval)]
+            except queue.Empty:
+                if self._stopped.is_set():
+                    return
+                continue
+            while len(entries) < self._max_batch_size:
+                try:
+                    entries.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(entries)
+            finally:
+                for _ in entries:
+                    self._queue.task_done()
+
+    def _write_batch(self, entries: list[dict[str, Any]]) -> None:
+        batch = self.logger.batch()
+        for entry in entries:
+            batch.log_struct(entry, labels=LOG_LABELS, severity="INFO")
+        try:
+            batch.commit()
+        except Exception as e:
+            with self._lock:
+                self._counts["log_failures"] += len(entries)
+            logging.warning(f"無法將 {len(entries)} 個追蹤點寫入 Cloud Logging：{e}")
+            return
+        with self._lock:
+            self._counts["logged"] += len(entries)
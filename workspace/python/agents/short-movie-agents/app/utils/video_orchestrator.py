@@ -0,0 +1,282 @@
+# 版權所有 2025 Google LLC
+#
+# 根據 Apache 許可證 2.0 版（「許可證」）授權；
+# 除非遵守許可證，否則您不得使用此檔案。
+# 您可以在以下網址獲得許可證副本：
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# 除非適用法律要求或書面同意，否則根據許可證分發的軟體
+# 是按「原樣」分發的，不附帶任何形式的明示或暗示的保證或條件。
+# 請參閱許可證以瞭解管理權限和限制的特定語言。
+
+"""場景影片的非同步生成協調器。
+
+原本的工具逐一呼叫 generate_videos 並以 time.sleep(15) 輪詢，會阻塞 ADK 的事件迴圈，
+且場景只能依序生成。此協調器：
+
+- 一開始就提交所有場景的操作（受 max_concurrency 限制，對應專案的並行配額）
+- 以自適應的退避間隔並行輪詢所有操作：依據已完成場景的耗時預估其他場景的完成時間
+- 提交或輪詢遇到 429 / 5xx 時退避重試
+- 依完成順序回傳結果，並在每次狀態變更時呼叫 on_update（用於更新場景狀態表）
+
+整部影片的耗時因此接近最慢的場景，而不是所有場景的總和。
+"""
+
+import asyncio
+import logging
+import random
+import statistics
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable
+from dataclasses import dataclass, field
+from typing import Any
+
+# 設定日誌記錄 (Logging)
+logger = logging.getLogger(__name__)
+
+# 視為暫時性錯誤、可重試的狀態碼
+RETRYABLE_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# 場景狀態
+PENDING = "pending"
+SUBMITTED = "submitted"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+@dataclass(frozen=True)
+class PollSettings:
+    """輪詢與重試參數（秒）。"""
+
+    # 提交後第一次輪詢前的等待；Veo 生成一段 8 秒影片通常需要一分鐘以上
+    initial_delay: float = 20.0
+    min_interval: float = 5.0
+    max_interval: float = 30.0
+    multiplier: float = 1.5
+    # 隨機抖動比例，避免所有操作在同一時間輪詢
+    jitter: float = 0.1
+    # 單一場景從提交到完成的上限
+    timeout: float = 900.0
+    # 提交或輪詢連續遇到暫時性錯誤的重試上限
+    max_retries: int = 5
+
+
+@dataclass
+class SceneJob:
+    """單一場景的生成工作與其狀態。"""
+
+    scene_number: int
+    prompt: str
+    output_gcs_uri: str
+    status: str = PENDING
+    operation: Any = None
+    polls: int = 0
+    retries: int = 0
+    submitted_at: float | None = None
+    finished_at: float | None = None
+    video_uris: list[str] = field(default_factory=list)
+    error: str | None = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def as_status(self) -> dict[str, Any]:
+        """轉換為可存入工作階段狀態的字典。"""
+        elapsed = None
+        if self.submitted_at is not None:
+            end = self.finished_at if self.finished_at is not None else time.monotonic()
+            elapsed = round(end - self.submitted_at, 1)
+        return {
+            "scene_number": self.scene_number,
+            "status": self.status,
+            "operation": getattr(self.operation, "name", None),
+            "polls": self.polls,
+            "retries": self.retries,
+            "elapsed_seconds": elapsed,
+            "video_uris": list(self.video_uris),
+            "error": self.error,
+        }
+
+
+def is_retryable(error: Exception) -> bool:
+    """是否為暫時性錯誤（配額不足、服務暫時無法使用等）。"""
+    code = getattr(error, "code", None)
+    return isinstance(code, int) and code in RETRYABLE_STATUS_CODES
+
+
+class VideoGenerationOrchestrator:
+    """以有上限的並行數提交並輪詢 Veo 影片生成操作。
+
+    Args:
+        client: google-genai 的 Client（使用 client.aio.models.generate_videos
+            與 client.aio.operations.get）；測試時可傳入相同介面的假客戶端。
+        model: 影片模型名稱。
+        config_factory: 依場景建立 GenerateVideosConfig。
+        max_concurrency: 同時進行中的操作上限（專案配額）。
+        settings: 輪詢與重試參數。
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        model: str,
+        config_factory: Callable[[SceneJob], Any],
+        max_concurrency: int = 4,
+        settings: PollSettings | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ) -> None:
+        self.client = client
+        self._model = model
+        self._config_factory = config_factory
+        self._settings = settings or PollSettings()
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._clock = clock
+        self._sleep = sleep
+        # 已完成場景的耗時，用於預估其他場景的完成時間
+        self._durations: list[float] = []
+
+    async def as_completed(
+        self,
+        jobs: Iterable[SceneJob],
+        on_update: Callable[[SceneJob], None] | None = None,
+    ) -> AsyncIterator[SceneJob]:
+        """並行執行所有工作，並依完成順序逐一產出。"""
+        def notify(job: SceneJob) -> None:
+            if on_update is None:
+                return
+            try:
+                on_update(job)
+            except Exception as e:
+                # 進度回報失敗不應中斷生成
+                logger.warning(f"場景 {job.scene_number} 狀態更新失敗：{e}")
+
+        tasks = [asyncio.create_task(self._run(job, notify)) for job in jobs]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def run(
+        self,
+        jobs: Iterable[SceneJob],
+        on_update: Callable[[SceneJob], None] | None = None,
+    ) -> list[SceneJob]:
+        """執行所有工作並依場景編號排序回傳。"""
+        results = [job async for job in self.as_completed(jobs, on_update)]
+        return sorted(results, key=lambda job: job.scene_number)
+
+    async def _run(self, job: SceneJob, notify: Callable[[SceneJob], None]) -> SceneJob:
+        async with self._semaphore:
+            try:
+                await self._submit(job)
+                notify(job)
+                await self._poll(job, notify)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.status = FAILED
+                job.error = str(e)
+                logger.error(f"場景 {job.scene_number} 影片生成失敗：{e}")
+            if job.finished_at is None:
+                job.finished_at = self._clock()
+            notify(job)
+            return job
+
+    async def _submit(self, job: SceneJob) -> None:
+        delay = self._settings.min_interval
+        while True:
+            try:
+                job.operation = await self.client.aio.models.generate_videos(
+                    model=self._model,
+                    prompt=job.prompt,
+                    config=self._config_factory(job),
+                )
+                break
+            except Exception as e:
+                if not is_retryable(e) or job.retries >= self._settings.max_retries:
+                    raise
+                job.retries += 1
+                logger.warning(f"場景 {job.scene_number} 提交遇到暫時性錯誤，{delay:.0f} 秒後重試：{e}")
+                await self._sleep(self._jittered(delay))
+                delay = min(delay * self._settings.multiplier, self._settings.max_interval)
+        job.status = SUBMITTED
+        job.submitted_at = self._clock()
+        logger.info(f"已提交場景 {job.scene_number} 的影片生成操作")
+
+    async def _poll(self, job: SceneJob, notify: Callable[[SceneJob], None]) -> None:
+        settings = self._settings
+        interval = settings.min_interval
+        delay = settings.initial_delay
+        assert job.submitted_at is not None
+
+        while not job.operation.done:
+            await self._sleep(self._jittered(self._adapt(delay, job.submitted_at)))
+            if self._clock() - job.submitted_at > settings.timeout:
+                raise TimeoutError(f"場景 {job.scene_number} 超過 {settings.timeout:.0f} 秒仍未完成")
+            try:
+                job.operation = await self.client.aio.operations.get(job.operation)
+            except Exception as e:
+                if not is_retryable(e) or job.retries >= settings.max_retries:
+                    raise
+                job.retries += 1
+                logger.warning(f"場景 {job.scene_number} 輪詢遇到暫時性錯誤：{e}")
+            job.polls += 1
+            notify(job)
+            delay = interval
+            interval = min(interval * settings.multiplier, settings.max_interval)
+
+        job.finished_at = self._clock()
+        self._durations.append(job.finished_at - job.submitted_at)
+        self._collect_result(job)
+
+    def _adapt(self, delay: float, submitted_at: float) -> float:
+        """若已有場景完成，且預估此場景會比下一次排定的輪詢更早完成，則提早輪詢。"""
+        if not self._durations:
+            return delay
+        remaining = statistics.median(self._durations) - (self._clock() - submitted_at)
+        if remaining <= 0:
+            # 已超過其他場景的典型耗時，可能隨時完成
+            return min(delay, self._settings.min_interval)
+        return max(self._settings.min_interval, min(delay, remaining))
+
+    def _jittered(self, delay: float) -> float:
+        spread = delay * self._settings.jitter
+        return max(0.0, delay + random.uniform(-spread, spread))
+
+    @staticmethod
+    def _collect_result(job: SceneJob) -> None:
+        operation = job.operation
+        videos = operation.result.generated_videos if operation.response else None
+        if not videos:
+            job.status = FAILED
+            job.error = str(getattr(operation, "error", None) or "未生成任何影片")
+            return
+        job.video_uris = [video.video.uri for video in videos]
+        job.status = SUCCEEDED
+
+
+# --- 場景進度 (Scene progress) ---
+# 工具結束前，工作階段狀態的變更不會送出；伺服器以此表提供生成中的即時進度。
+_MAX_TRACKED_SESSIONS = 256
+_scene_progress: "OrderedDict[str, dict[str, dict[str, Any]]]" = OrderedDict()
+
+
+def record_scene_progress(session_id: str, job: SceneJob) -> dict[str, dict[str, Any]]:
+    """更新並回傳工作階段的場景狀態表（以場景編號字串為鍵）。"""
+    table = _scene_progress.setdefault(session_id, {})
+    table[str(job.scene_number)] = job.as_status()
+    _scene_progress.move_to_end(session_id)
+    while len(_scene_progress) > _MAX_TRACKED_SESSIONS:
+        _scene_progress.popitem(last=False)
+    return table
+
+
+def get_scene_progress(session_id: str) -> dict[str, dict[str, Any]]:
+    """取得工作階段目前的場景狀態表。"""
+    return dict(_scene_progress.get(session_id, {}))
@@ -10,10 +10,13 @@
 # 是按「原樣」分發的，不附帶任何形式的明示或暗示的保證或條件。
 # 請參閱許可證以瞭解管理權限和限制的特定語言。
 
+import asyncio
 import logging
 import os
 import re
-import time
+import weakref
+from collections.abc import Callable
+from typing import Any
 
 from google import genai
 from google.adk.agents import Agent
@@ -21,6 +24,11 @@ from google.adk.tools import ToolContext
 from google.genai import types
 
 from .utils.utils import load_prompt_from_file
+from .utils.video_orchestrator import (
+    SceneJob,
+    VideoGenerationOrchestrator,
+    record_scene_progress,
+)
 
 # 設定日誌記錄 (Logging)
 logger = logging.getLogger(__name__)
@@ -32,6 +40,11 @@ VIDEO_MODEL = "veo-3.0-generate-preview"
 VIDEO_MODEL_LOCATION = "us-central1"
 DESCRIPTION = "負責根據劇本和分鏡圖建立影片的代理"
 ASPECT_RATIO = "16:9"
+AUTHORIZED_URI = "https://storage.mtls.cloud.google.com/"
+# 同時進行中的 Veo 操作上限（依專案配額調整）
+VIDEO_MAX_CONCURRENCY = int(os.getenv("VIDEO_MAX_CONCURRENCY", "4"))
+# 工作階段狀態中的場景狀態表鍵
+SCENE_STATUS_KEY = "video_scenes"
 
 # 初始化生成式 AI 客戶端
 client = genai.Client(
@@ -40,9 +53,82 @@ client = genai.Client(
     location=VIDEO_MODEL_LOCATION,
 )
 
+# 每個事件迴圈一個協調器，讓並行的工具呼叫共用同一個並行上限
+_orchestrators: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, VideoGenerationOrchestrator]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _video_config(job: SceneJob) -> types.GenerateVideosConfig:
+    """建立場景的影片生成設定。"""
+    return types.GenerateVideosConfig(
+        aspect_ratio=ASPECT_RATIO,
+        output_gcs_uri=job.output_gcs_uri,
+        number_of_videos=1,
+        duration_seconds=8,
+        person_generation="allow_adult",
+    )
+
+
+def get_orchestrator() -> VideoGenerationOrchestrator:
+    """取得目前事件迴圈的影片生成協調器。"""
+    loop = asyncio.get_running_loop()
+    orchestrator = _orchestrators.get(loop)
+    if orchestrator is None or orchestrator.client is not client:
+        orchestrator = VideoGenerationOrchestrator(
+            client=client,
+            model=VIDEO_MODEL,
+            config_factory=_video_config,
+            max_concurrency=VIDEO_MAX_CONCURRENCY,
+        )
+        _orchestrators[loop] = orchestrator
+    return orchestrator
+
+
+def _with_dialogue(prompt: str, screenplay: str) -> str:
+    """從劇本中提取對話內容，若有對話則添加到提示詞中作為音訊參考。"""
+    dialogue = "\n".join(
+        re.findall(r"^\w+\s*\(.+\)\s*$", screenplay, re.MULTILINE)
+    )
+    dialogue += "\n".join(
+        re.findall(r"^\s{2,}.+$", screenplay, re.MULTILINE)
+    )
+    if dialogue:
+        prompt += f"\n\n音訊 (Audio)：\n{dialogue}"
+    return prompt
+
+
+def _scene_job(
+    tool_context: ToolContext, scene_number: int, prompt: str, screenplay: str
+) -> SceneJob:
+    """建立場景的生成工作（輸出到以工作階段 ID 命名的 GCS 路徑）。"""
+    session_id = tool_context._invocation_context.session.id
+    bucket_name = os.getenv("GOOGLE_CLOUD_BUCKET_NAME")
+    return SceneJob(
+        scene_number=scene_number,
+        prompt=_with_dialogue(prompt, screenplay),
+        output_gcs_uri=f"gs://{bucket_name}/{session_id}/scene_{scene_number}",
+    )
+
+
+def _status_updater(tool_context: ToolContext) -> Callable[[SceneJob], None]:
+    """回傳在每次場景狀態變更時更新狀態表的回呼。"""
+    session_id = tool_context._invocation_context.session.id
+
+    def update(job: SceneJob) -> None:
+        table = record_scene_progress(session_id, job)
+        # 重新指定頂層鍵，工作階段狀態才會記錄此次變更
+        tool_context.state[SCENE_STATUS_KEY] = dict(table)
+
+    return update
+
+
+def _authorized(uris: list[str]) -> list[str]:
+    return [uri.replace("gs://", AUTHORIZED_URI) for uri in uris]
+
 
 # 影片生成工具 (Video generate tool)
-def video_generate(
+async def video_generate(
     prompt: str,
     scene_number: int,
     image_link: str,
@@ -50,7 +136,7 @@ def video_generate(
     tool_context: ToolContext,
 ) -> list[str]:
     """
-    根據傳遞的提示詞和分鏡影像生成影片。
+    根據傳遞的提示詞和分鏡影像生成單一場景的影片。
 
     參數：
         prompt (str): 描述應生成並由工具返回的影片的文字提示詞。
@@ -63,64 +149,67 @@ def video_generate(
         list[str]: 存儲在 GCS 儲存桶中的影片連結列表。
     """
     try:
-        # 獲取工作階段 ID 以定義 GCS 存儲路徑
-        session_id = tool_context._invocation_context.session.id
-        bucket_name = os.getenv("GOOGLE_CLOUD_BUCKET_NAME")
-        GCS_PATH = f"gs://{bucket_name}/{session_id}"
-        AUTHORIZED_URI = "https://storage.mtls.cloud.google.com/"
-
-        # 從劇本中提取對話內容
-        dialogue = "\n".join(
-            re.findall(r"^\w+\s*\(.+\)\s*$", screenplay, re.MULTILINE)
-        )
-        dialogue += "\n".join(
-            re.findall(r"^\s{2,}.+$", screenplay, re.MULTILINE)
-        )
-
-        # 若有對話，將其添加到提示詞中作為音訊參考
-        if dialogue:
-            prompt += f"\n\n音訊 (Audio)：\n{dialogue}"
-
-        # 執行實際的影片生成
+        job = _scene_job(tool_context, scene_number, prompt, screenplay)
         logger.info(
-            f"正在為提示詞 '{prompt}' 和影像 '{image_link}' 生成影片"
+            f"正在為提示詞 '{job.prompt}' 和影像 '{image_link}' 生成影片"
         )
-
-        operation = client.models.generate_videos(
-            model=VIDEO_MODEL,
-            prompt=prompt,
-            config=types.GenerateVideosConfig(
-                aspect_ratio=ASPECT_RATIO,
-                output_gcs_uri=f"{GCS_PATH}/scene_{scene_number}",
-                number_of_videos=1,
-                duration_seconds=8,
-                person_generation="allow_adult",
-            ),
-        )
-
-        # 輪詢異步操作直到完成
-        while not operation.done:
-            time.sleep(15)
-            operation = client.operations.get(operation)
-            logger.info(f"影片生成操作狀態：{operation}")
-
-        # 處理生成結果
-        if operation.response:
+        [job] = await get_orchestrator().run([job], _status_updater(tool_context))
+        if job.video_uris:
             logger.info(
-                f"已為提示詞生成 {len(operation.result.generated_videos)} 個影片：{prompt}"
+                f"已為提示詞生成 {len(job.video_uris)} 個影片：{prompt}"
             )
-            return [
-                video.video.uri.replace("gs://", AUTHORIZED_URI)
-                for video in operation.result.generated_videos
-            ]
         else:
-            logger.info(f"提示詞未生成任何 (0) 影片：{prompt}")
-            return []  # 若無影片則返回空列表
+            logger.info(f"提示詞未生成任何 (0) 影片：{prompt}（{job.error}）")
+        return _authorized(job.video_uris)
     except Exception as e:
         logger.error(f"為 {prompt} 生成影片時發生錯誤：{e}")
         return []
 
 
+# 多場景影片生成工具 (Scene videos generate tool)
+async def generate_scene_videos(
+    scenes: list[dict[str, Any]],
+    tool_context: ToolContext,
+) -> list[dict[str, Any]]:
+    """
+    一次提交所有場景的影片生成，並行等待完成。
+
+    參數：
+        scenes (list[dict]): 每個場景包含 scene_number (int)、prompt (str)、
+            image_link (str) 與 screenplay (str)。
+        tool_context (): 工具所需的 ToolContext 上下文物件。
+
+    返回：
+        list[dict]: 依場景編號排序的結果，包含 scene_number、status、
+            video_uris 與 error。
+    """
+    try:
+        jobs = [
+            _scene_job(
+                tool_context,
+                int(scene["scene_number"]),
+                scene["prompt"],
+                scene.get("screenplay", ""),
+            )
+            for scene in scenes
+        ]
+    except (KeyError, TypeError, ValueError) as e:
+        logger.error(f"場景參數無效：{e}")
+        return [{"status": "failed", "error": f"場景參數無效：{e}"}]
+
+    logger.info(f"正在並行生成 {len(jobs)} 個場景的影片")
+    results = await get_orchestrator().run(jobs, _status_updater(tool_context))
+    return [
+        {
+            "scene_number": job.scene_number,
+            "status": job.status,
+            "video_uris": _authorized(job.video_uris),
+            "error": job.error,
+        }
+        for job in results
+    ]
+
+
 # --- 影片代理 (Video Agent) ---
 video_agent = None
 try:
@@ -134,8 +223,8 @@ try:
         instruction=load_prompt_from_file("video_agent.txt"),
         # 將結果存儲在 "video" 鍵下
         output_key="video",
-        # 註冊影片生成工具
-        tools=[video_generate],
+        # 註冊影片生成工具（generate_scene_videos 一次並行生成所有場景）
+        tools=[generate_scene_videos, video_generate],
     )
     logger.info(f"✅ 代理 '{video_agent.name}' 已使用模型 '{MODEL}' 建立。")
 except Exception as e:
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+比較原本逐一寫入的追蹤點匯出與 CloudTraceLoggingSpanExporter 的吞吐量（spans/sec）。
+
+使用模擬的 Cloud Logging、Cloud Storage 與 Cloud Trace 客戶端，每次 API 呼叫
+以固定延遲模擬網路往返；工作負載模擬代理的追蹤點：多數為小型屬性，
+部分 LLM 呼叫的追蹤點帶有超過 250 KB 的請求內容。
+
+使用方法：
+    python benchmark_tracing.py --spans 2000 --large-ratio 0.05 --latency-ms 5
+"""
+
+import argparse
+import json
+import random
+import time
+from typing import Any
+from unittest.mock import Mock
+
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+
+from app.utils.tracing import CloudTraceLoggingSpanExporter
+
+# BatchSpanProcessor 預設每次匯出的追蹤點數
+EXPORT_BATCH_SIZE = 512
+
+
+class FakeBucket:
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.exists_calls = 0
+        self.uploads = 0
+
+    def exists(self) -> bool:
+        self.exists_calls += 1
+        time.sleep(self.latency)
+        return True
+
+    def blob(self, name: str) -> "FakeBucket":
+        return self
+
+    def upload_from_string(self, content: str, content_type: str) -> None:
+        self.uploads += 1
+        time.sleep(self.latency)
+
+
+class FakeBatch:
+    def __init__(self, logger: "FakeLogger") -> None:
+        self.logger = logger
+        self.entries = 0
+
+    def log_struct(self, info: dict[str, Any], **kwargs: Any) -> None:
+        self.entries += 1
+
+    def commit(self) -> None:
+        self.logger.calls += 1
+        self.logger.entries += self.entries
+        time.sleep(self.logger.latency)
+
+
+class FakeLogger:
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.calls = 0
+        self.entries = 0
+
+    def log_struct(self, info: dict[str, Any], **kwargs: Any) -> None:
+        self.calls += 1
+        self.entries += 1
+        time.sleep(self.latency)
+
+    def batch(self) -> FakeBatch:
+        return FakeBatch(self)
+
+
+class FakeTraceClient:
+    def batch_write_spans(self, request: Any) -> None:
+        pass
+
+
+def build_spans(count: int, large_ratio: float, seed: int = 0) -> list[ReadableSpan]:
+    rng = random.Random(seed)
+    tracer = TracerProvider().get_tracer("benchmark")
+    spans = []
+    for i in range(count):
+        attributes: dict[str, Any] = {
+            "gen_ai.system": "gcp.vertex.agent",
+            "gcp.vertex.agent.invocation_id": f"e-{i}",
+            "gcp.vertex.agent.event_id": f"{rng.getrandbits(64):x}",
+            "gcp.vertex.agent.tool_call_args": json.dumps({"prompt": "場景描述 " * 50}),
+        }
+        if rng.random() < large_ratio:
+            attributes["gcp.vertex.agent.llm_request"] = "故事內容與提示詞。" * 15_000
+        span = tracer.start_span(f"call_llm {i}", attributes=attributes)
+        span.add_event("tool_response", {"status": "success"})
+        span.end()
+        spans.append(span)
+    return spans
+
+
+def make_exporter(latency: float) -> tuple[CloudTraceLoggingSpanExporter, FakeLogger, FakeBucket]:
+    logger = FakeLogger(latency)
+    bucket = FakeBucket(latency)
+    logging_client = Mock()
+    logging_client.logger.return_value = logger
+    storage_client = Mock()
+    storage_client.bucket.return_value = bucket
+    exporter = CloudTraceLoggingSpanExporter(
+        logging_client=logging_client,
+        storage_client=storage_client,
+        bucket_name="benchmark-bucket",
+        project_id="benchmark-project",
+        client=FakeTraceClient(),
+        max_queue_size=100_000,
+    )
+    return exporter, logger, bucket
+
+
+def legacy_export(exporter: CloudTraceLoggingSpanExporter, spans: list[ReadableSpan]) -> None:
+    """原本的匯出流程：to_json/json.loads、整體 json.dumps 估計大小、每次檢查儲存桶、逐一 log_struct。"""
+    for span in spans:
+        span_context = span.get_span_context()
+        span_id = format(span_context.span_id, "x")
+        span_dict = json.loads(span.to_json())
+        span_dict["trace"] = f"projects/{exporter.project_id}/traces/{span_context.trace_id:x}"
+        span_dict["span_id"] = span_id
+        attributes = span_dict["attributes"]
+        if len(json.dumps(attributes).encode()) > 255 * 1024:
+            if exporter.storage_client.bucket(exporter.bucket_name).exists():
+                exporter.bucket.blob(f"spans/{span_id}.json").upload_from_string(
+                    json.dumps(attributes), "application/json"
+                )
+            attributes = {**attributes, "uri_payload": f"gs://{exporter.bucket_name}/spans/{span_id}.json"}
+            span_dict["attributes"] = attributes
+        exporter.logger.log_struct(span_dict, labels={"type": "agent_telemetry"}, severity="INFO")
+    exporter.client.batch_write_spans(request=None)
+
+
+def run(name: str, spans: list[ReadableSpan], latency: float, legacy: bool) -> None:
+    exporter, logger, bucket = make_exporter(latency)
+    batches = [spans[i : i + EXPORT_BATCH_SIZE] for i in range(0, len(spans), EXPORT_BATCH_SIZE)]
+
+    started = time.perf_counter()
+    for batch in batches:
+        if legacy:
+            legacy_export(exporter, batch)
+        else:
+            exporter.export(batch)
+    exported = time.perf_counter() - started
+    exporter.force_flush(timeout_millis=600_000)
+    drained = time.perf_counter() - started
+    stats = exporter.stats()
+    exporter.shutdown()
+
+    print(
+        f"{name:<8} {len(spans) / exported:>14,.0f} {len(spans) / drained:>14,.0f} "
+        f"{logger.calls:>10} {bucket.exists_calls:>8} {bucket.uploads:>8} "
+        f"{stats['dropped_entries'] + stats['dropped_uploads']:>6}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--spans", type=int, default=2000, help="追蹤點數")
+    parser.add_argument("--large-ratio", type=float, default=0.05, help="帶有大型屬性的追蹤點比例")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="每次模擬 API 呼叫的延遲（毫秒）")
+    args = parser.parse_args()
+
+    spans = build_spans(args.spans, args.large_ratio)
+    latency = args.latency_ms / 1000
+    print(f"{len(spans)} 個追蹤點，大型屬性比例 {args.large_ratio:.0%}，API 延遲 {args.latency_ms} ms")
+    print(f"{'匯出器':<8} {'export spans/s':>14} {'寫出 spans/s':>14} {'日誌呼叫':>10} {'exists':>8} {'上傳':>8} {'丟棄':>6}")
+    run("原始", spans, latency, legacy=True)
+    run("批次", spans, latency, legacy=False)
+
+
+if __name__ == "__main__":
+    main()
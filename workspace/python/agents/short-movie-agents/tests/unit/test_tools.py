@@ -4,7 +4,7 @@
 測試 storyboard_generate 和 video_generate 工具函式。
 """
 
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import AsyncMock, Mock, patch, MagicMock
 import pytest
 
 
@@ -143,6 +143,7 @@ class TestVideoGenerateTool:
         self.tool_context._invocation_context = Mock()
         self.tool_context._invocation_context.session = Mock()
         self.tool_context._invocation_context.session.id = "test-session-456"
+        self.tool_context.state = {}
 
     def test_tool_exists(self):
         """測試工具存在。"""
@@ -157,7 +158,8 @@ class TestVideoGenerateTool:
         },
     )
     @patch("app.video_agent.client")
-    def test_video_generate_success(self, mock_client):
+    @pytest.mark.asyncio
+    async def test_video_generate_success(self, mock_client):
         """測試成功生成影片。"""
         from app.video_agent import video_generate
 
@@ -174,11 +176,11 @@ class TestVideoGenerateTool:
         mock_operation.response = True
         mock_operation.result = mock_result
 
-        mock_client.models.generate_videos.return_value = mock_operation
-        mock_client.operations.get.return_value = mock_operation
+        mock_client.aio.models.generate_videos = AsyncMock(return_value=mock_operation)
+        mock_client.aio.operations.get = AsyncMock(return_value=mock_operation)
 
         # 執行工具
-        result = video_generate(
+        result = await video_generate(
             prompt="A sunset scene",
             scene_number=1,
             image_link="https://example.com/image.png",
@@ -191,6 +193,10 @@ class TestVideoGenerateTool:
         assert isinstance(result, list)
         assert len(result) == 1
         assert "storage.mtls.cloud.google.com" in result[0]
+        assert self.tool_context.state["video_scenes"]["1"]["status"] == "succeeded"
+        assert self.tool_context.state["video_scenes"]["1"]["video_uris"] == [
+            "gs://test-bucket/test-session-456/scene_1/video.mp4"
+        ]
 
     @patch.dict(
         "os.environ",
@@ -199,7 +205,8 @@ class TestVideoGenerateTool:
         },
     )
     @patch("app.video_agent.client")
-    def test_video_generate_no_videos(self, mock_client):
+    @pytest.mark.asyncio
+    async def test_video_generate_no_videos(self, mock_client):
         """測試生成失敗（無影片）。"""
         from app.video_agent import video_generate
 
@@ -208,11 +215,11 @@ class TestVideoGenerateTool:
         mock_operation.done = True
         mock_operation.response = False
 
-        mock_client.models.generate_videos.return_value = mock_operation
-        mock_client.operations.get.return_value = mock_operation
+        mock_client.aio.models.generate_videos = AsyncMock(return_value=mock_operation)
+        mock_client.aio.operations.get = AsyncMock(return_value=mock_operation)
 
         # 執行工具
-        result = video_generate(
+        result = await video_generate(
             prompt="Test prompt",
             scene_number=1,
             image_link="https://example.com/image.png",
@@ -230,15 +237,16 @@ class TestVideoGenerateTool:
         },
     )
     @patch("app.video_agent.client")
-    def test_video_generate_error_handling(self, mock_client):
+    @pytest.mark.asyncio
+    async def test_video_generate_error_handling(self, mock_client):
         """測試錯誤處理。"""
         from app.video_agent import video_generate
 
         # Mock 異常
-        mock_client.models.generate_videos.side_effect = Exception("API Error")
+        mock_client.aio.models.generate_videos = AsyncMock(side_effect=Exception("API Error"))
 
         # 執行工具
-        result = video_generate(
+        result = await video_generate(
             prompt="Test prompt",
             scene_number=1,
             image_link="https://example.com/image.png",
@@ -256,15 +264,16 @@ class TestVideoGenerateTool:
         },
     )
     @patch("app.video_agent.client")
-    def test_video_generate_extracts_dialogue(self, mock_client):
+    @pytest.mark.asyncio
+    async def test_video_generate_extracts_dialogue(self, mock_client):
         """測試從劇本中提取對話。"""
         from app.video_agent import video_generate
 
         mock_operation = Mock()
         mock_operation.done = True
         mock_operation.response = False
-        mock_client.models.generate_videos.return_value = mock_operation
-        mock_client.operations.get.return_value = mock_operation
+        mock_client.aio.models.generate_videos = AsyncMock(return_value=mock_operation)
+        mock_client.aio.operations.get = AsyncMock(return_value=mock_operation)
 
         screenplay = """
         NARRATOR (voiceover)
@@ -274,7 +283,7 @@ class TestVideoGenerateTool:
           This is amazing!
         """
 
-        video_generate(
+        await video_generate(
             prompt="Test prompt",
             scene_number=1,
             image_link="https://example.com/image.png",
@@ -283,4 +292,6 @@ class TestVideoGenerateTool:
         )
 
         # 驗證函式被呼叫（代表對話提取邏輯正常運作）
-        mock_client.models.generate_videos.assert_called_once()
+        mock_client.aio.models.generate_videos.assert_called_once()
+        prompt = mock_client.aio.models.generate_videos.call_args[1]["prompt"]
+        assert "This is amazing!" in prompt
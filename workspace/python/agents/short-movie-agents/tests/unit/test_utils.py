@@ -194,3 +194,233 @@ class TestCloudTraceLoggingSpanExporter:
         )
 
         assert exporter.debug is True
+
+
+class FakeBucket:
+    """模擬 GCS 儲存桶，記錄 exists 呼叫與上傳的物件。"""
+
+    def __init__(self, exists=True):
+        self._exists = exists
+        self.exists_calls = 0
+        self.uploads = {}
+
+    def exists(self):
+        self.exists_calls += 1
+        return self._exists
+
+    def blob(self, name):
+        bucket = self
+
+        class Blob:
+            def upload_from_string(self, content, content_type):
+                bucket.uploads[name] = content
+
+        return Blob()
+
+
+class FakeLogger:
+    """模擬 Cloud Logging 的 logger.batch()，記錄每次批次寫入的條目。"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.commits = []
+
+    def batch(self):
+        logger = self
+
+        class Batch:
+            def __init__(self):
+                self.entries = []
+
+            def log_struct(self, info, **kwargs):
+                self.entries.append((info, kwargs))
+
+            def commit(self):
+                if logger.fail:
+                    raise RuntimeError("logging unavailable")
+                logger.commits.append(self.entries)
+
+        return Batch()
+
+
+def make_exporter(bucket=None, logger=None, **kwargs):
+    """以假客戶端建立匯出器（不需要 Google Cloud 憑證）。"""
+    from app.utils.tracing import CloudTraceLoggingSpanExporter
+
+    logging_client = Mock()
+    logging_client.logger.return_value = logger or FakeLogger()
+    storage_client = Mock()
+    storage_client.bucket.return_value = bucket or FakeBucket()
+    return CloudTraceLoggingSpanExporter(
+        logging_client=logging_client,
+        storage_client=storage_client,
+        bucket_name="test-bucket",
+        project_id="test-project",
+        client=Mock(),
+        **kwargs,
+    )
+
+
+def make_spans(count, attributes=None):
+    """以 TracerProvider 建立已結束的追蹤點。"""
+    from opentelemetry.sdk.trace import TracerProvider
+
+    tracer = TracerProvider().get_tracer("test")
+    spans = []
+    for i in range(count):
+        span = tracer.start_span(f"span-{i}", attributes=attributes or {"index": i})
+        span.add_event("event", {"key": "value"})
+        span.end()
+        spans.append(span)
+    return spans
+
+
+class TestEstimateJsonSize:
+    """測試 estimate_json_size 函式。"""
+
+    @pytest.mark.parametrize(
+        "value",
+        ["ascii", '含 "引號" 與 \\ 的中文', 42, 3.5, True, None, ["a", 1, False], {"k": ["v", 2]}],
+    )
+    def test_close_to_serialized_size(self, value):
+        """測試估計值與 UTF-8 JSON 序列化的長度相近。"""
+        import json
+
+        from app.utils.tracing import estimate_json_size
+
+        actual = len(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode())
+        assert abs(estimate_json_size(value) - actual) <= 2
+
+
+class TestSpanExport:
+    """測試批次、非同步的追蹤點匯出。"""
+
+    def test_entries_match_to_json_format(self):
+        """測試日誌條目與 span.to_json() 的內容一致，並包含 trace 與 span_id。"""
+        import json
+
+        logger = FakeLogger()
+        exporter = make_exporter(logger=logger)
+        [span] = make_spans(1)
+
+        exporter.export([span])
+        assert exporter.force_flush(5000)
+        exporter.shutdown()
+
+        [[(entry, kwargs)]] = logger.commits
+        expected = json.loads(span.to_json())
+        assert {key: entry[key] for key in expected} == expected
+        assert entry["trace"] == f"projects/test-project/traces/{span.context.trace_id:x}"
+        assert entry["span_id"] == f"{span.context.span_id:x}"
+        assert kwargs["labels"]["type"] == "agent_telemetry"
+
+    def test_entries_are_batched(self):
+        """測試多個追蹤點以批次寫入，而非每個追蹤點一次。"""
+        logger = FakeLogger()
+        exporter = make_exporter(logger=logger, max_batch_size=50)
+
+        exporter.export(make_spans(120))
+        assert exporter.force_flush(5000)
+        exporter.shutdown()
+
+        assert sum(len(entries) for entries in logger.commits) == 120
+        assert len(logger.commits) < 120
+        assert max(len(entries) for entries in logger.commits) <= 50
+        assert exporter.stats()["logged"] == 120
+
+    def test_full_queue_drops_entries(self):
+        """測試佇列已滿時丟棄條目並計數，不阻塞匯出。"""
+        import threading
+
+        release = threading.Event()
+
+        class BlockingLogger(FakeLogger):
+            def batch(self):
+                release.wait(5)
+                return super().batch()
+
+        # 寫入執行緒最多取出一個條目後即被阻塞，佇列中最多再容納 5 個
+        exporter = make_exporter(logger=BlockingLogger(), max_queue_size=5, max_batch_size=1)
+
+        exporter.export(make_spans(20))
+        stats = exporter.stats()
+        release.set()
+        exporter.shutdown()
+
+        assert stats["dropped_entries"] >= 14
+        assert stats["spans"] + stats["dropped_entries"] == 20
+
+    def test_logging_failure_is_counted(self):
+        """測試 Cloud Logging 寫入失敗時記錄失敗數。"""
+        exporter = make_exporter(logger=FakeLogger(fail=True))
+
+        exporter.export(make_spans(3))
+        assert exporter.force_flush(5000)
+        exporter.shutdown()
+
+        assert exporter.stats()["log_failures"] == 3
+
+
+class TestLargeAttributes:
+    """測試大型屬性存儲於 GCS。"""
+
+    def test_large_attributes_uploaded_in_background(self):
+        """測試超過上限的屬性上傳至 GCS，日誌條目只保留小型屬性與 URI。"""
+        import json
+
+        bucket = FakeBucket()
+        logger = FakeLogger()
+        exporter = make_exporter(bucket=bucket, logger=logger)
+        [span] = make_spans(1, {"llm_request": "x" * 300_000, "model": "gemini"})
+
+        exporter.export([span])
+        assert exporter.force_flush(5000)
+        exporter.shutdown()
+
+        span_id = f"{span.context.span_id:x}"
+        [[(entry, _)]] = logger.commits
+        assert entry["attributes"]["model"] == "gemini"
+        assert "llm_request" not in entry["attributes"]
+        assert entry["attributes"]["uri_payload"] == f"gs://test-bucket/spans/{span_id}.json"
+        assert json.loads(bucket.uploads[f"spans/{span_id}.json"])["llm_request"] == "x" * 300_000
+        assert exporter.stats()["uploaded"] == 1
+
+    def test_small_attributes_stay_inline(self):
+        """測試未超過上限的屬性不會上傳。"""
+        bucket = FakeBucket()
+        exporter = make_exporter(bucket=bucket)
+
+        exporter.export(make_spans(1, {"llm_request": "x" * 1000}))
+        assert exporter.force_flush(5000)
+        exporter.shutdown()
+
+        assert bucket.uploads == {}
+        assert bucket.exists_calls == 0
+
+    def test_bucket_existence_is_cached(self):
+        """測試儲存桶檢查結果會被快取，而非每個大型追蹤點檢查一次。"""
+        bucket = FakeBucket()
+        exporter = make_exporter(bucket=bucket)
+
+        exporter.export(make_spans(5, {"llm_request": "x" * 300_000}))
+        assert exporter.force_flush(5000)
+        exporter.shutdown()
+
+        assert len(bucket.uploads) == 5
+        assert bucket.exists_calls == 1
+
+    def test_missing_bucket(self):
+        """測試儲存桶不存在時不上傳並在條目中註明。"""
+        from app.utils.tracing import BUCKET_NOT_FOUND
+
+        bucket = FakeBucket(exists=False)
+        logger = FakeLogger()
+        exporter = make_exporter(bucket=bucket, logger=logger)
+
+        exporter.export(make_spans(1, {"llm_request": "x" * 300_000}))
+        assert exporter.force_flush(5000)
+        exporter.shutdown()
+
+        [[(entry, _)]] = logger.commits
+        assert entry["attributes"]["uri_payload"] == BUCKET_NOT_FOUND
+        assert bucket.uploads == {}
@@ -0,0 +1,238 @@
+"""
+影片生成協調器測試
+
+以模擬的操作客戶端（每個場景有固定的生成耗時）驗證並行提交、輪詢、配額上限、
+重試與場景狀態表。
+"""
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+def fast_poll(**overrides):
+    """縮短的輪詢參數，讓測試以數百毫秒完成。"""
+    from app.utils.video_orchestrator import PollSettings
+
+    settings = {
+        "initial_delay": 0.02,
+        "min_interval": 0.01,
+        "max_interval": 0.05,
+        "jitter": 0.0,
+        "timeout": 5.0,
+        **overrides,
+    }
+    return PollSettings(**settings)
+
+
+class QuotaError(Exception):
+    """模擬 google-genai 的 APIError（具有 code 屬性）。"""
+
+    def __init__(self, code: int):
+        super().__init__(f"{code} RESOURCE_EXHAUSTED")
+        self.code = code
+
+
+class FakeOperationsClient:
+    """模擬 client.aio.models.generate_videos 與 client.aio.operations.get。
+
+    每個場景的提示詞對應一個生成耗時；操作在提交後經過該耗時即完成。
+    """
+
+    def __init__(self, durations, submit_failures=0, empty_prompts=()):
+        self.durations = durations
+        self.submit_failures = submit_failures
+        self.empty_prompts = set(empty_prompts)
+        self.submitted = []
+        self.polls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.aio = SimpleNamespace(
+            models=SimpleNamespace(generate_videos=self.generate_videos),
+            operations=SimpleNamespace(get=self.get),
+        )
+
+    async def generate_videos(self, model, prompt, config):
+        if self.submit_failures:
+            self.submit_failures -= 1
+            raise QuotaError(429)
+        self.submitted.append(prompt)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        return SimpleNamespace(
+            name=f"operations/{prompt}",
+            prompt=prompt,
+            started=time.monotonic(),
+            output=config,
+            done=False,
+            response=None,
+            result=None,
+            error=None,
+        )
+
+    async def get(self, operation):
+        self.polls += 1
+        if time.monotonic() - operation.started < self.durations[operation.prompt]:
+            return operation
+        self.in_flight -= 1
+        if operation.prompt in self.empty_prompts:
+            return SimpleNamespace(**{**vars(operation), "done": True, "response": None})
+        video = SimpleNamespace(video=SimpleNamespace(uri=f"{operation.output}/video.mp4"))
+        result = SimpleNamespace(generated_videos=[video])
+        return SimpleNamespace(**{**vars(operation), "done": True, "response": result, "result": result})
+
+
+def make_jobs(count):
+    from app.utils.video_orchestrator import SceneJob
+
+    return [
+        SceneJob(scene_number=i, prompt=f"scene-{i}", output_gcs_uri=f"gs://bucket/session/scene_{i}")
+        for i in range(1, count + 1)
+    ]
+
+
+def make_orchestrator(client, max_concurrency=8, settings=None):
+    from app.utils.video_orchestrator import VideoGenerationOrchestrator
+
+    return VideoGenerationOrchestrator(
+        client=client,
+        model="veo-test",
+        config_factory=lambda job: job.output_gcs_uri,
+        max_concurrency=max_concurrency,
+        settings=settings or fast_poll(),
+    )
+
+
+class TestConcurrentGeneration:
+    """測試並行生成。"""
+
+    @pytest.mark.asyncio
+    async def test_total_time_approaches_slowest_scene(self):
+        """測試總耗時接近最慢的場景，而不是所有場景的總和。"""
+        durations = {"scene-1": 0.2, "scene-2": 0.3, "scene-3": 0.4, "scene-4": 0.25}
+        client = FakeOperationsClient(durations)
+        # 先建立編排器與工作，首次匯入 app 的時間不計入
+        orchestrator = make_orchestrator(client)
+        jobs = make_jobs(4)
+
+        started = time.monotonic()
+        results = await orchestrator.run(jobs)
+        elapsed = time.monotonic() - started
+
+        assert [job.status for job in results] == [SUCCEEDED] * 4
+        assert client.max_in_flight == 4
+        assert elapsed < 0.4 + 0.2
+        assert elapsed < sum(durations.values()) / 2
+
+    @pytest.mark.asyncio
+    async def test_results_in_completion_order(self):
+        """測試 as_completed 依完成順序產出，run 依場景編號排序。"""
+        durations = {"scene-1": 0.3, "scene-2": 0.05, "scene-3": 0.15}
+        orchestrator = make_orchestrator(FakeOperationsClient(durations))
+
+        completed = [job.scene_number async for job in orchestrator.as_completed(make_jobs(3))]
+
+        assert completed == [2, 3, 1]
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_capped(self):
+        """測試同時進行中的操作不超過配額上限。"""
+        durations = {f"scene-{i}": 0.1 for i in range(1, 7)}
+        client = FakeOperationsClient(durations)
+
+        results = await make_orchestrator(client, max_concurrency=2).run(make_jobs(6))
+
+        assert client.max_in_flight == 2
+        assert all(job.status == SUCCEEDED for job in results)
+
+    @pytest.mark.asyncio
+    async def test_video_uris_use_scene_output_path(self):
+        """測試結果包含每個場景輸出路徑下的影片連結。"""
+        client = FakeOperationsClient({"scene-1": 0.01, "scene-2": 0.01})
+
+        results = await make_orchestrator(client).run(make_jobs(2))
+
+        assert results[1].video_uris == ["gs://bucket/session/scene_2/video.mp4"]
+
+
+class TestRetriesAndFailures:
+    """測試重試與失敗處理。"""
+
+    @pytest.mark.asyncio
+    async def test_quota_errors_are_retried(self):
+        """測試提交遇到 429 時退避重試。"""
+        client = FakeOperationsClient({"scene-1": 0.01}, submit_failures=2)
+
+        [job] = await make_orchestrator(client).run(make_jobs(1))
+
+        assert job.status == SUCCEEDED
+        assert job.retries == 2
+
+    @pytest.mark.asyncio
+    async def test_non_retryable_error_fails_only_that_scene(self):
+        """測試不可重試的錯誤只讓該場景失敗。"""
+        client = FakeOperationsClient({"scene-1": 0.01, "scene-2": 0.01})
+        original = client.generate_videos
+
+        async def generate_videos(model, prompt, config):
+            if prompt == "scene-1":
+                raise ValueError("prompt blocked")
+            return await original(model, prompt, config)
+
+        client.aio.models.generate_videos = generate_videos
+
+        first, second = await make_orchestrator(client).run(make_jobs(2))
+
+        assert first.status == FAILED
+        assert "prompt blocked" in first.error
+        assert second.status == SUCCEEDED
+
+    @pytest.mark.asyncio
+    async def test_empty_response_is_failure(self):
+        """測試沒有生成影片的操作標記為失敗。"""
+        client = FakeOperationsClient({"scene-1": 0.01}, empty_prompts={"scene-1"})
+
+        [job] = await make_orchestrator(client).run(make_jobs(1))
+
+        assert job.status == FAILED
+        assert job.video_uris == []
+
+    @pytest.mark.asyncio
+    async def test_timeout(self):
+        """測試超過時間上限的場景標記為失敗。"""
+        client = FakeOperationsClient({"scene-1": 10.0})
+        settings = fast_poll(max_interval=0.02, timeout=0.1)
+
+        [job] = await make_orchestrator(client, settings=settings).run(make_jobs(1))
+
+        assert job.status == FAILED
+        assert "超過" in job.error
+
+
+class TestSceneStatus:
+    """測試場景狀態表。"""
+
+    @pytest.mark.asyncio
+    async def test_status_updates(self):
+        """測試每次狀態變更都會呼叫 on_update，且最終狀態記錄在進度表中。"""
+        from app.utils.video_orchestrator import get_scene_progress, record_scene_progress
+
+        client = FakeOperationsClient({"scene-1": 0.05, "scene-2": 0.1})
+        statuses = []
+
+        def on_update(job):
+            statuses.append((job.scene_number, job.status))
+            record_scene_progress("session-1", job)
+
+        await make_orchestrator(client).run(make_jobs(2), on_update)
+        progress = get_scene_progress("session-1")
+
+        assert (1, "submitted") in statuses
+        assert statuses[-1] == (2, SUCCEEDED)
+        assert progress["1"]["status"] == SUCCEEDED
+        assert progress["2"]["polls"] >= 1
+        assert progress["2"]["video_uris"] == ["gs://bucket/session/scene_2/video.mp4"]
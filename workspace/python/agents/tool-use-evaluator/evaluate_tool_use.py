@@ -10,7 +10,9 @@
 4. 處理良好與不良的工具排序模式
 
 用法：
-    python evaluate_tool_use.py
+    python evaluate_tool_use.py                 # 執行代理並使用 LLM 評審
+    python evaluate_tool_use.py --offline       # 使用記錄的軌跡與規則評審
+    python evaluate_tool_use.py --workers 8 --no-cache
 
 需求：
     - 設定 GOOGLE_API_KEY 環境變數
@@ -18,12 +20,24 @@
     - 在 evalset.json 中定義的測試案例
 """
 
+import argparse
 import asyncio
 import json
 import os
 from pathlib import Path
+from typing import Optional
 
-from google.adk.evaluation.agent_evaluator import AgentEvaluator
+from tool_use_evaluator.eval_runner import (
+    EvaluationRunner,
+    HeuristicJudge,
+    LiveTrajectorySource,
+    LlmJudge,
+    load_eval_cases,
+    load_eval_config,
+)
+
+# 軌跡與評審結果的預設快取目錄
+DEFAULT_CACHE_DIR = Path(__file__).parent / ".eval_cache"
 
 
 async def create_evalset_file():
@@ -243,84 +257,112 @@ async def create_evalset_file():
     return evalset_path
 
 
-async def run_evaluation(evalset_path: Path):
+async def run_evaluation(
+    evalset_path: Path,
+    *,
+    offline: bool = False,
+    max_workers: int = 4,
+    cache_dir: Optional[Path] = DEFAULT_CACHE_DIR,
+):
     """使用 RUBRIC_BASED_TOOL_USE_QUALITY_V1 指標執行評估。
 
+    測試案例由 EvaluationRunner 平行評估：代理軌跡以 (代理程式碼雜湊, 案例輸入)
+    快取，評審結果以 (軌跡雜湊, 評量表) 快取，重複執行時只會重跑有變動的部分。
+
     Args:
         evalset_path: evalset.json 檔案的路徑
+        offline: 使用 evalset 中記錄的軌跡與規則評審，不呼叫任何模型
+        max_workers: 同時評估的案例數
+        cache_dir: 快取目錄；None 表示不寫入磁碟
+
+    Returns:
+        EvaluationReport 評估報告
     """
     print("\n" + "=" * 80)
     print("真實評估: 基於評量表的工具使用品質 V1 (RUBRIC BASED TOOL USE QUALITY V1)")
     print("=" * 80 + "\n")
 
-    # 評量表已在 test_config.json 中定義
-    rubrics = [
-        ("proper_tool_order", "代理在 extract_features 之前呼叫 analyze_data"),
-        ("complete_pipeline", "對於完整分析：analyze → extract → validate → apply"),
-        ("validation_before_model", "代理在建模前驗證特徵品質"),
-        ("no_tool_failures", "所有工具呼叫皆成功且參數正確"),
-    ]
+    # 評量表定義於 test_config.json
+    config = load_eval_config(evalset_path.parent / "test_config.json")
+    rubrics = config["rubrics"]
 
     print("📋 評估配置")
     print("-" * 80)
-    print("閾值: 0.7")
-    print("評審模型: gemini-2.5-flash")
+    print(f"閾值: {config['threshold']}")
+    print(f"評審模型: {'規則評審 (離線)' if offline else config['judge_model']}")
     print(f"評量表: {len(rubrics)}")
-
-    for rubric_id, rubric_desc in rubrics:
-        print(f"  • {rubric_id}: {rubric_desc[:55]}...")
+    print(f"工作者數: {max_workers}")
+
+    for rubric in rubrics:
+        print(f"  • {rubric['rubric_id']}: {rubric['rubric_content']['text_property'][:55]}...")
+
+    if offline:
+        runner = EvaluationRunner(
+            rubrics,
+            HeuristicJudge(),
+            threshold=config["threshold"],
+            max_workers=max_workers,
+            cache_dir=cache_dir,
+        )
+    else:
+        runner = EvaluationRunner(
+            rubrics,
+            LlmJudge(config["judge_model"], config["num_samples"]),
+            trajectory_source=LiveTrajectorySource(),
+            threshold=config["threshold"],
+            max_workers=max_workers,
+            cache_dir=cache_dir,
+        )
 
     print("\n🔍 正在執行評估")
     print("-" * 80)
 
-    try:
-        # 執行評估
-        results = await AgentEvaluator.evaluate(
-            agent_module="tool_use_evaluator",
-            eval_dataset_file_path_or_dir=str(evalset_path),
-        )
+    report = await runner.run(load_eval_cases(evalset_path))
 
-        print("✅ 評估成功完成！")
-        print("\n📊 評估結果")
-        print("-" * 80)
-        print(json.dumps(results, indent=2, default=str, ensure_ascii=False))
-
-        # 解讀結果
-        print("\n🧠 結果解讀")
-        print("-" * 80)
+    print("\n📊 評估結果")
+    print("-" * 80)
+    print(f"{'案例':<36} {'分數':>6} {'結果':>6} {'軌跡(s)':>9} {'評審(s)':>9} {'快取':>8}")
+    for case in report.cases:
+        status = "PASS" if case.passed else "FAIL"
+        cache = f"{'T' if case.trajectory_cached else '-'}{case.verdicts_cached}/{len(rubrics)}"
         print(
-            """
-            評估分數說明：
-            - 分數 1.0：完美的工具排序 (滿足所有評量表)
-            - 分數 0.8-0.99：優秀，1-2 個小問題
-            - 分數 0.7-0.79：良好，可接受但需要改進
-            - 分數 0.6-0.69：可接受但有重大問題
-            - 分數 <0.6：差，工具排序有根本性問題
-
-            每個評量表評估的內容：
-            1. proper_tool_order：是否遵守依賴關係？ (分析在提取之前)
-            2. complete_pipeline：是否包含所有必要步驟？
-            3. validation_before_model：是否在建模前驗證品質？
-            4. no_tool_failures：是否所有工具呼叫都執行成功？
-            """
+            f"{case.eval_id:<36} {case.score:>6.2f} {status:>6} "
+            f"{case.trajectory_seconds:>9.3f} {case.judge_seconds:>9.3f} {cache:>8}"
         )
+        if case.error:
+            print(f"  ❌ {case.error}")
+        for rubric_id, verdict in case.verdicts.items():
+            print(f"    - {rubric_id}: {verdict['score']:.2f} ({verdict['rationale']})")
 
-    except Exception as e:
-        error_msg = str(e)
-        if "Expected" in error_msg and "got" in error_msg:
-            # 這是評分失敗，實際上意味著評估工作正常！
-            print("⚠️  評估已執行但測試案例未達到評分閾值：")
-            print(f"   {error_msg}\n")
-            print("這意味著評估框架運作正常！")
-            print("測試代理不符合預期的工具順序。")
-            print("在真實場景中，您將會：\n")
-            print("1. 檢視上述預期與實際工具呼叫")
-            print("2. 調整代理指令以符合預期行為")
-            print("3. 重新執行評估以查看分數是否提高")
-        else:
-            print(f"❌ 評估失敗: {e}")
-            print("\n注意: 確保已設定 GOOGLE_API_KEY：")
-            print("  export GOOGLE_API_KEY=your_key")
+    print(f"\n通過: {report.passed}/{len(report.cases)}，總耗時: {report.wall_seconds:.3f}s")
+    print(f"快取統計: {json.dumps(report.cache_stats, ensure_ascii=False)}")
+
+    if any(case.error for case in report.cases) and not offline:
+        print("\n注意: 確保已設定 GOOGLE_API_KEY，或使用 --offline 以記錄的軌跡評估：")
+        print("  export GOOGLE_API_KEY=your_key")
+
+    # 解讀結果
+    print("\n🧠 結果解讀")
+    print("-" * 80)
+    print(
+        """
+        評估分數說明：
+        - 分數 1.0：完美的工具排序 (滿足所有評量表)
+        - 分數 0.8-0.99：優秀，1-2 個小問題
+        - 分數 0.7-0.79：良好，可接受但需要改進
+        - 分數 0.6-0.69：可接受但有重大問題
+        - 分數 <0.6：差，工具排序有根本性問題
+
+        每個評量表評估的內容：
+        1. proper_tool_order：是否遵守依賴關係？ (分析在提取之前)
+        2. complete_pipeline：是否包含所有必要步驟？
+        3. validation_before_model：是否在建模前驗證品質？
+        4. no_tool_failures：是否所有工具呼叫都執行成功？
+
+        快取欄位：T 表示軌跡命中快取，n/m 表示 m 個評量表中有 n 個評審結果命中快取。
+        """
+    )
+    return report
 
 
 def show_test_case_details():
@@ -356,14 +398,15 @@ def show_test_case_details():
         print(f"  原因: {case['why']}")
 
 
-async def main():
+async def main(offline: bool = False, max_workers: int = 4, use_cache: bool = True):
     """主評估工作流程。"""
-    # 檢查 API 金鑰
+    # 檢查 API 金鑰；沒有金鑰時改用記錄的軌跡離線評估
     api_key = os.environ.get("GOOGLE_API_KEY")
-    if not api_key:
+    if not api_key and not offline:
         print("⚠️  警告: 未設定 GOOGLE_API_KEY")
         print("    若要進行真實評估，請設定: export GOOGLE_API_KEY=your_key")
-        print("    繼續執行展示模式...\n")
+        print("    改用記錄的軌跡進行離線評估...\n")
+        offline = True
 
     # 顯示測試案例詳細資訊
     show_test_case_details()
@@ -374,7 +417,12 @@ async def main():
     print(f"   ✓ 已建立: {evalset_path}")
 
     # 執行評估
-    await run_evaluation(evalset_path)
+    await run_evaluation(
+        evalset_path,
+        offline=offline,
+        max_workers=max_workers,
+        cache_dir=DEFAULT_CACHE_DIR if use_cache else None,
+    )
 
     print("\n" + "=" * 80)
     print("評估完成")
@@ -401,4 +449,9 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="工具使用品質評估")
+    parser.add_argument("--offline", action="store_true", help="使用記錄的軌跡與規則評審")
+    parser.add_argument("--workers", type=int, default=4, help="同時評估的案例數")
+    parser.add_argument("--no-cache", action="store_true", help="不讀寫磁碟快取")
+    args = parser.parse_args()
+    asyncio.run(main(args.offline, args.workers, not args.no_cache))
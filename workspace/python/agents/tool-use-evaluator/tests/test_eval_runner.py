@@ -0,0 +1,195 @@
+"""測試平行、可快取的評估執行器。
+
+此模組驗證 EvaluationRunner 的工作者池、軌跡快取、評審結果快取、
+每個案例的耗時記錄，以及使用記錄軌跡的離線評估。
+"""
+
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from tool_use_evaluator.eval_runner import (
+    EvaluationRunner,
+    HeuristicJudge,
+    JsonCache,
+    agent_code_hash,
+    case_input_key,
+    load_eval_cases,
+    load_eval_config,
+    recorded_trajectory,
+)
+
+PROJECT_DIR = Path(__file__).parent.parent
+CASES = load_eval_cases(PROJECT_DIR / "tool_use_quality.evalset.json")
+CONFIG = load_eval_config(PROJECT_DIR / "test_config.json")
+
+
+class FakeTrajectorySource:
+    """回傳記錄軌跡並計算呼叫次數、最大並行數的假代理。"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def __call__(self, case):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        return recorded_trajectory(case)
+
+
+class CountingJudge(HeuristicJudge):
+    """計算評審呼叫次數的規則評審。"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self, trajectory, rubric):
+        self.calls += 1
+        return await super().__call__(trajectory, rubric)
+
+
+def _runner(judge, **kwargs):
+    return EvaluationRunner(
+        CONFIG["rubrics"],
+        judge,
+        threshold=CONFIG["threshold"],
+        agent_hash="agent-v1",
+        **kwargs,
+    )
+
+
+class TestOfflineEvaluation:
+    """測試使用記錄軌跡的離線評估。"""
+
+    async def test_offline_scores(self):
+        """測試離線評估的分數與通過狀態。
+
+        預期: 完整流程與分析流程通過，跳過驗證的流程失敗。
+        """
+        report = await _runner(HeuristicJudge()).run(CASES)
+        results = {case.eval_id: case for case in report.cases}
+
+        assert results["good_sequence_complete_pipeline"].score == 1.0
+        assert results["bad_sequence_skipped_validation"].passed is False
+        assert results["good_sequence_proper_analysis"].passed is True
+        assert report.passed == 2
+        assert all(case.error is None for case in report.cases)
+
+    async def test_results_keep_case_order(self):
+        """測試平行評估後結果仍依原始案例順序排列。"""
+        report = await _runner(HeuristicJudge(), max_workers=3).run(CASES)
+        assert [case.eval_id for case in report.cases] == [c["eval_id"] for c in CASES]
+
+    async def test_per_case_timing(self):
+        """測試每個案例都記錄各階段耗時。"""
+        source = FakeTrajectorySource(delay=0.02)
+        report = await _runner(HeuristicJudge(), trajectory_source=source).run(CASES)
+        for case in report.cases:
+            assert case.trajectory_seconds >= 0.02
+            assert case.total_seconds >= case.trajectory_seconds + case.judge_seconds
+        assert report.to_dict()["cases"][0]["total_seconds"] > 0
+
+
+class TestCaching:
+    """測試軌跡與評審結果的快取。"""
+
+    async def test_workers_run_cases_concurrently(self):
+        """測試工作者池同時執行多個案例，且不超過 max_workers。"""
+        source = FakeTrajectorySource(delay=0.05)
+        await _runner(HeuristicJudge(), trajectory_source=source, max_workers=2).run(
+            CASES * 2
+        )
+        assert source.max_active == 2
+
+    async def test_rejudge_with_new_rubric_reuses_trajectories(self, tmp_path):
+        """測試新增評量表後重新評審不會重新執行代理。
+
+        預期: 第二次執行軌跡全部命中快取，只有新評量表呼叫評審。
+        """
+        source, judge = FakeTrajectorySource(), CountingJudge()
+        await _runner(judge, trajectory_source=source, cache_dir=tmp_path).run(CASES)
+        assert source.calls == 3
+        assert judge.calls == 12
+
+        rubrics = CONFIG["rubrics"] + [
+            {
+                "rubric_id": "complete_pipeline",
+                "rubric_content": {"text_property": "修改後的完整流程描述"},
+            }
+        ]
+        runner = EvaluationRunner(
+            rubrics, judge, trajectory_source=source, cache_dir=tmp_path, agent_hash="agent-v1"
+        )
+        report = await runner.run(CASES)
+
+        assert source.calls == 3
+        assert judge.calls == 15
+        assert all(case.trajectory_cached for case in report.cases)
+        assert report.cache_stats["verdict_hits"] == 12
+
+    async def test_agent_change_invalidates_trajectories(self, tmp_path):
+        """測試代理程式碼雜湊改變時重新執行代理，但相同軌跡的評審結果仍可重用。"""
+        source, judge = FakeTrajectorySource(), CountingJudge()
+        await _runner(judge, trajectory_source=source, cache_dir=tmp_path).run(CASES)
+
+        runner = EvaluationRunner(
+            CONFIG["rubrics"],
+            judge,
+            trajectory_source=source,
+            cache_dir=tmp_path,
+            agent_hash="agent-v2",
+        )
+        await runner.run(CASES)
+
+        assert source.calls == 6
+        assert judge.calls == 12
+
+    async def test_judge_errors_are_reported_per_case(self):
+        """測試評審失敗只影響該案例並記錄錯誤。"""
+        rubrics = [{"rubric_id": "unknown", "rubric_content": {"text_property": "x"}}]
+        report = await EvaluationRunner(rubrics, HeuristicJudge(), agent_hash="a").run(CASES)
+        assert all("ValueError" in case.error for case in report.cases)
+        assert report.passed == 0
+
+
+class TestHelpers:
+    """測試雜湊與快取輔助函式。"""
+
+    def test_case_input_key_ignores_expected_output(self):
+        """測試修改預期工具呼叫不影響案例輸入鍵。"""
+        case = CASES[0]
+        modified = {
+            **case,
+            "conversation": [
+                {**case["conversation"][0], "intermediate_data": {"tool_uses": []}}
+            ],
+        }
+        assert case_input_key(case) == case_input_key(modified)
+        assert case_input_key(CASES[0]) != case_input_key(CASES[1])
+
+    def test_agent_code_hash_is_stable(self, tmp_path):
+        """測試代理程式碼雜湊隨原始碼變動。"""
+        (tmp_path / "agent.py").write_text("A = 1\n")
+        first = agent_code_hash(tmp_path)
+        assert agent_code_hash(tmp_path) == first
+        (tmp_path / "agent.py").write_text("A = 2\n")
+        assert agent_code_hash(tmp_path) != first
+
+    def test_json_cache_persists(self, tmp_path):
+        """測試磁碟快取可被新的實例讀取。"""
+        JsonCache(tmp_path).put("key", {"score": 1.0})
+        cache = JsonCache(tmp_path)
+        assert cache.get("key") == {"score": 1.0}
+        assert cache.get("missing") is None
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_invalid_workers(self):
+        """測試 max_workers 小於 1 時引發 ValueError。"""
+        with pytest.raises(ValueError):
+            EvaluationRunner([], HeuristicJudge(), max_workers=0, agent_hash="a")
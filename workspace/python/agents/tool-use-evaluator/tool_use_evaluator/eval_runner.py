@@ -0,0 +1,534 @@
+"""平行化、可快取的工具使用品質評估執行器。
+
+`AgentEvaluator.evaluate` 會依序處理整個 evalset，且每次評估都重新執行代理與評審模型。
+EvaluationRunner 將流程拆成兩個可快取的階段：
+
+1. 軌跡 (trajectory)：代理對測試案例的工具呼叫與最終回應，
+   以 (代理程式碼雜湊, 案例輸入) 為鍵快取 —— 只修改評量表時不必重新執行代理
+2. 評審結果 (verdict)：評審對單一評量表的評分，
+   以 (軌跡雜湊, 評量表) 為鍵快取 —— 代理行為不變時不必重新呼叫評審模型
+
+測試案例由固定數量的工作者 (worker) 平行處理，每個案例都會記錄各階段耗時。
+離線模式下直接使用 evalset 中記錄的軌跡 (intermediate_data)，
+搭配 HeuristicJudge 即可在沒有 API 金鑰的環境中完成評估。
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+# 評估配置中基於評量表的工具使用品質指標名稱
+METRIC_NAME = "rubric_based_tool_use_quality_v1"
+
+# 代理應遵循的完整工具流程
+EXPECTED_PIPELINE = (
+    "analyze_data",
+    "extract_features",
+    "validate_quality",
+    "apply_model",
+)
+
+Trajectory = dict[str, Any]
+Verdict = dict[str, Any]
+
+
+def _stable_hash(value: Any) -> str:
+    """計算可 JSON 序列化物件的穩定 SHA-256 雜湊。"""
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def agent_code_hash(package_dir: Optional[Path] = None) -> str:
+    """計算代理套件所有 Python 原始碼的雜湊。
+
+    代理的指令、工具或模型設定任何一處修改都會產生不同的雜湊，
+    使先前快取的軌跡自動失效。
+
+    Args:
+        package_dir: 代理套件目錄，預設為 tool_use_evaluator 套件本身
+
+    Returns:
+        十六進位雜湊字串
+    """
+    package_dir = Path(package_dir or Path(__file__).parent)
+    digest = hashlib.sha256()
+    for path in sorted(package_dir.rglob("*.py")):
+        digest.update(path.relative_to(package_dir).as_posix().encode("utf-8"))
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def case_input_key(case: dict[str, Any]) -> str:
+    """計算測試案例輸入 (使用者訊息與初始 session 狀態) 的雜湊。
+
+    預期的工具呼叫與回應不屬於輸入，因此修改預期值不會使軌跡快取失效。
+    """
+    user_contents = [
+        invocation.get("user_content")
+        for invocation in case.get("conversation", [])
+    ]
+    state = case.get("session_input", {}).get("state", {})
+    return _stable_hash({"user_contents": user_contents, "state": state})
+
+
+def trajectory_hash(trajectory: Trajectory) -> str:
+    """計算軌跡的雜湊 (不含耗時等中繼資料)。"""
+    return _stable_hash(
+        {
+            "tool_uses": trajectory.get("tool_uses", []),
+            "tool_errors": trajectory.get("tool_errors", []),
+            "final_response": trajectory.get("final_response", ""),
+        }
+    )
+
+
+def rubric_key(rubric: dict[str, Any]) -> str:
+    """計算評量表 (ID 與內容) 的雜湊；修改評量表文字會使評審快取失效。"""
+    return _stable_hash(rubric)
+
+
+def _content_text(content: Optional[dict[str, Any]]) -> str:
+    if not content:
+        return ""
+    return "".join(part.get("text") or "" for part in content.get("parts", []))
+
+
+def recorded_trajectory(case: dict[str, Any]) -> Trajectory:
+    """從 evalset 案例的 intermediate_data 取出記錄的軌跡 (不需執行代理)。"""
+    tool_uses: list[dict[str, Any]] = []
+    final_response = ""
+    for invocation in case.get("conversation", []):
+        data = invocation.get("intermediate_data") or {}
+        tool_uses.extend(
+            {"name": call["name"], "args": call.get("args", {})}
+            for call in data.get("tool_uses", [])
+        )
+        final_response = _content_text(invocation.get("final_response"))
+    return {
+        "tool_uses": tool_uses,
+        "tool_errors": [],
+        "final_response": final_response,
+    }
+
+
+def load_eval_cases(evalset_path: Path) -> list[dict[str, Any]]:
+    """讀取 evalset.json 中的測試案例。"""
+    with open(evalset_path, encoding="utf-8") as f:
+        return json.load(f)["eval_cases"]
+
+
+def load_eval_config(config_path: Path) -> dict[str, Any]:
+    """讀取 test_config.json 中的評量表指標配置。
+
+    Returns:
+        包含 threshold、judge_model、num_samples 與 rubrics 的字典
+    """
+    with open(config_path, encoding="utf-8") as f:
+        criterion = json.load(f)["criteria"][METRIC_NAME]
+    judge_options = criterion.get("judge_model_options", {})
+    return {
+        "threshold": criterion.get("threshold", 0.7),
+        "judge_model": judge_options.get("judge_model", "gemini-2.5-flash"),
+        "num_samples": judge_options.get("num_samples", 1),
+        "rubrics": criterion.get("rubrics", []),
+    }
+
+
+class JsonCache:
+    """以 JSON 檔案保存的鍵值快取；未指定目錄時只保存在記憶體中。
+
+    每個鍵對應一個檔案，寫入時先寫暫存檔再取代，
+    中斷的評估不會留下損毀的快取項目。
+    """
+
+    def __init__(self, directory: Optional[Path] = None):
+        """
+        初始化快取。
+
+        Args:
+            directory: 快取目錄；None 表示僅使用記憶體
+        """
+        self.directory = Path(directory) if directory is not None else None
+        self._memory: dict[str, Any] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.json"
+
+    def get(self, key: str) -> Optional[Any]:
+        """讀取快取項目；不存在時回傳 None。"""
+        if key in self._memory:
+            self.hits += 1
+            return self._memory[key]
+        if self.directory is not None:
+            path = self._path(key)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    value = json.load(f)
+            except (OSError, ValueError):
+                value = None
+            if value is not None:
+                self._memory[key] = value
+                self.hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def put(self, key: str, value: Any) -> None:
+        """寫入快取項目。"""
+        self._memory[key] = value
+        if self.directory is None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+
+class LiveTrajectorySource:
+    """透過 ADK InMemoryRunner 實際執行代理，記錄工具呼叫軌跡。"""
+
+    def __init__(self, agent=None, app_name: str = "tool_use_evaluator"):
+        """
+        初始化軌跡來源。
+
+        Args:
+            agent: 要執行的代理，預設為 root_agent
+            app_name: Runner 使用的應用程式名稱
+        """
+        if agent is None:
+            from .agent import root_agent
+
+            agent = root_agent
+        self.agent = agent
+        self.app_name = app_name
+
+    async def __call__(self, case: dict[str, Any]) -> Trajectory:
+        from google.adk.runners import InMemoryRunner
+        from google.genai import types
+
+        session_input = case.get("session_input", {})
+        runner = InMemoryRunner(agent=self.agent, app_name=self.app_name)
+        session = await runner.session_service.create_session(
+            app_name=self.app_name,
+            user_id=session_input.get("user_id", "eval_user"),
+            state=dict(session_input.get("state", {})),
+        )
+
+        tool_uses: list[dict[str, Any]] = []
+        tool_errors: list[str] = []
+        final_response = ""
+        for invocation in case.get("conversation", []):
+            new_message = types.Content.model_validate(invocation["user_content"])
+            async for event in runner.run_async(
+                user_id=session.user_id,
+                session_id=session.id,
+                new_message=new_message,
+            ):
+                for call in event.get_function_calls():
+                    tool_uses.append({"name": call.name, "args": dict(call.args or {})})
+                for response in event.get_function_responses():
+                    if (response.response or {}).get("status") == "error":
+                        tool_errors.append(response.name)
+                if event.is_final_response() and event.content and event.content.parts:
+                    final_response = "".join(
+                        part.text or "" for part in event.content.parts
+                    )
+
+        return {
+            "tool_uses": tool_uses,
+            "tool_errors": tool_errors,
+            "final_response": final_response,
+        }
+
+
+class HeuristicJudge:
+    """不需模型的離線評審，依工具呼叫順序規則評分內建的四個評量表。"""
+
+    cache_id = "heuristic-v1"
+
+    async def __call__(self, trajectory: Trajectory, rubric: dict[str, Any]) -> Verdict:
+        names = [call["name"] for call in trajectory.get("tool_uses", [])]
+        rubric_id = rubric["rubric_id"]
+
+        def first(name: str) -> Optional[int]:
+            return names.index(name) if name in names else None
+
+        if rubric_id == "proper_tool_order":
+            analyze, extract = first("analyze_data"), first("extract_features")
+            ok = analyze is not None and (extract is None or analyze < extract)
+            score = 1.0 if ok else 0.0
+            rationale = "analyze_data 先於 extract_features" if ok else "缺少 analyze_data 或順序錯誤"
+        elif rubric_id == "complete_pipeline":
+            # 依序出現的流程步驟數 (子序列比對)
+            position, matched = 0, 0
+            for step in EXPECTED_PIPELINE:
+                if step in names[position:]:
+                    position = names.index(step, position) + 1
+                    matched += 1
+            score = matched / len(EXPECTED_PIPELINE)
+            rationale = f"依序完成 {matched}/{len(EXPECTED_PIPELINE)} 個步驟"
+        elif rubric_id == "validation_before_model":
+            validate, apply = first("validate_quality"), first("apply_model")
+            ok = apply is None or (validate is not None and validate < apply)
+            score = 1.0 if ok else 0.0
+            rationale = "建模前已驗證品質" if ok else "未驗證即應用模型"
+        elif rubric_id == "no_tool_failures":
+            failed = list(trajectory.get("tool_errors", []))
+            failed += [call["name"] for call in trajectory.get("tool_uses", []) if not call.get("args")]
+            score = 0.0 if failed else 1.0
+            rationale = f"失敗的呼叫：{failed}" if failed else "所有工具呼叫皆成功"
+        else:
+            raise ValueError(f"HeuristicJudge 不支援評量表：{rubric_id}")
+
+        return {"score": score, "rationale": rationale}
+
+
+class LlmJudge:
+    """以 Gemini 模型評審軌跡是否滿足評量表，並平均多次取樣的分數。"""
+
+    def __init__(
+        self,
+        model: str = "gemini-2.5-flash",
+        num_samples: int = 1,
+        client=None,
+    ):
+        """
+        初始化 LLM 評審。
+
+        Args:
+            model: 評審模型名稱
+            num_samples: 每個評量表的取樣次數
+            client: google.genai Client，預設在第一次呼叫時建立
+        """
+        self.model = model
+        self.num_samples = max(num_samples, 1)
+        self._client = client
+
+    @property
+    def cache_id(self) -> str:
+        return f"llm:{self.model}:{self.num_samples}"
+
+    @property
+    def client(self):
+        if self._client is None:
+            from google import genai
+
+            self._client = genai.Client()
+        return self._client
+
+    def _prompt(self, trajectory: Trajectory, rubric: dict[str, Any]) -> str:
+        tool_calls = json.dumps(trajectory.get("tool_uses", []), ensure_ascii=False)
+        return (
+            "您是評估代理工具使用品質的評審。\n"
+            f"評量表：{rubric['rubric_content']['text_property']}\n"
+            f"工具呼叫 (依序)：{tool_calls}\n"
+            f"失敗的工具呼叫：{trajectory.get('tool_errors', [])}\n"
+            f"最終回應：{trajectory.get('final_response', '')}\n\n"
+            '請只回傳 JSON：{"score": 0 到 1 之間的數字, "rationale": "簡短理由"}'
+        )
+
+    async def _sample(self, prompt: str) -> Verdict:
+        from google.genai import types
+
+        response = await self.client.aio.models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config=types.GenerateContentConfig(response_mime_type="application/json"),
+        )
+        verdict = json.loads(response.text)
+        return {
+            "score": min(max(float(verdict["score"]), 0.0), 1.0),
+            "rationale": str(verdict.get("rationale", "")),
+        }
+
+    async def __call__(self, trajectory: Trajectory, rubric: dict[str, Any]) -> Verdict:
+        prompt = self._prompt(trajectory, rubric)
+        samples = await asyncio.gather(
+            *(self._sample(prompt) for _ in range(self.num_samples))
+        )
+        return {
+            "score": sum(s["score"] for s in samples) / len(samples),
+            "rationale": samples[0]["rationale"],
+        }
+
+
+@dataclass
+class CaseResult:
+    """單一測試案例的評估結果與各階段耗時。"""
+
+    eval_id: str
+    score: float = 0.0
+    passed: bool = False
+    verdicts: dict[str, Verdict] = field(default_factory=dict)
+    tool_calls: list[str] = field(default_factory=list)
+    trajectory_cached: bool = False
+    verdicts_cached: int = 0
+    trajectory_seconds: float = 0.0
+    judge_seconds: float = 0.0
+    total_seconds: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class EvaluationReport:
+    """整個 evalset 的評估報告。"""
+
+    threshold: float
+    cases: list[CaseResult]
+    wall_seconds: float
+    cache_stats: dict[str, int]
+
+    @property
+    def passed(self) -> int:
+        return sum(1 for case in self.cases if case.passed)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "threshold": self.threshold,
+            "passed": self.passed,
+            "total": len(self.cases),
+            "wall_seconds": self.wall_seconds,
+            "cache_stats": self.cache_stats,
+            "cases": [asdict(case) for case in self.cases],
+        }
+
+
+class EvaluationRunner:
+    """以工作者池平行評估測試案例，並快取軌跡與評審結果。"""
+
+    def __init__(
+        self,
+        rubrics: list[dict[str, Any]],
+        judge: Callable[[Trajectory, dict[str, Any]], Awaitable[Verdict]],
+        *,
+        trajectory_source: Optional[Callable[[dict[str, Any]], Awaitable[Trajectory]]] = None,
+        threshold: float = 0.7,
+        max_workers: int = 4,
+        cache_dir: Optional[Path] = None,
+        agent_hash: Optional[str] = None,
+    ):
+        """
+        初始化評估執行器。
+
+        Args:
+            rubrics: 評量表列表 (test_config.json 格式)
+            judge: 評審，接收 (軌跡, 評量表) 並回傳 {"score", "rationale"}
+            trajectory_source: 產生軌跡的來源；None 表示離線使用 evalset 記錄的軌跡
+            threshold: 通過的平均分數閾值
+            max_workers: 同時評估的案例數
+            cache_dir: 快取目錄；None 表示只在記憶體中快取
+            agent_hash: 代理程式碼雜湊，預設由 agent_code_hash() 計算
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers 必須大於 0")
+
+        self.rubrics = rubrics
+        self.judge = judge
+        self.trajectory_source = trajectory_source
+        self.threshold = threshold
+        self.max_workers = max_workers
+        self.agent_hash = agent_hash or agent_code_hash()
+
+        cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.trajectory_cache = JsonCache(cache_dir / "trajectories" if cache_dir else None)
+        self.verdict_cache = JsonCache(cache_dir / "verdicts" if cache_dir else None)
+
+    @property
+    def offline(self) -> bool:
+        return self.trajectory_source is None
+
+    async def _trajectory(self, case: dict[str, Any]) -> tuple[Trajectory, bool]:
+        """取得案例軌跡；回傳 (軌跡, 是否命中快取)。"""
+        if self.offline:
+            return recorded_trajectory(case), False
+
+        key = f"{self.agent_hash}:{case_input_key(case)}"
+        cached = self.trajectory_cache.get(key)
+        if cached is not None:
+            return cached, True
+        trajectory = await self.trajectory_source(case)
+        self.trajectory_cache.put(key, trajectory)
+        return trajectory, False
+
+    async def _verdict(
+        self, trajectory_key: str, trajectory: Trajectory, rubric: dict[str, Any]
+    ) -> tuple[Verdict, bool]:
+        """取得單一評量表的評審結果；回傳 (結果, 是否命中快取)。"""
+        judge_id = getattr(self.judge, "cache_id", type(self.judge).__name__)
+        key = f"{judge_id}:{trajectory_key}:{rubric_key(rubric)}"
+        cached = self.verdict_cache.get(key)
+        if cached is not None:
+            return cached, True
+        verdict = await self.judge(trajectory, rubric)
+        self.verdict_cache.put(key, verdict)
+        return verdict, False
+
+    async def evaluate_case(self, case: dict[str, Any]) -> CaseResult:
+        """評估單一測試案例 (同一案例的各評量表同時評審)。"""
+        result = CaseResult(eval_id=case["eval_id"])
+        start = time.perf_counter()
+        try:
+            trajectory, result.trajectory_cached = await self._trajectory(case)
+            result.trajectory_seconds = time.perf_counter() - start
+            result.tool_calls = [call["name"] for call in trajectory["tool_uses"]]
+
+            judge_start = time.perf_counter()
+            key = trajectory_hash(trajectory)
+            outcomes = await asyncio.gather(
+                *(self._verdict(key, trajectory, rubric) for rubric in self.rubrics)
+            )
+            result.judge_seconds = time.perf_counter() - judge_start
+
+            for rubric, (verdict, cached) in zip(self.rubrics, outcomes):
+                result.verdicts[rubric["rubric_id"]] = verdict
+                result.verdicts_cached += int(cached)
+            if outcomes:
+                result.score = sum(v["score"] for v, _ in outcomes) / len(outcomes)
+            result.passed = result.score >= self.threshold
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+        result.total_seconds = time.perf_counter() - start
+        return result
+
+    async def run(self, cases: list[dict[str, Any]]) -> EvaluationReport:
+        """以工作者池評估所有案例；結果依原始案例順序排列。"""
+        queue: asyncio.Queue = asyncio.Queue()
+        for index, case in enumerate(cases):
+            queue.put_nowait((index, case))
+        results: list[Optional[CaseResult]] = [None] * len(cases)
+
+        async def worker() -> None:
+            while True:
+                try:
+                    index, case = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                results[index] = await self.evaluate_case(case)
+
+        start = time.perf_counter()
+        workers = min(self.max_workers, len(cases))
+        await asyncio.gather(*(worker() for _ in range(workers)))
+
+        return EvaluationReport(
+            threshold=self.threshold,
+            cases=results,
+            wall_seconds=time.perf_counter() - start,
+            cache_stats={
+                "trajectory_hits": self.trajectory_cache.hits,
+                "trajectory_misses": self.trajectory_cache.misses,
+                "verdict_hits": self.verdict_cache.hits,
+                "verdict_misses": self.verdict_cache.misses,
+            },
+        )
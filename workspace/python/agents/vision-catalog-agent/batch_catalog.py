@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+批次目錄生成：為整個目錄的產品照片產生目錄條目。
+
+- 以感知雜湊將同一產品的近似重複照片分群，每群只分析一張代表圖片
+- 限制同時進行的分析數與每分鐘請求數
+- 目錄條目儲存為成品 (<output>/artifacts/)，進度寫入 <output>/manifest.json；
+  中斷後以相同參數重新執行即可從上次的進度繼續
+
+使用方法：
+    python batch_catalog.py _sample_images --concurrency 4 --rpm 60
+"""
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from vision_catalog_agent.batch import run_batch  # noqa: E402
+from vision_catalog_agent.image_pipeline import image_cache  # noqa: E402
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory', help='產品照片目錄')
+    parser.add_argument('--output', default='_catalog_output', help='成品與清單的輸出目錄')
+    parser.add_argument('--concurrency', type=int, default=4, help='同時進行的分析數上限')
+    parser.add_argument('--rpm', type=float, default=60, help='每分鐘的分析請求上限 (0 表示不限制)')
+    parser.add_argument('--threshold', type=int, default=6, help='視為近似重複的最大漢明距離 (0-63)')
+    parser.add_argument('--dry-run', action='store_true', help='只計算雜湊與分群，不呼叫模型')
+    args = parser.parse_args()
+
+    from google.adk.artifacts import FileArtifactService
+
+    output = Path(args.output)
+    print(f"📂 正在處理 {args.directory} (並行 {args.concurrency}，每分鐘 {args.rpm:g} 次)...")
+    stats = await run_batch(
+        args.directory,
+        FileArtifactService(root_dir=output / 'artifacts'),
+        manifest_path=str(output / 'manifest.json'),
+        concurrency=args.concurrency,
+        requests_per_minute=args.rpm,
+        threshold=args.threshold,
+        dry_run=args.dry_run,
+    )
+    print(json.dumps(stats.snapshot(), ensure_ascii=False, indent=2))
+    print(f"快取：{image_cache.stats()}")
+    if stats.failed:
+        print(f"⚠️ {stats.failed} 個產品分析失敗；重新執行即可重試")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
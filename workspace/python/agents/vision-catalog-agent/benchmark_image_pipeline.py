@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+量測圖片前處理管線對請求大小與延遲的影響。
+
+在暫存目錄中建立一批 12MP (4000x3000) 合成照片 (部分帶有 EXIF 方向標籤)，比較：
+
+- raw: load_image_from_file，直接傳送原始檔案 (原本的行為)
+- cold: load_image_for_model，第一次處理 (EXIF 方向、縮小、WebP)
+- warm: load_image_for_model，由內容雜湊快取命中
+
+請求大小以 base64 編碼後的位元組計算 (與 REST API 的 inline_data 相同)；
+端到端延遲 = 本地準備時間 + 以 --uplink-mbps 估算的上傳時間 (不包含模型推論)。
+
+使用方法：
+    python benchmark_image_pipeline.py --photos 12 --uplink-mbps 20
+"""
+import argparse
+import base64
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from vision_catalog_agent.agent import load_image_for_model, load_image_from_file  # noqa: E402
+from vision_catalog_agent.image_pipeline import image_cache  # noqa: E402
+
+
+def make_photos(directory: Path, count: int) -> list:
+    """建立帶有細節與雜訊的 12MP JPEG 照片 (接近手機照片的檔案大小)。"""
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        base = rng.integers(0, 255, (300, 400, 3), dtype=np.uint8)
+        image = Image.fromarray(base).resize((4000, 3000), Image.Resampling.BICUBIC)
+        noise = rng.normal(0, 6, (3000, 4000, 3))
+        pixels = np.clip(np.asarray(image, dtype=np.float32) + noise, 0, 255).astype(np.uint8)
+        exif = Image.Exif()
+        if i % 3 == 0:
+            exif[0x0112] = 6  # 直拍照片
+        path = directory / f"photo_{i:02d}.jpg"
+        Image.fromarray(pixels).save(path, format='JPEG', quality=92, exif=exif.tobytes())
+        paths.append(str(path))
+    return paths
+
+
+def measure(paths: list, load) -> tuple:
+    """回傳 (本地準備秒數, base64 請求位元組)。"""
+    start = time.perf_counter()
+    parts = [load(path) for path in paths]
+    elapsed = time.perf_counter() - start
+    payload = sum(len(base64.b64encode(part.inline_data.data)) for part in parts)
+    return elapsed, payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--photos', type=int, default=12)
+    parser.add_argument('--uplink-mbps', type=float, default=20.0, help='估算上傳時間用的上行頻寬')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = Path(workdir)
+        image_cache.cache_dir = workdir / 'cache'
+        image_cache.clear()
+        paths = make_photos(workdir, args.photos)
+        source_mb = sum(os.path.getsize(p) for p in paths) / 1024 / 1024
+        print(f"{args.photos} 張 12MP 照片，共 {source_mb:.1f} MB，上行 {args.uplink_mbps:g} Mbps")
+        print(f"{'模式':<8} {'請求大小 (MB)':>14} {'準備 (秒)':>10} {'上傳估算 (秒)':>14} {'合計 (秒)':>10}")
+
+        for name, load in (('raw', load_image_from_file), ('cold', load_image_for_model),
+                           ('warm', load_image_for_model)):
+            elapsed, payload = measure(paths, load)
+            upload = payload * 8 / (args.uplink_mbps * 1_000_000)
+            print(f"{name:<8} {payload / 1024 / 1024:>14.2f} {elapsed:>10.2f} "
+                  f"{upload:>14.2f} {elapsed + upload:>10.2f}")
+        print(f"快取：{image_cache.stats()}")
+
+
+if __name__ == '__main__':
+    main()
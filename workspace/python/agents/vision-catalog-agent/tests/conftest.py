@@ -0,0 +1,20 @@
+"""
+Pytest 共用 fixtures
+
+將共用的圖片快取指向暫存目錄，避免測試寫入專案中的 _image_cache/。
+"""
+
+import pytest
+
+from vision_catalog_agent.image_pipeline import image_cache
+
+
+@pytest.fixture(autouse=True)
+def isolated_image_cache(tmp_path, monkeypatch):
+    """每個測試使用獨立的圖片快取目錄。"""
+    monkeypatch.setattr(image_cache, 'cache_dir', tmp_path / '_image_cache')
+    monkeypatch.setattr(image_cache, '_sizes', None)
+    monkeypatch.setattr(image_cache, '_keys', {})
+    monkeypatch.setattr(image_cache, 'hits', 0)
+    monkeypatch.setattr(image_cache, 'misses', 0)
+    return image_cache
@@ -0,0 +1,296 @@
+"""
+測試批次目錄生成。
+
+涵蓋感知雜湊、近似重複分群、有限並行與速率限制的分析，
+以及可續傳的清單。視覺模型以假的分析函式取代。
+"""
+
+import asyncio
+import json
+import random
+
+import pytest
+from PIL import Image, ImageDraw, ImageEnhance
+
+from google.adk.artifacts import InMemoryArtifactService
+
+from vision_catalog_agent.batch import (
+    APP_NAME,
+    USER_ID,
+    Manifest,
+    RateLimiter,
+    cluster_hashes,
+    hamming_distance,
+    perceptual_hash,
+    run_batch,
+)
+
+
+def make_product(seed: int, size=(640, 480)) -> Image.Image:
+    """以隨機矩形建立可區分的合成產品照片。"""
+    rng = random.Random(seed)
+    image = Image.new('RGB', size, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x0, y0 = rng.randrange(size[0] - 60), rng.randrange(size[1] - 60)
+        x1, y1 = x0 + rng.randrange(40, 300), y0 + rng.randrange(40, 240)
+        draw.rectangle((x0, y0, x1, y1), fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    return image
+
+
+def variants(image: Image.Image):
+    """同一產品的近似重複照片：縮小、低品質重新壓縮、調亮。"""
+    yield image.resize((320, 240)), 95
+    yield image, 60
+    yield ImageEnhance.Brightness(image).enhance(1.1), 90
+
+
+def make_catalog(directory, products=3):
+    """建立每個產品 1 張原圖 + 3 張近似重複照片的目錄。"""
+    for seed in range(products):
+        image = make_product(seed)
+        image.save(directory / f'p{seed}_original.jpg', format='JPEG', quality=95)
+        for i, (variant, quality) in enumerate(variants(image)):
+            variant.save(directory / f'p{seed}_copy{i}.jpg', format='JPEG', quality=quality)
+
+
+class FakeAnalyzer:
+    """記錄呼叫與最大並行數的假分析函式。"""
+
+    def __init__(self, delay=0.01, fail=()):
+        self.delay = delay
+        self.fail = set(fail)
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, product_id, image_part):
+        self.calls.append(product_id)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if product_id in self.fail:
+                raise RuntimeError('模型暫時無法使用')
+            assert image_part.inline_data.mime_type == 'image/webp'
+            return f"{product_id} 的分析結果"
+        finally:
+            self.in_flight -= 1
+
+
+class TestPerceptualHash:
+    """測試感知雜湊與分群。"""
+
+    def test_near_duplicates_have_close_hashes(self):
+        """測試近似重複的照片雜湊接近，不同產品的雜湊差異大。"""
+        image = make_product(1)
+        original = perceptual_hash(image)
+
+        for variant, _ in variants(image):
+            assert hamming_distance(original, perceptual_hash(variant)) <= 6
+        assert hamming_distance(original, perceptual_hash(make_product(2))) > 12
+
+    def test_banded_clustering_matches_pairwise(self):
+        """測試分段索引的分群結果與兩兩比較的遞移閉包相同。"""
+        rng = random.Random(7)
+        hashes = {}
+        for group in range(30):
+            base = rng.getrandbits(64)
+            for member in range(rng.randrange(1, 4)):
+                flips = rng.sample(range(64), rng.randrange(0, 5))
+                hashes[f'{group:02d}-{member}'] = base ^ sum(1 << bit for bit in flips)
+
+        # 兩兩比較的參考實作
+        groups = [{key} for key in hashes]
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(groups)):
+                for j in range(i + 1, len(groups)):
+                    if any(hamming_distance(hashes[a], hashes[b]) <= 6
+                           for a in groups[i] for b in groups[j]):
+                        groups[i] |= groups.pop(j)
+                        merged = True
+                        break
+                if merged:
+                    break
+        expected = sorted(sorted(group) for group in groups)
+
+        assert cluster_hashes(hashes, threshold=6) == expected
+
+
+class TestRunBatch:
+    """測試批次執行。"""
+
+    @pytest.mark.asyncio
+    async def test_one_analysis_per_product(self, tmp_path):
+        """測試每群只分析一張代表圖片，並儲存列出所有照片的目錄條目。"""
+        make_catalog(tmp_path, products=3)
+        artifacts = InMemoryArtifactService()
+        analyzer = FakeAnalyzer()
+
+        stats = await run_batch(str(tmp_path), artifacts, analyzer=analyzer, requests_per_minute=0)
+        snapshot = stats.snapshot()
+
+        assert snapshot['images'] == 12
+        assert snapshot['clusters'] == 3
+        assert snapshot['duplicates_collapsed'] == 9
+        assert snapshot['analyzed'] == 3
+        assert len(analyzer.calls) == 3
+
+        filenames = await artifacts.list_artifact_keys(
+            app_name=APP_NAME, user_id=USER_ID, session_id='catalog-batch'
+        )
+        assert sorted(filenames) == sorted(f'{product_id}_catalog.md' for product_id in analyzer.calls)
+        entry = await artifacts.load_artifact(
+            app_name=APP_NAME, user_id=USER_ID, session_id='catalog-batch', filename=filenames[0]
+        )
+        assert '的分析結果' in entry.text
+        assert '## 圖片' in entry.text
+        assert entry.text.count('.jpg') == 4
+
+    @pytest.mark.asyncio
+    async def test_largest_source_is_representative(self, tmp_path):
+        """測試原始檔案最大的照片作為代表圖片。"""
+        make_catalog(tmp_path, products=1)
+
+        await run_batch(str(tmp_path), InMemoryArtifactService(), analyzer=FakeAnalyzer(),
+                        requests_per_minute=0)
+        manifest = json.loads((tmp_path / '_catalog_manifest.json').read_text(encoding='utf-8'))
+        product = next(iter(manifest['products'].values()))
+
+        largest = max(tmp_path.glob('*.jpg'), key=lambda path: path.stat().st_size)
+        assert product['representative'] == largest.name
+        assert product['status'] == 'done'
+
+    @pytest.mark.asyncio
+    async def test_concurrency_cap(self, tmp_path):
+        """測試同時進行的分析數不超過上限。"""
+        for seed in range(8):
+            make_product(seed).save(tmp_path / f'p{seed}.jpg', format='JPEG')
+        analyzer = FakeAnalyzer(delay=0.05)
+
+        stats = await run_batch(str(tmp_path), InMemoryArtifactService(), analyzer=analyzer,
+                                concurrency=2, requests_per_minute=0)
+
+        assert stats.analyzed == 8
+        assert analyzer.max_in_flight == 2
+
+    @pytest.mark.asyncio
+    async def test_resume_skips_done_and_retries_failures(self, tmp_path, isolated_image_cache):
+        """測試重新執行時不重新計算雜湊、略過已完成的產品並重試失敗的產品。"""
+        make_catalog(tmp_path, products=3)
+        first = FakeAnalyzer()
+        probe = await run_batch(str(tmp_path), InMemoryArtifactService(), dry_run=True)
+        assert probe.hashed == 12 and probe.analyzed == 0
+
+        # 第一次執行：一個產品失敗
+        manifest = json.loads((tmp_path / '_catalog_manifest.json').read_text(encoding='utf-8'))
+        failing = 'product-' + manifest['images']['p1_original.jpg']['phash']
+        first.fail = {failing}
+        stats = await run_batch(str(tmp_path), InMemoryArtifactService(), analyzer=first,
+                                requests_per_minute=0)
+        assert stats.hash_reused == 12
+        assert stats.failed == 1 and stats.analyzed == 2
+
+        # 第二次執行：只重試失敗的產品
+        second = FakeAnalyzer()
+        resumed = await run_batch(str(tmp_path), InMemoryArtifactService(), analyzer=second,
+                                  requests_per_minute=0)
+
+        assert resumed.hashed == 0
+        assert resumed.skipped == stats.analyzed
+        assert len(second.calls) == stats.failed
+        manifest = json.loads((tmp_path / '_catalog_manifest.json').read_text(encoding='utf-8'))
+        assert all(product['status'] == 'done' for product in manifest['products'].values())
+
+    @pytest.mark.asyncio
+    async def test_changed_image_is_rehashed(self, tmp_path):
+        """測試修改過的圖片重新計算雜湊，刪除的圖片自清單移除。"""
+        make_catalog(tmp_path, products=1)
+        await run_batch(str(tmp_path), InMemoryArtifactService(), dry_run=True)
+
+        make_product(5).save(tmp_path / 'p0_copy0.jpg', format='JPEG')
+        (tmp_path / 'p0_copy1.jpg').unlink()
+        stats = await run_batch(str(tmp_path), InMemoryArtifactService(), dry_run=True)
+        manifest = json.loads((tmp_path / '_catalog_manifest.json').read_text(encoding='utf-8'))
+
+        assert stats.hashed == 1
+        assert stats.hash_reused == 2
+        assert stats.clusters == 2
+        assert 'p0_copy1.jpg' not in manifest['images']
+
+
+    @pytest.mark.asyncio
+    async def test_manifest_write_failure_does_not_abort_batch(self, tmp_path, monkeypatch):
+        """測試寫入清單失敗時其他產品繼續分析，批次結束時寫入完整的清單。"""
+        for seed in range(6):
+            make_product(seed).save(tmp_path / f'p{seed}.jpg', format='JPEG')
+        original_write = Manifest.write
+        failures = []
+
+        def flaky_write(self, generation, text):
+            # 分析階段的前兩次寫入失敗
+            if json.loads(text)['products'] and len(failures) < 2:
+                failures.append(generation)
+                raise OSError('磁碟已滿')
+            original_write(self, generation, text)
+
+        monkeypatch.setattr(Manifest, 'write', flaky_write)
+        stats = await run_batch(str(tmp_path), InMemoryArtifactService(), analyzer=FakeAnalyzer(),
+                                concurrency=3, requests_per_minute=0)
+
+        assert stats.analyzed == 6
+        assert stats.manifest_errors == 2
+        manifest = json.loads((tmp_path / '_catalog_manifest.json').read_text(encoding='utf-8'))
+        assert len(manifest['products']) == 6
+
+
+class TestManifest:
+
+    def test_snapshot_is_independent_of_later_mutations(self, tmp_path):
+        """測試快照在呼叫時序列化，之後的修改不影響寫入內容。"""
+        manifest = Manifest(tmp_path / 'manifest.json')
+        manifest.products['a'] = {'status': 'done'}
+        snapshot = manifest.snapshot()
+        manifest.products['b'] = {'status': 'done'}
+
+        manifest.write(*snapshot)
+
+        saved = json.loads((tmp_path / 'manifest.json').read_text(encoding='utf-8'))
+        assert list(saved['products']) == ['a']
+
+    def test_stale_snapshot_is_not_written(self, tmp_path):
+        """測試較舊的快照晚於較新的快照完成時不會覆蓋清單。"""
+        manifest = Manifest(tmp_path / 'manifest.json')
+        manifest.products['a'] = {'status': 'done'}
+        older = manifest.snapshot()
+        manifest.products['b'] = {'status': 'done'}
+        newer = manifest.snapshot()
+
+        manifest.write(*newer)
+        manifest.write(*older)
+
+        saved = json.loads((tmp_path / 'manifest.json').read_text(encoding='utf-8'))
+        assert sorted(saved['products']) == ['a', 'b']
+
+
+class TestRateLimiter:
+    """測試權杖桶速率限制器。"""
+
+    @pytest.mark.asyncio
+    async def test_spacing_with_fake_clock(self):
+        """測試每分鐘 60 次時，超過突發量的請求每次等待約 1 秒。"""
+        now = [0.0]
+        sleeps = []
+
+        async def fake_sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        limiter = RateLimiter(60, burst=2, clock=lambda: now[0], sleep=fake_sleep)
+        for _ in range(5):
+            await limiter.acquire()
+
+        assert len(sleeps) == 3
+        assert sum(sleeps) == pytest.approx(3.0)
@@ -0,0 +1,204 @@
+"""
+測試圖片前處理管線與內容雜湊快取。
+
+涵蓋 EXIF 方向、縮小、重新編碼、快取命中 / 淘汰，
+以及分析與比較工具是否傳送正規化後的圖片。
+"""
+
+import io
+import shutil
+import threading
+
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+
+from PIL import Image
+
+from vision_catalog_agent import image_pipeline
+from vision_catalog_agent.agent import (
+    analyze_product_image,
+    compare_product_images,
+    load_image_for_model,
+)
+from vision_catalog_agent.image_pipeline import ImageCache, RenditionSpec, normalize_image
+
+
+def make_photo(path, size=(3000, 2000), orientation=None, color=(120, 80, 40)):
+    """建立測試照片；可選擇寫入 EXIF 方向標籤。"""
+    image = Image.new('RGB', size, color)
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    image.save(path, format='JPEG', quality=90, exif=exif.tobytes())
+    return str(path)
+
+
+class TestNormalizeImage:
+    """測試單張圖片的正規化。"""
+
+    def test_downscale_and_webp(self, tmp_path):
+        """測試大圖縮小到最大尺寸並編碼為 WebP。"""
+        photo = make_photo(tmp_path / 'large.jpg')
+        data, size = normalize_image(open(photo, 'rb').read(), RenditionSpec(max_dimension=1024))
+
+        assert size == (1024, 683)
+        with Image.open(io.BytesIO(data)) as image:
+            assert image.format == 'WEBP'
+
+    def test_exif_orientation_applied(self, tmp_path):
+        """測試 EXIF 方向 6 (順時針 90 度) 的照片被旋轉為直式。"""
+        photo = make_photo(tmp_path / 'rotated.jpg', size=(400, 200), orientation=6)
+        _, size = normalize_image(open(photo, 'rb').read(), RenditionSpec())
+
+        assert size == (200, 400)
+
+    def test_transparent_png_flattened(self, tmp_path):
+        """測試透明 PNG 合成到白色背景並輸出 JPEG。"""
+        buffer = io.BytesIO()
+        Image.new('RGBA', (50, 50), (0, 0, 0, 0)).save(buffer, format='PNG')
+        data, _ = normalize_image(buffer.getvalue(), RenditionSpec(format='JPEG'))
+
+        with Image.open(io.BytesIO(data)) as image:
+            assert image.mode == 'RGB'
+            assert image.getpixel((0, 0)) == (255, 255, 255)
+
+    def test_invalid_format(self):
+        """測試不支援的輸出格式。"""
+        with pytest.raises(ValueError):
+            RenditionSpec(format='GIF')
+
+
+class TestImageCache:
+    """測試內容雜湊快取。"""
+
+    def test_second_request_hits_cache(self, tmp_path, monkeypatch):
+        """測試第二次取得同一張圖片時由快取命中，不重新解碼。"""
+        cache = ImageCache(tmp_path / 'cache')
+        photo = make_photo(tmp_path / 'photo.jpg')
+        first = cache.get_rendition(photo)
+
+        monkeypatch.setattr(image_pipeline, 'normalize_image', MagicMock(side_effect=AssertionError))
+        second = cache.get_rendition(photo)
+
+        assert not first.from_cache
+        assert second.from_cache
+        assert second.data == first.data
+        assert (second.width, second.height) == (first.width, first.height)
+        assert cache.stats()['hits'] == 1
+
+    def test_same_content_different_path(self, tmp_path):
+        """測試內容相同但路徑不同的圖片共用同一個快取結果。"""
+        cache = ImageCache(tmp_path / 'cache')
+        photo = make_photo(tmp_path / 'a.jpg')
+        copy = shutil.copy(photo, tmp_path / 'b.jpg')
+
+        first = cache.get_rendition(photo)
+        second = cache.get_rendition(str(copy))
+
+        assert second.key == first.key
+        assert second.from_cache
+
+    def test_spec_is_part_of_key(self, tmp_path):
+        """測試轉換參數不同時不會誤用舊的快取結果。"""
+        photo = make_photo(tmp_path / 'photo.jpg')
+        webp = ImageCache(tmp_path / 'cache').get_rendition(photo)
+        jpeg = ImageCache(tmp_path / 'cache', spec=RenditionSpec(format='JPEG')).get_rendition(photo)
+
+        assert webp.key != jpeg.key
+        assert jpeg.mime_type == 'image/jpeg'
+        assert not jpeg.from_cache
+
+    def test_size_based_eviction(self, tmp_path):
+        """測試超過容量上限時淘汰最久未使用的結果，並保留最新寫入的結果。"""
+        probe = ImageCache(tmp_path / 'probe')
+        entry_size = len(probe.get_rendition(make_photo(tmp_path / 'probe.jpg', color=(1, 2, 3))).data)
+        cache = ImageCache(tmp_path / 'cache', max_bytes=int(entry_size * 2.5))
+
+        photos = [make_photo(tmp_path / f'p{i}.jpg', color=(40 * i, 90, 200)) for i in range(4)]
+        for photo in photos:
+            cache.get_rendition(photo)
+        stats = cache.stats()
+
+        assert stats['entries'] == 2
+        assert stats['bytes'] <= cache.max_bytes
+        assert cache.get_rendition(photos[-1]).from_cache
+        assert not cache.get_rendition(photos[0]).from_cache
+
+    def test_missing_and_unsupported_files(self, tmp_path):
+        """測試不存在或不支援的檔案。"""
+        cache = ImageCache(tmp_path / 'cache')
+        unsupported = tmp_path / 'notes.txt'
+        unsupported.write_text('x')
+
+        with pytest.raises(FileNotFoundError):
+            cache.get_rendition(str(tmp_path / 'missing.jpg'))
+        with pytest.raises(ValueError):
+            cache.get_rendition(str(unsupported))
+
+    def test_undecodable_image_falls_back_to_original(self, tmp_path, isolated_image_cache):
+        """測試 Pillow 無法解碼的圖片 (例如沒有 pillow-heif 的 HEIC) 直接傳送原始檔案。"""
+        photo = tmp_path / 'photo.heic'
+        photo.write_bytes(b'\x00\x00\x00\x18ftypheic' + bytes(64))
+
+        part = load_image_for_model(str(photo))
+
+        assert part.inline_data.mime_type == 'image/heic'
+        assert part.inline_data.data == photo.read_bytes()
+        assert isolated_image_cache.stats()['misses'] == 0
+
+
+class TestToolsUseRenditions:
+    """測試分析與比較工具傳送正規化後的圖片。"""
+
+    @staticmethod
+    def mock_context():
+        context = MagicMock()
+        result = MagicMock()
+        result.content.parts = [MagicMock(text="分析結果")]
+        context.run_agent = AsyncMock(return_value=result)
+        return context
+
+    @pytest.mark.asyncio
+    async def test_analyze_sends_downscaled_webp(self, tmp_path, isolated_image_cache):
+        """測試 analyze_product_image 傳送縮小後的 WebP，而不是原始檔案。"""
+        photo = make_photo(tmp_path / 'photo.jpg')
+        context = self.mock_context()
+
+        result = await analyze_product_image('PROD-001', photo, context)
+        image_part = context.run_agent.call_args_list[0].args[1][1]
+
+        assert result['status'] == 'success'
+        assert image_part.inline_data.mime_type == 'image/webp'
+        assert len(image_part.inline_data.data) < len(open(photo, 'rb').read())
+        assert isolated_image_cache.stats()['misses'] == 1
+
+    @pytest.mark.asyncio
+    async def test_compare_reuses_cached_renditions(self, tmp_path, isolated_image_cache):
+        """測試重複比較同一組圖片時使用快取的結果。"""
+        photos = [make_photo(tmp_path / f'p{i}.jpg', color=(10 * i, 0, 0)) for i in range(2)]
+        context = self.mock_context()
+
+        await compare_product_images(photos, context)
+        await compare_product_images(photos, context)
+        stats = isolated_image_cache.stats()
+
+        assert stats['misses'] == 2
+        assert stats['hits'] == 2
+
+    @pytest.mark.asyncio
+    async def test_images_load_off_the_event_loop(self, tmp_path, isolated_image_cache, monkeypatch):
+        """測試分析與比較工具在執行緒中載入圖片，不阻塞事件迴圈。"""
+        photos = [make_photo(tmp_path / f'p{i}.jpg', size=(200, 100)) for i in range(2)]
+        context = self.mock_context()
+        threads = []
+
+        def record(path):
+            threads.append(threading.get_ident())
+            return load_image_for_model(path)
+
+        monkeypatch.setattr('vision_catalog_agent.agent.load_image_for_model', record)
+        await analyze_product_image('PROD-001', photos[0], context)
+        await compare_product_images(photos, context)
+
+        assert len(threads) == 3
+        assert threading.get_ident() not in threads
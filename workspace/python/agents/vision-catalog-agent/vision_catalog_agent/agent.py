@@ -1,9 +1,9 @@
 """
 視覺目錄代理 - 教學 21：多模態與影像處理
 """
-import io
+import asyncio
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from pathlib import Path
 
 from google.adk.agents import Agent
@@ -16,6 +16,8 @@ try:
 except ImportError:
     Image = None
 
+from .image_pipeline import RenditionSpec, image_cache, mime_type_for, normalize_image
+
 
 # ============================================================================
 # 圖片工具程式
@@ -39,24 +41,11 @@ def load_image_from_file(path: str) -> types.Part:
     if not os.path.exists(path):
         raise FileNotFoundError(f"找不到圖片檔案：{path}")
 
+    mime_type = mime_type_for(path)
+
     with open(path, 'rb') as f:
         image_bytes = f.read()
 
-    # 從副檔名判斷 MIME 類型
-    extension = path.lower().split('.')[-1]
-    mime_types = {
-        'png': 'image/png',
-        'jpg': 'image/jpeg',
-        'jpeg': 'image/jpeg',
-        'webp': 'image/webp',
-        'heic': 'image/heic',
-        'heif': 'image/heif',
-    }
-
-    mime_type = mime_types.get(extension)
-    if not mime_type:
-        raise ValueError(f"不支援的圖片格式：{extension}")
-
     return types.Part(
         inline_data=types.Blob(
             data=image_bytes,
@@ -79,27 +68,41 @@ def optimize_image(image_bytes: bytes, max_size_kb: int = 500) -> bytes:
     if Image is None:
         return image_bytes
 
-    image = Image.open(io.BytesIO(image_bytes))
+    # 與分析工具相同的正規化流程 (EXIF 方向、縮小、轉為 RGB)，輸出 JPEG
+    optimized, _ = normalize_image(
+        image_bytes, RenditionSpec(max_dimension=1024, format='JPEG', quality=85)
+    )
+    return optimized
 
-    # 如果太大則調整大小
-    max_dimension = 1024
-    if max(image.size) > max_dimension:
-        image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
 
-    # 如有必要，轉換為 RGB
-    if image.mode in ('RGBA', 'P'):
-        background = Image.new('RGB', image.size, (255, 255, 255))
-        if image.mode == 'RGBA':
-            background.paste(image, mask=image.split()[3])
-        else:
-            background.paste(image)
-        image = background
+def load_image_for_model(path: str) -> types.Part:
+    """
+    載入要傳送給模型的圖片：經過正規化並由內容雜湊快取。
 
-    # 以壓縮方式儲存
-    output = io.BytesIO()
-    image.save(output, format='JPEG', quality=85, optimize=True)
+    每張圖片只會依 EXIF 方向旋轉、縮小並重新編碼一次；
+    之後的分析或比較直接使用快取的結果。Pillow 無法解碼的圖片
+    (例如未安裝 pillow-heif 時的 HEIC) 改為直接傳送原始檔案。
 
-    return output.getvalue()
+    Args:
+        path: 圖片檔案的路徑
+
+    Returns:
+        包含正規化圖片資料的 types.Part
+
+    Raises:
+        FileNotFoundError: 如果檔案不存在
+        ValueError: 如果是不支援的格式
+    """
+    if Image is None:
+        return load_image_from_file(path)
+    try:
+        rendition = image_cache.get_rendition(path)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        # Pillow 的解碼錯誤 (UnidentifiedImageError 等) 皆為 OSError
+        return load_image_from_file(path)
+    return rendition.to_part()
 
 
 def create_sample_image(path: str, color: tuple = (73, 109, 137)) -> str:
@@ -157,26 +160,19 @@ vision_analyzer = Agent(
 )
 
 
-# 用於生成目錄條目的工具
-async def generate_catalog_entry(
-    product_name: str,
-    analysis: str,
-    tool_context: ToolContext
-) -> Dict[str, Any]:
+def build_catalog_entry(product_name: str, analysis: str, images: Optional[List[str]] = None) -> str:
     """
-    生成並儲存一份可用於行銷的目錄條目。
+    建立 markdown 格式的目錄條目內容。
 
     Args:
         product_name: 產品的名稱/ID
         analysis: 視覺分析結果
-        tool_context: 用於成品管理的上下文
+        images: (可選) 此產品的所有圖片 (批次模式中近似重複的照片)
 
     Returns:
-        包含狀態、報告和成品版本的字典
+        目錄條目的 markdown 文字
     """
-    try:
-        # 生成目錄條目內容
-        entry = f"""
+    entry = f"""
         # {product_name}
 
         ## 描述
@@ -198,6 +194,31 @@ async def generate_catalog_entry(
 
         *目錄條目由 AI 視覺分析生成*
         """.strip()
+    if images:
+        listing = "\n".join(f"- {image}" for image in images)
+        entry += f"\n\n## 圖片\n\n{listing}"
+    return entry
+
+
+# 用於生成目錄條目的工具
+async def generate_catalog_entry(
+    product_name: str,
+    analysis: str,
+    tool_context: ToolContext
+) -> Dict[str, Any]:
+    """
+    生成並儲存一份可用於行銷的目錄條目。
+
+    Args:
+        product_name: 產品的名稱/ID
+        analysis: 視覺分析結果
+        tool_context: 用於成品管理的上下文
+
+    Returns:
+        包含狀態、報告和成品版本的字典
+    """
+    try:
+        entry = build_catalog_entry(product_name, analysis)
         # 儲存為成品
         part = types.Part.from_text(text=entry)
         version = await tool_context.save_artifact(
@@ -273,7 +294,8 @@ async def analyze_product_image(
                 'error': '找不到檔案'
             }
 
-        image_part = load_image_from_file(image_path)
+        # 解碼與重新編碼在執行緒中進行，不阻塞事件迴圈
+        image_part = await asyncio.to_thread(load_image_for_model, image_path)
 
         # 步驟 1：視覺分析
         analysis_query = [
@@ -362,7 +384,7 @@ async def compare_product_images(
                 }
 
             query_parts.append(types.Part.from_text(text=f"\n圖片 {i}："))
-            query_parts.append(load_image_from_file(path))
+            query_parts.append(await asyncio.to_thread(load_image_for_model, path))
 
         query_parts.append(types.Part.from_text(text="\n提供結構化的比較。"))
 
@@ -0,0 +1,523 @@
+"""
+批次目錄生成 - 感知雜湊去重、有限並行與可續傳的清單
+
+流程：
+1. 走訪目錄中的所有圖片，計算感知雜湊 (pHash)
+2. 以漢明距離將近似重複的照片 (同一產品的連拍、裁切、重新壓縮) 分群
+3. 每群只以 vision_analyzer 分析一張代表圖片 (限制並行數與每分鐘請求數)
+4. 將目錄條目儲存為成品 (artifact)
+
+進度寫入 manifest.json；中斷後重新執行時，未變更的圖片不重新計算雜湊，
+已完成的產品也不會重新分析。
+"""
+import asyncio
+import io
+import json
+import math
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from google.genai import types
+
+from .agent import build_catalog_entry, vision_analyzer
+from .image_pipeline import MIME_TYPES, ImageCache, image_cache
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+MANIFEST_VERSION = 1
+APP_NAME = 'vision_catalog_batch'
+USER_ID = 'catalog_batch'
+
+# 分析函式：(產品 ID, 圖片) → 視覺分析文字
+Analyzer = Callable[[str, types.Part], Awaitable[str]]
+
+
+# ============================================================================
+# 感知雜湊與分群
+# ============================================================================
+
+
+_HASH_SIZE = 32
+_LOW_FREQUENCIES = 8
+# DCT-II 係數表：只計算左上角 8x8 的低頻分量
+_DCT = [
+    [math.cos(math.pi * (2 * x + 1) * u / (2 * _HASH_SIZE)) for x in range(_HASH_SIZE)]
+    for u in range(_LOW_FREQUENCIES)
+]
+
+
+def perceptual_hash(image: 'Image.Image') -> int:
+    """
+    計算 64 位元的感知雜湊 (pHash)。
+
+    縮小為 32x32 灰階後取 DCT 的 8x8 低頻分量，與中位數比較得到位元。
+    重新壓縮、縮放或輕微調整亮度的照片會得到相同或非常接近的雜湊。
+
+    Args:
+        image: PIL 圖片
+
+    Returns:
+        64 位元整數
+    """
+    gray = image.convert('L').resize((_HASH_SIZE, _HASH_SIZE), Image.Resampling.LANCZOS)
+    pixels = gray.tobytes()
+    rows = [pixels[y * _HASH_SIZE:(y + 1) * _HASH_SIZE] for y in range(_HASH_SIZE)]
+
+    # 可分離的二維 DCT：先對每一列，再對每一行
+    row_coefficients = [
+        [sum(c * p for c, p in zip(_DCT[u], row)) for u in range(_LOW_FREQUENCIES)]
+        for row in rows
+    ]
+    coefficients = [
+        sum(_DCT[v][y] * row_coefficients[y][u] for y in range(_HASH_SIZE))
+        for v in range(_LOW_FREQUENCIES)
+        for u in range(_LOW_FREQUENCIES)
+    ]
+
+    # 排除直流分量 (整體亮度) 計算中位數
+    median = statistics.median(coefficients[1:])
+    value = 0
+    for coefficient in coefficients:
+        value = (value << 1) | (coefficient > median)
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """兩個雜湊之間不同的位元數。"""
+    return bin(a ^ b).count('1')
+
+
+def cluster_hashes(hashes: Dict[str, int], threshold: int = 6) -> List[List[str]]:
+    """
+    將漢明距離不超過 threshold 的雜湊分為同一群 (遞移閉包)。
+
+    將 64 位元切成 threshold + 1 段：距離不超過 threshold 的兩個雜湊
+    至少有一段完全相同 (鴿籠原理)，因此只需要比較共用某一段的候選，
+    不需要兩兩比較所有圖片。
+
+    Args:
+        hashes: 圖片鍵 → 雜湊
+        threshold: 視為近似重複的最大漢明距離
+
+    Returns:
+        分群結果；每群依鍵排序，群之間依第一個鍵排序
+    """
+    keys = sorted(hashes)
+    parent = {key: key for key in keys}
+
+    def find(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    bands = threshold + 1
+    width = math.ceil(64 / bands)
+    buckets: Dict[tuple, List[str]] = {}
+    for key in keys:
+        value = hashes[key]
+        for band in range(bands):
+            segment = (value >> (band * width)) & ((1 << width) - 1)
+            buckets.setdefault((band, segment), []).append(key)
+
+    for members in buckets.values():
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                root_a, root_b = find(a), find(b)
+                if root_a != root_b and hamming_distance(hashes[a], hashes[b]) <= threshold:
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    groups: Dict[str, List[str]] = {}
+    for key in keys:
+        groups.setdefault(find(key), []).append(key)
+    return sorted(groups.values(), key=lambda group: group[0])
+
+
+# ============================================================================
+# 速率限制與統計
+# ============================================================================
+
+
+class RateLimiter:
+    """
+    權杖桶 (token bucket) 速率限制器。
+
+    Example:
+        limiter = RateLimiter(requests_per_minute=60)
+        await limiter.acquire()
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        burst: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep
+    ):
+        """
+        初始化速率限制器。
+
+        Args:
+            requests_per_minute: 每分鐘允許的請求數 (0 表示不限制)
+            burst: 可累積的最大權杖數
+            clock / sleep: (可選) 時間函式，主要用於測試
+        """
+        self.rate = requests_per_minute / 60.0
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """等待直到取得一個權杖。"""
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = self._clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await self._sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class BatchStats:
+    """批次執行的吞吐量統計。"""
+    images: int = 0
+    hashed: int = 0
+    hash_reused: int = 0
+    unreadable: int = 0
+    clusters: int = 0
+    duplicates: int = 0
+    analyzed: int = 0
+    failed: int = 0
+    skipped: int = 0
+    manifest_errors: int = 0
+    hash_seconds: float = 0.0
+    elapsed_seconds: float = 0.0
+    analysis_seconds: List[float] = field(default_factory=list)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """統計摘要 (含每秒處理的圖片 / 產品數與分析延遲百分位數)。"""
+        latencies = sorted(self.analysis_seconds)
+
+        def percentile(q):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 3)
+
+        elapsed = self.elapsed_seconds or 0.0
+        return {
+            'images': self.images,
+            'hashed': self.hashed,
+            'hash_reused': self.hash_reused,
+            'unreadable': self.unreadable,
+            'clusters': self.clusters,
+            'duplicates_collapsed': self.duplicates,
+            'analyzed': self.analyzed,
+            'failed': self.failed,
+            'skipped_done': self.skipped,
+            'manifest_errors': self.manifest_errors,
+            'hash_seconds': round(self.hash_seconds, 3),
+            'elapsed_seconds': round(elapsed, 3),
+            'images_per_second': round(self.images / elapsed, 2) if elapsed else 0.0,
+            'products_per_second': round(self.analyzed / elapsed, 2) if elapsed else 0.0,
+            'analysis_p50_seconds': percentile(0.5),
+            'analysis_p95_seconds': percentile(0.95),
+        }
+
+
+# ============================================================================
+# 清單 (manifest)
+# ============================================================================
+
+
+class Manifest:
+    """
+    可續傳的批次進度清單。
+
+    格式：
+        {
+          "version": 1,
+          "images": {相對路徑: {"size", "mtime_ns", "phash"}},
+          "products": {產品 ID: {"status", "representative", "members",
+                                 "filename", "version", "error"}}
+        }
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.images: Dict[str, Dict[str, Any]] = {}
+        self.products: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._written = 0
+        if self.path.exists():
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+            if data.get('version') == MANIFEST_VERSION:
+                self.images = data.get('images', {})
+                self.products = data.get('products', {})
+
+    def cached_hash(self, key: str, stat: os.stat_result) -> Optional[int]:
+        """檔案大小與修改時間都未變更時回傳先前計算的雜湊。"""
+        entry = self.images.get(key)
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return int(entry['phash'], 16)
+        return None
+
+    def is_done(self, product_id: str, members: List[str]) -> bool:
+        entry = self.products.get(product_id)
+        return bool(entry) and entry['status'] == 'done' and entry['members'] == members
+
+    def snapshot(self) -> Tuple[int, str]:
+        """
+        在呼叫端執行緒序列化目前內容，回傳 (世代編號, JSON 文字)。
+
+        必須在修改 images / products 的同一執行緒 (事件迴圈) 呼叫，
+        寫入檔案的部分才能安全地交給 `write` 在背景執行緒執行。
+        """
+        self._generation += 1
+        data = {
+            'version': MANIFEST_VERSION,
+            'images': self.images,
+            'products': self.products,
+        }
+        return self._generation, json.dumps(data, ensure_ascii=False, indent=2)
+
+    def write(self, generation: int, text: str) -> None:
+        """以暫存檔 + 取代的方式寫入快照；比已寫入版本舊的快照會被略過。"""
+        with self._lock:
+            if generation <= self._written:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temporary = self.path.with_suffix('.json.tmp')
+            temporary.write_text(text, encoding='utf-8')
+            os.replace(temporary, self.path)
+            self._written = generation
+
+    def save(self) -> None:
+        """同步序列化並寫入，中斷時不會留下損壞的清單。"""
+        self.write(*self.snapshot())
+
+
+# ============================================================================
+# 批次執行
+# ============================================================================
+
+
+class VisionAgentAnalyzer:
+    """
+    以 ADK Runner 執行 vision_analyzer 的分析函式。
+
+    整個批次共用一個 Runner；每個產品使用獨立的工作階段並在完成後刪除。
+    """
+
+    def __init__(self, agent=vision_analyzer):
+        from google.adk.runners import Runner
+        from google.adk.sessions import InMemorySessionService
+
+        self.session_service = InMemorySessionService()
+        self.runner = Runner(app_name=APP_NAME, agent=agent, session_service=self.session_service)
+
+    async def __call__(self, product_id: str, image_part: types.Part) -> str:
+        session = await self.session_service.create_session(app_name=APP_NAME, user_id=USER_ID)
+        message = types.Content(
+            role='user',
+            parts=[types.Part.from_text(text=f"分析此產品圖片，產品為 {product_id}："), image_part]
+        )
+        try:
+            text = ''
+            async for event in self.runner.run_async(
+                user_id=USER_ID, session_id=session.id, new_message=message
+            ):
+                if event.is_final_response() and event.content and event.content.parts:
+                    text = ''.join(part.text or '' for part in event.content.parts)
+            return text
+        finally:
+            await self.session_service.delete_session(
+                app_name=APP_NAME, user_id=USER_ID, session_id=session.id
+            )
+
+
+def find_images(directory: Path) -> List[Path]:
+    """遞迴尋找目錄中支援格式的圖片 (略過以 _ 或 . 開頭的目錄)。"""
+    images = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith(('_', '.')))
+        for name in sorted(files):
+            if name.rsplit('.', 1)[-1].lower() in MIME_TYPES:
+                images.append(Path(root) / name)
+    return images
+
+
+def _product_id(phash: int) -> str:
+    return f"product-{phash:016x}"
+
+
+async def run_batch(
+    directory: str,
+    artifact_service,
+    manifest_path: Optional[str] = None,
+    analyzer: Optional[Analyzer] = None,
+    cache: Optional[ImageCache] = None,
+    concurrency: int = 4,
+    requests_per_minute: float = 60,
+    threshold: int = 6,
+    hash_workers: Optional[int] = None,
+    session_id: str = 'catalog-batch',
+    rate_limiter: Optional[RateLimiter] = None,
+    dry_run: bool = False
+) -> BatchStats:
+    """
+    為目錄中的所有產品照片產生目錄條目。
+
+    Args:
+        directory: 圖片目錄
+        artifact_service: ADK 成品服務 (例如 FileArtifactService)
+        manifest_path: 清單路徑 (預設為 directory/_catalog_manifest.json)
+        analyzer: 分析函式 (預設以 vision_analyzer 分析)
+        cache: 圖片快取 (預設為共用的 image_cache)
+        concurrency: 同時進行的分析數上限
+        requests_per_minute: 每分鐘的分析請求上限 (0 表示不限制)
+        threshold: 視為近似重複的最大漢明距離
+        hash_workers: 計算雜湊的執行緒數 (預設為 CPU 數)
+        session_id: 儲存成品時使用的工作階段 ID
+        rate_limiter: (可選) 自訂速率限制器
+        dry_run: 只計算雜湊與分群，不呼叫模型
+
+    Returns:
+        批次統計
+    """
+    if Image is None:
+        raise ImportError("批次模式需要 PIL/Pillow")
+
+    started = time.perf_counter()
+    root = Path(directory)
+    manifest = Manifest(Path(manifest_path) if manifest_path else root / '_catalog_manifest.json')
+    cache = cache or image_cache
+    stats = BatchStats()
+
+    # 步驟 1：計算感知雜湊 (使用正規化後的圖片，同時預熱分析要用的快取)
+    paths = {path.relative_to(root).as_posix(): path for path in find_images(root)}
+    stats.images = len(paths)
+    hashes: Dict[str, int] = {}
+    source_sizes: Dict[str, int] = {}
+    pending = []
+    for key, path in paths.items():
+        stat = path.stat()
+        source_sizes[key] = stat.st_size
+        known = manifest.cached_hash(key, stat)
+        if known is not None:
+            hashes[key] = known
+            stats.hash_reused += 1
+        else:
+            pending.append((key, path, stat))
+
+    def compute(path: Path) -> int:
+        rendition = cache.get_rendition(str(path))
+        with Image.open(io.BytesIO(rendition.data)) as image:
+            return perceptual_hash(image)
+
+    hash_started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=hash_workers or os.cpu_count() or 4) as executor:
+        futures = [loop.run_in_executor(executor, compute, path) for _, path, _ in pending]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+    for (key, _, stat), result in zip(pending, results):
+        if isinstance(result, Exception):
+            stats.unreadable += 1
+            continue
+        hashes[key] = result
+        manifest.images[key] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'phash': f"{result:016x}",
+        }
+        stats.hashed += 1
+    stats.hash_seconds = time.perf_counter() - hash_started
+    for key in set(manifest.images) - set(paths):
+        del manifest.images[key]
+    manifest.save()
+
+    # 步驟 2：分群；原始檔案最大 (細節最多) 的照片作為代表
+    clusters = cluster_hashes(hashes, threshold)
+    stats.clusters = len(clusters)
+    stats.duplicates = len(hashes) - len(clusters)
+    if dry_run:
+        stats.elapsed_seconds = time.perf_counter() - started
+        return stats
+
+    # 步驟 3：分析每群的代表圖片並儲存目錄條目
+    analyzer = analyzer or VisionAgentAnalyzer()
+    limiter = rate_limiter or RateLimiter(requests_per_minute)
+    slots = asyncio.Semaphore(max(concurrency, 1))
+
+    async def process(members: List[str]) -> None:
+        representative = max(members, key=lambda key: (source_sizes[key], key))
+        product_id = _product_id(hashes[representative])
+        if manifest.is_done(product_id, members):
+            stats.skipped += 1
+            return
+
+        async with slots:
+            await limiter.acquire()
+            analysis_started = time.perf_counter()
+            try:
+                rendition = await asyncio.to_thread(cache.get_rendition, str(paths[representative]))
+                analysis = await analyzer(product_id, rendition.to_part())
+                if not analysis:
+                    raise ValueError('沒有分析結果')
+                entry = build_catalog_entry(product_id, analysis, images=members)
+                filename = f"{product_id}_catalog.md"
+                version = await artifact_service.save_artifact(
+                    app_name=APP_NAME,
+                    user_id=USER_ID,
+                    session_id=session_id,
+                    filename=filename,
+                    artifact=types.Part.from_text(text=entry),
+                    custom_metadata={'representative': representative, 'members': members},
+                )
+            except Exception as e:
+                stats.failed += 1
+                manifest.products[product_id] = {
+                    'status': 'error',
+                    'representative': representative,
+                    'members': members,
+                    'error': str(e),
+                }
+            else:
+                stats.analyzed += 1
+                stats.analysis_seconds.append(time.perf_counter() - analysis_started)
+                manifest.products[product_id] = {
+                    'status': 'done',
+                    'representative': representative,
+                    'members': members,
+                    'filename': filename,
+                    'version': version,
+                }
+            # 在事件迴圈上序列化，背景執行緒只負責寫檔；寫入失敗不中斷其他產品，
+            # 批次結束時會再寫入一次完整的清單
+            try:
+                await asyncio.to_thread(manifest.write, *manifest.snapshot())
+            except OSError:
+                stats.manifest_errors += 1
+
+    await asyncio.gather(*(process(members) for members in clusters))
+    await asyncio.to_thread(manifest.write, *manifest.snapshot())
+    stats.elapsed_seconds = time.perf_counter() - started
+    return stats
@@ -0,0 +1,344 @@
+"""
+圖片前處理管線 - 以內容雜湊為鍵的磁碟快取
+
+每張圖片只正規化一次：
+1. 依 EXIF 方向旋轉
+2. 縮小到模型適用的最大尺寸
+3. 重新編碼為 WebP (或 JPEG)
+
+結果 (rendition) 以「原始內容 SHA-256 + 轉換參數」為鍵儲存在磁碟上，
+超過容量上限時淘汰最久未使用的檔案。相同內容的圖片即使路徑不同也只處理一次。
+"""
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from google.genai import types
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+
+# 依副檔名判斷的 MIME 類型
+MIME_TYPES = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'webp': 'image/webp',
+    'heic': 'image/heic',
+    'heif': 'image/heif',
+}
+
+# 輸出格式 → (MIME 類型, 副檔名)
+OUTPUT_FORMATS = {
+    'WEBP': ('image/webp', 'webp'),
+    'JPEG': ('image/jpeg', 'jpg'),
+}
+
+DEFAULT_CACHE_DIR = Path(__file__).parent.parent / '_image_cache'
+
+
+def mime_type_for(path: str) -> str:
+    """
+    從副檔名判斷 MIME 類型。
+
+    Raises:
+        ValueError: 如果是不支援的格式
+    """
+    extension = path.lower().split('.')[-1]
+    mime_type = MIME_TYPES.get(extension)
+    if not mime_type:
+        raise ValueError(f"不支援的圖片格式：{extension}")
+    return mime_type
+
+
+@dataclass(frozen=True)
+class RenditionSpec:
+    """
+    轉換參數。
+
+    Attributes:
+        max_dimension: 最長邊的像素上限
+        format: 輸出格式 ('WEBP' 或 'JPEG')
+        quality: 編碼品質 (1-100)
+    """
+    max_dimension: int = 1024
+    format: str = 'WEBP'
+    quality: int = 80
+
+    def __post_init__(self):
+        if self.format not in OUTPUT_FORMATS:
+            raise ValueError(f"不支援的輸出格式：{self.format}")
+
+    @property
+    def mime_type(self) -> str:
+        return OUTPUT_FORMATS[self.format][0]
+
+    @property
+    def tag(self) -> str:
+        """加入快取鍵的參數標籤；參數改變時不會誤用舊的結果。"""
+        return f"{self.max_dimension}-{self.format.lower()}-q{self.quality}"
+
+
+@dataclass
+class Rendition:
+    """
+    正規化後的圖片。
+
+    Attributes:
+        key: 快取鍵 (內容雜湊 + 參數標籤)
+        data: 編碼後的圖片位元組
+        mime_type: MIME 類型
+        width / height: 輸出尺寸
+        source_bytes: 原始檔案大小
+        from_cache: 是否由快取命中
+    """
+    key: str
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    source_bytes: int
+    from_cache: bool = False
+
+    def to_part(self) -> types.Part:
+        """轉換為可傳送給模型的 types.Part。"""
+        return types.Part(
+            inline_data=types.Blob(data=self.data, mime_type=self.mime_type)
+        )
+
+
+def normalize_image(image_bytes: bytes, spec: RenditionSpec) -> Tuple[bytes, Tuple[int, int]]:
+    """
+    正規化圖片：EXIF 方向、縮小、轉為 RGB 並重新編碼。
+
+    Args:
+        image_bytes: 原始圖片位元組
+        spec: 轉換參數
+
+    Returns:
+        (編碼後的位元組, (寬, 高))
+    """
+    if Image is None:
+        raise ImportError("圖片前處理需要 PIL/Pillow")
+
+    image = Image.open(io.BytesIO(image_bytes))
+    # JPEG 可在解碼時以 DCT 縮放直接降低解析度，大幅減少 12MP 照片的解碼時間
+    image.draft('RGB', (spec.max_dimension, spec.max_dimension))
+    image = ImageOps.exif_transpose(image)
+
+    if max(image.size) > spec.max_dimension:
+        image.thumbnail((spec.max_dimension, spec.max_dimension), Image.Resampling.LANCZOS)
+
+    # 將透明背景合成到白色背景
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[3])
+        image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    output = io.BytesIO()
+    if spec.format == 'WEBP':
+        image.save(output, format='WEBP', quality=spec.quality, method=4)
+    else:
+        image.save(output, format='JPEG', quality=spec.quality, optimize=True, progressive=True)
+    return output.getvalue(), image.size
+
+
+class ImageCache:
+    """
+    以內容雜湊為鍵、具有容量上限的磁碟圖片快取。
+
+    Example:
+        cache = ImageCache('/tmp/renditions', max_bytes=64 * 1024 * 1024)
+        part = cache.get_rendition('photo.jpg').to_part()
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path = DEFAULT_CACHE_DIR,
+        max_bytes: int = 256 * 1024 * 1024,
+        spec: Optional[RenditionSpec] = None
+    ):
+        """
+        初始化快取。
+
+        Args:
+            cache_dir: 快取目錄 (不存在時自動建立)
+            max_bytes: 快取的容量上限 (位元組)
+            spec: 轉換參數
+        """
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.spec = spec or RenditionSpec()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # (絕對路徑, 大小, 修改時間) → 快取鍵；避免每次命中都重新讀取並雜湊原始檔案
+        self._keys: Dict[Tuple[str, int, int], Tuple[str, int]] = {}
+        # 快取檔案 → 大小，依最近使用順序排列 (最舊的在前)
+        self._sizes: Optional['OrderedDict[Path, int]'] = None
+
+    @classmethod
+    def from_env(cls) -> 'ImageCache':
+        """
+        從環境變數建立快取 (VISION_IMAGE_CACHE_DIR、VISION_IMAGE_CACHE_MAX_MB、
+        VISION_IMAGE_MAX_DIMENSION、VISION_IMAGE_FORMAT、VISION_IMAGE_QUALITY)。
+        """
+        return cls(
+            cache_dir=Path(os.environ.get('VISION_IMAGE_CACHE_DIR', DEFAULT_CACHE_DIR)),
+            max_bytes=int(float(os.environ.get('VISION_IMAGE_CACHE_MAX_MB', 256)) * 1024 * 1024),
+            spec=RenditionSpec(
+                max_dimension=int(os.environ.get('VISION_IMAGE_MAX_DIMENSION', 1024)),
+                format=os.environ.get('VISION_IMAGE_FORMAT', 'WEBP').upper(),
+                quality=int(os.environ.get('VISION_IMAGE_QUALITY', 80)),
+            ),
+        )
+
+    # ------------------------------------------------------------------
+    # 查詢
+    # ------------------------------------------------------------------
+
+    def _path_for(self, key: str) -> Path:
+        extension = OUTPUT_FORMATS[self.spec.format][1]
+        return self.cache_dir / key[:2] / f"{key}.{extension}"
+
+    def _source_key(self, path: str) -> Tuple[str, int, Optional[bytes]]:
+        """回傳 (快取鍵, 原始大小, 原始位元組)；已知的檔案不重新讀取 (位元組為 None)。"""
+        stat = os.stat(path)
+        identity = (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+        known = self._keys.get(identity)
+        if known is not None:
+            return known[0], known[1], None
+        with open(path, 'rb') as f:
+            data = f.read()
+        key = f"{hashlib.sha256(data).hexdigest()}-{self.spec.tag}"
+        self._keys[identity] = (key, len(data))
+        return key, len(data), data
+
+    def get_rendition(self, path: str) -> Rendition:
+        """
+        取得圖片的正規化結果；快取未命中時處理並寫入快取。
+
+        Args:
+            path: 圖片檔案路徑
+
+        Raises:
+            FileNotFoundError: 如果檔案不存在
+            ValueError: 如果是不支援的格式
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"找不到圖片檔案：{path}")
+        mime_type_for(path)
+
+        key, source_bytes, data = self._source_key(path)
+        target = self._path_for(key)
+        cached = self._read(target)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+            width, height = self._dimensions(cached)
+            return Rendition(key, cached, self.spec.mime_type, width, height, source_bytes, True)
+
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        encoded, (width, height) = normalize_image(data, self.spec)
+        self._write(target, encoded)
+        with self._lock:
+            self.misses += 1
+        return Rendition(key, encoded, self.spec.mime_type, width, height, source_bytes, False)
+
+    @staticmethod
+    def _dimensions(data: bytes) -> Tuple[int, int]:
+        # 只讀取標頭，不解碼像素
+        with Image.open(io.BytesIO(data)) as image:
+            return image.size
+
+    # ------------------------------------------------------------------
+    # 儲存與淘汰
+    # ------------------------------------------------------------------
+
+    def _read(self, target: Path) -> Optional[bytes]:
+        try:
+            data = target.read_bytes()
+        except FileNotFoundError:
+            return None
+        # 更新修改時間，讓重新啟動後仍能依最近使用時間淘汰
+        os.utime(target)
+        with self._lock:
+            sizes = self._load_sizes()
+            sizes[target] = len(data)
+            sizes.move_to_end(target)
+        return data
+
+    def _load_sizes(self) -> 'OrderedDict[Path, int]':
+        if self._sizes is None:
+            files = []
+            if self.cache_dir.exists():
+                for file in self.cache_dir.glob('*/*'):
+                    if file.is_file() and not file.name.endswith('.tmp'):
+                        stat = file.stat()
+                        files.append((stat.st_mtime, file, stat.st_size))
+            self._sizes = OrderedDict((file, size) for _, file, size in sorted(files))
+        return self._sizes
+
+    def _write(self, target: Path, data: bytes) -> None:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temporary = target.with_name(f"{target.name}.{threading.get_ident()}.tmp")
+        temporary.write_bytes(data)
+        os.replace(temporary, target)
+        with self._lock:
+            sizes = self._load_sizes()
+            sizes[target] = len(data)
+            sizes.move_to_end(target)
+            self._evict()
+
+    def _evict(self) -> None:
+        """淘汰最久未使用的檔案直到低於容量上限；最新寫入的檔案一定保留。"""
+        sizes = self._sizes
+        total = sum(sizes.values())
+        while total > self.max_bytes and len(sizes) > 1:
+            file, size = sizes.popitem(last=False)
+            total -= size
+            try:
+                file.unlink()
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        """快取統計：命中、未命中、檔案數與總大小。"""
+        with self._lock:
+            sizes = self._load_sizes()
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(sizes),
+                'bytes': sum(sizes.values()),
+                'max_bytes': self.max_bytes,
+            }
+
+    def clear(self) -> None:
+        """刪除所有快取檔案。"""
+        with self._lock:
+            for file in list(self._load_sizes()):
+                try:
+                    file.unlink()
+                except FileNotFoundError:
+                    pass
+            self._sizes = OrderedDict()
+            self._keys.clear()
+
+
+# 分析與比較工具共用的快取
+image_cache = ImageCache.from_env()